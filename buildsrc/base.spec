@@ -39,6 +39,18 @@ extra_imports = [
     'petronia.arch.funcs_x64_win',
     'petronia.arch.funcs_x86_win',
     'petronia.shell.view.portal_chrome',
+
+    # Factories registered by "module:attribute" reference, which
+    # the import analysis can't see.
+    'petronia.system.logger',
+    'petronia.shell.control.split_layout',
+    'petronia.shell.control.portal',
+    'petronia.shell.control.root_layout',
+    'petronia.shell.control.command_handler',
+    'petronia.shell.control.active_portal_manager',
+    'petronia.shell.control.unowned_portal',
+    'petronia.shell.view.render_text',
+    'petronia.shell.native.shutdown',
 ]
 
 a = Analysis(scripts,
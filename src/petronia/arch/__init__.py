@@ -1,5 +1,7 @@
 """
 Low-Level Windows API Calls
-"""
 
-from . import funcs
+The native functions are in `petronia.arch.funcs`, which is only imported
+when used, so the platform independent modules here (such as the
+constants and the position batches) can be imported anywhere.
+"""
@@ -6,13 +6,21 @@ The required APIs are:
         *
     * GUI windows
         * mapping a window to a process ID
+
+Setting the environment variable PETRONIA_ARCH to "simulated" loads the
+functions from funcs_simulated instead, which run without Windows.
 """
 
+import os
 import sys
 import importlib
 
 # Top-level global def
-from .funcs_any_win import SHELL__CANCEL_CALLBACK_CHAIN
+from .windows_constants import SHELL__CANCEL_CALLBACK_CHAIN
+
+# Set to "simulated" to run against the in-memory desktop in funcs_simulated,
+# rather than Windows.
+ARCH_ENVIRONMENT_VARIABLE = 'PETRONIA_ARCH'
 
 
 def __load_functions(modules):
@@ -50,21 +58,31 @@ def __load_functions(modules):
     return ret
 
 
-__FUNCTIONS = __load_functions([
-    "petronia.arch.funcs_x86_win",
-    "petronia.arch.funcs_x64_win",
+def __load_simulated_functions():
+    from . import funcs_simulated
+    ret = {}
+    funcs_simulated.load_functions({'system': 'simulated'}, ret)
+    return ret
+
+
+if os.environ.get(ARCH_ENVIRONMENT_VARIABLE, '').strip().lower() == 'simulated':
+    __FUNCTIONS = __load_simulated_functions()
+else:
+    __FUNCTIONS = __load_functions([
+        "petronia.arch.funcs_x86_win",
+        "petronia.arch.funcs_x64_win",
 
-    # any_win must ALWAYS be after the bit ones.
-    "petronia.arch.funcs_any_win",
+        # any_win must ALWAYS be after the bit ones.
+        "petronia.arch.funcs_any_win",
 
-    # OS-specific come after the architecture ones
-    "petronia.arch.funcs_winXP",
-    "petronia.arch.funcs_winVista",
-    "petronia.arch.funcs_win7",
-    "petronia.arch.funcs_win8",
-    "petronia.arch.funcs_win10",
+        # OS-specific come after the architecture ones
+        "petronia.arch.funcs_winXP",
+        "petronia.arch.funcs_winVista",
+        "petronia.arch.funcs_win7",
+        "petronia.arch.funcs_win8",
+        "petronia.arch.funcs_win10",
 
-])
+    ])
 
 __current_module = importlib.import_module(__name__)
 for __k, __v in __FUNCTIONS.items():
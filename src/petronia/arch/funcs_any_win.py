@@ -9,6 +9,7 @@ from ctypes import WINFUNCTYPE, create_unicode_buffer, Structure, WinError, GetL
 from ctypes import sizeof as c_sizeof
 from ctypes import cast as c_cast
 from .windows_constants import *
+from .position_batch import PositionBatch
 import atexit
 import sys
 import traceback
@@ -41,9 +42,12 @@ def load_functions(environ, func_map):
     func_map['window__restore'] = window__restore
     func_map['window__get_visibility_states'] = window__get_visibility_states
     func_map['window__set_position'] = window__set_position
+    func_map['window__begin_batch'] = window__begin_batch
     func_map['window__set_layered_attributes'] = window__set_layered_attributes
     func_map['window__get_active_window'] = window__get_active_window
     func_map['window__activate'] = window__activate
+    func_map['window__set_timer'] = window__set_timer
+    func_map['window__kill_timer'] = window__kill_timer
     func_map['window__create_message_window'] = window__create_message_window
     func_map['window__create_display_window'] = window__create_display_window
     func_map['window__get_font_for_description'] = window__get_font_for_description
@@ -118,6 +122,18 @@ SystemParametersInfoW = windll.user32.SystemParametersInfoW
 
 SetWindowPos = windll.user32.SetWindowPos
 
+BeginDeferWindowPos = windll.user32.BeginDeferWindowPos
+BeginDeferWindowPos.argtypes = [c_int]
+BeginDeferWindowPos.restype = c_void_p
+
+DeferWindowPos = windll.user32.DeferWindowPos
+DeferWindowPos.argtypes = [c_void_p, c_void_p, c_void_p, c_int, c_int, c_int, c_int, c_uint]
+DeferWindowPos.restype = c_void_p
+
+EndDeferWindowPos = windll.user32.EndDeferWindowPos
+EndDeferWindowPos.argtypes = [c_void_p]
+EndDeferWindowPos.restype = wintypes.BOOL
+
 SetActiveWindow = windll.user32.SetActiveWindow
 
 SetForegroundWindow = windll.user32.SetForegroundWindow
@@ -496,6 +512,44 @@ def window__draw_border_outline(rect, color, width, line_style=PS_SOLID, fill_st
 
 
 def window__set_position(hwnd, hwnd_after_zorder, x, y, width, height, flags):
+    zorder, uflags = _set_position_args(hwnd_after_zorder, flags)
+    res = SetWindowPos(hwnd, zorder, x, y, width, height, uflags)
+    return res != 0
+
+
+def window__begin_batch():
+    """
+    Start moving several windows at once.
+
+    :return: a PositionBatch; see petronia.arch.position_batch
+    """
+    return DeferredPositionBatch()
+
+
+class DeferredPositionBatch(PositionBatch):
+    """
+    Moves the windows with the deferred window position calls, so they are
+    all redrawn in their new positions at once.
+    """
+    def _apply(self, entries):
+        if len(entries) > 1:
+            hdwp = BeginDeferWindowPos(len(entries))
+            for hwnd, hwnd_after_zorder, x, y, width, height, flags in entries:
+                if not hdwp:
+                    break
+                zorder, uflags = _set_position_args(hwnd_after_zorder, flags)
+                # Asynchronous positions are not allowed in a deferred batch.
+                hdwp = DeferWindowPos(hdwp, hwnd, zorder, x, y, width, height, uflags & ~SWP_ASYNCWINDOWPOS)
+            # When DeferWindowPos fails, it releases the batch itself.
+            if hdwp and EndDeferWindowPos(hdwp) != 0:
+                return [True] * len(entries)
+
+        # Move the windows one at a time.  If the batch failed, this also
+        # finds which windows are the problem.
+        return [window__set_position(*entry) for entry in entries]
+
+
+def _set_position_args(hwnd_after_zorder, flags):
     zorder = hwnd_after_zorder
     if zorder in HWND_ZORDER_MAP:
         zorder = HWND_ZORDER_MAP[zorder]
@@ -506,8 +560,7 @@ def window__set_position(hwnd, hwnd_after_zorder, x, y, width, height, flags):
         else:
             # TODO better error
             print("Unknown SWP set position flag {0}".format(flag))
-    res = SetWindowPos(hwnd, zorder, x, y, width, height, uflags)
-    return res != 0
+    return zorder, uflags
 
 
 def window__set_layered_attributes(hwnd, r, g, b, a):
@@ -526,6 +579,22 @@ def window__get_active_window():
     return hwnd
 
 
+def window__set_timer(hwnd, timer_id, milliseconds):
+    """
+    Post WM_TIMER messages, with the timer ID as the wparam, to the window
+    every `milliseconds`, until window__kill_timer.  Must be called from
+    the thread that owns the window.
+    """
+    res = windll.user32.SetTimer(hwnd, timer_id, milliseconds, None)
+    if res == 0:
+        raise WinError()
+
+
+def window__kill_timer(hwnd, timer_id):
+    res = windll.user32.KillTimer(hwnd, timer_id)
+    return res != 0
+
+
 def window__activate(hwnd):
     # Give the window the focus.  This is the Microsoft Magic Focus Dance.
     current_hwnd = windll.user32.GetForegroundWindow()
@@ -954,9 +1023,6 @@ def shell__is_key_pressed(vkey):
     return state != 0
 
 
-SHELL__CANCEL_CALLBACK_CHAIN = "Cancel"
-
-
 # see https://msdn.microsoft.com/en-us/library/windows/desktop/ms644967(v=vs.85).aspx
 class KBDLLHOOKSTRUCT(Structure):
     _fields_ = [
@@ -1375,9 +1441,9 @@ def process__get_exit_code(thread_pid):
     try:
         exit_code = wintypes.DWORD()
         if GetExitCodeProcess(hproc, byref(exit_code)) != 0:
-            if exit_code == STILL_ACTIVE:
+            if exit_code.value == STILL_ACTIVE:
                 return None
-            return int(exit_code)
+            return int(exit_code.value)
         raise WinError()
     finally:
         windll.kernel32.CloseHandle(hproc)
@@ -0,0 +1,110 @@
+"""
+Native functions backed by a SimulatedDesktop, rather than Windows.
+
+Selected by setting the environment variable PETRONIA_ARCH to "simulated"
+before `petronia.arch.funcs` is first imported.  If
+PETRONIA_SIMULATED_DESKTOP names a JSON file, the desktop starts with the
+monitors, windows and call latency it describes:
+
+    {
+        "monitors": [[0, 0, 1920, 1080]],
+        "latency": 0.001,
+        "windows": [
+            {"class": "Notepad", "title": "Untitled", "pid": 2000,
+             "rect": [10, 10, 640, 480], "resizable": true}
+        ]
+    }
+"""
+
+import json
+import os
+from .simulated_desktop import SimulatedDesktop
+
+SCENARIO_ENVIRONMENT_VARIABLE = 'PETRONIA_SIMULATED_DESKTOP'
+
+# Every function in petronia.arch.funcs.
+NATIVE_FUNCTIONS = (
+    'window__find_handles', 'window__enum_window_handles', 'window__find_handle_for_class_title',
+    'window__find_handle_for_child_class_title', 'window__get_title', 'window__is_visible',
+    'window__get_process_id', 'window__get_class_name', 'window__get_module_filename',
+    'window__get_thread_window_handles', 'window__get_child_window_handles',
+    'window__border_rectangle', 'window__client_rectangle', 'window__move_resize', 'window__redraw',
+    'window__repaint', 'window__wait_gui_thread_idle', 'window__send_message', 'window__post_message',
+    'window__close', 'window__maximize', 'window__minimize', 'window__restore',
+    'window__get_visibility_states', 'window__draw_border_outline', 'window__set_position',
+    'window__begin_batch', 'window__set_layered_attributes', 'window__get_active_window',
+    'window__activate', 'window__set_timer', 'window__kill_timer', 'window__set_style', 'window__has_style', 'window__get_style',
+    'window__create_message_window', 'window__create_display_window', 'window__create_borderless_window',
+    'window__get_font_for_description', 'window__get_text_size', 'window__do_paint', 'window__do_draw',
+    'paint__draw_rect', 'paint__draw_text', 'paint__draw_outline_text',
+    'shell__get_task_bar_window_handles', 'shell__find_notification_icons', 'shell__is_key_pressed',
+    'shell__keyboard_hook', 'shell__shell_hook', 'shell__unhook', 'shell__inject_scancode',
+    'shell__lock_workstation', 'shell__register_window_hook', 'shell__create_global_message_handler',
+    'shell__pump_messages', 'shell__system_parameters_info', 'shell__get_window_metrics',
+    'shell__get_raw_window_metrics', 'shell__set_window_metrics', 'shell__set_border_size',
+    'shell__open_start_menu',
+    'monitor__find_monitors',
+    'process__get_current_pid', 'process__get_current_username_domain',
+    'process__get_username_domain_for_pid', 'process__get_executable_filename', 'process__get_exit_code',
+    'process__get_all_pids', 'process__load_all_process_details', 'process__get_all_service_information',
+    'process__get_window_state',
+)
+
+_DESKTOP = [None]
+
+
+def load_functions(environ, func_map):
+    for name in NATIVE_FUNCTIONS:
+        func_map[name] = _native_function(name)
+
+
+def get_desktop():
+    """
+    The desktop the native functions run against.  Created on first use.
+    """
+    if _DESKTOP[0] is None:
+        _DESKTOP[0] = _create_desktop()
+    return _DESKTOP[0]
+
+
+def set_desktop(desktop):
+    """
+    Replace the desktop, such as at the start of a test.  The functions
+    already imported from petronia.arch.funcs use the new desktop.
+    """
+    assert isinstance(desktop, SimulatedDesktop)
+    _DESKTOP[0] = desktop
+
+
+def load_scenario(desktop, scenario):
+    """
+    Add the monitors, windows and latency from the scenario dict (the
+    format is in the module description) to the desktop.
+    """
+    if 'monitors' in scenario:
+        desktop.set_monitors([tuple(monitor) for monitor in scenario['monitors']])
+    for window in scenario.get('windows', []):
+        desktop.create_window(
+            window['class'], window.get('title', ''), pid=window.get('pid'),
+            rect=window.get('rect') and tuple(window['rect']) or None,
+            style=window.get('style') and frozenset(window['style']) or None,
+            resizable=window.get('resizable', True),
+            min_size=window.get('min-size') and tuple(window['min-size']) or None)
+    if 'latency' in scenario:
+        desktop.set_latency(float(scenario['latency']))
+
+
+def _create_desktop():
+    ret = SimulatedDesktop(current_pid=os.getpid())
+    filename = os.environ.get(SCENARIO_ENVIRONMENT_VARIABLE)
+    if filename:
+        with open(filename, 'r') as f:
+            load_scenario(ret, json.load(f))
+    return ret
+
+
+def _native_function(name):
+    def call(*args, **kwargs):
+        return get_desktop().call(name, args, kwargs)
+    call.__name__ = name
+    return call
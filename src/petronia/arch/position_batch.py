@@ -0,0 +1,87 @@
+"""
+Moves several windows at once.  A batch is started with
+`window__begin_batch()`, each window is added to it with `add`, and
+`commit` applies all the positions together, so the windows move in one
+step rather than one after the other.
+
+This module has no native calls; the Windows batch is in funcs_any_win.
+"""
+
+
+class PositionBatch(object):
+    """
+    Base class for the window position batches.  The arguments to `add` are
+    the same as for `window__set_position`.
+    """
+    def __init__(self):
+        # (hwnd, z-order, x, y, width, height, flags)
+        self.__entries = []
+        self.__committed = False
+
+    @property
+    def entries(self):
+        return tuple(self.__entries)
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def add(self, hwnd, hwnd_after_zorder, x, y, width, height, flags):
+        """
+
+        :return: the index of the window in the batch; the commit results are
+            in the same order.
+        """
+        assert not self.__committed
+        self.__entries.append((hwnd, hwnd_after_zorder, x, y, width, height, tuple(flags)))
+        return len(self.__entries) - 1
+
+    def commit(self):
+        """
+        Apply all the positions.  A batch can only be committed once.
+
+        :return: list of True or False for each added window, False if that
+            window could not be positioned.
+        """
+        assert not self.__committed
+        self.__committed = True
+        if len(self.__entries) <= 0:
+            return []
+        return self._apply(self.__entries)
+
+    def _apply(self, entries):
+        raise NotImplementedError()
+
+
+class RecordingPositionBatch(PositionBatch):
+    """
+    A batch that records the positions in a PositionBatchRecorder, rather
+    than moving any window.
+    """
+    def __init__(self, recorder):
+        PositionBatch.__init__(self)
+        self.__recorder = recorder
+
+    def _apply(self, entries):
+        return self.__recorder.record(entries)
+
+
+class PositionBatchRecorder(object):
+    """
+    Stands in for `window__begin_batch` in tests: keeps each committed batch,
+    in order.
+    """
+    def __init__(self, failed_hwnds=None):
+        """
+
+        :param failed_hwnds: windows which report a failure, as if they were
+            closed.
+        """
+        self.batches = []
+        self.failed_hwnds = set(failed_hwnds or ())
+
+    def begin_batch(self):
+        return RecordingPositionBatch(self)
+
+    def record(self, entries):
+        self.batches.append(list(entries))
+        return [entry[0] not in self.failed_hwnds for entry in entries]
@@ -0,0 +1,1115 @@
+"""
+A desktop that only exists in memory, so Petronia can run without Windows.
+
+The SimulatedDesktop keeps the windows (class, title, process, rectangle,
+style, show state), the z-order and focus, the monitors, the processes, and
+the installed keyboard and shell hooks.  Its native methods have the same
+names and return values as the functions in `petronia.arch.funcs`, and
+`funcs_simulated` installs them in place of the Windows functions.
+
+The test side of the desktop acts like the user and the other
+applications: `create_window`, `destroy_window`, `set_title`, `click`,
+`press_key` and so on, which send the same shell hook messages that Windows
+would.  Each native call can be slowed down or made to fail, either for all
+windows or for a single hung window.
+
+Messages are delivered like Windows does it: each window belongs to the
+thread that created it, and the messages posted to it wait in that thread's
+queue until it calls `shell__pump_messages` (or `dispatch_messages`).  The
+keyboard hooks are called directly by `press_key`, in the caller's thread.
+"""
+
+import collections
+import ctypes
+import queue
+import random
+import threading
+import time
+
+from .windows_constants import (
+    PETRONIA_CREATED_WINDOW__CLASS_PREFIX, SHELL__CANCEL_CALLBACK_CHAIN,
+    HWND_ZORDER_MAP, WS_STYLE_BIT_MAP, WS_EX_STYLE_BIT_MAP,
+    WM_CLOSE, WM_QUIT, WM_PAINT, WM_DISPLAYCHANGE, WM_TIMER,
+    WM_NCACTIVATE, WM_NCCALCSIZE, WM_NCHITTEST, HTCLIENT,
+)
+from .position_batch import PositionBatch
+
+# The message ID returned for the "SHELLHOOK" registered message.
+SHELL_HOOK_MESSAGE_ID = 0xC028
+
+# Shell hook codes; see petronia.shell.native.windows_hook_event
+HSHELL_WINDOWCREATED = 1
+HSHELL_WINDOWDESTROYED = 2
+HSHELL_WINDOWACTIVATED = 4
+HSHELL_GETMINRECT = 5
+HSHELL_REDRAW = 6
+HSHELL_FLASH = 0x8006
+
+# The window show states.
+HIDDEN = 'hidden'
+RESTORED = 'restored'
+MINIMIZED = 'minimized'
+MAXIMIZED = 'maximized'
+
+# Where Windows puts minimized windows.
+MINIMIZED_RECT = {'x': -32000, 'y': -32000, 'width': 160, 'height': 28}
+
+# Border and caption space around the client area of a framed window
+# (left, top, right, bottom).
+_FRAME_INSETS = (8, 31, 8, 8)
+
+# Style of an ordinary application window.
+DEFAULT_WINDOW_STYLE = frozenset([
+    'border', 'dialog-frame', 'sysmenu-button', 'size-border', 'minimize-button', 'maximize-button',
+    'clip-siblings', 'visible', 'window-edge', 'app-window',
+])
+
+# Passed as the failure result to make the call raise an OSError.
+RAISE = object()
+
+_DEFAULT_WINDOW_METRICS = {
+    'border-width': 1,
+    'scroll-width': 17,
+    'scroll-height': 17,
+    'caption-width': 36,
+    'caption-height': 22,
+    'sm-caption-width': 22,
+    'sm-caption-height': 22,
+    'menu-width': 19,
+    'menu-height': 19,
+    'padded-border-width': 4,
+}
+
+
+class SHELLHOOKINFO(ctypes.Structure):
+    """Same layout as the structure sent with HSHELL_GETMINRECT."""
+    _fields_ = [
+        ("hwnd", ctypes.c_void_p),
+        ("left", ctypes.c_long),
+        ("top", ctypes.c_long),
+        ("right", ctypes.c_long),
+        ("bottom", ctypes.c_long),
+    ]
+
+
+class SimulatedWindow(object):
+    def __init__(self, hwnd, class_name, title, pid, thread_id, rect, style, resizable, min_size):
+        self.hwnd = hwnd
+        self.class_name = class_name
+        self.title = title
+        self.pid = pid
+        self.thread_id = thread_id
+        self.rect = dict(rect)
+        self.restore_rect = dict(rect)
+        self.style = dict(style)
+        self.show_state = style.get('visible') and RESTORED or HIDDEN
+        self.resizable = resizable
+        self.min_size = min_size
+        self.alpha = None
+        # Set for the windows created through the native functions.
+        self.message_handler = None
+        self.flash_count = 0
+        self.paint_count = 0
+        self.close_requests = 0
+
+
+class SimulatedProcess(object):
+    def __init__(self, pid, username, domain, executable):
+        self.pid = pid
+        self.username = username
+        self.domain = domain
+        self.executable = executable
+        self.exit_code = None
+
+
+class _Failure(object):
+    def __init__(self, count, rate, result, hwnd):
+        self.count = count
+        self.rate = rate
+        self.result = result
+        self.hwnd = hwnd
+
+
+class SimulatedDesktop(object):
+    def __init__(self, monitors=None, current_pid=1000, seed=0, sleep=time.sleep):
+        """
+
+        :param monitors: list of (x, y, width, height); defaults to a single
+            1920x1080 monitor.
+        :param current_pid: the process ID of Petronia itself.
+        :param seed: for the random failures.
+        :param sleep: used for the call latency.
+        """
+        self.__lock = threading.RLock()
+        self.__sleep = sleep
+        self.__random = random.Random(seed)
+        self.__next_hwnd = 0x10010
+        self.__next_handle = 0x50000
+        self.__windows = {}
+        # Top-most window first.
+        self.__z_order = []
+        self.__active = None
+        self.__monitors = []
+        for monitor in (monitors or [(0, 0, 1920, 1080)]):
+            self.add_monitor(*monitor)
+        self.__processes = {}
+        self.__current_pid = current_pid
+        self.add_process(current_pid, 'user', 'desktop', 'c:\\petronia\\python.exe')
+        self.__registered_classes = set()
+        # thread ID -> queue.Queue of (hwnd, message, wparam, lparam, keep-alive)
+        self.__thread_queues = {}
+        # (hwnd, timer ID) -> milliseconds
+        self.__timers = {}
+        self.__shell_hook_windows = []
+        self.__hooks = collections.OrderedDict()
+        self.__pressed_keys = set()
+        self.__fonts = {}
+        self.__system_parameters = {}
+        self.__window_metrics = dict(_DEFAULT_WINDOW_METRICS)
+        self.__default_latency = 0.0
+        self.__latency = {}
+        self.__hung_windows = {}
+        self.__failures = {}
+        self.__call_counts = collections.Counter()
+        self.__batch_sizes = []
+        self.locked = False
+        self.start_menu_count = 0
+
+    # ------------------------------------------------------------------
+    # Calls, latency and failures
+
+    def call(self, name, args, kwargs):
+        """
+        Run the native method `name`, after the configured latency, or fail
+        it if a failure was injected.
+        """
+        # Most of the native functions take the window handle first.
+        hwnd = None
+        if len(args) > 0 and isinstance(args[0], int):
+            hwnd = args[0]
+        with self.__lock:
+            self.__call_counts[name] += 1
+            delay = self.__latency.get(name, self.__default_latency)
+            if hwnd in self.__hung_windows:
+                delay += self.__hung_windows[hwnd]
+            failure = self.__next_failure(name, hwnd)
+        if delay > 0:
+            self.__sleep(delay)
+        if failure is not None:
+            if failure.result is RAISE:
+                raise OSError("simulated failure in {0}".format(name))
+            return failure.result
+        return getattr(self, name)(*args, **kwargs)
+
+    def set_latency(self, seconds, name=None):
+        """
+        Make each native call take this long.
+
+        :param seconds:
+        :param name: the native function name, or None for every function
+            without its own latency.
+        """
+        with self.__lock:
+            if name is None:
+                self.__default_latency = seconds
+            else:
+                self.__latency[name] = seconds
+
+    def hang_window(self, hwnd, seconds):
+        """Make every call on the window take `seconds` longer; 0 to stop."""
+        with self.__lock:
+            if seconds > 0:
+                self.__hung_windows[hwnd] = seconds
+            else:
+                self.__hung_windows.pop(hwnd, None)
+
+    def fail(self, name, count=1, rate=None, result=RAISE, hwnd=None):
+        """
+        Make calls to the native function fail.
+
+        :param name:
+        :param count: number of calls to fail, or None for no limit.
+        :param rate: chance (0 to 1) that a call fails, or None to fail every
+            call.
+        :param result: returned by the failed call; RAISE raises an OSError.
+        :param hwnd: only fail calls on this window.
+        """
+        with self.__lock:
+            self.__failures.setdefault(name, []).append(_Failure(count, rate, result, hwnd))
+
+    def clear_failures(self):
+        with self.__lock:
+            self.__failures.clear()
+
+    @property
+    def call_counts(self):
+        """Native function name -> number of calls."""
+        with self.__lock:
+            return dict(self.__call_counts)
+
+    @property
+    def batch_sizes(self):
+        """The number of windows in each committed position batch."""
+        with self.__lock:
+            return list(self.__batch_sizes)
+
+    def __next_failure(self, name, hwnd):
+        failures = self.__failures.get(name)
+        if not failures:
+            return None
+        for failure in list(failures):
+            if failure.hwnd is not None and failure.hwnd != hwnd:
+                continue
+            if failure.rate is not None and self.__random.random() >= failure.rate:
+                continue
+            if failure.count is not None:
+                failure.count -= 1
+                if failure.count <= 0:
+                    failures.remove(failure)
+            return failure
+        return None
+
+    # ------------------------------------------------------------------
+    # The user and the other applications
+
+    def add_monitor(self, x, y, width, height):
+        with self.__lock:
+            self.__monitors.append({'x': x, 'y': y, 'width': width, 'height': height})
+
+    def set_monitors(self, monitors):
+        """Replace the monitors, and tell the windows, as a display change does."""
+        with self.__lock:
+            self.__monitors = []
+            for monitor in monitors:
+                self.add_monitor(*monitor)
+            hwnds = list(self.__windows.keys())
+        for hwnd in hwnds:
+            self.__post(hwnd, WM_DISPLAYCHANGE, 32, 0)
+
+    def add_process(self, pid, username='user', domain='desktop', executable=None):
+        with self.__lock:
+            self.__processes[pid] = SimulatedProcess(
+                pid, username, domain, executable or 'c:\\apps\\app{0}.exe'.format(pid))
+
+    def create_window(self, class_name, title, pid=None, rect=None, style=None,
+                      resizable=True, min_size=None, activate=True, thread_id=None):
+        """
+        Open an application window.
+
+        :param class_name:
+        :param title:
+        :param pid: the owning process; created if it doesn't exist.
+        :param rect: (x, y, width, height)
+        :param style: collection of style names; defaults to
+            DEFAULT_WINDOW_STYLE.  Without 'visible', the window is hidden.
+        :param resizable: False if the window ignores size changes.
+        :param min_size: (width, height) the window can't be made smaller than.
+        :param activate: give the window the focus.
+        :param thread_id:
+        :return: hwnd
+        """
+        if pid is None:
+            pid = self.__current_pid + 1
+        if rect is None:
+            rect = (100, 100, 800, 600)
+        if style is None:
+            style = DEFAULT_WINDOW_STYLE
+        with self.__lock:
+            if pid not in self.__processes:
+                self.add_process(pid)
+            hwnd = self.__next_hwnd
+            self.__next_hwnd += 2
+            window = SimulatedWindow(
+                hwnd, class_name, title, pid, thread_id, _rect(*rect), _style(style), resizable, min_size)
+            self.__windows[hwnd] = window
+            self.__z_order.insert(self.__top_index(window), hwnd)
+            shown = window.show_state != HIDDEN
+        if shown:
+            self.__shell_event(HSHELL_WINDOWCREATED, hwnd)
+            if activate:
+                self.__activate(hwnd)
+        return hwnd
+
+    def destroy_window(self, hwnd):
+        with self.__lock:
+            window = self.__windows.pop(hwnd, None)
+            if window is None:
+                return False
+            self.__z_order.remove(hwnd)
+            if hwnd in self.__shell_hook_windows:
+                self.__shell_hook_windows.remove(hwnd)
+            for key in [key for key in self.__timers if key[0] == hwnd]:
+                del self.__timers[key]
+            was_active = self.__active == hwnd
+            if was_active:
+                self.__active = None
+        self.__shell_event(HSHELL_WINDOWDESTROYED, hwnd)
+        if was_active:
+            self.__activate_next()
+        return True
+
+    def kill_process(self, pid, exit_code=1):
+        """End the process and close all its windows."""
+        with self.__lock:
+            self.__processes[pid].exit_code = exit_code
+            hwnds = [hwnd for hwnd, window in self.__windows.items() if window.pid == pid]
+        for hwnd in hwnds:
+            self.destroy_window(hwnd)
+
+    def set_title(self, hwnd, title):
+        with self.__lock:
+            self.__windows[hwnd].title = title
+        self.__shell_event(HSHELL_REDRAW, hwnd)
+
+    def click(self, hwnd):
+        """The user clicks on the window, which restores and focuses it."""
+        with self.__lock:
+            window = self.__windows[hwnd]
+            if window.show_state == MINIMIZED:
+                window.show_state = RESTORED
+                window.rect = dict(window.restore_rect)
+        self.__activate(hwnd)
+
+    def flash(self, hwnd):
+        with self.__lock:
+            self.__windows[hwnd].flash_count += 1
+        self.__shell_event(HSHELL_FLASH, hwnd)
+
+    def press_key(self, vk_code, is_key_up=False, scan_code=0, is_injected=False):
+        """
+        Send a key through the installed keyboard hooks, newest first.
+
+        :return: True if the key reached the application, False if a hook
+            cancelled it.
+        """
+        with self.__lock:
+            if is_key_up:
+                self.__pressed_keys.discard(vk_code)
+            else:
+                self.__pressed_keys.add(vk_code)
+            hooks = [hook for kind, hook in reversed(list(self.__hooks.values())) if kind == 'keyboard']
+        for hook in hooks:
+            if hook(vk_code, scan_code, is_key_up, is_injected) == SHELL__CANCEL_CALLBACK_CHAIN:
+                return False
+        return True
+
+    def tap_key(self, vk_code):
+        down = self.press_key(vk_code)
+        up = self.press_key(vk_code, True)
+        return down and up
+
+    def fire_timers(self):
+        """
+        Post one WM_TIMER message for each timer.  Time doesn't pass on its
+        own here, so the timers only go off when this is called.
+
+        :return: the number of timers.
+        """
+        with self.__lock:
+            timers = list(self.__timers.keys())
+        for hwnd, timer_id in timers:
+            self.__post(hwnd, WM_TIMER, timer_id, 0)
+        return len(timers)
+
+    def dispatch_messages(self, thread_id=None):
+        """
+        Handle the messages waiting for the thread's windows, without
+        blocking.
+
+        :return: the number of messages handled, or -1 if a quit message was
+            found.
+        """
+        q = self.__thread_queue(thread_id)
+        count = 0
+        while True:
+            try:
+                message = q.get_nowait()
+            except queue.Empty:
+                return count
+            if message[1] == WM_QUIT:
+                return -1
+            self.__dispatch(message)
+            count += 1
+
+    # ------------------------------------------------------------------
+    # Inspection
+
+    def window(self, hwnd):
+        """
+        :return: the SimulatedWindow, or None.  Don't change it directly.
+        """
+        with self.__lock:
+            return self.__windows.get(hwnd)
+
+    @property
+    def z_order(self):
+        """The window handles, top-most first."""
+        with self.__lock:
+            return list(self.__z_order)
+
+    @property
+    def active_window(self):
+        with self.__lock:
+            return self.__active
+
+    # ------------------------------------------------------------------
+    # Native windows functions
+
+    def window__find_handles(self):
+        with self.__lock:
+            return list(self.__z_order)
+
+    def window__enum_window_handles(self, callback):
+        for hwnd in self.window__find_handles():
+            if not callback(hwnd):
+                break
+
+    def window__find_handle_for_class_title(self, class_name, title):
+        return self.window__find_handle_for_child_class_title(None, None, class_name, title)
+
+    def window__find_handle_for_child_class_title(self, hwnd_parent, hwnd_child_after, class_name, title):
+        # Child windows are not simulated.
+        if hwnd_parent:
+            return 0
+        with self.__lock:
+            hwnds = self.__z_order
+            if hwnd_child_after in hwnds:
+                hwnds = hwnds[hwnds.index(hwnd_child_after) + 1:]
+            for hwnd in hwnds:
+                window = self.__windows[hwnd]
+                if class_name is not None and window.class_name != class_name:
+                    continue
+                if title is not None and window.title != title:
+                    continue
+                return hwnd
+        return 0
+
+    def window__get_title(self, hwnd):
+        with self.__lock:
+            window = self.__windows.get(hwnd)
+            return window is not None and window.title or ""
+
+    def window__is_visible(self, hwnd):
+        with self.__lock:
+            window = self.__windows.get(hwnd)
+            return window is not None and window.show_state != HIDDEN
+
+    def window__get_process_id(self, hwnd):
+        with self.__lock:
+            window = self.__windows.get(hwnd)
+            # The native function returns a DWORD.
+            return ctypes.c_ulong(window is not None and window.pid or 0)
+
+    def window__get_class_name(self, hwnd):
+        with self.__lock:
+            window = self.__windows.get(hwnd)
+            return window is not None and window.class_name or ""
+
+    def window__get_module_filename(self, hwnd):
+        with self.__lock:
+            window = self.__windows.get(hwnd)
+            if window is None or window.pid not in self.__processes:
+                return None
+            return self.__processes[window.pid].executable
+
+    def window__get_thread_window_handles(self, thread_process_id):
+        with self.__lock:
+            return [hwnd for hwnd in self.__z_order if self.__windows[hwnd].thread_id == thread_process_id]
+
+    def window__get_child_window_handles(self, hwnd_parent):
+        return []
+
+    def window__border_rectangle(self, hwnd):
+        with self.__lock:
+            window = self.__get(hwnd)
+            if window.show_state == MINIMIZED:
+                rect = MINIMIZED_RECT
+            elif window.show_state == MAXIMIZED:
+                rect = self.__monitor_for(window.restore_rect)
+            else:
+                rect = window.rect
+            return _rect_dict(rect['x'], rect['y'], rect['width'], rect['height'])
+
+    def window__client_rectangle(self, hwnd):
+        with self.__lock:
+            rect = self.window__border_rectangle(hwnd)
+            if self.__windows[hwnd].style.get('popup'):
+                return _rect_dict(0, 0, rect['width'], rect['height'])
+            left, top, right, bottom = _FRAME_INSETS
+            return _rect_dict(
+                0, 0, max(0, rect['width'] - left - right), max(0, rect['height'] - top - bottom))
+
+    def window__move_resize(self, hwnd, x, y, width, height, repaint=True):
+        with self.__lock:
+            self.__get(hwnd)
+            self.__place(hwnd, x, y, width, height, False, False)
+
+    def window__redraw(self, hwnd):
+        self.window__repaint(hwnd)
+
+    def window__repaint(self, hwnd):
+        with self.__lock:
+            self.__get(hwnd)
+        self.__post(hwnd, WM_PAINT, 0, 0)
+
+    def window__wait_gui_thread_idle(self, hwnd):
+        pass
+
+    def window__send_message(self, hwnd, key, arg1, arg2):
+        with self.__lock:
+            window = self.__windows.get(hwnd)
+            if window is None:
+                return 0
+            owner = window.thread_id
+        if key == WM_QUIT or owner is None or owner != threading.get_ident():
+            # Can't run in another thread's message loop; queue it instead.
+            return self.window__post_message(hwnd, key, arg1, arg2)
+        return self.__dispatch((hwnd, key, arg1, arg2, None))
+
+    def window__post_message(self, hwnd, key, arg1, arg2):
+        with self.__lock:
+            if hwnd not in self.__windows:
+                return False
+        return self.__post(hwnd, key, arg1, arg2)
+
+    def window__close(self, hwnd):
+        return self.window__post_message(hwnd, WM_CLOSE, 0, 0)
+
+    def window__maximize(self, hwnd):
+        with self.__lock:
+            window = self.__windows.get(hwnd)
+            if window is None:
+                return False
+            if window.show_state == RESTORED:
+                window.restore_rect = dict(window.rect)
+            window.show_state = MAXIMIZED
+        self.__activate(hwnd)
+        return True
+
+    def window__minimize(self, hwnd):
+        with self.__lock:
+            window = self.__get(hwnd)
+            if window.show_state == RESTORED:
+                window.restore_rect = dict(window.rect)
+            window.show_state = MINIMIZED
+            was_active = self.__active == hwnd
+            if was_active:
+                self.__active = None
+            rect = window.restore_rect
+        info = SHELLHOOKINFO(hwnd, rect['x'], rect['y'], rect['x'] + rect['width'], rect['y'] + rect['height'])
+        self.__shell_event(HSHELL_GETMINRECT, ctypes.addressof(info), info)
+        if was_active:
+            self.__activate_next()
+
+    def window__restore(self, hwnd):
+        with self.__lock:
+            window = self.__windows.get(hwnd)
+            if window is None or window.show_state == RESTORED:
+                return
+            window.show_state = RESTORED
+            window.rect = dict(window.restore_rect)
+
+    def window__get_visibility_states(self, hwnd):
+        with self.__lock:
+            window = self.__windows.get(hwnd)
+            if window is None:
+                return []
+            if window.show_state == HIDDEN:
+                return ['hidden']
+            ret = ['shown', window.show_state]
+            if self.__active == hwnd:
+                ret.append('active')
+            return ret
+
+    def window__draw_border_outline(self, rect, color, width, line_style=None, fill_style=None, parent_hwnd=None):
+        pass
+
+    def window__set_position(self, hwnd, hwnd_after_zorder, x, y, width, height, flags):
+        with self.__lock:
+            if hwnd not in self.__windows:
+                return False
+            self.__set_position(hwnd, hwnd_after_zorder, x, y, width, height, flags)
+        if hwnd_after_zorder is not None and 'no-zorder' not in flags and 'no-activate' not in flags:
+            self.__activate(hwnd)
+        return True
+
+    def window__begin_batch(self):
+        return SimulatedPositionBatch(self)
+
+    def window__set_layered_attributes(self, hwnd, r, g, b, a):
+        with self.__lock:
+            self.__get(hwnd).alpha = a
+
+    def window__get_active_window(self):
+        with self.__lock:
+            return self.__active
+
+    def window__activate(self, hwnd):
+        with self.__lock:
+            if hwnd not in self.__windows:
+                return False
+        self.__activate(hwnd)
+        return True
+
+    def window__set_timer(self, hwnd, timer_id, milliseconds):
+        with self.__lock:
+            self.__get(hwnd)
+            self.__timers[(hwnd, timer_id)] = milliseconds
+
+    def window__kill_timer(self, hwnd, timer_id):
+        with self.__lock:
+            return self.__timers.pop((hwnd, timer_id), None) is not None
+
+    @property
+    def timers(self):
+        """(hwnd, timer ID) -> milliseconds"""
+        with self.__lock:
+            return dict(self.__timers)
+
+    def window__set_style(self, hwnd, style_update):
+        assert isinstance(style_update, dict)
+        with self.__lock:
+            window = self.__get(hwnd)
+            original = dict(window.style)
+            for key, value in style_update.items():
+                if key in window.style:
+                    window.style[key] = bool(value)
+            return original
+
+    def window__has_style(self, hwnd, style):
+        # Same as the native function.
+        return style in self.window__get_style(hwnd)
+
+    def window__get_style(self, hwnd):
+        with self.__lock:
+            window = self.__windows.get(hwnd)
+            if window is None:
+                return _style(())
+            return dict(window.style)
+
+    def window__create_message_window(self, class_name, message_handler):
+        if not class_name.startswith(PETRONIA_CREATED_WINDOW__CLASS_PREFIX):
+            class_name = PETRONIA_CREATED_WINDOW__CLASS_PREFIX + class_name
+        return self.__create_own_window(class_name, None, message_handler, ())
+
+    def window__create_display_window(self, class_name, title, message_handler, style_flags):
+        if not class_name.startswith(PETRONIA_CREATED_WINDOW__CLASS_PREFIX):
+            class_name = PETRONIA_CREATED_WINDOW__CLASS_PREFIX + class_name
+        hwnd = self.__create_own_window(class_name, title or "", message_handler, set(style_flags) | {'visible'})
+        self.__shell_event(HSHELL_WINDOWCREATED, hwnd)
+        self.__activate(hwnd)
+        self.__post(hwnd, WM_PAINT, 0, 0)
+        return hwnd
+
+    def window__create_borderless_window(self, class_name, title, message_handler, callback_map,
+                                         show_on_taskbar=True, always_on_top=False):
+        style_flags = {'popup', 'visible', 'transparent'}
+        if always_on_top:
+            style_flags.add('topmost')
+        if not show_on_taskbar:
+            style_flags.add('tool-window')
+        callback_map[WM_NCACTIVATE] = lambda hwnd, msg, wparam, lparam: 0
+        callback_map[WM_NCCALCSIZE] = lambda hwnd, msg, wparam, lparam: lparam == 0 and 0 or False
+        callback_map[WM_NCHITTEST] = lambda hwnd, msg, wparam, lparam: HTCLIENT
+        return self.window__create_display_window(class_name, title, message_handler, style_flags)
+
+    def window__get_font_for_description(self, font, hwnd=None, base_hdc=None):
+        with self.__lock:
+            if font not in self.__fonts:
+                point = 12
+                for param in font.split(',')[1:]:
+                    param = param.strip().lower()
+                    if param.endswith('pt'):
+                        point = int(param[:-2])
+                self.__fonts[font] = (self.__new_handle(), point)
+            return self.__fonts[font][0]
+
+    def window__get_text_size(self, hfont, text, hwnd=None, base_hdc=None):
+        point = 12
+        with self.__lock:
+            for handle, font_point in self.__fonts.values():
+                if handle == hfont:
+                    point = font_point
+        # Roughly a proportional font at 96 DPI.
+        height = (point * 96) // 72
+        lines = text.splitlines()
+        return max([len(line) * height // 2 for line in lines] or [0]), height * len(lines)
+
+    def window__do_paint(self, hwnd, paint_callback):
+        with self.__lock:
+            self.__get(hwnd).paint_count += 1
+        return paint_callback(hwnd, hwnd)
+
+    def window__do_draw(self, hwnd, paint_callback):
+        self.window__do_paint(hwnd, paint_callback)
+
+    def paint__draw_rect(self, hdc, pos_x, pos_y, width, height, color):
+        pass
+
+    def paint__draw_text(self, hdc, hfont, text, pos_x, pos_y, width, height, fg_color, bg_color):
+        pass
+
+    def paint__draw_outline_text(self, hdc, hfont, text, pos_x, pos_y, outline_width, outline_color,
+                                 fill_color, bg_color):
+        pass
+
+    # ------------------------------------------------------------------
+    # Native shell functions
+
+    def shell__get_task_bar_window_handles(self):
+        with self.__lock:
+            return [hwnd for hwnd in self.__z_order if self.__windows[hwnd].class_name == "Shell_TrayWnd"]
+
+    def shell__find_notification_icons(self):
+        return []
+
+    def shell__is_key_pressed(self, vkey):
+        with self.__lock:
+            return vkey in self.__pressed_keys
+
+    def shell__keyboard_hook(self, callback):
+        return self.__add_hook('keyboard', callback)
+
+    def shell__shell_hook(self, callback):
+        return self.__add_hook('shell', callback)
+
+    def shell__unhook(self, hook_id):
+        with self.__lock:
+            self.__hooks.pop(hook_id, None)
+
+    def shell__inject_scancode(self, scancode, is_key_up):
+        self.press_key(scancode, is_key_up, scancode, True)
+
+    def shell__lock_workstation(self):
+        self.locked = True
+
+    def shell__register_window_hook(self, hwnd, message_id_callbacks=None, callback=None):
+        assert message_id_callbacks is None or isinstance(message_id_callbacks, dict)
+        with self.__lock:
+            self.__get(hwnd)
+            if hwnd not in self.__shell_hook_windows:
+                self.__shell_hook_windows.append(hwnd)
+        if message_id_callbacks:
+            message_id_callbacks[SHELL_HOOK_MESSAGE_ID] = callback
+        return SHELL_HOOK_MESSAGE_ID
+
+    def shell__create_global_message_handler(self, message_id_callbacks):
+        assert isinstance(message_id_callbacks, dict)
+
+        def handler(hwnd, message, wparam, lparam):
+            if message in message_id_callbacks:
+                ret = message_id_callbacks[message](hwnd, message, wparam, lparam)
+                if ret is not False:
+                    return ret or 0
+            elif message == WM_CLOSE:
+                self.destroy_window(hwnd)
+                self.__post_thread_message(threading.get_ident(), WM_QUIT)
+                return 0
+            return 0
+
+        return handler
+
+    def shell__pump_messages(self, on_exit_callback=None):
+        assert on_exit_callback is None or callable(on_exit_callback)
+        q = self.__thread_queue(None)
+        while True:
+            message = q.get()
+            if message[1] == WM_QUIT:
+                if on_exit_callback is not None:
+                    on_exit_callback()
+                return
+            self.__dispatch(message)
+
+    def shell__system_parameters_info(self, values):
+        assert isinstance(values, dict)
+        with self.__lock:
+            for parameter, value in values.items():
+                self.__system_parameters[parameter] = value
+
+    def shell__get_window_metrics(self):
+        with self.__lock:
+            return dict(self.__window_metrics)
+
+    def shell__get_raw_window_metrics(self):
+        return self.shell__get_window_metrics()
+
+    def shell__set_window_metrics(self, metrics):
+        with self.__lock:
+            self.__window_metrics.update(metrics)
+
+    def shell__set_border_size(self, border_width, border_padding):
+        self.shell__set_window_metrics({'border-width': border_width, 'padded-border-width': border_padding})
+
+    def shell__open_start_menu(self, show_taskbar=False):
+        with self.__lock:
+            self.start_menu_count += 1
+
+    # ------------------------------------------------------------------
+    # Native monitor and process functions
+
+    def monitor__find_monitors(self):
+        ret = []
+        with self.__lock:
+            for index, monitor in enumerate(self.__monitors):
+                info = _rect_dict(monitor['x'], monitor['y'], monitor['width'], monitor['height'])
+                del info['x']
+                del info['y']
+                info.update({
+                    'monitor_handle': index + 1,
+                    'device_context_handle': None,
+                    'primary': index == 0,
+                    'index': index,
+                })
+                ret.append(info)
+        return ret
+
+    def process__get_current_pid(self):
+        return self.__current_pid
+
+    def process__get_current_username_domain(self):
+        return self.process__get_username_domain_for_pid(self.__current_pid)
+
+    def process__get_username_domain_for_pid(self, thread_pid):
+        process = self.__process(thread_pid)
+        return process.username, process.domain
+
+    def process__get_executable_filename(self, thread_pid):
+        return self.__process(thread_pid).executable
+
+    def process__get_exit_code(self, thread_pid):
+        return self.__process(thread_pid).exit_code
+
+    def process__get_all_pids(self):
+        with self.__lock:
+            return [pid for pid, process in self.__processes.items() if process.exit_code is None]
+
+    def process__load_all_process_details(self):
+        with self.__lock:
+            return [
+                {'Name': process.executable.split('\\')[-1], 'ProcessId': str(pid),
+                 'ExecutablePath': process.executable}
+                for pid, process in self.__processes.items() if process.exit_code is None
+            ]
+
+    def process__get_all_service_information(self):
+        return []
+
+    def process__get_window_state(self, thread_pid):
+        with self.__lock:
+            active = self.__active
+            if active is not None and self.__windows[active].pid != _pid(thread_pid):
+                active = None
+        return {
+            'active_hwnd': active,
+            'focus_hwnd': active,
+            'capture_hwnd': None,
+            'menu_hwnd': None,
+            'movesize_hwnd': None,
+            'caret_hwnd': None,
+            'caret_rect': _rect_dict(0, 0, 0, 0),
+            'flags': [],
+        }
+
+    # ------------------------------------------------------------------
+
+    def _apply_batch(self, entries):
+        with self.__lock:
+            self.__batch_sizes.append(len(entries))
+        return [self.window__set_position(*entry) for entry in entries]
+
+    def __get(self, hwnd):
+        window = self.__windows.get(hwnd)
+        if window is None:
+            raise OSError("invalid window handle {0}".format(hwnd))
+        return window
+
+    def __process(self, pid):
+        with self.__lock:
+            process = self.__processes.get(_pid(pid))
+            if process is None:
+                raise OSError("no such process {0}".format(pid))
+            return process
+
+    def __new_handle(self):
+        self.__next_handle += 1
+        return self.__next_handle
+
+    def __create_own_window(self, class_name, title, message_handler, style_flags):
+        with self.__lock:
+            if class_name in self.__registered_classes:
+                raise OSError("class already registered: {0}".format(class_name))
+            self.__registered_classes.add(class_name)
+            hwnd = self.__next_hwnd
+            self.__next_hwnd += 2
+            monitor = self.__monitors[0]
+            window = SimulatedWindow(
+                hwnd, class_name, title, self.__current_pid, threading.get_ident(),
+                _rect(monitor['x'], monitor['y'], 240, 120), _style(style_flags), True, None)
+            window.message_handler = message_handler
+            self.__windows[hwnd] = window
+            self.__z_order.insert(self.__top_index(window), hwnd)
+            return hwnd
+
+    def __set_position(self, hwnd, hwnd_after_zorder, x, y, width, height, flags):
+        window = self.__windows[hwnd]
+        if 'no-move' in flags:
+            x, y = window.rect['x'], window.rect['y']
+        if 'no-size' in flags:
+            width, height = window.rect['width'], window.rect['height']
+        self.__place(hwnd, x, y, width, height, 'no-size' in flags, 'no-move' in flags)
+        if 'hide-window' in flags:
+            window.show_state = HIDDEN
+        elif 'show-window' in flags and window.show_state == HIDDEN:
+            window.show_state = RESTORED
+        if hwnd_after_zorder is not None and 'no-zorder' not in flags:
+            self.__restack(window, hwnd_after_zorder)
+
+    def __place(self, hwnd, x, y, width, height, keep_size, keep_position):
+        window = self.__windows[hwnd]
+        if not window.resizable and not keep_size:
+            width, height = window.rect['width'], window.rect['height']
+        if window.min_size is not None:
+            width = max(width, window.min_size[0])
+            height = max(height, window.min_size[1])
+        window.rect = _rect(x, y, width, height)
+        if window.show_state == RESTORED:
+            window.restore_rect = dict(window.rect)
+
+    def __restack(self, window, hwnd_after_zorder):
+        zorder = HWND_ZORDER_MAP.get(hwnd_after_zorder, hwnd_after_zorder)
+        self.__z_order.remove(window.hwnd)
+        if zorder == HWND_ZORDER_MAP['topmost']:
+            window.style['topmost'] = True
+        elif zorder == HWND_ZORDER_MAP['no-topmost'] or zorder == HWND_ZORDER_MAP['bottom']:
+            window.style['topmost'] = False
+        if zorder == HWND_ZORDER_MAP['bottom']:
+            self.__z_order.append(window.hwnd)
+        elif zorder in self.__z_order:
+            self.__z_order.insert(self.__z_order.index(zorder) + 1, window.hwnd)
+        else:
+            self.__z_order.insert(self.__top_index(window), window.hwnd)
+
+    def __top_index(self, window):
+        """Index of the top of the window's band (top-most or not)."""
+        if window.style.get('topmost'):
+            return 0
+        index = 0
+        while index < len(self.__z_order) and self.__windows[self.__z_order[index]].style.get('topmost'):
+            index += 1
+        return index
+
+    def __activate(self, hwnd):
+        with self.__lock:
+            window = self.__windows.get(hwnd)
+            if window is None:
+                return
+            self.__z_order.remove(hwnd)
+            self.__z_order.insert(self.__top_index(window), hwnd)
+            if self.__active == hwnd:
+                return
+            self.__active = hwnd
+        self.__shell_event(HSHELL_WINDOWACTIVATED, hwnd)
+
+    def __activate_next(self):
+        with self.__lock:
+            for hwnd in self.__z_order:
+                if self.__windows[hwnd].show_state in (RESTORED, MAXIMIZED):
+                    break
+            else:
+                return
+        self.__activate(hwnd)
+
+    def __monitor_for(self, rect):
+        center_x = rect['x'] + rect['width'] // 2
+        center_y = rect['y'] + rect['height'] // 2
+        for monitor in self.__monitors:
+            if (
+                    monitor['x'] <= center_x < monitor['x'] + monitor['width'] and
+                    monitor['y'] <= center_y < monitor['y'] + monitor['height']
+            ):
+                return monitor
+        return self.__monitors[0]
+
+    def __add_hook(self, kind, callback):
+        with self.__lock:
+            hook_id = self.__new_handle()
+            self.__hooks[hook_id] = (kind, callback)
+            return hook_id
+
+    def __shell_event(self, code, lparam, keep_alive=None):
+        """Send a shell hook message to the shell hooks and the shell hook windows."""
+        with self.__lock:
+            hooks = [hook for kind, hook in reversed(list(self.__hooks.values())) if kind == 'shell']
+            hook_windows = list(self.__shell_hook_windows)
+        for hook in hooks:
+            if hook(code, code, lparam) == SHELL__CANCEL_CALLBACK_CHAIN:
+                break
+        for hwnd in hook_windows:
+            self.__post(hwnd, SHELL_HOOK_MESSAGE_ID, code, lparam, keep_alive)
+
+    def __post(self, hwnd, message, wparam, lparam, keep_alive=None):
+        with self.__lock:
+            window = self.__windows.get(hwnd)
+            if window is None:
+                return False
+            if window.message_handler is None:
+                # Another application's window; it handles the close itself.
+                if message == WM_CLOSE:
+                    window.close_requests += 1
+                return True
+            q = self.__thread_queue(window.thread_id)
+        q.put((hwnd, message, wparam, lparam, keep_alive))
+        return True
+
+    def __post_thread_message(self, thread_id, message):
+        self.__thread_queue(thread_id).put((None, message, 0, 0, None))
+
+    def __thread_queue(self, thread_id):
+        if thread_id is None:
+            thread_id = threading.get_ident()
+        with self.__lock:
+            if thread_id not in self.__thread_queues:
+                self.__thread_queues[thread_id] = queue.Queue()
+            return self.__thread_queues[thread_id]
+
+    def __dispatch(self, message):
+        hwnd, message_id, wparam, lparam, keep_alive = message
+        with self.__lock:
+            window = self.__windows.get(hwnd)
+            handler = window is not None and window.message_handler or None
+        if handler is None:
+            return 0
+        return handler(hwnd, message_id, wparam, lparam)
+
+
+class SimulatedPositionBatch(PositionBatch):
+    def __init__(self, desktop):
+        PositionBatch.__init__(self)
+        self.__desktop = desktop
+
+    def _apply(self, entries):
+        return self.__desktop._apply_batch(entries)
+
+
+def _pid(pid):
+    return getattr(pid, 'value', pid)
+
+
+def _rect(x, y, width, height):
+    return {'x': x, 'y': y, 'width': width, 'height': height}
+
+
+def _rect_dict(x, y, width, height):
+    return {
+        'x': x, 'y': y, 'width': width, 'height': height,
+        'left': x, 'right': x + width, 'top': y, 'bottom': y + height,
+    }
+
+
+def _style(names):
+    ret = {}
+    for key in WS_STYLE_BIT_MAP:
+        ret[key] = key in names
+    for key in WS_EX_STYLE_BIT_MAP:
+        ret[key] = key in names
+    return ret
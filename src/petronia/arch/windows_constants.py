@@ -1,6 +1,9 @@
 
 PETRONIA_CREATED_WINDOW__CLASS_PREFIX = "Petronia__"
 
+# Returned by a hook callback to stop the other hooks from seeing the event.
+SHELL__CANCEL_CALLBACK_CHAIN = "Cancel"
+
 
 GW_OWNER = 4  # c_int
 GWL_EXSTYLE = -20  # c_int
@@ -122,6 +125,7 @@ WM_LBUTTONDOWN = 0x0201
 WM_NCACTIVATE = 0x86
 WM_NCCALCSIZE = 0x83
 WM_NCHITTEST = 0x84
+WM_TIMER = 0x113
 
 WM_MESSAGE_NAMES = {
     'keydown': WM_KEYDOWN,
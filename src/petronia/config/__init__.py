@@ -4,7 +4,7 @@ from .chrome import ChromeConfig
 from .command import CommandConfig
 from .config import Config
 from .config_type import ConfigType
-from .hotkey import HotKeyConfig, DEFAULT_MODE
+from .hotkey import HotKeyConfig, DEFAULT_MODE, MODE_CHANGE_COMMAND, NO_STEP_TIMEOUT
 from .workgroup import (
     DisplayWorkGroupsConfig, MonitorResConfig, LayoutConfig, WorkGroupConfig, ChildSplitConfig,
     ORIENTATION_CENTER, ORIENTATION_HORIZONTAL, ORIENTATION_VERTICAL
@@ -12,5 +12,4 @@ from .workgroup import (
 from .component import ComponentConfig
 from .shell import ShellConfig, WindowsShellConfig
 
-MODE_CHANGE_COMMAND = "change mode"
 LAYOUT_MANAGEMENT_MODE = "Layout Management"
@@ -3,6 +3,8 @@ Manages the user configuration.
 """
 
 from .base_config import BaseConfig
+from ..util.app_rules import AppRuleEngine, AppRule, AppFlags, RuleMatcher
+from ..util.portal_placement import PortalRule
 import re
 
 
@@ -42,6 +44,37 @@ class AbstractApplicationConfig(BaseConfig):
         """
         raise NotImplementedError()
 
+    def get_flags(self, window_info):
+        """
+        All the display flags for the window at once.
+
+        :param window_info:
+        :return: AppFlags
+        """
+        return AppFlags(
+            is_tiled=self.is_tiled(window_info),
+            has_title=self.has_title(window_info),
+            has_border=self.has_border(window_info),
+            is_resizable=self.is_resizable(window_info))
+
+    def get_flag_rules(self):
+        """
+        The display flag rules, for compiling into an AppRuleEngine.
+
+        :return: list of AppRule, or None if the flags can only be found
+            through the methods.
+        """
+        return None
+
+    def get_portal_rules(self):
+        """
+        The portal placement rules, for compiling into a PortalPlacement.
+
+        :return: list of PortalRule, or None if the placement can only be
+            found through get_best_portal_match.
+        """
+        return None
+
     def get_best_portal_match(self, portal_aliases, window_info):
         """
 
@@ -69,7 +102,31 @@ class ApplicationListConfig(AbstractApplicationConfig):
         self.default_has_title = default_has_title is None and True or default_has_title
         self.default_is_resizable = default_is_resizable is None and True or default_is_resizable
 
+        # Compile the rules, unless some application config can't be
+        # compiled; those are asked in turn by the methods below.
+        rules = []
+        for app in app_configs:
+            app_rules = app.get_flag_rules()
+            if app_rules is None:
+                rules = None
+                break
+            rules.extend(app_rules)
+        self.__engine = None
+        if rules is not None:
+            self.__engine = AppRuleEngine(rules, AppFlags(
+                is_tiled=self.default_is_tiled,
+                has_title=self.default_has_title,
+                has_border=self.default_has_border,
+                is_resizable=self.default_is_resizable))
+
+    def get_flags(self, window_info):
+        if self.__engine is not None:
+            return self.__engine.get_flags(window_info)
+        return super().get_flags(window_info)
+
     def is_tiled(self, window_info):
+        if self.__engine is not None:
+            return self.__engine.get_flags(window_info).is_tiled
         for app in self.__app_configs:
             assert isinstance(app, AbstractApplicationConfig)
             res = app.is_tiled(window_info)
@@ -78,6 +135,8 @@ class ApplicationListConfig(AbstractApplicationConfig):
         return self.default_is_tiled
 
     def has_title(self, window_info):
+        if self.__engine is not None:
+            return self.__engine.get_flags(window_info).has_title
         for app in self.__app_configs:
             assert isinstance(app, AbstractApplicationConfig)
             res = app.has_title(window_info)
@@ -86,6 +145,8 @@ class ApplicationListConfig(AbstractApplicationConfig):
         return self.default_has_title
 
     def has_border(self, window_info):
+        if self.__engine is not None:
+            return self.__engine.get_flags(window_info).has_border
         for app in self.__app_configs:
             assert isinstance(app, AbstractApplicationConfig)
             res = app.has_border(window_info)
@@ -94,6 +155,8 @@ class ApplicationListConfig(AbstractApplicationConfig):
         return self.default_has_border
 
     def is_resizable(self, window_info):
+        if self.__engine is not None:
+            return self.__engine.get_flags(window_info).is_resizable
         for app in self.__app_configs:
             assert isinstance(app, AbstractApplicationConfig)
             res = app.is_resizable(window_info)
@@ -108,6 +171,15 @@ class ApplicationListConfig(AbstractApplicationConfig):
                 return res
         return None
 
+    def get_portal_rules(self):
+        ret = []
+        for app in self.__app_configs:
+            app_rules = app.get_portal_rules()
+            if app_rules is None:
+                return None
+            ret.extend(app_rules)
+        return ret
+
 
 class ApplicationChromeConfig(AbstractApplicationConfig):
     """
@@ -162,6 +234,18 @@ class ApplicationChromeConfig(AbstractApplicationConfig):
     def get_best_portal_match(self, portal_aliases, window_info):
         return None
 
+    def get_flag_rules(self):
+        return [AppRule(
+            AppFlags(
+                is_tiled=self.__is_tiled,
+                has_title=self.__has_title,
+                has_border=self.__has_border,
+                is_resizable=self.__is_resizable),
+            [matcher.get_rule_matcher() for matcher in self.__app_matchers])]
+
+    def get_portal_rules(self):
+        return []
+
 
 class ApplicationPositionConfig(AbstractApplicationConfig):
     """
@@ -198,6 +282,14 @@ class ApplicationPositionConfig(AbstractApplicationConfig):
     def is_resizable(self, window_info):
         return None
 
+    def get_flag_rules(self):
+        return []
+
+    def get_portal_rules(self):
+        return [PortalRule(
+            [matcher.get_rule_matcher() for matcher in self.__app_matchers],
+            self.__portal_matchers)]
+
     def get_best_portal_match(self, portal_aliases, window_info):
         for app_matcher in self.__app_matchers:
             if app_matcher.matches(window_info):
@@ -244,11 +336,14 @@ class AppMatcher(BaseConfig):
         self.match_returns = match_returns
 
         self.re_matchers = {}
+        # name -> the exact text, for the matchers not given as a regex.
+        self.exact_matches = {}
 
         def add_matcher(name, exact, regex):
             if exact is not None:
                 assert regex is None
                 assert isinstance(exact, str)
+                self.exact_matches[name] = exact
                 regex = re.escape(exact)
                 if name.endswith("_filename"):
                     regex = r'.*?\\' + regex + '$'
@@ -283,5 +378,8 @@ class AppMatcher(BaseConfig):
             return self.match_returns
         return not self.match_returns
 
+    def get_rule_matcher(self):
+        return RuleMatcher(self.match_returns, dict(self.re_matchers), dict(self.exact_matches))
+
     def __repr__(self):
         return "AppMatcher({0})".format(repr(self.re_matchers))
@@ -19,6 +19,10 @@ class ChromeConfig(BaseConfig):
         }
         self.flash_count = 3
         self.flash_wait_seconds = 1.0
+        # When a portal's windows are laid out, only move the top window
+        # right away; the windows under it are moved when they come to the
+        # top, or when the bus is quiet.
+        self.lazy_window_layout = True
 
     def set_border(self, top, bottom, left, right):
         self.__portal_chrome_border['top'] = int(top)
@@ -16,12 +16,15 @@ class ComponentConfig(BaseConfig):
         """
 
         :param singletons: list of factories that initiate themselves and install a single component
-            into the system.
-        :param extensions: dictionary of component type keys linked to the component factory.
+            into the system.  A factory may also be a "module:attribute" string, which is only
+            imported when the singleton is activated.
+        :param extensions: dictionary of component type keys linked to the component factory, or
+            to a "module:attribute" string for the factory.
         """
         # Perform import here to avoid circular imports.
         from ..system.extensions.component_factory_registry import get_base_extension_factories
         from ..system.extensions.singleton_factory_registry import get_base_singleton_factories
+        from ..system.extensions.lazy_factory import as_factory
 
         super()
 
@@ -29,14 +32,12 @@ class ComponentConfig(BaseConfig):
         if extensions is not None:
             for category, factory in extensions.items():
                 assert isinstance(category, str)
-                assert callable(factory)
-                self.__extensions[category] = factory
+                self.__extensions[category] = as_factory(factory)
 
         self.__singletons = list(get_base_singleton_factories())
         if singletons is not None:
             for singleton in singletons:
-                assert callable(singleton)
-                self.__singletons.append(singleton)
+                self.__singletons.append(as_factory(singleton))
 
     def register_extensions(self, registrar):
         # Perform Registry import here to avoid circular imports.
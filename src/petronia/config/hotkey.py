@@ -3,9 +3,15 @@ Manages the user configuration.
 """
 
 from .base_config import BaseConfig
-from ..util.hotkey_chain import HotKeyChain, KeyOverride
+from ..util.hotkey_chain import HotKeyChain, KeyOverride, ChainDiagnostic
+from ..util.chord_engine import ChordEngine, DEFAULT_STEP_TIMEOUT, DEFAULT_HOLD_TIME
 
 DEFAULT_MODE = "default"
+MODE_CHANGE_COMMAND = "change mode"
+
+# Step timeout value for a mode whose partially typed key chains never
+# time out.
+NO_STEP_TIMEOUT = "none"
 
 
 class HotKeyConfig(BaseConfig):
@@ -21,6 +27,11 @@ class HotKeyConfig(BaseConfig):
             DEFAULT_MODE: HotKeyChain()
         }
 
+        # mode -> (key chain text -> command), for the analysis.
+        self.__mode_commands = {
+            DEFAULT_MODE: {}
+        }
+
     @property
     def mode_combos(self):
         """
@@ -29,12 +40,93 @@ class HotKeyConfig(BaseConfig):
         """
         return self.__key_modes
 
-    def parse_hotkey_mode_keys(self, mode, key_mapping, block_win_key=False):
+    @property
+    def diagnostics(self):
+        """
+        The problems found in the key chains of every mode, such as chains
+        that conflict or can never be matched, mode changes to modes that
+        don't exist, and modes which can't be reached from the default mode.
+
+        :return: list of ChainDiagnostic
+        """
+        ret = []
+        for mode, chain in self.__key_modes.items():
+            for diagnostic in chain.diagnostics:
+                ret.append(diagnostic.for_mode(mode))
+
+        reachable = {DEFAULT_MODE}
+        pending = [DEFAULT_MODE]
+        while len(pending) > 0:
+            mode = pending.pop()
+            for key_chain, command in self.__mode_commands.get(mode, {}).items():
+                target = _mode_change_target(command)
+                if target is None:
+                    continue
+                if target not in self.__key_modes:
+                    ret.append(ChainDiagnostic(
+                        ChainDiagnostic.ERROR, key_chain, "changes to unknown mode `{0}`".format(target), mode))
+                elif target not in reachable:
+                    reachable.add(target)
+                    pending.append(target)
+        for mode in self.__key_modes.keys():
+            if mode not in reachable:
+                ret.append(ChainDiagnostic(
+                    ChainDiagnostic.WARNING, mode, "no key chain changes to this mode", mode))
+        return ret
+
+    def parse_hotkey_mode_keys(self, mode, key_mapping, block_win_key=False, step_timeout=None,
+                               hold_time=None, tap_hold=None, leader=None, leader_mapping=None):
+        """
+        The timing options (step timeout, tap / hold keys, and the leader
+        key) use a ChordEngine for the mode, rather than a HotKeyChain.
+
+        :param mode:
+        :param key_mapping: key chain text -> command
+        :param block_win_key:
+        :param step_timeout: seconds allowed between steps in a chain;
+            None for the default, or NO_STEP_TIMEOUT for no limit.
+        :param hold_time: seconds before a tap / hold key counts as held.
+        :param tap_hold: key name -> (tap command, hold command)
+        :param leader: key chain text which starts a leader sequence.
+        :param leader_mapping: leader sequence text -> command
+        """
         assert isinstance(mode, str)
-        chain = HotKeyChain(key_mapping)
+        if step_timeout in (None, NO_STEP_TIMEOUT) and hold_time is None and tap_hold is None and leader is None:
+            # A HotKeyChain has no step timeout.
+            chain = HotKeyChain(key_mapping)
+        else:
+            if step_timeout == NO_STEP_TIMEOUT:
+                step_timeout = None
+            elif step_timeout is None:
+                step_timeout = DEFAULT_STEP_TIMEOUT
+            chain = ChordEngine(
+                key_mapping,
+                step_timeout=step_timeout,
+                hold_time=hold_time is None and DEFAULT_HOLD_TIME or hold_time)
+            if tap_hold is not None:
+                chain.set_tap_hold(tap_hold)
+            if leader is not None:
+                chain.set_leader(leader, leader_mapping)
         chain.block_win_key = block_win_key
         self.__key_modes[mode] = chain
+        commands = dict(key_mapping)
+        if tap_hold is not None:
+            for key, tap_hold_commands in tap_hold.items():
+                for command in tap_hold_commands:
+                    if command is not None:
+                        commands[key] = command
+        if leader_mapping is not None:
+            for key_chain, command in leader_mapping.items():
+                commands["{0}, {1}".format(leader, key_chain)] = command
+        self.__mode_commands[mode] = commands
 
     def parse_exclusive_mode_keys(self, mode, key_mapping):
         assert isinstance(mode, str)
         self.__key_modes[mode] = KeyOverride(key_mapping)
+        self.__mode_commands[mode] = dict(key_mapping)
+
+
+def _mode_change_target(command):
+    if len(command) > 1 and command[0] == MODE_CHANGE_COMMAND and isinstance(command[1], str):
+        return command[1].strip()
+    return None
@@ -2,6 +2,9 @@
 Manages the user configuration.
 """
 
+import collections
+import threading
+
 from .base_config import BaseConfig
 
 # How the panel splits its children.
@@ -9,6 +12,9 @@ ORIENTATION_VERTICAL = "vertical"
 ORIENTATION_HORIZONTAL = "horizontal"
 ORIENTATION_CENTER = "none"
 
+# Number of monitor setups to remember the workgroup for.
+_WORKGROUP_MEMO_SIZE = 16
+
 
 class DisplayWorkGroupsConfig(BaseConfig):
     """
@@ -37,7 +43,27 @@ class DisplayWorkGroupsConfig(BaseConfig):
                 group['monitors'][i].update_monitor_index(i)
             self.__groups.append(group)
 
+        # The match only depends on the monitor sizes, and there are usually
+        # just a few monitor setups (docked, undocked), so the chosen
+        # workgroup is remembered for each.
+        self.__memo = collections.OrderedDict()
+        self.__memo_lock = threading.Lock()
+
     def get_workgroup_for_display(self, monitors):
+        key = get_monitor_sizes(monitors)
+        with self.__memo_lock:
+            ret = self.__memo.get(key)
+            if ret is not None:
+                self.__memo.move_to_end(key)
+                return ret
+        ret = self.__find_workgroup_for_display(monitors)
+        with self.__memo_lock:
+            self.__memo[key] = ret
+            while len(self.__memo) > _WORKGROUP_MEMO_SIZE:
+                self.__memo.popitem(last=False)
+        return ret
+
+    def __find_workgroup_for_display(self, monitors):
         default_workgroup = None
         best_match = None
         best_rank = 0
@@ -67,6 +93,16 @@ class DisplayWorkGroupsConfig(BaseConfig):
         return best_match
 
 
+def get_monitor_sizes(monitors):
+    """
+    The part of the monitor descriptions that picks the workgroup.
+
+    :param monitors: list of monitor dicts from the OS event.
+    :return: tuple of (width, height) for each monitor.
+    """
+    return tuple((monitor['width'], monitor['height']) for monitor in monitors)
+
+
 class WorkGroupConfig(BaseConfig):
     """
     Contains all the configurations for the current monitor set.
@@ -5,15 +5,7 @@
 
 # http://stackoverflow.com/questions/2270527/how-to-code-a-new-windows-shell
 
-from petronia.system.bus import Bus
-from petronia.system.id_manager import IdManager
-from petronia.system.registrar import Registrar
-from petronia.system.logger import Logger, LEVEL_DEBUG, LEVEL_VERBOSE, LEVEL_WARN
-from petronia.shell.native.windows_hook_event import WindowsHookEvent
-from petronia.shell.native.window_mapper import WindowMapper
-from petronia.script.read_config import read_user_configuration
-from petronia.tests.bus_logger import log_events
-from petronia.script.script_logger import create_stdout_logger
+from petronia.system.startup_profiler import StartupProfiler, NULL_PROFILER
 from petronia.version import VERSION
 
 import sys
@@ -21,28 +13,65 @@ import os
 import argparse
 
 
-def setup(config_file, layout_name):
-    config = read_user_configuration(config_file, create_stdout_logger())
+def setup(config_file, layout_name, profiler=None, key_trace_file=None, window_state_file=None):
+    if profiler is None:
+        profiler = NULL_PROFILER
+
+    # These are imported here, rather than at the top of the file, so the
+    # start-up profiler can see how long they take to load.
+    with profiler.measure("import core modules"):
+        from petronia.system.bus import Bus
+        from petronia.system.id_manager import IdManager
+        from petronia.system.registrar import Registrar
+        from petronia.system.logger import LEVEL_VERBOSE
+        from petronia.script.read_config import read_user_configuration
+        from petronia.script.script_logger import create_stdout_logger
+    with profiler.measure("import native modules"):
+        from petronia.shell.native.windows_hook_event import WindowsHookEvent
+        from petronia.shell.native.window_mapper import WindowMapper
+
+    with profiler.measure("read configuration"):
+        config = read_user_configuration(config_file, create_stdout_logger())
     config.init_options['layout-name'] = layout_name
     config.init_options['config-file'] = config_file
     config.init_options['log-level'] = LEVEL_VERBOSE
     # config.init_options['log-level'] = LEVEL_DEBUG
+    if profiler is not NULL_PROFILER:
+        config.init_options['startup-profiler'] = profiler
+    if key_trace_file is not None:
+        config.init_options['key-trace-file'] = key_trace_file
+    if window_state_file is not None:
+        config.init_options['window-state-file'] = window_state_file
 
     bus = Bus()
+    if profiler is not NULL_PROFILER:
+        profiler.listen_for_first_window(bus)
     id_mgr = IdManager(bus)
     registrar = Registrar(bus, id_mgr, config)
     config.register_components(registrar)
 
     # Important: Mapper before Hook Event
-    WindowMapper(bus, id_mgr, config)
+    with profiler.measure("WindowMapper"):
+        WindowMapper(bus, id_mgr, config)
 
     # Important: Hook Event after Mapper
-    WindowsHookEvent(bus, config)
+    with profiler.measure("WindowsHookEvent"):
+        WindowsHookEvent(bus, config)
+
+    if profiler is not NULL_PROFILER:
+        profiler.setup_complete()
 
     return bus
 
 
 def main_setup():
+    profiler = None
+    if '--profile-startup' in sys.argv[1:]:
+        # Started before anything else, so the argument parsing and
+        # module loading are included.
+        profiler = StartupProfiler()
+        profiler.install_import_hook()
+
     parser = argparse.ArgumentParser()
     parser.description = "Window tiling manager for Windows."
     parser.add_argument(
@@ -57,6 +86,21 @@ def main_setup():
         help="Show the version and quit.",
         action="store_true"
     )
+    parser.add_argument(
+        "--profile-startup",
+        help="Report the time spent importing modules and constructing components at startup.",
+        action="store_true"
+    )
+    parser.add_argument(
+        "--record-keys",
+        metavar="FILE",
+        help="Record the keyboard hook events to FILE, for replaying with petronia.tests.perf.hotkey_replay."
+    )
+    parser.add_argument(
+        "--window-state",
+        metavar="FILE",
+        help="Remember the portal of each application window in FILE, and put the windows back there on start-up."
+    )
     parser.add_argument(
         "-e", "--extensions",
         help="Directory where the user extensions are stored.  Defaults to environment variable %%PETRONIA_USER_DIR%%"
@@ -87,7 +131,7 @@ def main_setup():
     if not args.configfile or not os.path.isfile(args.configfile):
         parser.error("Missing configuration file.  Use `-h' to see the full usage.")
 
-    setup(args.configfile, args.layout)
+    setup(args.configfile, args.layout, profiler, args.record_keys, args.window_state)
 
 
 if __name__ == '__main__':
@@ -24,6 +24,7 @@ def create_all_commands():
         create_lock_screen(),
         create_inject_keys(),
         create_exec_cmd(),
+        create_show_navigation(),
     ]
 
 
@@ -107,6 +108,10 @@ def create_exec_cmd():
     return Command("cmd", command_helper.exec_cmd)
 
 
+def create_show_navigation():
+    return Command("show-navigation", command_helper.show_navigation)
+
+
 if __name__ == '__main__':
     # Create the 'user-commands.md' file.
 
@@ -3,7 +3,6 @@
 
 from ..system import event_ids
 from ..system import target_ids
-from ..shell.native.shutdown import shutdown_system
 from ..shell.navigation import DIRECTIONS, ROTATABLE_DIRECTIONS
 import subprocess
 import shlex
@@ -21,6 +20,8 @@ def quit_shell(bus):
     # This should really be a signal to something else,
     # but due to the nature of a 'quit' command, this
     # needs to happen NOW.
+    # Imported here so that loading the configuration doesn't load the OS functions.
+    from ..shell.native.shutdown import shutdown_system
     shutdown_system()
 
 
@@ -316,3 +317,14 @@ def exec_cmd(bus, *cmd_line):
     bus.fire(event_ids.LOG__INFO, target_ids.LOGGER, {
         'message': '{0}: {1}'.format(proc.pid, full_cmd)
     })
+
+
+def show_navigation(bus):
+    """
+    Log the portal navigation table: for each portal, the portal that
+    `move-focus` and `move-window-to-other-portal` go to in each direction.
+    Useful for checking how a layout spans the monitors.
+
+    :param bus:
+    """
+    bus.fire(event_ids.FOCUS__SHOW_NAVIGATION, target_ids.ACTIVE_PORTAL_MANAGER, {})
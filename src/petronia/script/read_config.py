@@ -1,6 +1,7 @@
 
 import traceback
 from ..config import Config, HotKeyConfig, DEFAULT_MODE
+from ..util.hotkey_chain import ChainDiagnostic
 from . import reader
 
 _LOADED_MODULES = {}
@@ -38,6 +39,11 @@ def read_user_configuration(config_file, logger):
     if config is None:
         config = _create_default_config()
     assert isinstance(config, Config)
+    for diagnostic in config.hotkeys.diagnostics:
+        if diagnostic.level == ChainDiagnostic.WARNING:
+            logger.warn("CONFIG WARNING: {0}".format(diagnostic))
+        else:
+            logger.error("CONFIG ERROR: {0}".format(diagnostic))
     config.init_options['config-file'] = config_file
     return config
 
@@ -76,10 +76,22 @@ def load_config(section, d, logger):
             'mode 1': {
                 'type': 'hotkey',
                 'options': {
-                    'block-win-key': false
+                    'block-win-key': false,
+                    'step-timeout': 1.5,  // or 'none' for no limit
+                    'hold-time': 0.3,
+                    'leader': 'win+space'
                 },
                 'commands': {
                     'win+f1': ['command', 'text']
+                },
+                'tap-hold': {
+                    'f12': {
+                        'tap': ['command', 'text'],
+                        'hold': ['command', 'text']
+                    }
+                },
+                'leader-commands': {
+                    'w, h': ['command', 'text']
                 }
                 // todo
             },
@@ -531,10 +543,22 @@ def _load_hotkeys(section, d):
             'mode 1': {
                 'type': 'hotkey',
                 'options': {
-                    'block-win-key': false
+                    'block-win-key': false,
+                    'step-timeout': 1.5,  // or 'none' for no limit
+                    'hold-time': 0.3,
+                    'leader': 'win+space'
                 },
                 'commands': {
                     'win+f1': ['command', 'text']
+                },
+                'tap-hold': {
+                    'f12': {
+                        'tap': ['command', 'text'],
+                        'hold': ['command', 'text']
+                    }
+                },
+                'leader-commands': {
+                    'w, h': ['command', 'text']
                 }
                 // todo
             },
@@ -563,10 +587,37 @@ def _load_hotkeys(section, d):
         if mode_type == 'hotkey':
             options = _key_as_dict(sec, mode, 'options')
             block_win_key = None
+            step_timeout = None
+            hold_time = None
+            leader = None
             if options is not None:
                 block_win_key = _key_as_bool([*sec, 'options'], options, 'block-win-key')
+                step_timeout = options.get('step-timeout')
+                if isinstance(step_timeout, str) and step_timeout.strip().lower() == config.NO_STEP_TIMEOUT:
+                    step_timeout = config.NO_STEP_TIMEOUT
+                else:
+                    step_timeout = _key_as_float([*sec, 'options'], options, 'step-timeout')
+                hold_time = _key_as_float([*sec, 'options'], options, 'hold-time')
+                leader = _key_as_str([*sec, 'options'], options, 'leader')
             block_win_key = block_win_key is None and False or block_win_key
-            ret.parse_hotkey_mode_keys(mode_id, _key_as_dict(sec, mode, 'commands', False), block_win_key=block_win_key)
+            tap_hold = None
+            tap_hold_dict = _key_as_dict(sec, mode, 'tap-hold')
+            if tap_hold_dict is not None:
+                tap_hold = {}
+                for key, tap_hold_keys in tap_hold_dict.items():
+                    key_sec = [*sec, 'tap-hold', key]
+                    tap_hold_keys = _ensure_dict(key_sec, tap_hold_keys, False)
+                    tap_hold[key] = (
+                        _key_as_list(key_sec, tap_hold_keys, 'tap'),
+                        _key_as_list(key_sec, tap_hold_keys, 'hold'),
+                    )
+            leader_commands = None
+            if leader is not None:
+                leader_commands = _key_as_dict(sec, mode, 'leader-commands', False)
+            ret.parse_hotkey_mode_keys(
+                mode_id, _key_as_dict(sec, mode, 'commands', False), block_win_key=block_win_key,
+                step_timeout=step_timeout, hold_time=hold_time, tap_hold=tap_hold,
+                leader=leader, leader_mapping=leader_commands)
         elif mode_type == 'exclusive':
             ret.parse_exclusive_mode_keys(mode_id, _key_as_dict(sec, mode, 'commands', False))
         else:
@@ -3,6 +3,9 @@ from ...config import Config
 from ...system.component import Component, Identifiable
 from ...system import event_ids
 from ...system import target_ids
+from ...util.portal_placement import PortalPlacement
+from ...util.portal_neighbors import PortalNeighborIndex, DIRECTIONS as NEIGHBOR_DIRECTIONS, format_table
+from ...util.window_state import WindowStateStore, window_identity
 from ..control.portal import PORTAL_CATEGORY
 from ..navigation import create_direction_negotiation_start_event_obj, DIR_PREVIOUS, DIR_NEXT
 
@@ -28,6 +31,30 @@ class ActivePortalManager(Identifiable, Component):
         self.__active_portal_cid = None
         self.__portal_aliases = {}
 
+        # The window placement is looked up through a table, unless the
+        # application configuration can only be asked directly.
+        self.__placement = None
+        portal_rules = config.applications.get_portal_rules()
+        if portal_rules is not None:
+            self.__placement = PortalPlacement(portal_rules)
+
+        # The portal each window was last in is remembered across restarts,
+        # along with its place in the portal's z-order.  The state is loaded
+        # here, before the window mapper sends the existing windows.  Windows
+        # with a remembered portal are held until the bus goes idle, then
+        # placed together in their z-order.
+        self.__window_state = None
+        self.__pending_windows = []
+        state_file = config.init_options.get('window-state-file')
+        if state_file:
+            self.__window_state = WindowStateStore(state_file)
+            try:
+                count = self.__window_state.load()
+                self._log_verbose("Loaded the portal of {0} windows from {1}".format(count, state_file))
+            except (OSError, UnicodeError) as e:
+                self._log_warn("Could not read the window state file {0}".format(state_file), e)
+            self._listen(event_ids.PORTAL__WINDOW_ORDER_CHANGED, target_ids.ANY, self._on_window_order_changed)
+
         self._listen(event_ids.FOCUS__MOVE, target_ids.ACTIVE_PORTAL_MANAGER, self._on_focus_move)
         self._listen(event_ids.ZORDER__WINDOW_SHOWN_CHANGE, target_ids.ACTIVE_PORTAL_MANAGER,
                      self._on_window_zorder_change)
@@ -39,16 +66,31 @@ class ActivePortalManager(Identifiable, Component):
                      self._move_portal_window_to_other_portal)
         self._listen(event_ids.PORTAL__ACTIVATED, target_ids.ANY, self._on_portal_activated)
 
+        # Directional moves look up the neighboring portal from the portal
+        # rectangles; the layout negotiation is only used for portals
+        # without a known rectangle.  The neighbor table is built once the
+        # layout changes are done, when the bus goes idle.
+        self.__neighbors = PortalNeighborIndex()
+        self._listen(event_ids.LAYOUT__SET_RECTANGLE, target_ids.ANY, self._on_tile_resized)
+        self._listen(event_ids.BUS__IDLE, target_ids.ANY, self._on_bus_idle)
+        self._listen(event_ids.FOCUS__SHOW_NAVIGATION, target_ids.ACTIVE_PORTAL_MANAGER, self._on_show_navigation)
+
         # Because this class owns the list of portals and their aliases, we can have it also take on the
         # responsibility of the window to portal assignment.  This may need to be split out eventually.
 
         self._listen(event_ids.WINDOW__CREATED, target_ids.ANY, self._on_window_created)
+        self._listen(event_ids.LAYOUT__PLACE_WINDOW, target_ids.ACTIVE_PORTAL_MANAGER, self._on_window_created)
 
     # noinspection PyUnusedLocal
     def _on_focus_move(self, event_id, target_id, event_obj):
         active = self._find_active_portal_cid()
         if active is not None:
             direction = event_obj['direction']
+            if direction in NEIGHBOR_DIRECTIONS and active in self.__neighbors:
+                dest_cid = self.__neighbors.neighbor(active, direction)
+                if dest_cid is not None:
+                    self._fire(event_ids.PORTAL__SET_ACTIVE, dest_cid, {})
+                return
             self._fire(
                 event_ids.DIRECTION_NEGOTIATION__BEGIN, active,
                 create_direction_negotiation_start_event_obj(
@@ -73,10 +115,15 @@ class ActivePortalManager(Identifiable, Component):
     def _on_create_portal_alias(self, event_id, target_id, event_obj):
         if 'portal-cid' in event_obj:
             # print("DEBUG registered alias {0} on portal {1}".format(event_obj['alias'], event_obj['portal-cid']))
-            self.__portal_aliases[event_obj['portal-cid']] = event_obj['alias']
+            self._set_portal_alias(event_obj['alias'], event_obj['portal-cid'])
         elif self.__active_portal_cid is not None:
             # print("DEBUG registered alias {0} on portal {1}".format(event_obj['alias'], self.__active_portal_cid))
-            self.__portal_aliases[event_obj['alias']] = self.__active_portal_cid
+            self._set_portal_alias(event_obj['alias'], self.__active_portal_cid)
+
+    def _set_portal_alias(self, alias, portal_cid):
+        self.__portal_aliases[alias] = portal_cid
+        if self.__placement is not None:
+            self.__placement.set_alias(alias, portal_cid)
 
     # noinspection PyUnusedLocal
     def _on_focus_portal_alias(self, event_id, target_id, event_obj):
@@ -93,6 +140,13 @@ class ActivePortalManager(Identifiable, Component):
                 active, event_obj['direction']
             ))
             direction = event_obj['direction']
+            if direction in NEIGHBOR_DIRECTIONS and active in self.__neighbors:
+                dest_cid = self.__neighbors.neighbor(active, direction)
+                if dest_cid is None:
+                    return self._log_verbose("No portal {0} of {1}; cannot move window.".format(direction, active))
+                return self._fire(event_ids.PORTAL__MOVE_WINDOW_TO_OTHER_PORTAL, active, {
+                    'destination-cid': dest_cid
+                })
             if DIR_NEXT == direction:
                 dir_add = 1
             elif DIR_PREVIOUS == direction:
@@ -120,6 +174,7 @@ class ActivePortalManager(Identifiable, Component):
     # noinspection PyUnusedLocal
     def _on_portal_activated(self, event_id, target_id, event_obj):
         self.__active_portal_cid = event_obj['portal-cid']
+        self.__neighbors.touch(self.__active_portal_cid)
         self._log_debug("Active manager assigned active portal to {0}".format(self.__active_portal_cid))
 
     # noinspection PyUnusedLocal
@@ -135,7 +190,12 @@ class ActivePortalManager(Identifiable, Component):
     def _on_object_removed(self, event_id, target_id, event_obj):
         try:
             self.__portal_cids.remove(target_id)
+            self.__neighbors.remove(target_id)
             self._log_verbose("Removed registered portal {0}".format(target_id))
+            for alias in [a for a, cid in self.__portal_aliases.items() if cid == target_id]:
+                del self.__portal_aliases[alias]
+            if self.__placement is not None:
+                self.__placement.remove_portal(target_id)
             # Ensure the active portal is still accurate
             self._find_active_portal_cid()
             self._fire(event_ids.PORTAL__DESTROYED, target_id, event_obj)
@@ -144,16 +204,40 @@ class ActivePortalManager(Identifiable, Component):
         except ValueError:
             pass
 
+    # noinspection PyUnusedLocal
+    def _on_tile_resized(self, event_id, target_id, event_obj):
+        if target_id in self.__portal_cids:
+            self.__neighbors.set_rect(target_id, event_obj)
+
+    # noinspection PyUnusedLocal
+    def _on_bus_idle(self, event_id, target_id, event_obj):
+        self._place_pending_windows()
+        self.__neighbors.build_table()
+
+    # noinspection PyUnusedLocal
+    def _on_show_navigation(self, event_id, target_id, event_obj):
+        aliases = {}
+        for alias, portal_cid in self.__portal_aliases.items():
+            aliases.setdefault(portal_cid, []).append(alias)
+        lines = format_table(self.__neighbors.table, aliases)
+        self._log_info("Portal navigation table ({0} portals):\n{1}".format(len(lines), "\n".join(lines)))
+
     # noinspection PyUnusedLocal
     def _on_window_created(self, event_id, target_id, event_obj):
-        portal_alias = self.__config.applications.get_best_portal_match(
-            self.__portal_aliases.keys(), event_obj['window-info'])
-        # print("DEBUG matched {1} with {0}".format(event_obj['window-info']['exec_filename'], portal_alias))
-        dest_cid = None
-        if portal_alias in self.__portal_aliases:
-            dest_cid = self.__portal_aliases[portal_alias]
-            if dest_cid not in self.__portal_cids:
-                dest_cid = None
+        if self.__window_state is not None:
+            state = self.__window_state.get(window_identity(event_obj['window-info']))
+            if state is not None and self.__portal_aliases.get(state.alias) in self.__portal_cids:
+                self.__pending_windows.append((state.z_index, event_obj))
+                return
+        if self.__placement is not None:
+            dest_cid = self.__placement.get_portal_cid(event_obj['window-info'])
+        else:
+            portal_alias = self.__config.applications.get_best_portal_match(
+                self.__portal_aliases.keys(), event_obj['window-info'])
+            # print("DEBUG matched {1} with {0}".format(event_obj['window-info']['exec_filename'], portal_alias))
+            dest_cid = self.__portal_aliases.get(portal_alias)
+        if dest_cid not in self.__portal_cids:
+            dest_cid = None
         if dest_cid is None:
             dest_cid = self._find_active_portal_cid()
             if dest_cid is None:
@@ -161,6 +245,44 @@ class ActivePortalManager(Identifiable, Component):
                 return
         self._fire(event_ids.LAYOUT__ADD_WINDOW, dest_cid, event_obj)
 
+    def _place_pending_windows(self):
+        if len(self.__pending_windows) <= 0:
+            return
+        pending = self.__pending_windows
+        self.__pending_windows = []
+        # sort is stable, so windows with the same index keep their order.
+        # A portal keeps the windows added to it in the same most recently
+        # used order, so the top window goes first.
+        pending.sort(key=lambda p: p[0])
+        self._log_debug("Placing {0} windows in their remembered portals".format(len(pending)))
+        for z_index, event_obj in pending:
+            state = self.__window_state.get(window_identity(event_obj['window-info']))
+            dest_cid = state is not None and self.__portal_aliases.get(state.alias) or None
+            if dest_cid in self.__portal_cids:
+                self._fire(event_ids.LAYOUT__ADD_WINDOW, dest_cid, event_obj)
+            else:
+                # The portal went away while the window waited.
+                self.__pending_windows.append((z_index, event_obj))
+        if len(self.__pending_windows) > 0:
+            pending = self.__pending_windows
+            self.__pending_windows = []
+            for z_index, event_obj in pending:
+                self._on_window_created(event_ids.LAYOUT__PLACE_WINDOW, self.cid, event_obj)
+
+    # noinspection PyUnusedLocal
+    def _on_window_order_changed(self, event_id, target_id, event_obj):
+        if target_id not in self.__portal_cids:
+            return
+        aliases = sorted(a for a, cid in self.__portal_aliases.items() if cid == target_id)
+        if len(aliases) <= 0:
+            return
+        try:
+            # Only the windows whose place changed are written.
+            for z_index, window_info in enumerate(event_obj['window-infos']):
+                self.__window_state.record(window_identity(window_info), aliases[0], z_index)
+        except OSError as e:
+            self._log_warn("Could not write the window state", e)
+
     def _find_active_portal_cid(self):
         ret = self.__active_portal_cid
         if ret is not None:
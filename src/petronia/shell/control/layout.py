@@ -24,25 +24,32 @@ class Layout(Tile):
         :param events:
         :return:
         """
-        return self.__add_child_obj(PORTAL_TYPE, layout_def, size, events)
+        return self.__add_child_obj(PORTAL_TYPE, layout_def, size, events, None, None)
 
-    def _add_child_layout(self, layout_def, size, events):
+    def _add_child_layout(self, layout_def, size, events, layout_rects=None, layout_path=()):
         """
         Add a layout child.
 
         :param layout_def:
         :param size:
         :param events:
+        :param layout_rects: the rectangles computed for the whole layout tree
+            (see petronia.util.layout_engine), passed down so the child can
+            create its own children at their final size.
+        :param layout_path: the child's path in layout_rects.
         :return:
         """
         assert isinstance(layout_def, LayoutConfig)
-        return self.__add_child_obj(layout_def.category, layout_def, size, events)
+        return self.__add_child_obj(layout_def.category, layout_def, size, events, layout_rects, layout_path)
 
-    def __add_child_obj(self, category, layout_def, size, events):
+    def __add_child_obj(self, category, layout_def, size, events, layout_rects, layout_path):
         assert layout_def is None or isinstance(layout_def, LayoutConfig)
         arguments = {
             'layout-def': layout_def,
         }
+        if layout_rects is not None:
+            arguments['layout-rects'] = layout_rects
+            arguments['layout-path'] = layout_path
         if size is not None:
             events.append({
                 'event-id': event_ids.LAYOUT__SET_RECTANGLE,
@@ -54,8 +61,20 @@ class Layout(Tile):
         child_cid = self._create_child(category, arguments, self._create_child_listeners(category), events)
         self._set_child_data(child_cid, 'type', category)
         self._set_child_data(child_cid, 'layout-def', layout_def)
+        if size is not None:
+            self._set_child_data(child_cid, 'rect', dict(size))
         return child_cid
 
+    def _set_child_rect(self, child_cid, rect):
+        """
+        Tell the child its new rectangle, unless the child already has it
+        (such as when it was created with its final rectangle).
+        """
+        if self._get_child_data(child_cid, 'rect') == rect:
+            return
+        self._set_child_data(child_cid, 'rect', dict(rect))
+        self._fire(event_ids.LAYOUT__SET_RECTANGLE, child_cid, rect)
+
     def _get_child_layout(self, child_cid):
         ret = self._get_child_data(child_cid, 'layout-def')
         assert ret is None or isinstance(ret, LayoutConfig)
@@ -76,6 +95,7 @@ class Layout(Tile):
             # print("DEBUG {0} requesting removal of child {1}".format(self.cid, child_cid))
             self._fire(event_ids.LAYOUT__REMOVE_OBJECT, child_cid, {
                 'window-parent': self.parent_cid,
+                'replace-windows': event_obj.get('replace-windows', False),
             })
         # Wait for the children to be removed before closing self.
 
@@ -123,7 +143,7 @@ class Layout(Tile):
 
     def _do_layout(self):
         for child_cid in self._child_cids:
-            self._fire(event_ids.LAYOUT__SET_RECTANGLE, child_cid, dict(self.size))
+            self._set_child_rect(child_cid, dict(self.size))
 
     def _find_child_cid_for_window(self, window_info, lowest_priority_cids=None):
         if lowest_priority_cids is None:
@@ -3,6 +3,7 @@ from .tile import Tile
 from ..navigation import PORTAL_TYPE, create_direction_negotiation_start_event_obj, DIR_PREVIOUS
 from ...system import event_ids
 from ...system import target_ids
+from ...util.window_ring import WindowRing
 
 
 PORTAL_CATEGORY = PORTAL_TYPE
@@ -17,15 +18,15 @@ def get_object_factories():
 def portal_factory(cid, arguments, bus, id_manager, config):
     parent_cid = arguments['parent-cid']
     ret = Portal(cid, bus, config, id_manager, parent_cid)
-    if 'layout-def' in arguments:
-        layout_def = arguments['layout-def']
+    layout_def = arguments.get('layout-def')
+    if layout_def is not None:
         ret.snap_horizontal = layout_def.snap_horizontal
         ret.snap_vertical = layout_def.snap_vertical
         bus.fire(event_ids.PORTAL__CREATE_ALIAS, target_ids.ACTIVE_PORTAL_MANAGER, {
              'alias': layout_def.name,
              'portal-cid': cid,
         })
-    else:
+    elif 'layout-def' not in arguments:
         print("ERROR layout-def not set in arguments {0}".format(arguments))
     return ret
 
@@ -34,24 +35,38 @@ class Portal(Tile):
     def __init__(self, cid, bus, config, id_manager, parent_cid):
         Tile.__init__(self, cid, bus, config, id_manager, parent_cid)
 
-        self.__windows = []
+        # window cid -> window info, with the top window and the most
+        # recently used order.
+        self.__windows = WindowRing()
         self.__window_listeners = {}
-        self.__top_window_index = None
         self.__active = False
         self.__last_flashing_window_cid = None
+        # The rectangle last given to the windows by _do_layout.
+        self.__window_rect = None
+        # window cid -> the rectangle last given to the window.
+        self.__given_rects = {}
+        # window cid -> the rectangle the window ended up at; it may keep
+        # its own size.
+        self.__applied_rects = {}
+        # The windows under the top window which haven't been given the
+        # current window rectangle yet.
+        self.__stale_window_cids = set()
+        self.__hidden_layout_queued = False
         self.snap_vertical = None
         self.snap_horizontal = None
 
         self._listen(event_ids.PORTAL__MOVE_WINDOW_HERE, target_ids.ANY, self._on_move_window_here)
         self._listen(event_ids.ZORDER__CHANGE_TOP_WINDOW, cid, self._on_window_zorder_change)
         self._listen(event_ids.FOCUS__SET_FIRST_WINDOW_FOCUSED, cid, self._on_set_first_window_focused)
-        self._listen(event_ids.PORTAL__CHANGE_BORDER_SIZE, cid, self._on_portal_border_size_changed)
+        # The border size change is broadcast, so listen for any target.
+        self._listen(event_ids.PORTAL__CHANGE_BORDER_SIZE, target_ids.ANY, self._on_portal_border_size_changed)
         self._listen(event_ids.PORTAL__MOVE_WINDOW_TO_OTHER_PORTAL, cid, self._on_move_window_to_other_portal)
         self._listen(event_ids.PORTAL__MOVE_WINDOW_TO_DESTINATION, cid, self._on_move_window_to_destination)
         self._listen(event_ids.PORTAL__SET_ACTIVE, cid, self._on_portal_becomes_active)
         self._listen(event_ids.PORTAL__ACTIVATED, target_ids.ANY, self._on_portal_activated)
         self._listen(event_ids.WINDOW__FLASHING, target_ids.ANY, self._on_any_window_flashing)
         self._listen(event_ids.FOCUS__SWITCH_TO_LAST_FLASHING_WINDOW, target_ids.ANY, self._on_switch_flashing_window)
+        self._listen(event_ids.PORTAL__LAYOUT_HIDDEN_WINDOW, cid, self._on_layout_hidden_window)
 
     # noinspection PyUnusedLocal
     def _on_move_window_here(self, event_id, target_id, event_obj):
@@ -60,27 +75,23 @@ class Portal(Tile):
 
     def _on_add_window(self, event_id, target_id, event_obj):
         window_cid = event_obj['window-cid']
-        window_index = self._get_window_index(window_cid)
-        if target_id != self.cid and window_index >= 0:
+        if target_id != self.cid and window_cid in self.__windows:
             # Remove the window
             self._log_debug("Removing window {0} from portal {1}, moving to {2}".format(
                 window_cid, self.cid, target_id))
-            del self.__windows[window_index]
+            self.__windows.remove(window_cid)
+            self.__forget_window_rect(window_cid)
             if window_cid in self.__window_listeners:
                 for event_id, listener in self.__window_listeners[window_cid].items():
                     self._remove_listener(event_id, window_cid, listener)
                 del self.__window_listeners[window_cid]
-        elif target_id == self.cid and window_index < 0:
+            self.__window_order_changed()
+        elif target_id == self.cid and window_cid not in self.__windows:
             # Take on the new window
             self._log_debug("Moving widow {0} to portal {2} from {1}".format(
                 window_cid, self.cid, target_id))
             window_info = event_obj['window-info']
-            self.__windows.append(window_info)
-            window_rect = self._get_window_rect()
-            window_rect['make-focused'] = 'make-focused' in event_obj and event_obj['make-focused'] or False
-            window_rect['v-snap'] = self.snap_vertical
-            window_rect['h-snap'] = self.snap_horizontal
-            self._fire(event_ids.LAYOUT__SET_RECTANGLE, window_cid, window_rect)
+            self.__windows.add(window_cid, window_info)
 
             def this_window_activated(e, t, o):
                 self._on_window_becomes_active(e, t, o)
@@ -94,25 +105,36 @@ class Portal(Tile):
             def this_window_flashing(e, t, o):
                 self._on_window_flashing(e, t, o)
 
+            def this_window_positioned(e, t, o):
+                self._on_window_positioned(e, t, o)
+
             self._listen(event_ids.WINDOW__FOCUSED, window_cid, this_window_activated)
             self._listen(event_ids.WINDOW__REDRAW, window_cid, this_window_redraw)
             self._listen(event_ids.WINDOW__CLOSED, window_cid, this_window_closed)
             self._listen(event_ids.WINDOW__FLASHING, window_cid, this_window_flashing)
+            self._listen(event_ids.WINDOW__POSITIONED, window_cid, this_window_positioned)
             self.__window_listeners[window_cid] = {
                 event_ids.WINDOW__FOCUSED: this_window_activated,
                 event_ids.WINDOW__REDRAW: this_window_redraw,
                 event_ids.WINDOW__CLOSED: this_window_closed,
-                event_ids.WINDOW__FLASHING: this_window_flashing
+                event_ids.WINDOW__FLASHING: this_window_flashing,
+                event_ids.WINDOW__POSITIONED: this_window_positioned,
             }
+            window_rect = self._get_window_rect()
+            window_rect['make-focused'] = 'make-focused' in event_obj and event_obj['make-focused'] or False
+            window_rect['v-snap'] = self.snap_vertical
+            window_rect['h-snap'] = self.snap_horizontal
+            self.__given_rects[window_cid] = self._get_window_rect()
+            self._fire(event_ids.LAYOUT__SET_RECTANGLE, window_cid, window_rect)
             if 'make-focused' in event_obj and event_obj['make-focused']:
-                window_index = self._get_window_index(window_cid)
-                self.__top_window_index = window_index
+                self.__windows.set_top(window_cid)
                 self._fire(event_ids.PORTAL__SET_ACTIVE, self.cid, {})
                 self._fire(event_ids.TELL_WINDOWS__FOCUS_WINDOW, window_cid, {})
+            self.__window_order_changed()
 
     # noinspection PyUnusedLocal
     def _on_portal_border_size_changed(self, event_id, target_id, event_obj):
-        self._do_layout()
+        self._relayout()
 
     def _on_portal_becomes_active(self, event_id, target_id, event_obj):
         self._on_set_first_window_focused(event_id, target_id, event_obj)
@@ -127,28 +149,22 @@ class Portal(Tile):
 
     # noinspection PyUnusedLocal
     def _on_window_zorder_change(self, event_id, target_id, event_obj):
-        next_index = 0
-        # test for > 0 to prevent a modulo by 0 error.
-        if self.__top_window_index is not None and len(self.__windows) > 0:
-            dir_change = 1
-            if 'direction' in event_obj and event_obj['direction'] == DIR_PREVIOUS:
-                dir_change = -1
-            next_index = abs((self.__top_window_index + dir_change) % len(self.__windows))
-        if 0 <= next_index < len(self.__windows):
-            self.__top_window_index = next_index
-            self._log_debug("Rotating window to {0}".format(self.__windows[next_index]))
-            self._fire(event_ids.ZORDER__SET_WINDOW_ON_TOP, self.__windows[next_index]['cid'], {})
+        forward = not ('direction' in event_obj and event_obj['direction'] == DIR_PREVIOUS)
+        window_cid = self.__windows.rotate(forward)
+        if window_cid is not None:
+            self._log_debug("Rotating window to {0}".format(self.__windows.top))
+            self.__window_order_changed()
+            self._show_window(event_ids.ZORDER__SET_WINDOW_ON_TOP, window_cid)
         else:
             self._log_verbose("Could not rotate next window; no windows")
 
     # noinspection PyUnusedLocal
     def _on_switch_flashing_window(self, event_id, target_id, event_obj):
         if self.__last_flashing_window_cid is not None:
-            window_index = self._get_window_index(self.__last_flashing_window_cid)
-            if 0 <= window_index < len(self.__windows):
-                self.__top_window_index = window_index
-                self._log_debug("Switching to last flashing window {0}".format(self.__windows[window_index]))
-                self._fire(event_ids.ZORDER__SET_WINDOW_ON_TOP, self.__last_flashing_window_cid, {})
+            if self.__windows.set_top(self.__last_flashing_window_cid):
+                self._log_debug("Switching to last flashing window {0}".format(self.__windows.top))
+                self.__window_order_changed()
+                self._show_window(event_ids.ZORDER__SET_WINDOW_ON_TOP, self.__last_flashing_window_cid)
 
     # noinspection PyUnusedLocal
     def _on_set_first_window_focused(self, event_id, target_id, event_obj):
@@ -157,16 +173,11 @@ class Portal(Tile):
             self._log_verbose("Cannot activate window in portal {0}: no registered windows".format(self.cid))
             return
 
-        if self.__top_window_index is None or self.__top_window_index >= len(self.__windows):
-            self.__top_window_index = 0
-
-        self._fire(event_ids.TELL_WINDOWS__FOCUS_WINDOW, self.__windows[self.__top_window_index]['cid'], {})
+        self._show_window(event_ids.TELL_WINDOWS__FOCUS_WINDOW, self.__windows.top_key)
 
     # noinspection PyUnusedLocal
     def _on_move_window_to_other_portal(self, event_id, target_id, event_obj):
-        dest_window_info = None
-        if self.__top_window_index is not None and self.__top_window_index < len(self.__windows):
-            dest_window_info = self.__windows[self.__top_window_index]
+        dest_window_info = self.__windows.top
         if dest_window_info is not None:
             if 'destination-cid' in event_obj:
                 # Allow for direct action, rather than going through negotiation.
@@ -195,9 +206,10 @@ class Portal(Tile):
     # noinspection PyUnusedLocal
     def _on_window_becomes_active(self, event_id, target_id, event_obj):
         # TODO see if we need a thread lock on each of the __windows events.
-        window_index = self._get_window_index(target_id)
-        if window_index >= 0:
-            self.__top_window_index = window_index
+        if self.__windows.set_top(target_id):
+            # Focused from outside the portal, such as the task bar.
+            self._position_stale_window(target_id)
+            self.__window_order_changed()
             if not self.__active:
                 self.__active = True
                 self._fire(event_ids.PORTAL__ACTIVATED, self.cid, {
@@ -223,20 +235,30 @@ class Portal(Tile):
 
     # noinspection PyUnusedLocal
     def _on_window_closed(self, event_id, target_id, event_obj):
-        window_index = self._get_window_index(target_id)
-        if window_index >= 0:
-            if self.__top_window_index is not None:
-                if 0 <= self.__top_window_index <= len(self.__windows):
-                    if self.__top_window_index == window_index:
-                        self.__top_window_index = (window_index + 1) % len(self.__windows)
-                        # TODO fire change z-order?
-                else:
-                    self.__top_window_index = None
+        if target_id in self.__windows:
+            # If it was the top window, the most recently used window
+            # becomes the top.
+            self.__windows.remove(target_id)
+            self.__forget_window_rect(target_id)
             if target_id in self.__window_listeners:
                 for key, listener in self.__window_listeners[target_id].items():
                     self._remove_listener(key, target_id, listener)
                 del self.__window_listeners[target_id]
-            del self.__windows[window_index]
+            self.__window_order_changed()
+
+    # noinspection PyUnusedLocal
+    def _on_window_positioned(self, event_id, target_id, event_obj):
+        if target_id not in self.__windows:
+            return
+        self.__applied_rects[target_id] = {
+            'x': event_obj['x'], 'y': event_obj['y'],
+            'width': event_obj['width'], 'height': event_obj['height'],
+        }
+        if target_id == self.__windows.top_key and not self.__top_window_fills_rect():
+            # The top window didn't take the rectangle, so the windows
+            # under it would show around it.
+            for window_cid in list(self.__stale_window_cids):
+                self._position_stale_window(window_cid)
 
     # noinspection PyUnusedLocal
     def _on_portal_activated(self, event_id, target_id, event_obj):
@@ -262,8 +284,7 @@ class Portal(Tile):
         :param event_obj:
         :return:
         """
-        window_index = self._get_window_index(target_id)
-        if window_index >= 0:
+        if target_id in self.__windows:
             self._fire(event_ids.PORTAL__FLASHING, self.cid, {
                 'portal-cid': self.cid,
                 'portal-size': self.size,
@@ -282,8 +303,7 @@ class Portal(Tile):
         :param event_obj:
         :return:
         """
-        window_index = self._get_window_index(target_id)
-        if window_index >= 0:
+        if target_id in self.__windows:
             self.__last_flashing_window_cid = target_id
         else:
             self.__last_flashing_window_cid = None
@@ -305,10 +325,22 @@ class Portal(Tile):
         self._on_direction_negotiation_target(event_id, target_id, event_obj)
 
     def _on_remove_self(self, event_id, target_id, event_obj):
+        if event_obj.get('replace-windows', False):
+            # Only this part of the layout is going away; the windows are
+            # placed again in the remaining portals.  Close first, so that
+            # they can't be placed back here.
+            windows = self.__windows.values()
+            self.close()
+            for window_info in windows:
+                self._fire(event_ids.LAYOUT__PLACE_WINDOW, target_ids.ACTIVE_PORTAL_MANAGER, {
+                    'window-cid': window_info['cid'],
+                    'window-info': window_info,
+                })
+            return
         dest_cid = self.parent_cid
         if 'window-parent' in event_obj:
             dest_cid = event_obj['window-parent']
-        for window_info in self.__windows:
+        for window_info in self.__windows.values():
             self._fire(event_ids.PORTAL__MOVE_WINDOW_TO_OTHER_PORTAL, dest_cid, {
                 'window-cid': window_info['cid'],
                 'window-info': window_info,
@@ -318,15 +350,100 @@ class Portal(Tile):
 
     def _do_layout(self):
         window_rect = self._get_window_rect()
-        for window_info in self.__windows:
+        if window_rect == self.__window_rect:
+            # The windows are already there.
+            return
+        self.__window_rect = dict(window_rect)
+        top_cid = self.__windows.top_key
+        # Only a top window that takes the size it's given covers the
+        # windows under it.
+        lazy = self.config.chrome.lazy_window_layout and self.__top_window_fills_rect()
+        for window_info in self.__windows.values():
             window_cid = window_info['cid']
+            if window_cid == top_cid:
+                continue
+            if lazy and _contains(window_rect, self.__given_rects.get(window_cid)):
+                # The top window, which fills the new rectangle, covers it,
+                # so it can wait.
+                self.__stale_window_cids.add(window_cid)
+            else:
+                self.__stale_window_cids.discard(window_cid)
+                self.__given_rects[window_cid] = dict(window_rect)
+                self._fire(event_ids.LAYOUT__SET_RECTANGLE, window_cid, window_rect)
+        if top_cid is not None:
+            # Moved last, so that if it doesn't take the new size, all the
+            # windows left under it are known.
+            self.__stale_window_cids.discard(top_cid)
+            self.__given_rects[top_cid] = dict(window_rect)
+            self._fire(event_ids.LAYOUT__SET_RECTANGLE, top_cid, window_rect)
+        self.__queue_hidden_layout()
+
+    def _position_stale_window(self, window_cid):
+        """
+        Give the window the current window rectangle, if it missed a layout
+        while under the top window.  Call before bringing it to the top.
+
+        :return: the rectangle given to the window, or None if it was
+            already there.
+        """
+        if window_cid in self.__stale_window_cids:
+            self.__stale_window_cids.discard(window_cid)
+            window_rect = self._get_window_rect()
+            self.__given_rects[window_cid] = dict(window_rect)
             self._fire(event_ids.LAYOUT__SET_RECTANGLE, window_cid, window_rect)
+            return window_rect
+        return None
 
-    def _get_window_index(self, window_cid):
-        for index in range(len(self.__windows)):
-            if self.__windows[index]['cid'] == window_cid:
-                return index
-        return -1
+    def _show_window(self, event_id, window_cid):
+        """
+        Fire the event that brings the window to the top, after moving it
+        to the current window rectangle if it's stale.
+        """
+        event_obj = {}
+        window_rect = self._position_stale_window(window_cid)
+        if window_rect is not None:
+            # The focus request runs in a different event lane than the
+            # move, so the window mapper gets the rectangle with it too.
+            event_obj['window-rect'] = window_rect
+        self._fire(event_id, window_cid, event_obj)
+
+    # noinspection PyUnusedLocal
+    def _on_layout_hidden_window(self, event_id, target_id, event_obj):
+        # One window each time the bus is quiet, so a large portal doesn't
+        # hold up other events.
+        self.__hidden_layout_queued = False
+        if len(self.__stale_window_cids) > 0:
+            self._position_stale_window(next(iter(self.__stale_window_cids)))
+        self.__queue_hidden_layout()
+
+    def __queue_hidden_layout(self):
+        if len(self.__stale_window_cids) > 0 and not self.__hidden_layout_queued:
+            self.__hidden_layout_queued = True
+            self._schedule_idle(lambda: self._fire(event_ids.PORTAL__LAYOUT_HIDDEN_WINDOW, self.cid, {}))
+
+    def __window_order_changed(self):
+        self._fire(event_ids.PORTAL__WINDOW_ORDER_CHANGED, self.cid, {
+            'portal-cid': self.cid,
+            'window-infos': [self.__windows.get(key) for key in self.__windows.mru_keys()],
+        })
+
+    def __top_window_fills_rect(self):
+        """
+        True if the top window can be resized, and ended up at the last
+        rectangle it was given.
+        """
+        top_cid = self.__windows.top_key
+        if top_cid is None or not self.config.applications.is_resizable(self.__windows.top):
+            return False
+        applied_rect = self.__applied_rects.get(top_cid)
+        return applied_rect is not None and applied_rect == self.__given_rects.get(top_cid)
+
+    def __forget_window_rect(self, window_cid):
+        self.__given_rects.pop(window_cid, None)
+        self.__applied_rects.pop(window_cid, None)
+        self.__stale_window_cids.discard(window_cid)
+        # If it was the top window, the new top window is now showing.
+        self._position_stale_window(self.__windows.top_key)
 
     def _get_window_rect(self):
         border = self.config.chrome.portal_chrome_border
@@ -338,9 +455,19 @@ class Portal(Tile):
         }
 
     def _get_active_hwnd(self):
-        if self.__top_window_index is not None and 0 <= self.__top_window_index < len(self.__windows):
-            return self.__windows[self.__top_window_index]['hwnd']
-        elif len(self.__windows) > 0:
-            return self.__windows[0]['hwnd']
-        else:
-            return None
+        window_info = self.__windows.top
+        if window_info is not None:
+            return window_info['hwnd']
+        return None
+
+
+def _contains(outer, inner):
+    """
+    True if the inner rectangle is inside the outer rectangle.
+    """
+    return (
+        inner is not None and
+        outer['x'] <= inner['x'] and outer['y'] <= inner['y'] and
+        inner['x'] + inner['width'] <= outer['x'] + outer['width'] and
+        inner['y'] + inner['height'] <= outer['y'] + outer['height']
+    )
@@ -2,7 +2,9 @@ from .layout import Layout
 from ...system import event_ids
 from ...system import target_ids
 from ...config import LayoutConfig
+from ...util.layout_engine import compute_layout
 from ..navigation import *
+import collections
 import threading
 
 
@@ -15,6 +17,9 @@ _DIRECTION_INDEX = {
     DIR_NEXT: 1,
 }
 
+# Number of computed layout tables to keep.
+_LAYOUT_RECTS_MEMO_SIZE = 32
+
 
 def root_layout_factory(bus, config, id_manager):
     if config.uses_layout:
@@ -38,6 +43,10 @@ class RootLayout(Layout):
 
         self.__layout_lock = threading.RLock()
 
+        # (layout id, rectangle) -> (LayoutConfig, rectangles from compute_layout),
+        # so going back to a known monitor setup doesn't compute them again.
+        self.__layout_rects = collections.OrderedDict()
+
         self._listen(event_ids.OS__RESOLUTION_CHANGED, target_ids.ANY, self._on_resolution_changed)
         self._listen(event_ids.LAYOUT__ROOT_LAYOUT_CREATE, target_ids.TOP_LAYOUT, self._on_root_create_layout)
         self._listen(event_ids.LAYOUT__SWITCH_TO, target_ids.TOP_LAYOUT, self._on_workflow_layout_switch)
@@ -54,21 +63,25 @@ class RootLayout(Layout):
 
     # noinspection PyUnusedLocal
     def _on_config_update(self, event_id, target_id, event_obj):
+        with self.__layout_lock:
+            self.__layout_rects.clear()
         self._on_workflow_layout_switch(event_id, target_id, {'layout-name': self.__layout_name})
 
     # noinspection PyUnusedLocal
     def _on_workflow_layout_switch(self, event_id, target_id, event_obj):
         # Even if the requested layout is the same as the current layout,
         # still perform the change.  If the user had changed around the layout manually,
-        # the layout may need adjustment.  Also, this will reset the windows to their
-        # original position.
+        # or the monitors changed, the layout may need adjustment.
         self._log_verbose("Switching Layout")
 
-        # Remove all children.  When the last is removed, that will trigger
-        # _on_last_child_removed, which will rebuild the layout.
+        # If the new layout has the same top layouts, update the existing tiles
+        # in place.  Otherwise, remove all children.  When the last is removed,
+        # that will trigger _on_last_child_removed, which will rebuild the layout.
         with self.__layout_lock:
             self.__layout_name = event_obj['layout-name']
-            if self._has_children:
+            if self._has_children and self._update_layout():
+                self._log_debug("Updated the existing layout in place")
+            elif self._has_children:
                 self._log_debug("Delaying workflow layout switch - need to clear out children first")
                 for child_cid in self._child_cids:
                     self._log_debug("Requesting removal of child {0}".format(child_cid))
@@ -101,41 +114,8 @@ class RootLayout(Layout):
                 # TODO could generate a new event to trigger the windows_hook_event to regenerate the monitor setup
                 # event.
                 return
-            workgroup = self.config.get_workgroup_for_display(self.__monitors)
-            top_layouts = workgroup.get_layout_group(self.__layout_name)
-            if len(top_layouts) == len(self.__monitors):
-                self._log_debug("RootLayout: One layout per monitor")
-                for i in range(len(top_layouts)):
-                    layout = top_layouts[i]
-                    assert isinstance(layout, LayoutConfig)
-                    monitor = self.__monitors[i]
-                    size = {
-                        'x': monitor['left'],
-                        'y': monitor['top'],
-                        'width': monitor['right'] - monitor['left'],
-                        'height': monitor['bottom'] - monitor['top'],
-                    }
-                    events = []
-                    child_cid = self._add_child_layout(layout, size, events)
-                    self._set_child_data(child_cid, 'monitor', size)
-
-            # elif len(top_layouts) == 1:
-            else:
-                # We only support 1 layout for everything, or 1 layout per monitor.
-                # Other combinations are just too tricky (for now).
-                if len(top_layouts) != 1:
-                    self._log_warn("Layout group {0} has {1} layouts, but there are {2} monitors".format(
-                        self.__layout_name, len(top_layouts), len(self.__monitors)
-                    ))
-                self._log_debug("One layout for all the monitors")
-                size = {'x': 100000, 'y': 100000, 'width': 0, 'height': 0}
-                for monitor in self.__monitors:
-                    size['x'] = min(size['x'], monitor['left'])
-                    size['y'] = min(size['y'], monitor['top'])
-                    size['width'] = max(size['width'], monitor['right'])
-                    size['height'] = max(size['height'], monitor['bottom'])
-                events = []
-                child_cid = self._add_child_layout(top_layouts[0], size, events)
+            for layout, size in self._get_top_layouts():
+                child_cid = self._add_top_layout(layout, size)
                 self._set_child_data(child_cid, 'monitor', size)
 
             # Re-allocate all the open windows to their correct portals.
@@ -146,6 +126,104 @@ class RootLayout(Layout):
             })
             self._fire(event_ids.LAYOUT__RESEND_WINDOW_CREATED_EVENTS, target_ids.WINDOW_MAPPER, {})
 
+    def _get_top_layouts(self):
+        """
+        Find the layouts for the current monitors and layout name.
+
+        :return: list of (LayoutConfig, rectangle dict) for each top layout.
+        """
+        workgroup = self.config.get_workgroup_for_display(self.__monitors)
+        top_layouts = workgroup.get_layout_group(self.__layout_name)
+        ret = []
+        if len(top_layouts) == len(self.__monitors):
+            self._log_debug("RootLayout: One layout per monitor")
+            for i in range(len(top_layouts)):
+                layout = top_layouts[i]
+                assert isinstance(layout, LayoutConfig)
+                monitor = self.__monitors[i]
+                size = {
+                    'x': monitor['left'],
+                    'y': monitor['top'],
+                    'width': monitor['right'] - monitor['left'],
+                    'height': monitor['bottom'] - monitor['top'],
+                }
+                ret.append((layout, size))
+
+        # elif len(top_layouts) == 1:
+        else:
+            # We only support 1 layout for everything, or 1 layout per monitor.
+            # Other combinations are just too tricky (for now).
+            if len(top_layouts) != 1:
+                self._log_warn("Layout group {0} has {1} layouts, but there are {2} monitors".format(
+                    self.__layout_name, len(top_layouts), len(self.__monitors)
+                ))
+            self._log_debug("One layout for all the monitors")
+            size = {'x': 100000, 'y': 100000, 'width': 0, 'height': 0}
+            for monitor in self.__monitors:
+                size['x'] = min(size['x'], monitor['left'])
+                size['y'] = min(size['y'], monitor['top'])
+                size['width'] = max(size['width'], monitor['right'])
+                size['height'] = max(size['height'], monitor['bottom'])
+            ret.append((top_layouts[0], size))
+        return ret
+
+    def _update_layout(self):
+        """
+        Change the existing tiles to the new layout, if every top layout
+        matches the current one by name.  Each layout then matches up its
+        own children, so only the tiles that changed are created or removed,
+        and the surviving portals keep their windows and focus.
+
+        :return: True if the tiles were updated, False if the layout needs to
+            be built from scratch.
+        """
+        if self.__monitors is None:
+            return False
+        top_layouts = self._get_top_layouts()
+        child_cids = self._child_cids
+        if len(top_layouts) != len(child_cids):
+            return False
+        for child_cid, (layout, size) in zip(child_cids, top_layouts):
+            current = self._get_child_layout(child_cid)
+            if current is None or current.category != layout.category or current.name != layout.name:
+                return False
+        for child_cid, (layout, size) in zip(child_cids, top_layouts):
+            self._set_child_data(child_cid, 'layout-def', layout)
+            self._set_child_data(child_cid, 'monitor', size)
+            self._set_child_data(child_cid, 'rect', dict(size))
+            self._fire(event_ids.LAYOUT__UPDATE_LAYOUT, child_cid, {
+                'layout-def': layout,
+                'layout-rects': self._get_layout_rects(layout, size),
+                'layout-path': (),
+            })
+        return True
+
+    def _add_top_layout(self, layout, size):
+        """
+        Add the layout for a monitor.  The rectangles for the whole layout
+        tree are computed here, in one pass, and handed down as the tiles
+        are created, so each tile is created with its final rectangle.
+        """
+        layout_rects = self._get_layout_rects(layout, size)
+        return self._add_child_layout(layout, size, [], layout_rects, ())
+
+    def _get_layout_rects(self, layout, size):
+        """
+        The rectangles for the layout tree; see `compute_layout`.  The
+        tables are shared, so they must not be changed.
+        """
+        key = (id(layout), size['x'], size['y'], size['width'], size['height'])
+        with self.__layout_lock:
+            cached = self.__layout_rects.get(key)
+            if cached is not None and cached[0] is layout:
+                self.__layout_rects.move_to_end(key)
+                return cached[1]
+            ret = compute_layout(layout, size)
+            self.__layout_rects[key] = (layout, ret)
+            while len(self.__layout_rects) > _LAYOUT_RECTS_MEMO_SIZE:
+                self.__layout_rects.popitem(last=False)
+            return ret
+
     def _on_last_child_removed(self):
         self._log_debug("Last root child removed; going on to create the layout.")
         self._on_root_create_layout(None, None, None)
@@ -2,7 +2,8 @@
 from .layout import Layout
 from .portal import PORTAL_CATEGORY
 from ...system import event_ids
-from ...config import LayoutConfig, ChildSplitConfig, ORIENTATION_HORIZONTAL, ORIENTATION_VERTICAL, ORIENTATION_CENTER
+from ...config import LayoutConfig, ChildSplitConfig, ORIENTATION_HORIZONTAL, ORIENTATION_VERTICAL
+from ...util.layout_engine import split_rects
 from ..navigation import *
 
 SPLIT_LAYOUT_CATEGORY = 'split-layout'
@@ -41,39 +42,125 @@ _ORIENT_DIRS = {
 def split_layout_factory(cid, arguments, bus, id_manager, config):
     parent_cid = arguments['parent-cid']
     layout_def = arguments['layout-def']
-    return SplitLayout(cid, bus, config, id_manager, parent_cid, layout_def)
+    return SplitLayout(cid, bus, config, id_manager, parent_cid, layout_def,
+                       arguments.get('layout-rects'), arguments.get('layout-path', ()))
 
 
 class SplitLayout(Layout):
-    def __init__(self, cid, bus, config, id_manager, parent_cid, layout_config):
+    def __init__(self, cid, bus, config, id_manager, parent_cid, layout_config, layout_rects=None, layout_path=()):
+        """
+
+        :param layout_rects: the rectangles computed for the whole layout tree
+            by the root layout, or None if not known.
+        :param layout_path: the path of this layout in layout_rects.
+        """
         assert isinstance(layout_config, LayoutConfig)
         assert layout_config.orientation in _ORIENT_DIRS
         Layout.__init__(self, cid, bus, config, id_manager, parent_cid)
 
         self.__layout_config = layout_config
 
+        # Create a child for each split, at its final size if the root
+        # computed the layout.
+        for index, split in enumerate(self.__get_splits(layout_config)):
+            self.__add_split_child(split, layout_rects, layout_path + (index,))
+
+        self._listen(event_ids.LAYOUT__SET_SPLIT_SIZES, cid, self._on_set_split_sizes)
+        self._listen(event_ids.LAYOUT__UPDATE_LAYOUT, cid, self._on_update_layout)
+
+    def __get_splits(self, layout_config):
         splits = layout_config.child_splits
         if splits is None or len(splits) <= 0:
             self._log_debug("Split definition {0} has no child splits; assuming 1 child portal".format(
                 layout_config.name))
             splits = [None]
+        return [split is None and ChildSplitConfig(1, None) or split for split in splits]
+
+    def __add_split_child(self, split, layout_rects, child_path):
+        size = layout_rects is not None and layout_rects.get(child_path) or _RAW_SIZE
+        if split.layout_def is None or PORTAL_CATEGORY == split.layout_def.category:
+            child_cid = self._add_child_portal(size, split.layout_def, [])
+            self._log_debug("Split {0} ({1}) child {2} assigned to portal {3}".format(
+                self.cid, self.__layout_config.name, self._child_count, child_cid
+            ))
+        else:
+            child_cid = self._add_child_layout(split.layout_def, size, [], layout_rects, child_path)
+            self._log_debug("Split {0} ({1}) child {2} assigned to layout {3} ({4})".format(
+                self.cid, self.__layout_config.name, self._child_count, child_cid, split.layout_def.name
+            ))
+        self._set_child_data(child_cid, 'split', split)
+        return child_cid
+
+    # noinspection PyUnusedLocal
+    def _on_update_layout(self, event_id, target_id, event_obj):
+        """
+        Change this layout to a new definition.  The children are matched to
+        the new splits by category and name (or, for unnamed children, by
+        category and position); the matching children are kept and updated,
+        the rest are removed and their windows placed again, and the new
+        splits get new children.
+        """
+        layout_config = event_obj['layout-def']
+        layout_rects = event_obj['layout-rects']
+        layout_path = event_obj['layout-path']
+        assert isinstance(layout_config, LayoutConfig)
+        assert layout_config.orientation in _ORIENT_DIRS
+        self.__layout_config = layout_config
 
-        # Create a child for each split
-        for split in splits:
-            if split is None:
-                split = ChildSplitConfig(1, None)
-            if split.layout_def is None or PORTAL_CATEGORY == split.layout_def.category:
-                child_cid = self._add_child_portal(_RAW_SIZE, split.layout_def, [])
-                self._log_debug("Split {0} ({1}) child {2} assigned to portal {3}".format(
-                    self.cid, layout_config.name, self._child_count, child_cid
-                ))
-                self._set_child_data(child_cid, 'split', split)
+        existing = {}
+        for index, child_cid in enumerate(self._child_cids):
+            key = _child_key(index, self._get_child_layout(child_cid))
+            if key not in existing:
+                existing[key] = child_cid
+        child_cids = []
+        for index, split in enumerate(self.__get_splits(layout_config)):
+            child_path = layout_path + (index,)
+            child_cid = existing.pop(_child_key(index, split.layout_def), None)
+            if child_cid is None:
+                child_cid = self.__add_split_child(split, layout_rects, child_path)
             else:
-                child_cid = self._add_child_layout(split.layout_def, _RAW_SIZE, [])
-                self._log_debug("Split {0} ({1}) child {2} assigned to layout {3} ({4})".format(
-                    self.cid, layout_config.name, self._child_count, child_cid, split.layout_def.name
-                ))
                 self._set_child_data(child_cid, 'split', split)
+                self._set_child_data(child_cid, 'layout-def', split.layout_def)
+                if split.layout_def is None or PORTAL_CATEGORY == split.layout_def.category:
+                    self._set_child_rect(child_cid, layout_rects[child_path])
+                else:
+                    self._set_child_data(child_cid, 'rect', dict(layout_rects[child_path]))
+                    self._fire(event_ids.LAYOUT__UPDATE_LAYOUT, child_cid, {
+                        'layout-def': split.layout_def,
+                        'layout-rects': layout_rects,
+                        'layout-path': child_path,
+                    })
+            child_cids.append(child_cid)
+
+        # The new children are in place, so the windows of the removed
+        # children have somewhere to go.
+        for child_cid in existing.values():
+            self._log_debug("Split {0} ({1}) removing child {2}".format(
+                self.cid, layout_config.name, child_cid))
+            self._forget_child(child_cid)
+            self._fire(event_ids.LAYOUT__REMOVE_OBJECT, child_cid, {
+                'window-parent': self.cid,
+                'replace-windows': True,
+            })
+        self._set_child_order(child_cids)
+        self._on_resize(event_id, target_id, layout_rects[layout_path])
+
+    # noinspection PyUnusedLocal
+    def _on_set_split_sizes(self, event_id, target_id, event_obj):
+        """
+        Change the split size of each child.  Only the children whose
+        rectangle changes are told about it.
+        """
+        sizes = event_obj['sizes']
+        child_cids = self._child_cids
+        if len(sizes) != len(child_cids):
+            self._log_warn("Split {0} has {1} children, but was given {2} split sizes".format(
+                self.cid, len(child_cids), len(sizes)))
+            return
+        for child_cid, size in zip(child_cids, sizes):
+            split = self._get_split(child_cid)
+            self._set_child_data(child_cid, 'split', ChildSplitConfig(int(size), split.layout_def))
+        self._relayout()
 
     def _on_direction_negotiation_descend__portal(self, event_obj):
         # print("DEBUG negotiation descend for portal; {0}".format(self.cid))
@@ -191,61 +278,28 @@ class SplitLayout(Layout):
         self._fire(event_ids.DIRECTION_NEGOTIATION__TARGET, target_cid, event_obj)
 
     def _do_layout(self):
-        if ORIENTATION_CENTER == self.__layout_config.orientation:
-            super()._do_layout()
-            return
-
-        dyn_min = 'y'
-        dyn_max = 'height'
-        static_min = 'x'
-        static_max = 'width'
-        if self.__layout_config.orientation == ORIENTATION_HORIZONTAL:
-            static_min = 'y'
-            static_max = 'height'
-            dyn_min = 'x'
-            dyn_max = 'width'
-
-        static_min_pos = self.size[static_min]
-        static_max_pos = self.size[static_max]
-        start_pos = self.size[dyn_min]
-        diff_pos = self.size[dyn_max]
-        max_pos = diff_pos + start_pos
-
-        # First, calculate the number of split steps
-        step_count = 0
-        for child_cid in self._child_cids:
-            step_count += self._get_split(child_cid).size
-
-        step_pos = 0
-        current_dyn = start_pos
-        # print("DEBUG Splitting {0} (base size ({1},{2})x({3},{4})".format(
-        #     self.cid, static_min_pos, static_max_pos, start_pos, max_pos
-        # ))
-        for child_cid in self._child_cids:
-            split = self._get_split(child_cid)
-            if split.size <= 0:
-                # Floating child.
-                self._fire(event_ids.LAYOUT__SET_RECTANGLE, child_cid, self.size)
-                continue
-            next_step = step_pos + split.size
-            next_dyn = current_dyn + ((split.size * diff_pos) // step_count)
-            if next_step >= step_count:
-                # last child, make it full size
-                # Remember, this is a width or height, not a final pixels position.
-                next_dyn = max_pos
-            # print("DEBUG - child {0}@{1} ({2},{3}) ({4} steps)".format(
-            #     child_cid, step_pos, current_dyn, next_dyn - current_dyn, split.size))
-            size = {
-                static_min: static_min_pos,
-                static_max: static_max_pos,
-                dyn_min: current_dyn,
-                dyn_max: next_dyn - current_dyn,
-            }
-            self._fire(event_ids.LAYOUT__SET_RECTANGLE, child_cid, size)
-            step_pos = next_step
-            current_dyn = next_dyn
+        child_cids = self._child_cids
+        rects = split_rects(
+            self.__layout_config.orientation,
+            [self._get_split(child_cid).size for child_cid in child_cids],
+            self.size)
+        for child_cid, rect in zip(child_cids, rects):
+            self._set_child_rect(child_cid, rect)
 
     def _get_split(self, child_cid):
         ret = self._get_child_data(child_cid, 'split')
         assert isinstance(ret, ChildSplitConfig)
         return ret
+
+
+def _child_key(index, layout_def):
+    """
+    How a child is matched up when the layout definition changes: by its
+    category and name, or by its position and category if it has no name.
+    A child whose category changes is created again.
+    """
+    if layout_def is None:
+        return index, PORTAL_CATEGORY
+    if layout_def.name is None:
+        return index, layout_def.category
+    return layout_def.category, layout_def.name
@@ -19,6 +19,9 @@ class Tile(Identifiable, Parent, MarshalableComponent):
 
         self.__config = config
         self.__size = None
+        # Whether the tile needs to lay out its children (or windows) again,
+        # even if its own rectangle doesn't change.
+        self.__dirty = True
 
         self._listen(event_ids.LAYOUT__SET_RECTANGLE, cid, self._on_resize)
         self._listen(event_ids.LAYOUT__ADD_WINDOW, cid, self._on_add_window)
@@ -31,14 +34,30 @@ class Tile(Identifiable, Parent, MarshalableComponent):
 
     # noinspection PyUnusedLocal
     def _on_resize(self, event_id, target_id, event_obj):
-        self.__size = {
+        size = {
             'x': event_obj['x'],
             'y': event_obj['y'],
             'width': event_obj['width'],
             'height': event_obj['height'],
         }
+        if size == self.__size and not self.__dirty:
+            # Nothing under this tile changes.
+            return
+        self.__size = size
+        self.__dirty = False
         self._do_layout()
 
+    def _relayout(self):
+        """
+        Something other than the tile's rectangle changed how its children
+        are laid out; lay them out again now, or when the tile gets its
+        rectangle if it doesn't have one yet.
+        """
+        self.__dirty = True
+        if self.__size is not None:
+            self.__dirty = False
+            self._do_layout()
+
     def _on_add_window(self, event_id, target_id, event_obj):
         raise NotImplementedError()
 
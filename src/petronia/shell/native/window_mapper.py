@@ -20,15 +20,32 @@ from ...arch.funcs import (
     window__get_class_name, window__is_visible, window__set_position,
     window__activate, window__get_title, window__get_visibility_states,
     window__get_active_window, window__maximize, window__minimize, window__move_resize,
-    window__restore,
+    window__restore, window__begin_batch,
     process__get_current_pid, process__get_username_domain_for_pid,
-    shell__set_window_metrics
+    process__get_exit_code, shell__set_window_metrics
 )
+from ...util.process_cache import ProcessInfoCache, pid_key
+from ...util.parallel_gather import gather
+from ...util.window_snapshot import WindowSnapshotCache, TITLE, BORDER, VISIBILITY
+from ...util.window_geometry import GeometryTracker, GeometryRequest
+from ...util.window_positioner import WindowPositioner
 import atexit
+import threading
 
 _CURRENT_PROCESS_ID = process__get_current_pid()
 _CURRENT_USER_DOMAIN = process__get_username_domain_for_pid(_CURRENT_PROCESS_ID)
 
+# Threads reading the details of the windows that exist at start-up.
+_STARTUP_WORKERS = 8
+
+# Seconds a window may take to answer at start-up before it's reported as
+# hung and skipped.
+_STARTUP_WINDOW_TIMEOUT = 2.0
+
+# Most seconds a queued window position waits for the bus to go idle before
+# it's moved anyway.
+_MAX_POSITION_DELAY = 0.1
+
 
 class WindowMapper(Identifiable, Component):
     def __init__(self, bus, id_manager, config):
@@ -45,12 +62,39 @@ class WindowMapper(Identifiable, Component):
         self.__handle_map = {}
         self.__cid_to_handle = {}
         self.__hwnd_restore_state = {}
-        for hwnd in hwnd_list:
+        self.__process_cache = ProcessInfoCache(
+            process__get_username_domain_for_pid, process__get_executable_filename, _is_process_alive)
+        # The last position applied to each window, to skip requests that
+        # wouldn't move it.
+        self.__geometry = GeometryTracker()
+        # The window positions requested in the current layout pass; they
+        # are applied together when the bus goes idle, or when the first one
+        # has waited too long.
+        self.__positioner = WindowPositioner(window__begin_batch, self.__read_border)
+        self.__commit_timer = None
+        self.__commit_timer_lock = threading.Lock()
+        # The title, border and visibility of the registered windows.
+        self.__snapshots = WindowSnapshotCache(
+            window__get_title, self.__read_border, window__get_visibility_states)
+        self.__process_cache.check_processes(True)
+
+        # Reading the window details makes several blocking OS calls per
+        # window, so it's done in parallel.  The windows are registered in
+        # the original order.
+        gathered = gather(hwnd_list, self._read_window_details, _STARTUP_WORKERS, _STARTUP_WINDOW_TIMEOUT)
+        for hwnd in gathered.timed_out:
+            self._log_warn("Window {0} did not respond within {1} seconds; not managing it".format(
+                hwnd, _STARTUP_WINDOW_TIMEOUT))
+        for hwnd, e in gathered.failed:
+            self._log_error("WindowMapper failed to initialize window {0}".format(hwnd), e)
+        for hwnd, details in gathered.results:
             try:
-                self._init_window(hwnd)
+                self._register_window(details)
             except BaseException as e:
                 self._log_error("WindowMapper failed to initialize window {0}".format(hwnd), e)
         self._log_verbose("===== Finished existing window registration =====")
+        self._log_verbose("Process details cache: {0} processes, {1} hits, {2} misses".format(
+            len(self.__process_cache), self.__process_cache.hits, self.__process_cache.misses))
 
         self._listen(event_ids.OS__WINDOW_CREATED, target_ids.ANY, self._on_window_created)
         self._listen(event_ids.OS__WINDOW_DESTROYED, target_ids.ANY, self._on_window_destroyed)
@@ -73,6 +117,8 @@ class WindowMapper(Identifiable, Component):
 
         # Events from the system that request OS actions.
         self._listen(event_ids.LAYOUT__SET_RECTANGLE, target_ids.ANY, self._on_window_move_resize)
+        self._listen(event_ids.BUS__IDLE, target_ids.ANY, self._on_bus_idle)
+        self._listen(event_ids.WINDOW__COMMIT_POSITIONS, target_ids.WINDOW_MAPPER, self._on_commit_positions)
         self._listen(event_ids.TELL_WINDOWS__FOCUS_WINDOW, target_ids.ANY, self._on_set_window_focus)
         self._listen(event_ids.ZORDER__SET_WINDOW_ON_TOP, target_ids.ANY, self._on_set_window_top)
         self._listen(event_ids.TELL_WINDOWS__MINIMIZE_WINDOW, target_ids.ANY, self._on_minimize_window)
@@ -87,15 +133,20 @@ class WindowMapper(Identifiable, Component):
                      self._on_resend_window_created_events)
 
     def close(self):
+        with self.__commit_timer_lock:
+            if self.__commit_timer is not None:
+                self.__commit_timer.cancel()
+                self.__commit_timer = None
         try:
-            for hwnd, state in self.__hwnd_restore_state.items():
+            # Windows can still be registered by the shell hook thread.
+            for hwnd, state in list(self.__hwnd_restore_state.items()):
                 _restore_window_state(hwnd, state[0], state[1])
         finally:
             super().close()
 
     def _setup_window_style(self, info):
         if 'title' not in info:
-            info['title'] = window__get_title(info['hwnd'])
+            info['title'] = self.__snapshots.title(info['hwnd'])
         is_managed, remove_border, remove_title = self._get_managed_chrome_details(info)
         if is_managed:
             # print("DEBUG managed border {0}, title {1} for {2}".format(remove_border, remove_title, info))
@@ -117,58 +168,98 @@ class WindowMapper(Identifiable, Component):
                 except OSError as e:
                     self._log_debug("Problem setting style for {0}".format(info['class']), e)
                 window__redraw(hwnd)
+                self.__snapshots.invalidate(hwnd, BORDER)
+                self.__geometry.forget(hwnd)
 
     def _init_window(self, hwnd):
+        self.__process_cache.check_processes()
+        return self._register_window(self._read_window_details(hwnd))
+
+    def _read_window_details(self, hwnd):
+        """
+        Query the OS for the window details needed to register it.  Only
+        blocking OS calls; nothing is changed, so this can run on a worker
+        thread.
+
+        :param hwnd:
+        :return: dict of the details.  'ignore' is set to the reason if the
+            window shouldn't be managed; 'problems' is a list of
+            (message, exception) to log.
+        """
+        details = {'hwnd': hwnd, 'ignore': None, 'problems': []}
         pid = window__get_process_id(hwnd)
-        if _CURRENT_PROCESS_ID == pid:
-            return None
+        details['pid'] = pid
+        if _CURRENT_PROCESS_ID == pid_key(pid):
+            details['ignore'] = ""
+            return details
+        process_cache = self.__process_cache
+        process_cache.add_window(hwnd, pid)
         class_name = window__get_class_name(hwnd)
+        details['class'] = class_name
         try:
-            username_domain = process__get_username_domain_for_pid(pid)
-            self._log_debug("window {0}, pid {1}, owned by [{2}@{3}]".format(
-                hwnd, pid, username_domain[0], username_domain[1]))
+            username_domain = process_cache.get_username_domain(pid)
         except OSError as e:
             # Most probably an access problem.  We don't want to manage programs
             # that we can't access.
-            self._log_debug("username/domain read problem for window {0}, pid {1}, class {2}".format(
-                hwnd, pid, class_name), e)
+            details['problems'].append((
+                "username/domain read problem for window {0}, pid {1}, class {2}".format(hwnd, pid, class_name), e))
             username_domain = ("[aborted]", "[aborted]")
-            # return None
         # Only manage windows that the user owns.
         if username_domain != _CURRENT_USER_DOMAIN:
-            self._log_debug("ignoring window with pid {0}, class {1} from other user {2}@{3}".format(
+            details['ignore'] = "ignoring window with pid {0}, class {1} from other user {2}@{3}".format(
                 pid, class_name, username_domain[0], username_domain[1])
-            )
             if class_name == 'PuTTY':
                 print("PUTTY ignoring window; detected {0}\\{1}, have {2}\\{3}".format(
                     username_domain[1], username_domain[0], _CURRENT_USER_DOMAIN[1], _CURRENT_USER_DOMAIN[0]
                 ))
-            return None
+            return details
         if class_name is None or class_name.startswith(PETRONIA_CREATED_WINDOW__CLASS_PREFIX):
-            self._log_debug("Ignoring self-managed window with class {0}".format(class_name))
-            return None
-        cid = self.__id_manager.allocate('hwnd')
-        key = str(hwnd)
+            details['ignore'] = "Ignoring self-managed window with class {0}".format(class_name)
+            return details
         module_filename = ""
         try:
             module_filename = window__get_module_filename(hwnd)
         except OSError as e:
-            self._log_debug("Ignoring problem from window__get_module_filename", e)
-        if module_filename is None:
-            module_filename = ''
+            details['problems'].append(("Ignoring problem from window__get_module_filename", e))
+        details['module_filename'] = module_filename or ''
         exec_filename = ""
         try:
-            exec_filename = process__get_executable_filename(pid)
+            exec_filename = process_cache.get_executable_filename(pid)
         except OSError as e:
-            self._log_debug("Ignoring problem from process__get_executable_filename", e)
-        if exec_filename is None:
-            exec_filename = ''
-        visible = window__is_visible(hwnd)
+            details['problems'].append(("Ignoring problem from process__get_executable_filename", e))
+        details['exec_filename'] = exec_filename or ''
+        details['visible'] = window__is_visible(hwnd)
+        return details
+
+    def _register_window(self, details):
+        """
+        Allocate the id for the window found by _read_window_details, set up its
+        style, and tell the other components about it.
+
+        :param details:
+        :return: the window info, or None if the window isn't registered.
+        """
+        for message, e in details['problems']:
+            self._log_debug(message, e)
+        if details['ignore'] is not None:
+            if details['ignore']:
+                self._log_debug(details['ignore'])
+            return None
+        hwnd = details['hwnd']
+        # The handle may be reused from a window whose destruction was missed.
+        self.__snapshots.remove(hwnd)
+        self.__geometry.forget(hwnd)
+        cid = self.__id_manager.allocate('hwnd')
+        key = str(hwnd)
+        module_filename = details['module_filename']
+        exec_filename = details['exec_filename']
+        pid = details['pid']
+        visible = details['visible']
         if visible:
             info = {
                 'cid': cid,
                 'hwnd': hwnd,
-                'class': class_name,
+                'class': details['class'],
                 'module_filename': module_filename,
                 'exec_filename': exec_filename,
                 'pid': pid,
@@ -200,8 +291,9 @@ class WindowMapper(Identifiable, Component):
         :return: (should be managed chrome, remove border?, remove title?)
         """
         if window_info['visible'] and not self.__config.shell.matches_shell_window(window_info):
-            has_title = self.__config.applications.has_title(window_info)
-            has_border = self.__config.applications.has_border(window_info)
+            flags = self.__config.applications.get_flags(window_info)
+            has_title = flags.has_title
+            has_border = flags.has_border
             # print("DEBUG window managed as border {0} title {1}: {2}".format(has_border, has_title, window_info))
             return not (has_title and has_border), not has_border, not has_title
         # print("DEBUG window not visible or is shell: {0}".format(window_info))
@@ -223,6 +315,7 @@ class WindowMapper(Identifiable, Component):
     def _on_window_destroyed(self, event_id, target_id, obj):
         hwnd = obj['target_hwnd']
         key = str(hwnd)
+        self.__process_cache.remove_window(hwnd)
         # No need to check if the window is registered
         if key in self.__handle_map:
             info = self.__handle_map[key]
@@ -234,6 +327,9 @@ class WindowMapper(Identifiable, Component):
                 del self.__cid_to_handle[info['cid']]
             if hwnd in self.__hwnd_restore_state:
                 del self.__hwnd_restore_state[hwnd]
+        self.__snapshots.remove(hwnd)
+        self.__geometry.forget(hwnd)
+        self.__positioner.cancel(hwnd)
 
     # noinspection PyUnusedLocal
     def _on_window_focused(self, event_id, target_id, obj):
@@ -246,6 +342,12 @@ class WindowMapper(Identifiable, Component):
             return
         key = str(hwnd)
         if key in self.__handle_map:
+            # The active window changed.
+            self.__invalidate_focus()
+            # The user may have moved the window.  Reading the border checks
+            # it against the position it was given.
+            self.__snapshots.invalidate(hwnd, BORDER)
+            self.__snapshots.border(hwnd)
             info = self.__handle_map[key]
             self._fire_for_window(event_ids.WINDOW__FOCUSED, info)
 
@@ -253,6 +355,8 @@ class WindowMapper(Identifiable, Component):
     def _on_window_minimized(self, event_id, target_id, obj):
         hwnd = obj['target_hwnd']
         key = str(hwnd)
+        self.__snapshots.invalidate(hwnd, VISIBILITY, BORDER)
+        self.__geometry.forget(hwnd)
         if key in self.__handle_map:
             info = self.__handle_map[key]
             # TODO do something
@@ -261,6 +365,8 @@ class WindowMapper(Identifiable, Component):
     def _on_window_redraw(self, event_id, target_id, obj):
         hwnd = obj['target_hwnd']
         key = str(hwnd)
+        # Sent when the window title changes.
+        self.__snapshots.invalidate(hwnd, TITLE)
         if key in self.__handle_map:
             info = self.__handle_map[key]
             self._fire_for_window(event_ids.WINDOW__REDRAW, info)
@@ -282,6 +388,8 @@ class WindowMapper(Identifiable, Component):
     def _on_window_replaced(self, event_id, target_id, obj):
         hwnd = obj['target_hwnd']
         key = str(hwnd)
+        self.__snapshots.invalidate(hwnd)
+        self.__geometry.forget(hwnd)
         if key in self.__handle_map:
             info = self.__handle_map[key]
             # TODO do something
@@ -304,25 +412,72 @@ class WindowMapper(Identifiable, Component):
         if target_id in self.__cid_to_handle:
             hwnd = self.__cid_to_handle[target_id]
             info = None
-            resize = True
             if str(hwnd) in self.__handle_map:
                 info = self._create_window_info(self.__handle_map[str(hwnd)])
             if 'x' in obj and 'y' in obj and 'height' in obj and 'width' in obj:
+                request = GeometryRequest.from_event(obj)
+                # A 'force' request is sent to the OS even if nothing changed.
+                if not obj.get('force') and self.__geometry.matches(hwnd, request):
+                    # The window is already there.
+                    self.__positioner.cancel(hwnd)
+                    return
                 # Move and resize the window and possibly make it on top
-                # of all the other windows.
-                if not _move_resize_window(
-                            hwnd, info, self.__config,
-                            int(obj['x']), int(obj['y']), int(obj['width']), int(obj['height']),
-                            obj
-                        ):
-                    self._on_window_destroyed(event_id, target_id, {'target_hwnd': hwnd})
+                # of all the other windows, once the layout pass is over.
+                resizable = info is None or self.__config.applications.is_resizable(info)
+                self.__positioner.request(hwnd, request, resizable)
+                self.__start_commit_timer()
                 return
 
             # Could not move or resize, so just send it to the top if necessary.
             if 'make-focused' in obj and obj['make-focused']:
+                self.__apply_positions(self.__positioner.commit(hwnd))
+                self.__invalidate_focus()
                 if not window__activate(hwnd):
                     self._on_window_destroyed(event_id, target_id, {'target_hwnd': hwnd})
 
+    # noinspection PyUnusedLocal
+    def _on_bus_idle(self, event_id, target_id, obj):
+        # Runs in whichever lane emptied last; the windows are moved in the
+        # rectangle events' lane.
+        if self.__positioner.has_pending:
+            self._fire(event_ids.WINDOW__COMMIT_POSITIONS, target_ids.WINDOW_MAPPER, {})
+
+    # noinspection PyUnusedLocal
+    def _on_commit_positions(self, event_id, target_id, obj):
+        with self.__commit_timer_lock:
+            if self.__commit_timer is not None:
+                self.__commit_timer.cancel()
+                self.__commit_timer = None
+        self.__apply_positions(self.__positioner.commit())
+
+    def __start_commit_timer(self):
+        # Steady traffic can keep the bus from going idle, so the windows
+        # are moved after a bounded delay even then.
+        with self.__commit_timer_lock:
+            if self.__commit_timer is None:
+                self.__commit_timer = threading.Timer(_MAX_POSITION_DELAY, self.__on_commit_timer)
+                self.__commit_timer.daemon = True
+                self.__commit_timer.start()
+
+    def __on_commit_timer(self):
+        self._fire(event_ids.WINDOW__COMMIT_POSITIONS, target_ids.WINDOW_MAPPER, {})
+
+    def __apply_positions(self, results):
+        for hwnd, request, final_rect in results:
+            self.__geometry.set_applied(hwnd, request, final_rect)
+            self.__snapshots.invalidate(hwnd, BORDER)
+            if final_rect is None:
+                self._on_window_destroyed(None, None, {'target_hwnd': hwnd})
+            elif str(hwnd) in self.__handle_map:
+                window_cid = self.__handle_map[str(hwnd)]['cid']
+                self._fire(event_ids.WINDOW__POSITIONED, window_cid, {
+                    'window-cid': window_cid,
+                    'x': final_rect['x'],
+                    'y': final_rect['y'],
+                    'width': final_rect['width'],
+                    'height': final_rect['height'],
+                })
+
     # noinspection PyUnusedLocal
     def _on_set_window_focus(self, event_id, target_id, obj):
         if target_id in self.__cid_to_handle:
@@ -338,7 +493,17 @@ class WindowMapper(Identifiable, Component):
             if not 'restored' in info['visibility']:
                 # Whether the window is maximized or restored, change it.
                 window__restore(hwnd)
-
+                self.__snapshots.invalidate(hwnd, VISIBILITY, BORDER)
+                self.__geometry.forget(hwnd)
+
+            if 'window-rect' in obj:
+                # The portal moved the window just before showing it.  That
+                # move is in another event lane, so it may not be here yet.
+                self._on_window_move_resize(event_id, target_id, obj['window-rect'])
+            # Move the window before it's shown, rather than waiting for the
+            # end of the layout pass, so it never shows at its old position.
+            self.__apply_positions(self.__positioner.commit(hwnd))
+            self.__invalidate_focus()
             if window__activate(hwnd):
                 self._fire_for_window(event_ids.WINDOW__FOCUSED, self.__handle_map[str(hwnd)])
             else:
@@ -360,6 +525,8 @@ class WindowMapper(Identifiable, Component):
             hwnd = window__get_active_window()
 
         if hwnd:
+            self.__snapshots.invalidate(hwnd, VISIBILITY, BORDER)
+            self.__geometry.forget(hwnd)
             if not window__maximize(hwnd):
                 self._log_info("Attempted to focus on a window that isn't responsive ({0} / {1})".format(
                     target_id, hwnd))
@@ -376,6 +543,8 @@ class WindowMapper(Identifiable, Component):
 
         if hwnd is not None:
             # print("DEBUG minimizing handle " + hwnd)
+            self.__snapshots.invalidate(hwnd, VISIBILITY, BORDER)
+            self.__geometry.forget(hwnd)
             if not window__minimize(hwnd):
                 self._log_info("Attempted to focus on a window that isn't responsive ({0} / {1})".format(
                     target_id, hwnd))
@@ -399,6 +568,8 @@ class WindowMapper(Identifiable, Component):
             height = rect['height'] + int(obj['adjust-y'])
             print("Resizing to ({0}, {1}), {2}x{3}".format(rect['x'], rect['y'], width, height))
             window__move_resize(hwnd, rect['x'], rect['y'], width, height)
+            self.__snapshots.invalidate(hwnd, BORDER)
+            self.__geometry.forget(hwnd)
         else:
             self._log_warn("No active window found")
 
@@ -417,7 +588,7 @@ class WindowMapper(Identifiable, Component):
     # noinspection PyUnusedLocal
     def _on_resend_window_created_events(self, event_id, target_id, obj):
         self._log_debug("Resending window create events.")
-        for info in self.__handle_map.values():
+        for info in list(self.__handle_map.values()):
             if self._is_tile_managed(info):
                 self._fire_for_window(event_ids.WINDOW__CREATED, info)
 
@@ -430,37 +601,43 @@ class WindowMapper(Identifiable, Component):
                 'window-info': full_info,
             })
 
-    @staticmethod
-    def _create_window_info(info):
+    def _create_window_info(self, info):
         if info['visible']:
             hwnd = info['hwnd']
-            try:
-                title = window__get_title(hwnd)
-                rect = window__border_rectangle(hwnd)
-                visibility = window__get_visibility_states(hwnd)
-            except OSError:
-                # Window is gone now (#4)
-                title = ""
-                rect = {'x': 0, 'y': 0, 'width': 0, 'height': 0, 'top': 0, 'bottom': 0, 'left': 0, 'right': 0}
-                visibility = {}
-            full_info = {
-                # Some things we load every time.
+            # The title, border and visibility come from the snapshot cache;
+            # by default, they're only read when a listener uses them.
+            return self.__snapshots.snapshot(hwnd, {
                 'cid': info['cid'],
-                'title': title,
-                'border': rect,
-                'visibility': visibility,
-
-                # Others are static
                 'hwnd': hwnd,
                 'class': info['class'],
                 'module_filename': info['module_filename'],
                 'exec_filename': info['exec_filename'],
                 'pid': info['pid'],
                 'visible': info['visible'],
-            }
-            return full_info
+            })
         return info
 
+    def __invalidate_focus(self):
+        # The 'active' visibility state moves between windows, so it has to
+        # be dropped for all of them.
+        for hwnd in self.__cid_to_handle.values():
+            self.__snapshots.invalidate(hwnd, VISIBILITY)
+        self.__geometry.focus_changed()
+
+    def __read_border(self, hwnd):
+        rect = window__border_rectangle(hwnd)
+        self.__geometry.observed(hwnd, rect)
+        return rect
+
+    @property
+    def geometry_counts(self):
+        """(requests applied, requests skipped because the window was already there)"""
+        return self.__geometry.applied, self.__geometry.skipped
+
+
+def _is_process_alive(pid):
+    return process__get_exit_code(pid) is None
+
 
 def _restore_window_state(hwnd, size, style):
     try:
@@ -475,59 +652,3 @@ def _restore_window_state(hwnd, size, style):
             ["frame-changed", "no-zorder", "async-window-pos"])
     except OSError:
         pass
-
-
-def _move_resize_window(hwnd, window_info, config, pos_x, pos_y, width, height, options):
-    do_resize = window_info is None or config.applications.is_resizable(window_info)
-
-    # Because we check the final size of the window, we don't use "async"
-    flags = ['frame-changed', 'draw-frame']
-    if not do_resize:
-        # print("DEBUG do not resize window (info is {0})".format(window_info is None and 'None' or 'set'))
-        flags.append("no-size")
-        flags.append('async-window-pos')
-
-    z_order = None
-    if 'make-focused' in options and options['make-focused']:
-        z_order = 'topmost'
-    if do_resize:
-        if not window__set_position(hwnd, z_order, pos_x, pos_y, width, height, flags):
-            return False
-
-    try:
-        final_size = window__border_rectangle(hwnd)
-    except OSError:
-        return False
-
-    if not do_resize or final_size['width'] != width or final_size['height'] != height:
-        # print("DEBUG requested size {0}x{1}, found {2}x{3}".format(
-        #     width, height, final_size['width'], final_size['height']))
-
-        # The window could not be inserted into the portal at the expected size.
-        # Put the window in according to the position options.
-        v = ('v-snap' in options and options['v-snap'] or 'top').strip().lower()
-        h = ('h-snap' in options and options['h-snap'] or 'left').strip().lower()
-        if v == 'bottom':
-            y = pos_y + height - final_size['height']
-        elif v == 'center':
-            y = pos_y + (height // 2) - (final_size['height'] // 2)
-        else:
-            y = pos_y
-        if h == 'right':
-            x = pos_x + width - final_size['width']
-        elif h == 'center':
-            x = pos_x + (width // 2) - (final_size['width'] // 2)
-        else:
-            x = pos_x
-
-        flags.append("no-size")
-        flags.append('async-window-pos')
-
-        # print("DEBUG could not fit window into portal, snapping {2} {3} at ({0},{1})".format(x, y, v, h))
-        if not window__set_position(hwnd, z_order, x, y, 0, 0, flags):
-            return False
-
-    # if 'make-focused' in obj and obj['make-focused']:
-    #     if not window__activate(hwnd):
-    #         return False
-    return True
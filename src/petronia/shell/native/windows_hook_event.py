@@ -8,26 +8,35 @@ This needs to be one of the last events to
 from ...system import event_ids
 from ...system import target_ids
 from ...system.component import Component, Identifiable
+from ...system.logger import LEVEL_DEBUG, LEVEL_WARN
 from ...arch.funcs import (
     shell__keyboard_hook, shell__shell_hook, shell__pump_messages, shell__unhook,
     shell__create_global_message_handler, shell__register_window_hook,
     shell__open_start_menu, shell__inject_scancode, shell__lock_workstation,
     shell__is_key_pressed,
     window__create_message_window, monitor__find_monitors, window__send_message,
+    window__post_message, window__set_timer, window__kill_timer,
     SHELL__CANCEL_CALLBACK_CHAIN
 )
 from ...arch import windows_constants
 from ...config import Config, DEFAULT_MODE, MODE_CHANGE_COMMAND
 from ...util.hotkey_chain import (
-    on_key_hook, ACTION_PENDING, IGNORED,
-    STR_VK_MAP, SPECIAL_MODIFIER_CHECK_VKEY_CODES
+    KEY_STATE, STR_VK_MAP, SPECIAL_MODIFIER_CHECK_VKEY_CODES
 )
+from ...util import hotkey_dispatch
+from ...util.hotkey_dispatch import HotkeyDispatch
+from ...util.key_trace import KeyTraceRecorder
 import threading
 
 # for the bits of Windows compatiblity that oozed out of funcs
 from ctypes import wintypes, Structure, POINTER
 from ctypes import cast as c_cast
 
+# The timer that lets the timed hotkey chains act between key events, such
+# as a tap / hold key held down without key repeats.
+_POLL_TIMER_ID = 1
+_POLL_MILLISECONDS = 50
+
 
 class WindowsHookEvent(Identifiable, Component):
     def __init__(self, bus, config):
@@ -37,14 +46,22 @@ class WindowsHookEvent(Identifiable, Component):
         assert isinstance(config, Config)
 
         self.__config = config
-        self.__mode = None
-        self.__mode_keys = None
-        self.__key_combos = None
+        self.__dispatch = HotkeyDispatch(
+            KEY_STATE, MODE_CHANGE_COMMAND,
+            debug_keys=config.init_options.get('log-level', LEVEL_WARN) <= LEVEL_DEBUG)
         self.__key_hook = None
         self.__shell_hook = None
         self.__hwnd = None
+        # Only used from the hook thread.
+        self.__polling = False
         self.__has_quit = False
+        self.__key_trace = None
+        if config.init_options.get('key-trace-file'):
+            self.__key_trace = KeyTraceRecorder(config.init_options['key-trace-file'])
+        # Reused for every key event, so the hook doesn't allocate.
+        self.__special_states = bytearray(len(SPECIAL_MODIFIER_CHECK_VKEY_CODES))
         self._reload_hotkeys(None, None, None)
+        self.__dispatch.start(self._on_dispatched, self._log_error)
 
         self._listen(event_ids.CONFIG__UPDATE, target_ids.ANY, self._reload_hotkeys)
         self._listen(event_ids.TELL_WINDOWS__INJECT_KEYS, target_ids.ANY, self._on_inject_keys)
@@ -53,6 +70,8 @@ class WindowsHookEvent(Identifiable, Component):
         def key_callback(vk_code, scan_code, is_key_up, is_injected):
             # print("k {0} {1} {2} {3}".format(
             #     hex(vk_code), hex(scan_code), is_key_up and "Up" or "Dn", is_injected and "Injected" or "Natural"))
+            if self.__key_trace is not None:
+                self.__key_trace.record(vk_code, not is_key_up, is_injected)
             return self._modal_hotkey(vk_code, not is_key_up)
 
         # noinspection PyUnusedLocal
@@ -65,8 +84,15 @@ class WindowsHookEvent(Identifiable, Component):
             self._on_display_change()
             return 0
 
+        # noinspection PyUnusedLocal
+        def poll_timer(hwnd, message, wparam, lparam):
+            if wparam == _POLL_TIMER_ID:
+                self._poll_hotkeys()
+            return 0
+
         message_id_callbacks = {
             windows_constants.WM_DISPLAYCHANGE: shell_display_change,
+            windows_constants.WM_TIMER: poll_timer,
         }
 
         def on_exit_callback():
@@ -80,6 +106,7 @@ class WindowsHookEvent(Identifiable, Component):
             message_callback_handler = shell__create_global_message_handler(message_id_callbacks)
             self.__hwnd = window__create_message_window("PyWinShell Hooks", message_callback_handler)
             shell__register_window_hook(self.__hwnd, message_id_callbacks, shell_callback)
+            self._poll_hotkeys()
 
             shell__pump_messages(on_exit_callback)
 
@@ -103,53 +130,63 @@ class WindowsHookEvent(Identifiable, Component):
             self._log_verbose("Registered keyboard mode {0}".format(mode))
             mode_chains[mode] = combos
 
-        if self.__mode not in mode_chains:
-            self.__mode = DEFAULT_MODE
-        self.__key_combos = mode_chains
-        self.__mode_keys = mode_chains[self.__mode]
+        self.__dispatch.set_mode_combos(mode_chains, DEFAULT_MODE)
+        if self.__hwnd is not None:
+            # The poll timer may need to start or stop, which must be done
+            # by the hook thread.
+            window__post_message(self.__hwnd, windows_constants.WM_TIMER, _POLL_TIMER_ID, 0)
+
+    def _poll_hotkeys(self):
+        # Called on the hook thread.
+        self.__dispatch.poll()
+        needs_poll = self.__dispatch.needs_poll
+        if needs_poll and not self.__polling:
+            window__set_timer(self.__hwnd, _POLL_TIMER_ID, _POLL_MILLISECONDS)
+        elif self.__polling and not needs_poll:
+            window__kill_timer(self.__hwnd, _POLL_TIMER_ID)
+        self.__polling = needs_poll
 
     def _modal_hotkey(self, vk_code, is_down):
         # HAAAACK
         # Due to issues when the user locks the desktop, the windows key
-        # release hook can get lost.  Because of that, we need to test if
-        # the windows key is up or down, and send that to the hook.
-        specials = {}
-        for special_code in SPECIAL_MODIFIER_CHECK_VKEY_CODES:
-            specials[special_code] = shell__is_key_pressed(special_code)
-        
-        if on_key_hook(vk_code, is_down, specials):
-            res = self.__key_combos[self.__mode].key_action(vk_code, is_down)
-            if res == IGNORED:
-                return None
-            if res != ACTION_PENDING:
-                # Mode change actions need to be done here first.
-                # So special handling for mode changes.
-                # print("DEBUG command {0}".format(res))
-                if res[0] == MODE_CHANGE_COMMAND:
-                    new_mode = res[1].strip()
-                    if new_mode in self.__key_combos:
-                        old_mode = self.__mode
-                        self.__mode = new_mode
-                        self.__mode_keys = self.__key_combos[new_mode]
-                        self.__mode_keys.reset()
-                        self._fire(event_ids.MODE__CHANGE_TO, target_ids.ANY, {
-                            'old-mode': old_mode,
-                            'new-mode': new_mode,
-                        })
-                    else:
-                        self._log_error("CONFIG: unknown mode {0}".format(new_mode))
-                else:
-                    self._fire(event_ids.USER__COMMAND, target_ids.BROADCAST, {'command': res})
-
-            # Weird things happen if we block win+L and win+U;
-            # specifically, the win key is stuck down.
-            # Experiments found that if we don't block the key release,
-            # then things won't get stuck.
-            if not is_down and (vk_code == 0x5B or vk_code == 0x5C):
-                self._log_debug("Not blocking a Win key up")
-                return None
-            self._log_debug("Returning Cancel Key Forward ({0} {1})".format(hex(vk_code), is_down and "Dn" or "Up"))
+        # release hook can get lost.  The key state is only wrong when it
+        # has the windows key down, so only then is the OS asked whether
+        # it's still down.
+        specials = self.__special_states
+        for i in range(len(SPECIAL_MODIFIER_CHECK_VKEY_CODES)):
+            special_vk_code = SPECIAL_MODIFIER_CHECK_VKEY_CODES[i]
+            down = KEY_STATE.is_down(special_vk_code)
+            if down and special_vk_code != vk_code:
+                down = shell__is_key_pressed(special_vk_code)
+            specials[i] = down and 1 or 0
+
+        if self.__dispatch.verdict(vk_code, is_down, SPECIAL_MODIFIER_CHECK_VKEY_CODES, specials):
             return SHELL__CANCEL_CALLBACK_CHAIN
+        return None
+
+    def _on_dispatched(self, item):
+        """
+        Runs in the hotkey dispatch thread, for everything the keyboard hook
+        doesn't need to do itself.
+        """
+        kind, value_1, value_2 = item
+        if kind == hotkey_dispatch.COMMAND:
+            self._fire(event_ids.USER__COMMAND, target_ids.BROADCAST, {'command': value_1})
+        elif kind == hotkey_dispatch.MODE_CHANGED:
+            self._fire(event_ids.MODE__CHANGE_TO, target_ids.ANY, {
+                'old-mode': value_1,
+                'new-mode': value_2,
+            })
+        elif kind == hotkey_dispatch.UNKNOWN_MODE:
+            self._log_error("CONFIG: unknown mode {0}".format(value_1))
+        elif kind == hotkey_dispatch.DROPPED:
+            self._log_warn("Hotkey dispatch queue was full; dropped {0} items ({1} in total)".format(
+                value_1, value_2))
+        elif kind == hotkey_dispatch.WIN_KEY_UP_PASSED:
+            self._log_debug("Not blocking a Win key up")
+        elif kind == hotkey_dispatch.KEY_SWALLOWED:
+            self._log_debug("Returning Cancel Key Forward ({0} {1})".format(
+                hex(value_1), value_2 and "Dn" or "Up"))
 
     def _shell_message(self, source_hwnd, action_id, lparam):
         self._log_debug("shell message {0} {1}".format(hex(action_id), hex(lparam)))
@@ -181,6 +218,7 @@ class WindowsHookEvent(Identifiable, Component):
 
     def close(self):
         try:
+            self.__dispatch.stop()
             if not self.__has_quit:
                 window__send_message(self.__hwnd, windows_constants.WM_QUIT, 0, 0)
             if self.__key_hook:
@@ -189,6 +227,9 @@ class WindowsHookEvent(Identifiable, Component):
             if self.__shell_hook:
                 shell__unhook(self.__shell_hook)
                 self.__shell_hook = None
+            if self.__key_trace is not None:
+                self.__key_trace.close()
+                self.__key_trace = None
         finally:
             super().close()
 
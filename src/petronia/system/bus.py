@@ -2,12 +2,14 @@
 from collections import defaultdict
 
 import datetime
+import threading
 import weakref
 
 from . import event_ids
 from . import target_ids
 from ..util.worker_thread import WorkerThread
 from ..util.rwlock import RWLock
+from ..util.idle_scheduler import IdleScheduler
 import traceback
 
 
@@ -25,10 +27,25 @@ class Bus(object):
     loose.
     """
 
-    def __init__(self, worker_factory=WorkerThread):
+    def __init__(self, worker_factory=WorkerThread, idle_scheduler=None):
+        """
+
+        :param worker_factory:
+        :param idle_scheduler: runs the background work when the bus is
+            quiet; if not given, one is created with its own thread.
+        """
         self.__listeners = defaultdict(weakref.WeakSet)
         self.__listener_lock = RWLock()
 
+        # Number of events queued or running in the workers.
+        self.__pending = 0
+        self.__pending_lock = threading.Lock()
+
+        if idle_scheduler is None:
+            idle_scheduler = IdleScheduler()
+            idle_scheduler.start()
+        self.__idle_scheduler = idle_scheduler
+
         self.__workers = {}
         for worker_name in event_ids.EVENT_THREAD_NAMES:
             if worker_name != event_ids.EVENT_THREAD__NOW:
@@ -73,6 +90,8 @@ class Bus(object):
             event_listeners = self.__listeners[key]
             try:
                 event_listeners.remove(callback)
+                if len(event_listeners) <= 0:
+                    self.__idle_scheduler.schedule(self.__compact_listeners, 'bus-compact-listeners')
             except KeyError:
                 # can happen even if the callback seems to be in the list,
                 # but isn't any longer due to a weak reference.
@@ -81,6 +100,23 @@ class Bus(object):
             self.__listener_lock.release()
         self.fire(event_ids.BUS__LISTENER_REMOVED, target_ids.BROADCAST, {})
 
+    @property
+    def idle_scheduler(self):
+        """
+        Runs low priority tasks once the bus has been quiet for a while.
+        """
+        return self.__idle_scheduler
+
+    def __compact_listeners(self):
+        # Drop the event / target entries with no listeners left, such as
+        # those of closed windows.
+        self.__listener_lock.acquire_write()
+        try:
+            for key in [k for k, v in self.__listeners.items() if len(v) <= 0]:
+                del self.__listeners[key]
+        finally:
+            self.__listener_lock.release()
+
     def fire(self, event_id, target_id, event_obj):
         if event_id in event_ids.EVENT_ID_TO_THREAD:
             worker_name = event_ids.EVENT_ID_TO_THREAD[event_id]
@@ -98,15 +134,35 @@ class Bus(object):
         self.__normalize_event(event_id, target_id, event_obj)
         listeners = self.__get_listeners_for(event_id, target_id)
 
+        with self.__pending_lock:
+            self.__pending += 1
+            self.__idle_scheduler.set_busy()
+
         # Add in the extra event information for possible queue compacting
         if not worker.queue({
-            'op': lambda: _fire_listeners(listeners, event_id, target_id, event_obj),
+            'op': lambda: self.__run_queued(listeners, event_id, target_id, event_obj),
             'event_id': event_id,
             'target_id': target_id,
             'event_obj': event_obj
         }):
+            self.__finished_queued()
             print("<<BUS ERROR: Not a valid event object {0}>>".format(event_obj))
 
+    def __run_queued(self, listeners, event_id, target_id, event_obj):
+        try:
+            _fire_listeners(listeners, event_id, target_id, event_obj)
+        finally:
+            self.__finished_queued()
+
+    def __finished_queued(self):
+        with self.__pending_lock:
+            self.__pending -= 1
+            idle = self.__pending <= 0
+            if idle:
+                self.__idle_scheduler.set_idle()
+        if idle:
+            self.__fire_now(event_ids.BUS__IDLE, target_ids.BUS, {})
+
     def __fire_now(self, event_id, target_id, event_obj):
         event_obj = self.__normalize_event(event_id, target_id, event_obj)
         _fire_listeners(self.__get_listeners_for(event_id, target_id), event_id, target_id, event_obj)
@@ -139,8 +195,11 @@ class Bus(object):
         self.__listener_lock.acquire_read()
         try:
             for key in keys:
-                event_listeners = self.__listeners[key]
-                ret.update(event_listeners)
+                # Not through the defaultdict, so looking up an event
+                # without listeners doesn't add an entry.
+                event_listeners = self.__listeners.get(key)
+                if event_listeners is not None:
+                    ret.update(event_listeners)
         finally:
             self.__listener_lock.release()
         return ret
@@ -169,7 +228,8 @@ class SingleThreadedBus(Bus):
     Used for unit testing.
     """
     def __init__(self):
-        Bus.__init__(self, NonThreadedWorker)
+        # The idle tasks only run when the test runs them.
+        Bus.__init__(self, NonThreadedWorker, IdleScheduler(quiet_period=0))
 
 
 class NonThreadedWorker(object):
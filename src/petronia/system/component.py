@@ -52,6 +52,16 @@ class Component(object):
     def _fire(self, event_id, target_id, event_obj):
         self.__bus.fire(event_id, target_id, event_obj)
 
+    def _schedule_idle(self, task, key=None):
+        """
+        Run the task once the bus has been quiet for a while.  The task runs
+        in the idle scheduler's thread; to change the component's state, it
+        should fire an event to the component.
+
+        :return: True if the task was queued.
+        """
+        return self.__bus.idle_scheduler.schedule(task, key)
+
     def _log_debug(self, message, exception=None):
         self._log(event_ids.LOG__DEBUG, message, exception)
 
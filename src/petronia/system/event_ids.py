@@ -36,6 +36,10 @@ BUS__LISTENER_ADDED = "Listener Added" + EVENT_THREAD__NOTICE
 BUS__LISTENER_REMOVED = "Listener Removed" + EVENT_THREAD__NOTICE
 BUS__USER_GENERATED_ID = "User Generated ID" + EVENT_THREAD__NOTICE
 
+# Fired when the last queued event is processed, and no other queued event
+# is waiting.  The listeners run in the thread that processed that event.
+BUS__IDLE = "Bus Idle" + EVENT_THREAD__NOW
+
 
 # ---------------------------------------------------------------------------
 # Registrar Events
@@ -131,6 +135,12 @@ WINDOW__CLOSED = "Window Closed" + EVENT_THREAD__NOTICE
 WINDOW__FOCUSED = "Window Focused" + EVENT_THREAD__NOTICE
 WINDOW__FLASHING = "Window Flashing" + EVENT_THREAD__NOTICE
 WINDOW__REDRAW = "Window Redraw" + EVENT_THREAD__NOTICE
+# The rectangle a window ended up at after it was moved; the window may
+# not take the size it was given.
+WINDOW__POSITIONED = "Window Positioned" + EVENT_THREAD__NOTICE
+# Move the windows queued by the rectangle events; in the same lane as the
+# rectangle events, so it runs after the ones already sent.
+WINDOW__COMMIT_POSITIONS = "Window Commit Positions" + EVENT_THREAD__NOTICE
 
 
 # ---------------------------------------------------------------------------
@@ -138,6 +148,9 @@ WINDOW__REDRAW = "Window Redraw" + EVENT_THREAD__NOTICE
 
 LAYOUT__SWITCH_TO = "Switch Layout" + EVENT_THREAD__USER_REQUEST
 LAYOUT__SET_RECTANGLE = "Set Screen Rectangle" + EVENT_THREAD__NOTICE
+LAYOUT__SET_SPLIT_SIZES = "Set Split Sizes" + EVENT_THREAD__NOTICE
+LAYOUT__UPDATE_LAYOUT = "Update Layout Definition" + EVENT_THREAD__NOTICE
+LAYOUT__PLACE_WINDOW = "Place Window In Portal" + EVENT_THREAD__NOTICE
 LAYOUT__REMOVE_OBJECT = "Remove Object" + EVENT_THREAD__NOW
 LAYOUT__ROOT_LAYOUT_CREATE = "Root Layout Create" + EVENT_THREAD__NOTICE
 LAYOUT__ADD_WINDOW = "Add Top-Level Window" + EVENT_THREAD__NOTICE
@@ -153,6 +166,7 @@ FOCUS__PORTAL_ALIAS = "Portal Focus By Alias" + EVENT_THREAD__NOTICE  # technica
 FOCUS__MAKE_OWNED_PORTAL_ACTIVE = "Make Portal Owning Window Active" + EVENT_THREAD__USER_REQUEST
 FOCUS__SET_FIRST_WINDOW_FOCUSED = "Portal Focus First Window" + EVENT_THREAD__NOTICE
 FOCUS__SWITCH_TO_LAST_FLASHING_WINDOW = "Make Last Flashing Window Focused" + EVENT_THREAD__USER_REQUEST
+FOCUS__SHOW_NAVIGATION = "Show Portal Navigation Table" + EVENT_THREAD__USER_REQUEST
 
 # ---------------------------------------------------------------------------
 # Layout Selection Events
@@ -178,6 +192,10 @@ PORTAL__MOVE_WINDOW_HERE = "Move Specific Top-Level Window Here" + EVENT_THREAD_
 PORTAL__WINDOW_MOVED_TO_OTHER_PORTAL = "Top-Level Window Moved" + EVENT_THREAD__NOTICE
 PORTAL__MOVE_WINDOW_TO_OTHER_PORTAL = "Move Top-Level Window" + EVENT_THREAD__USER_REQUEST
 PORTAL__MOVE_WINDOW_TO_DESTINATION = "Move Top-Level Window To Destination Portal" + EVENT_THREAD__NOTICE
+PORTAL__LAYOUT_HIDDEN_WINDOW = "Lay Out Hidden Top-Level Window" + EVENT_THREAD__NOTICE
+# The portal's window information, top window first then the most recently
+# used, sent each time that order changes.
+PORTAL__WINDOW_ORDER_CHANGED = "Portal Window Order Changed" + EVENT_THREAD__NOTICE
 
 
 # ---------------------------------------------------------------------------
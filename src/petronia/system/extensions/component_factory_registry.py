@@ -1,12 +1,18 @@
+from .lazy_factory import LazyFactory
 
-from ...shell.control.split_layout import get_object_factories as layout_factories
-from ...shell.control.portal import get_object_factories as portal_factories
-from ...shell.view.render_text import get_object_factories as render_text_factories
+# The category names are kept here, rather than read from each module's
+# get_object_factories(), so that building the registry doesn't import the
+# modules.  They must match the *_CATEGORY constants in those modules, which
+# petronia.tests.lazy_factory checks.
+_BASE_EXTENSION_FACTORIES = {
+    'split-layout': 'petronia.shell.control.split_layout:split_layout_factory',
+    'portal': 'petronia.shell.control.portal:portal_factory',
+    'render-text': 'petronia.shell.view.render_text:render_text_factory',
+}
 
 
 def get_base_extension_factories():
     ret = {}
-    for reg_objects in (layout_factories(), portal_factories(), render_text_factories()):
-        for category, factory in reg_objects.items():
-            ret[category] = factory
+    for category, reference in _BASE_EXTENSION_FACTORIES.items():
+        ret[category] = LazyFactory(reference)
     return ret
@@ -0,0 +1,75 @@
+"""
+Factories that are referenced by name, and only imported when first used.
+"""
+
+import importlib
+import threading
+
+
+class LazyFactory(object):
+    """
+    A callable stand-in for a factory, described by a "module:attribute"
+    reference.  The module is not imported until the factory is first
+    called (or explicitly resolved), so registering a factory does not
+    pull in its module and everything that module imports.
+    """
+    def __init__(self, reference):
+        """
+
+        :param reference: "module.name:attribute" string.
+        """
+        assert isinstance(reference, str)
+        module_name, sep, attr_name = reference.partition(':')
+        assert sep == ':' and len(module_name) > 0 and len(attr_name) > 0, (
+            "factory reference must be in the form `module:attribute`: {0}".format(reference))
+        self.__reference = reference
+        self.__module_name = module_name.strip()
+        self.__attr_name = attr_name.strip()
+        self.__factory = None
+        self.__lock = threading.Lock()
+
+    @property
+    def reference(self):
+        return self.__reference
+
+    @property
+    def is_resolved(self):
+        return self.__factory is not None
+
+    def resolve(self):
+        """
+        Import the referenced module, if it hasn't been already, and return
+        the real factory.
+
+        :return: the callable factory.
+        """
+        factory = self.__factory
+        if factory is None:
+            with self.__lock:
+                factory = self.__factory
+                if factory is None:
+                    module = importlib.import_module(self.__module_name)
+                    factory = getattr(module, self.__attr_name)
+                    assert callable(factory), "{0} is not callable".format(self.__reference)
+                    self.__factory = factory
+        return factory
+
+    def __call__(self, *args, **kwargs):
+        return self.resolve()(*args, **kwargs)
+
+    def __repr__(self):
+        return "LazyFactory({0})".format(repr(self.__reference))
+
+
+def as_factory(factory):
+    """
+    Turn a "module:attribute" reference into a LazyFactory; callables are
+    returned as-is.
+
+    :param factory: callable or reference string.
+    :return: a callable factory.
+    """
+    if isinstance(factory, str):
+        return LazyFactory(factory)
+    assert callable(factory)
+    return factory
@@ -1,17 +1,14 @@
+from .lazy_factory import LazyFactory
 
-
-from ...shell.control.root_layout import root_layout_factory
-from ...shell.control.command_handler import command_handler_factory
-from ...shell.control.active_portal_manager import active_portal_manager_factory
-from ...shell.control.unowned_portal import unowned_portal_factory
-from ..logger import logger_factory
+# In activation order.
+_BASE_SINGLETON_FACTORIES = (
+    'petronia.system.logger:logger_factory',
+    'petronia.shell.control.command_handler:command_handler_factory',
+    'petronia.shell.control.root_layout:root_layout_factory',
+    'petronia.shell.control.active_portal_manager:active_portal_manager_factory',
+    'petronia.shell.control.unowned_portal:unowned_portal_factory',
+)
 
 
 def get_base_singleton_factories():
-    return [
-        logger_factory,
-        command_handler_factory,
-        root_layout_factory,
-        active_portal_manager_factory,
-        unowned_portal_factory,
-    ]
+    return [LazyFactory(reference) for reference in _BASE_SINGLETON_FACTORIES]
@@ -97,6 +97,13 @@ class Parent(object):
         else:
             self._log_warn("INTERNAL ERROR Cannot remove; no such child: {0}".format(child_cid))
 
+    def _forget_child(self, child_cid):
+        """
+        Stop tracking a child that was asked to remove itself, rather than
+        waiting for it to finish closing.
+        """
+        self.__remove_child_data(child_cid)
+
     def __remove_child_data(self, child_cid):
         if child_cid in self.__child_cid_data:
             for event_id, target_id, listener in self.__child_cid_data[child_cid]['listeners']:
@@ -133,6 +140,15 @@ class Parent(object):
         if child_cid in self.__child_cid_data:
             self.__child_cid_data[child_cid][key] = data
 
+    def _set_child_order(self, child_cids):
+        """
+        Reorder the children.
+
+        :param child_cids: all the child cids, in the new order.
+        """
+        assert sorted(child_cids) == sorted(self.__ordered_child_cids)
+        self.__ordered_child_cids = list(child_cids)
+
     @property
     def _has_children(self):
         return len(self.__ordered_child_cids) > 0
@@ -3,6 +3,7 @@ from .component import Component, Identifiable
 from .id_manager import IdManager
 from . import event_ids
 from . import target_ids
+from .startup_profiler import get_startup_profiler
 from ..config import Config
 
 
@@ -25,7 +26,8 @@ class Registrar(Identifiable, Component):
         self._listen(event_ids.REGISTRAR__REGISTER_OBJECT, target_ids.REGISTRAR, self._on_register_object)
 
     def activate_singleton(self, factory):
-        factory(self._bus, self.__config, self.__id_manager)
+        with get_startup_profiler(self.__config).measure_factory(factory):
+            factory(self._bus, self.__config, self.__id_manager)
 
     def register_category_factory(self, category, factory):
         """
@@ -61,7 +63,9 @@ class Registrar(Identifiable, Component):
     def _create_object(self, category, cid, arguments):
         try:
             if category in self.__category_factories:
-                obj = self.__category_factories[category](cid, arguments, self._bus, self.__id_manager, self.__config)
+                factory = self.__category_factories[category]
+                with get_startup_profiler(self.__config).measure_factory(factory):
+                    obj = factory(cid, arguments, self._bus, self.__id_manager, self.__config)
                 assert obj is None or isinstance(obj, Identifiable)
                 return obj
             self._log_error("No such registered category {0}".format(category))
@@ -0,0 +1,224 @@
+"""
+Breaks down where the start-up time goes: module imports, component
+construction, and the time until the first window is processed.
+
+Enabled with the `--profile-startup` command line argument.
+"""
+
+from . import event_ids
+from . import target_ids
+import contextlib
+import importlib.abc
+import sys
+import threading
+import time
+
+
+class StartupProfiler(object):
+    def __init__(self, clock=time.perf_counter, out=None):
+        self.__clock = clock
+        self.__out = out
+        self.__start = clock()
+        self.__lock = threading.RLock()
+
+        # module name -> [cumulative seconds, self seconds]
+        self.__imports = {}
+        # Imports can happen on any thread, so each has its own nesting stack.
+        self.__import_stacks = threading.local()
+        self.__finder = None
+
+        # (name, seconds), in order of completion
+        self.__constructors = []
+
+        # mark name -> seconds since start
+        self.__marks = {}
+        self.__reported = False
+
+        # The bus only keeps weak references to listeners.
+        self.__listeners = []
+
+    def install_import_hook(self):
+        if self.__finder is None:
+            self.__finder = _TimingFinder(self)
+            sys.meta_path.insert(0, self.__finder)
+
+    def remove_import_hook(self):
+        if self.__finder is not None:
+            if self.__finder in sys.meta_path:
+                sys.meta_path.remove(self.__finder)
+            self.__finder = None
+
+    @contextlib.contextmanager
+    def measure(self, name):
+        """
+        Time the enclosed block, and record it under the given name.
+        """
+        start = self.__clock()
+        try:
+            yield
+        finally:
+            with self.__lock:
+                # Objects keep being created after start-up; those aren't interesting.
+                if not self.__reported:
+                    self.__constructors.append((name, self.__clock() - start))
+
+    def measure_factory(self, factory):
+        return self.measure(_factory_name(factory))
+
+    def mark(self, name):
+        with self.__lock:
+            if name not in self.__marks:
+                self.__marks[name] = self.__clock() - self.__start
+
+    def listen_for_first_window(self, bus):
+        """
+        Report once set-up has finished and the first window has been
+        processed, or at quit time if that never happens.
+        """
+        def on_window(event_id, target_id, event_obj):
+            self.mark('first window')
+            self._report_when_ready()
+
+        def on_quit(event_id, target_id, event_obj):
+            self.report()
+
+        self.__listeners.extend((on_window, on_quit))
+        bus.add_listener(event_ids.WINDOW__CREATED, target_ids.ANY, on_window)
+        bus.add_listener(event_ids.LAYOUT__WINDOW_PUT_OUTSIDE_MANAGEMENT, target_ids.ANY, on_window)
+        bus.add_listener(event_ids.SYSTEM__QUIT, target_ids.ANY, on_quit)
+
+    def setup_complete(self):
+        self.mark('setup complete')
+        self.remove_import_hook()
+        self._report_when_ready()
+
+    def _report_when_ready(self):
+        with self.__lock:
+            if 'setup complete' in self.__marks and 'first window' in self.__marks:
+                self.report()
+
+    def import_started(self, name):
+        stack = getattr(self.__import_stacks, 'stack', None)
+        if stack is None:
+            stack = []
+            self.__import_stacks.stack = stack
+        stack.append([name, self.__clock(), 0.0])
+
+    def import_finished(self):
+        stack = self.__import_stacks.stack
+        name, start, child_time = stack.pop()
+        total = self.__clock() - start
+        if stack:
+            stack[-1][2] += total
+        with self.__lock:
+            self.__imports[name] = [total, total - child_time]
+
+    def report(self):
+        with self.__lock:
+            if self.__reported:
+                return
+            self.__reported = True
+            lines = ["===== Startup profile ====="]
+            for name, when in sorted(self.__marks.items(), key=lambda x: x[1]):
+                lines.append("{0:10.1f} ms  {1}".format(when * 1000.0, name))
+            lines.append("--- Component construction ---")
+            for name, duration in self.__constructors:
+                lines.append("{0:10.1f} ms  {1}".format(duration * 1000.0, name))
+            lines.append("--- Imports (cumulative / self) ---")
+            for name, times in sorted(self.__imports.items(), key=lambda x: -x[1][1])[:_MAX_REPORTED_IMPORTS]:
+                lines.append("{0:10.1f} ms {1:8.1f} ms  {2}".format(times[0] * 1000.0, times[1] * 1000.0, name))
+            lines.append("  ({0} modules imported)".format(len(self.__imports)))
+            text = "\n".join(lines)
+        if self.__out is None:
+            print(text)
+        else:
+            self.__out(text)
+
+
+class _NullProfiler(object):
+    """
+    Stands in for the StartupProfiler when profiling is turned off.
+    """
+    # noinspection PyUnusedLocal
+    def measure_factory(self, factory):
+        return _NULL_CONTEXT
+
+    # noinspection PyUnusedLocal
+    def measure(self, name):
+        return _NULL_CONTEXT
+
+    def mark(self, name):
+        pass
+
+
+class _NullContext(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+_NULL_CONTEXT = _NullContext()
+NULL_PROFILER = _NullProfiler()
+_MAX_REPORTED_IMPORTS = 30
+
+
+def get_startup_profiler(config):
+    """
+
+    :param config: the Config; the profiler is stored in its init options.
+    :return: the active profiler, or one that does nothing.
+    """
+    ret = config.init_options.get('startup-profiler')
+    if ret is None:
+        return NULL_PROFILER
+    return ret
+
+
+def _factory_name(factory):
+    if hasattr(factory, 'reference'):
+        return factory.reference
+    if hasattr(factory, '__module__') and hasattr(factory, '__qualname__'):
+        return "{0}:{1}".format(factory.__module__, factory.__qualname__)
+    return repr(factory)
+
+
+class _TimingFinder(importlib.abc.MetaPathFinder):
+    """
+    Finds modules through the rest of the import machinery, but wraps the
+    loader so the module execution is timed.
+    """
+    def __init__(self, profiler):
+        self.__profiler = profiler
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+                    spec.loader = _TimingLoader(spec.loader, fullname, self.__profiler)
+                return spec
+        return None
+
+
+class _TimingLoader(importlib.abc.Loader):
+    def __init__(self, loader, fullname, profiler):
+        self.__loader = loader
+        self.__fullname = fullname
+        self.__profiler = profiler
+
+    def create_module(self, spec):
+        return self.__loader.create_module(spec)
+
+    def exec_module(self, module):
+        self.__profiler.import_started(self.__fullname)
+        try:
+            self.__loader.exec_module(module)
+        finally:
+            self.__profiler.import_finished()
+
+    def __getattr__(self, item):
+        return getattr(self.__loader, item)
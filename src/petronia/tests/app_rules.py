@@ -0,0 +1,151 @@
+
+# Usage: python3 -m unittest petronia.tests.app_rules
+
+import random
+import re
+import unittest
+
+from ..config.application import ApplicationListConfig, ApplicationChromeConfig, ApplicationPositionConfig
+from ..config.application import AbstractApplicationConfig, AppMatcher
+from ..util.app_rules import AppRuleEngine, AppRule, AppFlags, RuleMatcher
+
+
+class AppRuleEngineTests(unittest.TestCase):
+    def test_first_rule_decides_each_flag(self):
+        configs = [
+            ApplicationChromeConfig(has_title=False, has_border=None, is_tiled=None, is_resizable=None,
+                                    app_matchers=[AppMatcher(class_name='Notepad')]),
+            ApplicationChromeConfig(has_title=True, has_border=False, is_tiled=None, is_resizable=None,
+                                    app_matchers=[AppMatcher(exec_path='notepad.exe')]),
+            ApplicationPositionConfig('portal 1', [AppMatcher(class_name='Notepad')]),
+            ApplicationChromeConfig(has_title=None, has_border=None, is_tiled=False, is_resizable=None,
+                                    app_matchers=[AppMatcher(title_re='untitled')]),
+        ]
+        apps = ApplicationListConfig(configs, default_is_resizable=False)
+        self.assertEqual(
+            apps.get_flags(_info('notepad', 'c:\\windows\\NOTEPAD.EXE', title='Untitled - Notepad')),
+            AppFlags(is_tiled=False, has_title=False, has_border=False, is_resizable=False))
+        self.assertEqual(
+            apps.get_flags(_info('Edit', 'c:\\windows\\notepad.exe', title='readme.txt')),
+            AppFlags(is_tiled=True, has_title=True, has_border=False, is_resizable=False))
+        self.assertEqual(
+            apps.get_flags(_info('Edit', 'c:\\notepad.exe.bak', title='readme.txt')),
+            AppFlags(is_tiled=True, has_title=True, has_border=True, is_resizable=False))
+        self.assertFalse(apps.has_title(_info('Notepad', '')))
+        self.assertFalse(apps.is_tiled(_info('Other', '', title='UNTITLED')))
+
+    def test_negative_matchers(self):
+        configs = [
+            ApplicationChromeConfig(is_tiled=False, app_matchers=[
+                AppMatcher(match_returns=False, class_name='Tiled', title_re='.*tiled')]),
+        ]
+        apps = ApplicationListConfig(configs)
+        # Both fields must match to not fire.
+        self.assertTrue(apps.is_tiled(_info('tiled', '', title='also tiled')))
+        self.assertFalse(apps.is_tiled(_info('tiled', '', title='floating')))
+        self.assertFalse(apps.is_tiled(_info('Other', '')))
+        # A window with none of the fields doesn't fire the matcher.
+        self.assertTrue(apps.is_tiled({'class': None}))
+
+    def test_not_compiled(self):
+        class Custom(AbstractApplicationConfig):
+            def is_tiled(self, window_info):
+                return window_info['class'] == 'Custom'
+
+            def has_title(self, window_info):
+                return None
+
+            def has_border(self, window_info):
+                return None
+
+            def is_resizable(self, window_info):
+                return None
+
+        apps = ApplicationListConfig([
+            Custom(),
+            ApplicationChromeConfig(has_title=False, app_matchers=[AppMatcher(class_name='Custom')]),
+        ])
+        self.assertEqual(
+            apps.get_flags(_info('Custom', '')),
+            AppFlags(is_tiled=True, has_title=False, has_border=True, is_resizable=True))
+        self.assertFalse(apps.is_tiled(_info('Other', '')))
+
+    def test_memo(self):
+        engine = AppRuleEngine(
+            [AppRule(AppFlags(is_tiled=False), [RuleMatcher(True, {'class': re.compile('a', re.I)})])],
+            AppFlags(True, True, True, True), memo_size=2)
+        self.assertFalse(engine.get_flags(_info('a', '', title='1')).is_tiled)
+        # No rule looks at the title, so it isn't part of the memo key.
+        self.assertFalse(engine.get_flags(_info('a', '', title='2')).is_tiled)
+        self.assertEqual((engine.memo_hits, engine.memo_misses), (1, 1))
+        engine.get_flags(_info('b', ''))
+        engine.get_flags(_info('c', ''))
+        engine.get_flags(_info('a', ''))
+        self.assertEqual((engine.memo_hits, engine.memo_misses), (1, 4))
+
+    def test_same_as_matchers(self):
+        # Random rules and windows, compared with asking each config in turn.
+        rnd = random.Random(1234)
+        names = ['Notepad', 'notepad', 'Chrome_WidgetWin_1', 'cmd', 'Code', 'K\u212a', 'x\n', 'SunAwtFrame']
+        files = ['notepad.exe', 'chrome.exe', 'cmd.exe', 'code.exe', 'java.exe']
+        patterns = ['not', 'chrome.*', '.*e$', '(c)(o)\\2', '(?P<n>a)|b', 'Code|Sun', '(?i)java', '.*\\.exe']
+        for attempt in range(20):
+            configs = []
+            for _ in range(rnd.randint(1, 15)):
+                matchers = []
+                for _ in range(rnd.randint(0, 3)):
+                    kwargs = {}
+                    for key in rnd.sample(['class_name', 'class_name_re', 'exec_path', 'exec_path_re',
+                                           'title_re', 'module_path'], rnd.randint(1, 2)):
+                        if key.startswith('class_name') and ('class_name' in kwargs or 'class_name_re' in kwargs):
+                            continue
+                        if key.startswith('exec_path') and ('exec_path' in kwargs or 'exec_path_re' in kwargs):
+                            continue
+                        if key == 'class_name':
+                            kwargs[key] = rnd.choice(names)
+                        elif key in ('exec_path', 'module_path'):
+                            kwargs[key] = rnd.choice(files + ['dir\\' + files[0]])
+                        elif rnd.random() < 0.2:
+                            kwargs[key] = re.compile(rnd.choice(patterns))
+                        else:
+                            kwargs[key] = rnd.choice(patterns)
+                    matchers.append(AppMatcher(match_returns=rnd.random() > 0.2, **kwargs))
+                flags = [rnd.choice([None, True, False]) for _ in range(4)]
+                configs.append(ApplicationChromeConfig(
+                    is_tiled=flags[0], has_title=flags[1], has_border=flags[2], is_resizable=flags[3],
+                    app_matchers=matchers))
+            apps = ApplicationListConfig(configs)
+            for _ in range(100):
+                info = _info(
+                    rnd.choice(names + ['Other', 'k', 'KK', None]),
+                    rnd.choice(['c:\\apps\\' + f for f in files] + ['c:\\dir\\notepad.exe', 'cmd.exe', '', None]),
+                    title=rnd.choice(['Untitled - Notepad', 'java', 'cobalt', 'coo', None]),
+                    module=rnd.choice(['c:\\x\\notepad.exe', None]))
+                self.assertEqual(apps.get_flags(info), _walk(configs, apps, info), (attempt, info))
+
+
+def _info(class_name, exec_filename, title=None, module=None):
+    ret = {'class': class_name, 'exec_filename': exec_filename, 'pid': 1, 'hwnd': 2, 'visible': True}
+    if title is not None:
+        ret['title'] = title
+    if module is not None:
+        ret['module_filename'] = module
+    return ret
+
+
+def _walk(configs, apps, info):
+    ret = []
+    for name, default in (('is_tiled', apps.default_is_tiled), ('has_title', apps.default_has_title),
+                          ('has_border', apps.default_has_border), ('is_resizable', apps.default_is_resizable)):
+        value = default
+        for config in configs:
+            res = getattr(config, name)(info)
+            if res is not None:
+                value = res
+                break
+        ret.append(value)
+    return AppFlags(*ret)
+
+
+if __name__ == '__main__':
+    unittest.main()
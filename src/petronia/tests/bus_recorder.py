@@ -0,0 +1,46 @@
+
+# Shared by the tests which run components on a single threaded bus.
+
+from ..system.bus import SingleThreadedBus
+from ..system import target_ids
+
+
+class BusRecorder(object):
+    """
+    Adds the test's listeners to the bus, and keeps them alive, as the bus
+    only keeps weak references to the listeners.  The bus also hides
+    listener exceptions, so listeners record what happened in lists for the
+    test to check.
+    """
+    def __init__(self, bus=None):
+        if bus is None:
+            bus = SingleThreadedBus()
+        self.bus = bus
+        self.__listeners = []
+
+    def listen(self, event_id, target_id, listener):
+        self.__listeners.append(listener)
+        self.bus.add_listener(event_id, target_id, listener)
+
+    def record(self, event_id, target_id=target_ids.ANY, item=None, into=None):
+        """
+        Record each matching event.
+
+        :param item: called with the event's target id and object, and
+            returns what is recorded; by default the target id.
+        :param into: list to add to; by default a new list.
+        :return: the list the events are added to.
+        """
+        if into is None:
+            into = []
+
+        # noinspection PyUnusedLocal
+        def listener(e, t, o):
+            into.append(t if item is None else item(t, o))
+
+        self.listen(event_id, target_id, listener)
+        return into
+
+
+def make_rect(x, y, width, height):
+    return {'x': x, 'y': y, 'width': width, 'height': height}
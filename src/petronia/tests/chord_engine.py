@@ -0,0 +1,128 @@
+
+# Usage: python3 -m unittest petronia.tests.chord_engine
+
+import unittest
+
+from ..util.chord_engine import ChordEngine
+from ..util.hotkey_chain import STR_VK_MAP, ACTION_PENDING, IGNORED
+from ..util.key_state import KeyState
+
+
+class ChordEngineTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.key_state = KeyState(STR_VK_MAP[k] for k in ('lwin', 'rwin', 'lshift', 'rshift'))
+        self.engine = ChordEngine(
+            {
+                "win+a": ["cmd-a"],
+                "win+a, b": ["cmd-ab"],
+                "win+c, d, e": ["cmd-cde"],
+            },
+            key_state=self.key_state, clock=self.clock, step_timeout=1.0, hold_time=0.5)
+
+    def test_chain_within_timeout(self):
+        self._key('lwin', True)
+        self.assertEqual(self._key('c', True), ACTION_PENDING)
+        self._key('c', False)
+        self.clock.advance(0.9)
+        self.assertEqual(self._key('d', True), ACTION_PENDING)
+        self._key('d', False)
+        self.clock.advance(0.9)
+        self.assertEqual(self._key('e', True), ("cmd-cde",))
+        self.assertEqual(self.engine.expired, 0)
+
+    def test_chain_step_timeout(self):
+        self._key('lwin', True)
+        self.assertEqual(self._key('c', True), ACTION_PENDING)
+        self._key('c', False)
+        self.clock.advance(1.1)
+        # The stale chain is dropped, so the key goes through.
+        self.assertEqual(self._key('d', True), IGNORED)
+        self.assertEqual(self.engine.expired, 1)
+        self._key('d', False)
+        # ... and a new chain can start right away.
+        self.assertEqual(self._key('c', True), ACTION_PENDING)
+
+    def test_poll_expires(self):
+        self._key('lwin', True)
+        self._key('c', True)
+        self.clock.advance(2.0)
+        self.assertEqual(self.engine.poll(), IGNORED)
+        self.assertEqual(self.engine.expired, 1)
+
+    def test_shorter_chain_wins(self):
+        self._key('lwin', True)
+        self.assertEqual(self._key('a', True), ("cmd-a",))
+
+    def test_tap_hold(self):
+        self.engine.set_tap_hold({"f12": (["tap"], ["hold"])})
+        self.assertEqual(self._key('f12', True), ACTION_PENDING)
+        self.clock.advance(0.1)
+        self.assertEqual(self._key('f12', False), ("tap",))
+
+        self.assertEqual(self._key('f12', True), ACTION_PENDING)
+        self.clock.advance(0.6)
+        self.assertEqual(self._key('f12', False), ("hold",))
+
+    def test_hold_fires_once_while_down(self):
+        self.engine.set_tap_hold({"f12": (["tap"], ["hold"])})
+        self._key('f12', True)
+        self.assertEqual(self.engine.poll(), IGNORED)
+        self.clock.advance(0.6)
+        self.assertEqual(self.engine.poll(), ("hold",))
+        # Key repeat, then the release; the hold already ran.
+        self.assertEqual(self._key('f12', True), ACTION_PENDING)
+        self.assertEqual(self._key('f12', False), ACTION_PENDING)
+
+    def test_tap_hold_needs_no_modifiers(self):
+        self.engine.set_tap_hold({"f12": (["tap"], ["hold"])})
+        self._key('lshift', True)
+        self.assertEqual(self._key('f12', True), IGNORED)
+
+    def test_leader(self):
+        self.engine.set_leader("win+space", {
+            "w, h": ["cmd-wh"],
+            "q": ["cmd-q"],
+        })
+        self._key('lwin', True)
+        self.assertEqual(self._key('space', True), ACTION_PENDING)
+        self.assertEqual(self._key('space', False), ACTION_PENDING)
+        self.assertEqual(self._key('lwin', False), IGNORED)
+        self.assertEqual(self._key('w', True), ACTION_PENDING)
+        self.assertEqual(self._key('w', False), ACTION_PENDING)
+        self.assertEqual(self._key('h', True), ("cmd-wh",))
+
+        # Unknown keys end the leader sequence.
+        self._key('lwin', True)
+        self._key('space', True)
+        self._key('space', False)
+        self._key('lwin', False)
+        self.assertEqual(self._key('z', True), IGNORED)
+        self._key('z', False)
+        self.assertEqual(self._key('q', True), IGNORED)
+
+    def test_leader_timeout(self):
+        self.engine.set_leader("win+space", {"q": ["cmd-q"]})
+        self._key('lwin', True)
+        self._key('space', True)
+        self._key('space', False)
+        self._key('lwin', False)
+        self.clock.advance(1.5)
+        self.assertEqual(self._key('q', True), IGNORED)
+        self.assertEqual(self.engine.expired, 1)
+
+    def _key(self, key, is_down):
+        vk_code = STR_VK_MAP[key]
+        self.key_state.set_key(vk_code, is_down)
+        return self.engine.key_action(vk_code, is_down)
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 100.0
+
+    def advance(self, seconds):
+        self.now += seconds
+
+    def __call__(self):
+        return self.now
@@ -0,0 +1,178 @@
+
+# Usage: python3 -m unittest petronia.tests.hotkey_chain
+
+import unittest
+
+from ..util.hotkey_chain import (
+    HotKeyChain, on_key_hook, STR_VK_MAP, ACTION_PENDING, IGNORED, KEY_STATE,
+    ChainDiagnostic, compile_key_chains
+)
+from ..util.key_state import KeyState
+from ..util.chord_engine import ChordEngine, DEFAULT_STEP_TIMEOUT
+from ..config import HotKeyConfig, MODE_CHANGE_COMMAND, NO_STEP_TIMEOUT
+
+
+class HotKeyChainTests(unittest.TestCase):
+    def setUp(self):
+        _release_all_keys()
+
+    def tearDown(self):
+        _release_all_keys()
+
+    def test_single_combo(self):
+        chain = HotKeyChain({"win+a": ["cmd-a"]})
+        self.assertEqual(_press(chain, 'lwin'), IGNORED)
+        self.assertEqual(_press(chain, 'a'), ("cmd-a",))
+        _release(chain, 'a')
+        # The modifier is still down, so the combo can be repeated.
+        self.assertEqual(_press(chain, 'a'), ("cmd-a",))
+
+    def test_modifier_aliases(self):
+        chain = HotKeyChain({"win+shift+a": ["cmd-a"]})
+        _press(chain, 'rwin')
+        _press(chain, 'lshift')
+        self.assertEqual(_press(chain, 'a'), ("cmd-a",))
+
+    def test_wrong_modifiers(self):
+        chain = HotKeyChain({"win+a": ["cmd-a"]})
+        _press(chain, 'lwin')
+        _press(chain, 'lshift')
+        self.assertEqual(_press(chain, 'a'), IGNORED)
+
+    def test_multi_step_chain(self):
+        chain = HotKeyChain({
+            "win+a, b": ["cmd-ab"],
+            "win+a, c": ["cmd-ac"],
+        })
+        _press(chain, 'lwin')
+        self.assertEqual(_press(chain, 'a'), ACTION_PENDING)
+        # "b" while "a" is still down is ignored; the chain waits for "a" to go up.
+        self.assertEqual(_press(chain, 'b'), IGNORED)
+        _release(chain, 'b')
+        _release(chain, 'a')
+        self.assertEqual(_press(chain, 'c'), ("cmd-ac",))
+
+    def test_chain_broken_by_other_key(self):
+        chain = HotKeyChain({"win+a, b": ["cmd-ab"]})
+        _press(chain, 'lwin')
+        _press(chain, 'a')
+        _release(chain, 'a')
+        self.assertEqual(_press(chain, 'c'), IGNORED)
+        _release(chain, 'c')
+        self.assertEqual(_press(chain, 'b'), IGNORED)
+
+    def test_block_win_key(self):
+        chain = HotKeyChain({"win+a": ["cmd-a"]})
+        chain.block_win_key = True
+        self.assertEqual(_press(chain, 'lwin'), ACTION_PENDING)
+        self.assertEqual(_press(chain, 'b'), IGNORED)
+
+    def test_special_modifier_state(self):
+        chain = HotKeyChain({"win+a": ["cmd-a"]})
+        # The hook missed the win key up (e.g. the desktop was locked).
+        _press(chain, 'lwin')
+        on_key_hook(STR_VK_MAP['a'], True, {STR_VK_MAP['lwin']: False})
+        self.assertEqual(chain.key_action(STR_VK_MAP['a'], True), IGNORED)
+        # Releasing a modifier the hook never saw go down must not fail.
+        on_key_hook(STR_VK_MAP['lshift'], False, {STR_VK_MAP['rwin']: False})
+
+    def test_own_key_state(self):
+        key_state = KeyState((STR_VK_MAP['lwin'], STR_VK_MAP['rwin']))
+        chain = HotKeyChain({"win+a": ["cmd-a"]}, key_state)
+        key_state.set_key(STR_VK_MAP['lwin'], True)
+        chain.key_action(STR_VK_MAP['lwin'], True)
+        key_state.set_key(STR_VK_MAP['a'], True)
+        self.assertEqual(chain.key_action(STR_VK_MAP['a'], True), ("cmd-a",))
+        # The module key state is untouched.
+        self.assertEqual(KEY_STATE.modifier_mask, 0)
+
+
+class KeyChainDiagnosticTests(unittest.TestCase):
+    def test_no_problems(self):
+        chain = HotKeyChain({"win+a": ["a"], "win+b, c": ["bc"], "shift+win+b": ["b"]})
+        self.assertEqual(chain.diagnostics, ())
+
+    def test_shadowed_chain(self):
+        chain = HotKeyChain({"win+left": ["short"], "win+left, x": ["long"]})
+        self.assertEqual(_messages(chain), [
+            ("win+left, x", "never matched; `win+left` matches first"),
+        ])
+        # The order the chains are given doesn't matter.
+        chain = HotKeyChain({"win+left, x": ["long"], "win+left": ["short"]})
+        self.assertEqual(_messages(chain), [
+            ("win+left, x", "never matched; `win+left` matches first"),
+        ])
+
+    def test_same_modifier_set(self):
+        chain = HotKeyChain({"win+shift+a": ["first"], "shift+win+a": ["second"], "lwin+lshift+a": ["first"]})
+        self.assertEqual(_messages(chain), [
+            ("shift+win+a", "conflicts with `win+shift+a`, which is used instead"),
+            ("lwin+lshift+a", "duplicate of `win+shift+a`"),
+        ])
+        self.assertEqual(chain.diagnostics[1].level, ChainDiagnostic.WARNING)
+
+    def test_bad_keys(self):
+        chain = HotKeyChain({"win+nokey": ["a"], "a+b": ["b"]})
+        self.assertEqual(_messages(chain), [
+            ("win+nokey", "unknown key code nokey"),
+            ("win+nokey", "no keys after the modifiers; never matched"),
+            ("a+b", "primary key not a modifier a"),
+        ])
+
+    def test_compiled_tables_reused(self):
+        key_state = KeyState((STR_VK_MAP['lwin'],))
+        first = compile_key_chains({"lwin+a": ["a"], "lwin+b": ["b"]}, key_state)
+        second = compile_key_chains({"lwin+b": ["b"], "lwin+a": ["a"]}, key_state)
+        self.assertIs(first, second)
+        third = compile_key_chains({"lwin+b": ["b"], "lwin+a": ["other"]}, key_state)
+        self.assertIsNot(first, third)
+
+    def test_config_modes(self):
+        hotkeys = HotKeyConfig()
+        hotkeys.parse_hotkey_mode_keys("default", {
+            "win+a": [MODE_CHANGE_COMMAND, "second"],
+            "win+b": [MODE_CHANGE_COMMAND, "missing"],
+            "win+c": ["c"],
+            "win+c, d": ["cd"],
+        })
+        hotkeys.parse_hotkey_mode_keys("second", {"win+a": [MODE_CHANGE_COMMAND, "default"]})
+        hotkeys.parse_exclusive_mode_keys("island", {"esc": [MODE_CHANGE_COMMAND, "default"]})
+        self.assertEqual([str(d) for d in hotkeys.diagnostics], [
+            "hotkey mode `default`, `win+c, d`: never matched; `win+c` matches first",
+            "hotkey mode `default`, `win+b`: changes to unknown mode `missing`",
+            "hotkey mode `island`, `island`: no key chain changes to this mode",
+        ])
+
+    def test_config_step_timeout(self):
+        hotkeys = HotKeyConfig()
+        tap_hold = {"f12": (["tap"], ["hold"])}
+        hotkeys.parse_hotkey_mode_keys("default", {"win+a": ["a"]}, tap_hold=tap_hold)
+        hotkeys.parse_hotkey_mode_keys("timed", {"win+a": ["a"]}, step_timeout=0.5)
+        hotkeys.parse_hotkey_mode_keys("untimed", {"win+a": ["a"]}, step_timeout=NO_STEP_TIMEOUT, tap_hold=tap_hold)
+        hotkeys.parse_hotkey_mode_keys("plain", {"win+a": ["a"]}, step_timeout=NO_STEP_TIMEOUT)
+        modes = hotkeys.mode_combos
+        self.assertEqual(modes["default"].step_timeout, DEFAULT_STEP_TIMEOUT)
+        self.assertEqual(modes["timed"].step_timeout, 0.5)
+        self.assertIsInstance(modes["untimed"], ChordEngine)
+        self.assertIsNone(modes["untimed"].step_timeout)
+        self.assertIsInstance(modes["plain"], HotKeyChain)
+
+
+def _messages(chain):
+    return [(d.chain, d.message) for d in chain.diagnostics]
+
+
+def _press(chain, key):
+    vk_code = STR_VK_MAP[key]
+    on_key_hook(vk_code, True)
+    return chain.key_action(vk_code, True)
+
+
+def _release(chain, key):
+    vk_code = STR_VK_MAP[key]
+    on_key_hook(vk_code, False)
+    return chain.key_action(vk_code, False)
+
+
+def _release_all_keys():
+    KEY_STATE.clear()
@@ -0,0 +1,238 @@
+
+# Usage: python3 -m unittest petronia.tests.hotkey_dispatch
+
+import threading
+import time
+import unittest
+
+from ..util import hotkey_dispatch
+from ..util.hotkey_dispatch import HotkeyDispatch
+from ..util.hotkey_chain import HotKeyChain, STR_VK_MAP, SPECIAL_MODIFIER_CHECK_VKEY_CODES
+from ..util.chord_engine import ChordEngine
+from ..util.key_state import KeyState
+from ..util.spsc_ring import SpscRing
+from .perf.hotkey_matcher import create_bindings, create_keystrokes
+
+_MODE_CHANGE = "change mode"
+
+# The verdict must answer within this many microseconds, for nearly every
+# key.  Windows drops hooks that take too long; this is far below that, but
+# leaves room for a slow test machine.
+_LATENCY_BUDGET_MICROS = 100
+_LATENCY_PERCENTILE = 0.99
+
+
+class SpscRingTests(unittest.TestCase):
+    def test_put_get(self):
+        ring = SpscRing(3)
+        self.assertEqual(ring.capacity, 4)
+        self.assertIsNone(ring.get())
+        for i in range(4):
+            self.assertTrue(ring.put(i))
+        self.assertFalse(ring.put(4))
+        self.assertEqual(ring.dropped, 1)
+        self.assertEqual([ring.get() for _ in range(5)], [0, 1, 2, 3, None])
+        # Wrap around.
+        for i in range(10):
+            ring.put(i)
+            self.assertEqual(ring.get(), i)
+
+    def test_threaded_handoff(self):
+        ring = SpscRing(64)
+        received = []
+
+        def consume():
+            while len(received) < 10000:
+                if ring.wait(1.0):
+                    item = ring.get()
+                    while item is not None:
+                        received.append(item)
+                        item = ring.get()
+
+        consumer = threading.Thread(target=consume)
+        consumer.start()
+        i = 0
+        while i < 10000:
+            if ring.put(i):
+                i += 1
+            else:
+                time.sleep(0)
+        consumer.join(10.0)
+        self.assertEqual(received, list(range(10000)))
+
+    def test_interrupt(self):
+        ring = SpscRing(4)
+        ring.interrupt()
+        self.assertFalse(ring.wait(5.0))
+
+
+class HotkeyDispatchTests(unittest.TestCase):
+    def setUp(self):
+        self.key_state = KeyState(STR_VK_MAP[k] for k in ('lwin', 'rwin', 'lshift', 'rshift'))
+        self.dispatch = HotkeyDispatch(self.key_state, _MODE_CHANGE)
+        self.dispatch.set_mode_combos({
+            'default': HotKeyChain({
+                "win+a": ["cmd-a"],
+                "win+m": [_MODE_CHANGE, "other"],
+                "win+x": [_MODE_CHANGE, "missing"],
+            }, self.key_state),
+            'other': HotKeyChain({
+                "win+b": ["cmd-b"],
+            }, self.key_state),
+        }, 'default')
+        self.items = []
+
+    def test_command(self):
+        self.assertFalse(self._key('lwin', True))
+        self.assertTrue(self._key('a', True))
+        self.assertFalse(self._key('a', False))
+        # Win key up is never blocked.
+        self.assertFalse(self._key('lwin', False))
+        self.assertFalse(self._key('b', True))
+        self.dispatch.drain(self.items.append)
+        self.assertEqual(self.items, [(hotkey_dispatch.COMMAND, ("cmd-a",), None)])
+
+    def test_debug_keys(self):
+        dispatch = HotkeyDispatch(self.key_state, _MODE_CHANGE, debug_keys=True)
+        dispatch.set_mode_combos({'default': HotKeyChain({"win+a": ["cmd-a"]}, self.key_state)}, 'default')
+        for key, is_down in (('lwin', True), ('a', True), ('a', False), ('lwin', False)):
+            dispatch.verdict(STR_VK_MAP[key], is_down)
+        dispatch.drain(self.items.append)
+        self.assertEqual(self.items, [
+            (hotkey_dispatch.COMMAND, ("cmd-a",), None),
+            (hotkey_dispatch.KEY_SWALLOWED, STR_VK_MAP['a'], True),
+        ])
+
+    def test_full_ring(self):
+        dispatch = HotkeyDispatch(self.key_state, _MODE_CHANGE, 2)
+        dispatch.set_mode_combos({'default': HotKeyChain({"win+a": ["cmd-a"]}, self.key_state)}, 'default')
+        dispatch.verdict(STR_VK_MAP['lwin'], True)
+        verdicts = []
+        for _ in range(4):
+            verdicts.append(dispatch.verdict(STR_VK_MAP['a'], True))
+            dispatch.verdict(STR_VK_MAP['a'], False)
+        # The commands that didn't fit pass the key on.
+        self.assertEqual(verdicts, [True, True, False, False])
+        self.assertEqual(dispatch.dropped, 2)
+        dispatch.drain(self.items.append)
+        self.assertEqual(self.items[-1], (hotkey_dispatch.DROPPED, 2, 2))
+        self.assertEqual(len([item for item in self.items if item[0] == hotkey_dispatch.COMMAND]), 2)
+
+        # Only new drops are reported.
+        del self.items[:]
+        self.assertTrue(dispatch.verdict(STR_VK_MAP['a'], True))
+        dispatch.drain(self.items.append)
+        self.assertEqual(self.items, [(hotkey_dispatch.COMMAND, ("cmd-a",), None)])
+
+    def test_mode_change(self):
+        self._key('lwin', True)
+        self._key('m', True)
+        self.assertEqual(self.dispatch.mode, 'other')
+        self._key('m', False)
+        self.assertTrue(self._key('b', True))
+        self._key('b', False)
+        self._key('x', True)
+        self.dispatch.drain(self.items.append)
+        self.assertEqual(self.items, [
+            (hotkey_dispatch.MODE_CHANGED, 'default', 'other'),
+            (hotkey_dispatch.COMMAND, ("cmd-b",), None),
+        ])
+
+    def test_unknown_mode(self):
+        self._key('lwin', True)
+        self._key('x', True)
+        self.assertEqual(self.dispatch.mode, 'default')
+        self.dispatch.drain(self.items.append)
+        self.assertEqual(self.items[0], (hotkey_dispatch.UNKNOWN_MODE, "missing", None))
+
+    def test_poll_hold(self):
+        self.assertFalse(self.dispatch.needs_poll)
+        self.dispatch.poll()
+        now = [100.0]
+        engine = ChordEngine({"win+a": ["cmd-a"]}, key_state=self.key_state, clock=lambda: now[0], hold_time=0.5)
+        engine.set_tap_hold({"f12": (["tap"], ["hold"])})
+        self.dispatch.set_mode_combos({'default': engine}, 'default')
+        self.assertTrue(self.dispatch.needs_poll)
+
+        self.assertTrue(self._key('f12', True))
+        self.dispatch.poll()
+        now[0] += 0.6
+        # Held without key repeats.
+        self.dispatch.poll()
+        self.dispatch.poll()
+        self._key('f12', False)
+        self.dispatch.drain(self.items.append)
+        self.assertEqual(self.items, [(hotkey_dispatch.COMMAND, ("hold",), None)])
+
+    def test_dispatch_thread(self):
+        received = threading.Event()
+
+        def handler(item):
+            if item[0] == hotkey_dispatch.COMMAND:
+                self.items.append(item)
+                received.set()
+
+        self.dispatch.start(handler, lambda message, e: self.items.append((message, e)))
+        try:
+            self._key('lwin', True)
+            self._key('a', True)
+            self.assertTrue(received.wait(5.0))
+            self.assertEqual(self.items, [(hotkey_dispatch.COMMAND, ("cmd-a",), None)])
+        finally:
+            self.dispatch.stop(5.0)
+
+    def test_handler_error(self):
+        errors = []
+
+        def handler(item):
+            if item[1] == ("cmd-a",):
+                raise ValueError("bad command")
+            self.items.append(item)
+
+        self._key('lwin', True)
+        self._key('a', True)
+        # Without a logger, the caller gets the error.
+        self.assertRaises(ValueError, self.dispatch.drain, handler)
+
+        self._key('a', False)
+        self._key('a', True)
+        self._key('a', False)
+        self._key('m', True)
+        self.dispatch.drain(handler, lambda message, e: errors.append((message, e)))
+        # The items after the failed one are still handled.
+        self.assertEqual(self.items, [(hotkey_dispatch.MODE_CHANGED, 'default', 'other')])
+        self.assertEqual(len(errors), 1)
+        self.assertIsInstance(errors[0][1], ValueError)
+
+    def test_verdict_latency_budget(self):
+        key_state = KeyState(STR_VK_MAP[k] for k in (
+            'lwin', 'rwin', 'lshift', 'rshift', 'lcontrol', 'rcontrol', 'lalt', 'ralt'))
+        dispatch = HotkeyDispatch(key_state, _MODE_CHANGE, 1024)
+        dispatch.set_mode_combos({'default': HotKeyChain(create_bindings(), key_state)}, 'default')
+        specials = bytearray(len(SPECIAL_MODIFIER_CHECK_VKEY_CODES))
+        clock = time.perf_counter
+        verdict = dispatch.verdict
+
+        timings = []
+        for vk_code, is_down in create_keystrokes(20000):
+            start = clock()
+            verdict(vk_code, is_down, SPECIAL_MODIFIER_CHECK_VKEY_CODES, specials)
+            timings.append(clock() - start)
+            if len(timings) % 256 == 0:
+                dispatch.drain(_ignore)
+            for i in range(len(SPECIAL_MODIFIER_CHECK_VKEY_CODES)):
+                specials[i] = key_state.is_down(SPECIAL_MODIFIER_CHECK_VKEY_CODES[i]) and 1 or 0
+
+        timings.sort()
+        slow = timings[int(len(timings) * _LATENCY_PERCENTILE)] * 1e6
+        self.assertLess(slow, _LATENCY_BUDGET_MICROS,
+                        "{0}th percentile verdict time: {1:.1f} us".format(
+                            int(_LATENCY_PERCENTILE * 100), slow))
+
+    def _key(self, key, is_down):
+        return self.dispatch.verdict(STR_VK_MAP[key], is_down)
+
+
+# noinspection PyUnusedLocal
+def _ignore(item):
+    pass
@@ -0,0 +1,157 @@
+
+# Usage: python3 -m unittest petronia.tests.idle_scheduler
+
+import threading
+import unittest
+
+from ..system.bus import Bus, SingleThreadedBus, NonThreadedWorker
+from ..system import event_ids, target_ids
+from ..util.idle_scheduler import IdleScheduler
+
+
+class IdleSchedulerTests(unittest.TestCase):
+    def setUp(self):
+        self.now = [0.0]
+        self.scheduler = IdleScheduler(
+            quiet_period=0.1, slice_time=0.01, starvation_time=1.0, clock=lambda: self.now[0])
+        self.ran = []
+
+    def _task(self, name, steps=1, step_time=0.0):
+        remaining = [steps]
+
+        def task():
+            self.ran.append(name)
+            self.now[0] += step_time
+            remaining[0] -= 1
+            return remaining[0] > 0
+        return task
+
+    def test_quiet_period(self):
+        self.assertIsNone(self.scheduler.quiet_wait())
+        self.scheduler.schedule(self._task('a'))
+        self.scheduler.set_busy()
+        self.assertIsNone(self.scheduler.quiet_wait())
+        self.assertEqual(self.scheduler.run_slice(), 0)
+
+        self.scheduler.set_idle()
+        self.now[0] += 0.04
+        self.assertAlmostEqual(self.scheduler.quiet_wait(), 0.06)
+        self.assertEqual(self.scheduler.run_slice(), 0)
+        self.now[0] += 0.06
+        self.assertEqual(self.scheduler.run_slice(), 1)
+        self.assertEqual(self.ran, ['a'])
+        self.assertIsNone(self.scheduler.quiet_wait())
+
+    def test_slices(self):
+        self.scheduler.schedule(self._task('a', steps=3, step_time=0.004))
+        self.scheduler.schedule(self._task('b', step_time=0.004))
+        self.scheduler.set_idle()
+        self.now[0] += 0.1
+        # A task with more to do runs again before the later tasks.
+        self.assertEqual(self.scheduler.run_slice(), 3)
+        self.assertEqual(self.ran, ['a', 'a', 'a'])
+        self.assertEqual(self.scheduler.run_slice(), 1)
+        self.assertEqual(self.ran, ['a', 'a', 'a', 'b'])
+
+    def test_yields_to_events(self):
+        def busy_task():
+            self.ran.append('busy')
+            # An event arrives while the task runs.
+            self.scheduler.set_busy()
+
+        self.scheduler.schedule(busy_task)
+        self.scheduler.schedule(self._task('b'))
+        self.scheduler.set_idle()
+        self.now[0] += 0.1
+        self.assertEqual(self.scheduler.run_slice(), 1)
+        self.assertEqual(self.scheduler.statistics()['yielded-slices'], 1)
+        # The event finished, but the bus has to be quiet again.
+        self.scheduler.set_idle()
+        self.assertEqual(self.scheduler.run_slice(), 0)
+        self.now[0] += 0.1
+        self.assertEqual(self.scheduler.run_slice(), 1)
+        self.assertEqual(self.ran, ['busy', 'b'])
+
+    def test_keys(self):
+        self.assertTrue(self.scheduler.schedule(self._task('a'), 'k'))
+        self.assertFalse(self.scheduler.schedule(self._task('a'), 'k'))
+        self.scheduler.set_idle()
+        self.now[0] += 0.1
+        self.scheduler.run_slice()
+        self.assertTrue(self.scheduler.schedule(self._task('a'), 'k'))
+
+    def test_statistics(self):
+        self.scheduler.schedule(self._task('a'))
+        self.now[0] += 2.0
+        self.scheduler.schedule(self._task('b'))
+        stats = self.scheduler.statistics()
+        self.assertEqual(stats['queued'], 2)
+        self.assertEqual(stats['starving'], 1)
+        self.assertEqual(stats['max-wait'], 2.0)
+
+        self.scheduler.set_idle()
+        self.now[0] += 0.5
+        self.scheduler.run_slice()
+        stats = self.scheduler.statistics()
+        self.assertEqual(stats['completed'], 2)
+        self.assertEqual(stats['starved'], 1)
+        self.assertEqual(stats['max-latency'], 2.5)
+        self.assertEqual(stats['mean-latency'], 1.5)
+        self.assertEqual(stats['slices'], 1)
+        self.assertEqual(stats['queued'], 0)
+
+    def test_failing_task(self):
+        def bad_task():
+            raise ValueError('bad task')
+
+        self.scheduler.schedule(bad_task)
+        self.scheduler.schedule(self._task('b'))
+        self.scheduler.set_idle()
+        self.now[0] += 0.1
+        self.assertEqual(self.scheduler.run_slice(), 2)
+        self.assertEqual(self.ran, ['b'])
+
+
+class BusIdleSchedulerTests(unittest.TestCase):
+    def test_bus_state(self):
+        bus = SingleThreadedBus()
+        ran = []
+        bus.idle_scheduler.schedule(lambda: ran.append(1))
+
+        def listener(event_id, target_id, obj):
+            # The bus is busy while the event runs.
+            ran.append(bus.idle_scheduler.run_slice())
+
+        bus.add_listener(event_ids.OS__RESOLUTION_CHANGED, target_ids.ANY, listener)
+        bus.fire(event_ids.OS__RESOLUTION_CHANGED, target_ids.ANY, {})
+        self.assertEqual(ran, [0])
+        self.assertEqual(bus.idle_scheduler.run_slice(), 1)
+        self.assertEqual(ran, [0, 1])
+
+    def test_threaded(self):
+        scheduler = IdleScheduler(quiet_period=0.01)
+        bus = Bus(NonThreadedWorker, scheduler)
+        done = threading.Event()
+        scheduler.start()
+        try:
+            scheduler.schedule(done.set)
+            bus.fire(event_ids.OS__RESOLUTION_CHANGED, target_ids.ANY, {})
+            self.assertTrue(done.wait(5.0))
+        finally:
+            scheduler.stop()
+
+    def test_compact_listeners(self):
+        bus = SingleThreadedBus()
+
+        def listener(event_id, target_id, obj):
+            pass
+
+        bus.add_listener(event_ids.WINDOW__CLOSED, 'window-1', listener)
+        bus.remove_listener(event_ids.WINDOW__CLOSED, 'window-1', listener)
+        self.assertEqual(len(bus.idle_scheduler), 1)
+        self.assertEqual(bus.idle_scheduler.run_slice(), 1)
+        self.assertNotIn(event_ids.WINDOW__CLOSED + chr(2) + 'window-1', bus._Bus__listeners)
+
+
+if __name__ == '__main__':
+    unittest.main()
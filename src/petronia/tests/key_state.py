@@ -0,0 +1,80 @@
+
+# Usage: python3 -m unittest petronia.tests.key_state
+
+import threading
+import unittest
+
+from ..util.key_state import KeyState, MAX_VK_KEY
+
+_LWIN = 0x5B
+_RWIN = 0x5C
+_LSHIFT = 0xA0
+_KEY_A = 0x41
+
+
+class KeyStateTests(unittest.TestCase):
+    def test_modifier_mask(self):
+        state = KeyState((_LSHIFT, _RWIN, _LWIN))
+        self.assertTrue(state.is_modifier(_LWIN))
+        self.assertFalse(state.is_modifier(_KEY_A))
+        self.assertEqual(state.modifier_mask_for((_LWIN,)), 1)
+        self.assertEqual(state.modifier_mask_for((_LSHIFT, _LWIN)), 5)
+        self.assertEqual(state.modifier_mask_for((_KEY_A,)), 0)
+
+        state.set_key(_LWIN, True)
+        state.set_key(_KEY_A, True)
+        self.assertEqual(state.modifier_mask, 1)
+        self.assertTrue(state.is_down(_KEY_A))
+        state.set_key(_LWIN, False)
+        self.assertEqual(state.modifier_mask, 0)
+        self.assertFalse(state.is_down(_LWIN))
+
+        # Releasing a key that was never down is fine.
+        state.set_key(_RWIN, False)
+        self.assertEqual(state.modifier_mask, 0)
+
+    def test_unknown_key(self):
+        state = KeyState((_LWIN,))
+        self.assertFalse(state.set_key(MAX_VK_KEY, True))
+        self.assertFalse(state.key_event(-1, True))
+        self.assertEqual(state.modifier_mask, 0)
+
+    def test_forced_states(self):
+        state = KeyState((_LWIN, _RWIN))
+        codes = (_LWIN, _RWIN)
+        states = bytearray(2)
+
+        states[0] = 1
+        self.assertTrue(state.key_event(_KEY_A, True, codes, states))
+        self.assertTrue(state.is_down(_LWIN))
+        self.assertEqual(state.modifier_mask, state.modifier_mask_for(codes[:1]))
+
+        # The event's own key is never forced.
+        states[0] = 1
+        state.key_event(_LWIN, False, codes, states)
+        self.assertFalse(state.is_down(_LWIN))
+        self.assertEqual(state.modifier_mask, 0)
+
+    def test_clear(self):
+        state = KeyState((_LWIN,))
+        state.set_key(_LWIN, True)
+        state.set_key(_KEY_A, True)
+        state.clear()
+        self.assertEqual(state.modifier_mask, 0)
+        self.assertFalse(state.is_down(_KEY_A))
+
+    def test_threaded_updates(self):
+        state = KeyState((_LWIN, _RWIN, _LSHIFT))
+        modifiers = (_LWIN, _RWIN, _LSHIFT)
+
+        def toggle(vk_code):
+            for _ in range(2000):
+                state.set_key(vk_code, True)
+                state.set_key(vk_code, False)
+
+        threads = [threading.Thread(target=toggle, args=(vk,)) for vk in modifiers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(state.modifier_mask, 0)
@@ -0,0 +1,127 @@
+
+# Usage: python3 -m unittest petronia.tests.key_trace
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from ..config import HotKeyConfig, DEFAULT_MODE, MODE_CHANGE_COMMAND
+from ..util import hotkey_dispatch
+from ..util.hotkey_chain import KEY_STATE, STR_VK_MAP, ACTION_PENDING, IGNORED
+from ..util.key_trace import (
+    KeyEvent, KeyTraceRecorder, encode_key_trace, parse_key_trace, read_key_trace
+)
+from .perf.hotkey_replay import replay, synthetic_events, synthetic_hotkeys
+
+
+class KeyTraceTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_round_trip(self):
+        events = [
+            KeyEvent(0x5B, True, False, 0.0),
+            KeyEvent(0x41, True, True, 0.25),
+            KeyEvent(0x41, False, True, 0.3),
+            KeyEvent(0x5B, False, False, 4000.5),
+        ]
+        self.assertEqual(parse_key_trace(encode_key_trace(events)), events)
+
+    def test_truncated(self):
+        events = [KeyEvent(0x41, True, False, 0.1), KeyEvent(0x41, False, False, 0.2)]
+        data = encode_key_trace(events)
+        self.assertEqual(parse_key_trace(data[:-3]), events[:1])
+        self.assertEqual(parse_key_trace(data[:8]), [])
+
+    def test_bad_header(self):
+        with self.assertRaises(ValueError):
+            parse_key_trace(b'PK')
+        with self.assertRaises(ValueError):
+            parse_key_trace(b'NOTATRACE')
+
+    def test_recorder(self):
+        now = [10.0]
+        filename = os.path.join(self.tmp_dir, 'keys.trace')
+        recorder = KeyTraceRecorder(filename, clock=lambda: now[0])
+        recorder.record(0x5B, True, False)
+        now[0] += 0.5
+        recorder.record(0x41, True, True)
+        recorder.close()
+        # Ignored once closed.
+        recorder.record(0x41, False, True)
+        self.assertEqual(read_key_trace(filename), [
+            KeyEvent(0x5B, True, False, 0.0),
+            KeyEvent(0x41, True, True, 0.5),
+        ])
+
+
+class HotkeyReplayTests(unittest.TestCase):
+    def test_matches_direct_chain(self):
+        hotkeys = synthetic_hotkeys()
+        events = synthetic_events(20000)
+        result = replay(events, hotkeys)
+        self.assertEqual(len(result.latencies), len(events))
+        self.assertGreater(len(result.commands), 0)
+        self.assertEqual(result.commands, _direct_commands(events, hotkeys))
+
+    def test_mode_change(self):
+        hotkeys = HotKeyConfig()
+        hotkeys.parse_hotkey_mode_keys(DEFAULT_MODE, {
+            "win+f1": [MODE_CHANGE_COMMAND, "resize"],
+            "win+a": ["cmd-a"],
+        })
+        hotkeys.parse_exclusive_mode_keys("resize", {
+            "left": ["shrink"],
+            "esc": [MODE_CHANGE_COMMAND, DEFAULT_MODE],
+        })
+        events = _events('lwin', 'f1', '-f1', '-lwin', 'left', '-left', 'esc', '-esc', 'lwin', 'a', '-a', '-lwin')
+        result = replay(events, hotkeys)
+        self.assertEqual(result.commands, [
+            (1, hotkey_dispatch.MODE_CHANGED, DEFAULT_MODE, "resize"),
+            (5, hotkey_dispatch.COMMAND, ("shrink",), None),
+            (7, hotkey_dispatch.MODE_CHANGED, "resize", DEFAULT_MODE),
+            (9, hotkey_dispatch.COMMAND, ("cmd-a",), None),
+        ])
+        self.assertEqual(result.commands, _direct_commands(events, hotkeys))
+
+
+def _events(*keys):
+    ret = []
+    for i, key in enumerate(keys):
+        is_down = not key.startswith('-')
+        ret.append(KeyEvent(STR_VK_MAP[key.lstrip('-')], is_down, False, i * 0.1))
+    return ret
+
+
+def _direct_commands(events, hotkeys):
+    """Drive the key chains without the dispatcher, as the oracle."""
+    mode_combos = hotkeys.mode_combos
+    for chain in mode_combos.values():
+        chain.reset()
+    mode = DEFAULT_MODE
+    ret = []
+    KEY_STATE.clear()
+    try:
+        for index, event in enumerate(events):
+            if not KEY_STATE.key_event(event.vk_code, event.is_down):
+                continue
+            res = mode_combos[mode].key_action(event.vk_code, event.is_down)
+            if res == IGNORED or res == ACTION_PENDING:
+                continue
+            if res[0] == MODE_CHANGE_COMMAND:
+                new_mode = res[1].strip()
+                if new_mode in mode_combos:
+                    mode_combos[new_mode].reset()
+                    ret.append((index, hotkey_dispatch.MODE_CHANGED, mode, new_mode))
+                    mode = new_mode
+                else:
+                    ret.append((index, hotkey_dispatch.UNKNOWN_MODE, new_mode, None))
+            else:
+                ret.append((index, hotkey_dispatch.COMMAND, res, None))
+    finally:
+        KEY_STATE.clear()
+    return ret
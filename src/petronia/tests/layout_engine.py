@@ -0,0 +1,152 @@
+
+# Usage: python3 -m unittest petronia.tests.layout_engine
+
+import unittest
+
+from ..system.id_manager import IdManager
+from ..system.registrar import StatefulRegistrar
+from ..system import event_ids, target_ids
+from .. import config
+from ..config import LayoutConfig, ChildSplitConfig, ORIENTATION_HORIZONTAL, ORIENTATION_VERTICAL
+from ..shell.control.root_layout import RootLayout
+from ..shell.control.split_layout import SplitLayout, get_object_factories as layout_factories
+from ..shell.control.portal import get_object_factories as portal_factories
+from ..util.layout_engine import split_rects, compute_layout
+from .bus_recorder import BusRecorder, make_rect as _rect
+
+
+class SplitRectsTests(unittest.TestCase):
+    def test_last_child_remainder(self):
+        self.assertEqual(split_rects(ORIENTATION_HORIZONTAL, [1, 1, 1], _rect(0, 0, 1000, 500)), [
+            _rect(0, 0, 333, 500), _rect(333, 0, 333, 500), _rect(666, 0, 334, 500),
+        ])
+        self.assertEqual(split_rects(ORIENTATION_VERTICAL, [2, 1], _rect(5, 10, 100, 101)), [
+            _rect(5, 10, 100, 67), _rect(5, 77, 100, 34),
+        ])
+
+    def test_floating_children(self):
+        self.assertEqual(split_rects(ORIENTATION_VERTICAL, [1, 0, 2, 0], _rect(0, 10, 50, 100)), [
+            _rect(0, 10, 50, 33), _rect(0, 10, 50, 100), _rect(0, 43, 50, 67), _rect(0, 10, 50, 100),
+        ])
+
+    def test_no_orientation(self):
+        self.assertEqual(split_rects(None, [1, 2], _rect(1, 2, 3, 4)), [_rect(1, 2, 3, 4), _rect(1, 2, 3, 4)])
+
+
+class ComputeLayoutTests(unittest.TestCase):
+    def test_tree(self):
+        rects = compute_layout(_hv_layout(LayoutConfig('right-bottom', 'split-layout', ORIENTATION_VERTICAL, [])),
+                               _rect(0, 0, 1000, 1000))
+        self.assertEqual(rects, {
+            (): _rect(0, 0, 1000, 1000),
+            (0,): _rect(0, 0, 500, 1000),
+            (1,): _rect(500, 0, 500, 1000),
+            (1, 0): _rect(500, 0, 500, 500),
+            (1, 1): _rect(500, 500, 500, 500),
+            (1, 1, 0): _rect(500, 500, 500, 500),
+        })
+
+    def test_portal(self):
+        self.assertEqual(compute_layout(LayoutConfig('p', 'portal', None, None), _rect(0, 0, 10, 10)),
+                         {(): _rect(0, 0, 10, 10)})
+
+
+class RootLayoutTests(unittest.TestCase):
+    def setUp(self):
+        self.recorder = BusRecorder()
+        self.bus = self.recorder.bus
+        self.id_manager = IdManager(self.bus)
+        self.layout = _hv_layout(LayoutConfig('right-bottom', 'split-layout', ORIENTATION_HORIZONTAL, [
+            ChildSplitConfig(1, LayoutConfig('a', 'portal', None, None)),
+            ChildSplitConfig(0, LayoutConfig('floating', 'portal', None, None)),
+            ChildSplitConfig(2, LayoutConfig('b', 'portal', None, None)),
+        ]))
+        self.config = config.Config(workgroups=config.DisplayWorkGroupsConfig([{
+            'name': 'default',
+            'monitors': [config.MonitorResConfig(1000, 1000)],
+            'workgroup': config.WorkGroupConfig({'default': [self.layout]}),
+        }]))
+        self.registrar = StatefulRegistrar(self.bus, self.id_manager, self.config)
+        for reg_objects in (layout_factories(), portal_factories()):
+            for category, factory in reg_objects.items():
+                self.registrar.register_category_factory(category, factory)
+        self.rect_events = self.recorder.record(event_ids.LAYOUT__SET_RECTANGLE)
+
+    def _create_layout(self):
+        root = RootLayout(self.bus, self.config, self.id_manager)
+        self.bus.fire(event_ids.OS__RESOLUTION_CHANGED, root.cid, {'monitors': [
+            {'left': 0, 'right': 1000, 'top': 0, 'bottom': 1000, 'width': 1000, 'height': 1000},
+        ]})
+        return root
+
+    def _tile_sizes(self):
+        return dict((cid, dict(obj.size)) for cid, obj in self.registrar.created_objects_by_cid.items())
+
+    def test_one_rectangle_per_tile(self):
+        root = self._create_layout()
+        created = self.registrar.created_objects_by_cid
+        self.assertEqual(len(created), 8)
+        self.assertEqual(sorted(self.rect_events), sorted(created.keys()))
+
+        expected = sorted(_rect_tuple(r) for r in compute_layout(self.layout, _rect(0, 0, 1000, 1000)).values())
+        self.assertEqual(sorted(_rect_tuple(obj.size) for obj in created.values()), expected)
+
+    def test_split_size_change(self):
+        root = self._create_layout()
+        top = [obj for obj in self.registrar.created_objects_by_cid.values()
+               if isinstance(obj, SplitLayout) and obj.parent_cid == root.cid][0]
+        right_cid = top._child_cids[1]
+        before = self._tile_sizes()
+        del self.rect_events[:]
+
+        self.bus.fire(event_ids.LAYOUT__SET_SPLIT_SIZES, right_cid, {'sizes': [1, 3]})
+        after = self._tile_sizes()
+        changed = [cid for cid in after if after[cid] != before[cid]]
+        # right-top, and the right-bottom split with its 3 portals.
+        self.assertEqual(len(changed), 5)
+        self.assertEqual(sorted(self.rect_events), sorted(changed))
+
+        # The same sizes again change nothing.
+        del self.rect_events[:]
+        self.bus.fire(event_ids.LAYOUT__SET_SPLIT_SIZES, right_cid, {'sizes': [1, 3]})
+        self.assertEqual(self.rect_events, [])
+
+    def test_border_change(self):
+        self._create_layout()
+        portal_cids = [cid for cid, obj in self.registrar.created_objects_by_cid.items()
+                       if not isinstance(obj, SplitLayout)]
+        for index, portal_cid in enumerate(portal_cids[:2]):
+            window_cid = 'window-{0}'.format(index)
+            self.bus.fire(event_ids.LAYOUT__ADD_WINDOW, portal_cid, {
+                'window-cid': window_cid, 'window-info': {'cid': window_cid, 'hwnd': index},
+            })
+        del self.rect_events[:]
+
+        # Only the windows move; no tile changes.
+        self.config.chrome.set_border(top=0, bottom=10, left=0, right=0)
+        self.bus.fire(event_ids.PORTAL__CHANGE_BORDER_SIZE, target_ids.BROADCAST, {})
+        self.assertEqual(sorted(self.rect_events), ['window-0', 'window-1'])
+
+        del self.rect_events[:]
+        self.bus.fire(event_ids.PORTAL__CHANGE_BORDER_SIZE, target_ids.BROADCAST, {})
+        self.assertEqual(self.rect_events, [])
+
+
+def _hv_layout(right_bottom):
+    # Horizontal split with a portal and a vertical split; the vertical
+    # split has a portal and the given layout.
+    return LayoutConfig('top', 'split-layout', ORIENTATION_HORIZONTAL, [
+        ChildSplitConfig(1, LayoutConfig('left', 'portal', None, None)),
+        ChildSplitConfig(1, LayoutConfig('right', 'split-layout', ORIENTATION_VERTICAL, [
+            ChildSplitConfig(1, LayoutConfig('right-top', 'portal', None, None)),
+            ChildSplitConfig(1, right_bottom),
+        ])),
+    ])
+
+
+def _rect_tuple(rect):
+    return rect['x'], rect['y'], rect['width'], rect['height']
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+
+# Usage: python3 -m unittest petronia.tests.layout_switch
+
+import unittest
+
+from ..system.id_manager import IdManager
+from ..system.registrar import StatefulRegistrar
+from ..system import event_ids, target_ids
+from .. import config
+from ..config import LayoutConfig, ChildSplitConfig, ORIENTATION_HORIZONTAL, ORIENTATION_VERTICAL
+from ..shell.control.root_layout import RootLayout
+from ..shell.control.active_portal_manager import ActivePortalManager
+from ..shell.control.split_layout import get_object_factories as layout_factories
+from ..shell.control.portal import Portal, get_object_factories as portal_factories
+from .bus_recorder import BusRecorder
+
+
+class LayoutSwitchTests(unittest.TestCase):
+    def setUp(self):
+        self.recorder = BusRecorder()
+        self.bus = self.recorder.bus
+        self.id_manager = IdManager(self.bus)
+        self.config = config.Config(workgroups=config.DisplayWorkGroupsConfig([{
+            'name': 'default',
+            'monitors': [config.MonitorResConfig(1000, 1000)],
+            'workgroup': config.WorkGroupConfig({
+                'default': [_layout(ORIENTATION_HORIZONTAL, ['a', 'b'])],
+                'other': [_layout(ORIENTATION_VERTICAL, ['c', 'a'])],
+                'unnamed-portal': [_unnamed_layout(LayoutConfig(None, 'portal', None, None))],
+                'unnamed-split': [_unnamed_layout(LayoutConfig(None, 'split-layout', ORIENTATION_VERTICAL, [
+                    ChildSplitConfig(1, LayoutConfig('x', 'portal', None, None)),
+                    ChildSplitConfig(1, LayoutConfig('y', 'portal', None, None)),
+                ]))],
+            }),
+        }]))
+        self.registrar = StatefulRegistrar(self.bus, self.id_manager, self.config)
+        for reg_objects in (layout_factories(), portal_factories()):
+            for category, factory in reg_objects.items():
+                self.registrar.register_category_factory(category, factory)
+        self.portal_manager = ActivePortalManager(self.bus, self.config)
+
+        self.rect_events = self.recorder.record(event_ids.LAYOUT__SET_RECTANGLE)
+        self.removed = self.recorder.record(event_ids.REGISTRAR__OBJECT_REMOVED)
+        self.windows = {}
+        self.recorder.listen(event_ids.LAYOUT__ADD_WINDOW, target_ids.ANY, self._on_add_window)
+
+        self.root = RootLayout(self.bus, self.config, self.id_manager)
+        self._set_monitor(1000)
+        for name in ('main', 'a', 'b'):
+            window_cid = 'window-' + name
+            self.bus.fire(event_ids.LAYOUT__ADD_WINDOW, self._portal_cid(name), {
+                'window-cid': window_cid, 'window-info': {'cid': window_cid, 'hwnd': name},
+            })
+        self.created = set(self.registrar.created_objects_by_cid.keys())
+        del self.rect_events[:]
+
+    def _on_add_window(self, event_id, target_id, obj):
+        self.windows[obj['window-cid']] = target_id
+
+    def _set_monitor(self, width):
+        self.bus.fire(event_ids.OS__RESOLUTION_CHANGED, self.root.cid, {'monitors': [
+            {'left': 0, 'right': width, 'top': 0, 'bottom': 1000, 'width': width, 'height': 1000},
+        ]})
+
+    def _portal_cid(self, alias):
+        return self.portal_manager._ActivePortalManager__portal_aliases[alias]
+
+    def _portals(self):
+        return dict((cid, obj) for cid, obj in self.registrar.created_objects_by_cid.items()
+                    if isinstance(obj, Portal) and cid not in self.removed)
+
+    def test_resolution_change(self):
+        self._set_monitor(1200)
+        self.assertEqual(self.removed, [])
+        self.assertEqual(set(self.registrar.created_objects_by_cid.keys()), self.created)
+        self.assertEqual(self.windows['window-b'], self._portal_cid('b'))
+        # The layouts take their size from the update; every portal and
+        # window moved, once each.
+        self.assertEqual(sorted(self.rect_events), sorted(
+            list(self._portals().keys()) + ['window-main', 'window-a', 'window-b']))
+        self.assertEqual(self._portals()[self._portal_cid('b')].size, {'x': 900, 'y': 0, 'width': 300, 'height': 1000})
+
+        # The same monitors again do nothing.
+        del self.rect_events[:]
+        self.bus.fire(event_ids.CONFIG__UPDATE, target_ids.BROADCAST, {})
+        self.assertEqual(self.rect_events, [])
+        self.assertEqual(self.removed, [])
+
+    def test_switch_keeps_matching_portals(self):
+        main_cid = self._portal_cid('main')
+        a_cid = self._portal_cid('a')
+        b_cid = self._portal_cid('b')
+        self.bus.fire(event_ids.LAYOUT__SWITCH_TO, target_ids.TOP_LAYOUT, {'layout-name': 'other'})
+
+        # Only the 'b' portal went away, and only the 'c' portal is new.
+        self.assertEqual(self.removed, [b_cid])
+        new_cids = set(self.registrar.created_objects_by_cid.keys()) - self.created
+        self.assertEqual(new_cids, {self._portal_cid('c')})
+        self.assertEqual(self._portal_cid('main'), main_cid)
+        self.assertEqual(self._portal_cid('a'), a_cid)
+
+        # The windows in the kept portals stay put; the window from the
+        # removed portal is placed again.
+        self.assertEqual(self.windows['window-main'], main_cid)
+        self.assertEqual(self.windows['window-a'], a_cid)
+        self.assertIn(self.windows['window-b'], self._portals())
+        self.assertNotEqual(self.windows['window-b'], b_cid)
+        self.assertEqual(self.rect_events.count('window-main'), 0)
+
+        # The right split changed orientation and order.
+        right_split = [obj for obj in self.registrar.created_objects_by_cid.values()
+                       if isinstance(obj, Portal) is False and obj.parent_cid != self.root.cid][0]
+        self.assertEqual(right_split._child_cids, [self._portal_cid('c'), a_cid])
+        self.assertEqual(self._portals()[self._portal_cid('c')].size, {'x': 500, 'y': 0, 'width': 500, 'height': 500})
+        self.assertEqual(self._portals()[a_cid].size, {'x': 500, 'y': 500, 'width': 500, 'height': 500})
+
+    def test_unnamed_child_changes_category(self):
+        self.bus.fire(event_ids.LAYOUT__SWITCH_TO, target_ids.TOP_LAYOUT, {'layout-name': 'unnamed-portal'})
+        self.assertEqual(self._tree(), ('split-layout', ['portal', 'portal']))
+        main_cid = self._portal_cid('main')
+
+        # An unnamed split where the unnamed portal was is created new.
+        self.bus.fire(event_ids.LAYOUT__SWITCH_TO, target_ids.TOP_LAYOUT, {'layout-name': 'unnamed-split'})
+        self.assertEqual(self._tree(), ('split-layout', ['portal', ('split-layout', ['portal', 'portal'])]))
+        self.assertEqual(self._portal_cid('main'), main_cid)
+        x_cid = self._portal_cid('x')
+        self.assertIn(x_cid, self._portals())
+
+        # And the other way around.
+        self.bus.fire(event_ids.LAYOUT__SWITCH_TO, target_ids.TOP_LAYOUT, {'layout-name': 'unnamed-portal'})
+        self.assertEqual(self._tree(), ('split-layout', ['portal', 'portal']))
+        self.assertIn(x_cid, self.removed)
+
+    def _tree(self, cid=None):
+        """
+        The live tiles under the root layout, by category.
+        """
+        if cid is None:
+            self.assertEqual(len(self.root._child_cids), 1)
+            cid = self.root._child_cids[0]
+        obj = self.registrar.created_objects_by_cid[cid]
+        self.assertNotIn(cid, self.removed)
+        if isinstance(obj, Portal):
+            return 'portal'
+        return 'split-layout', [self._tree(child_cid) for child_cid in obj._child_cids]
+
+
+def _unnamed_layout(child):
+    # The 'main' portal, and an unnamed child.
+    return LayoutConfig('top', 'split-layout', ORIENTATION_HORIZONTAL, [
+        ChildSplitConfig(1, LayoutConfig('main', 'portal', None, None)),
+        ChildSplitConfig(1, child),
+    ])
+
+
+def _layout(orientation, names):
+    # A portal on the left, and a split of the named portals on the right.
+    return LayoutConfig('top', 'split-layout', ORIENTATION_HORIZONTAL, [
+        ChildSplitConfig(1, LayoutConfig('main', 'portal', None, None)),
+        ChildSplitConfig(1, LayoutConfig('right', 'split-layout', orientation, [
+            ChildSplitConfig(1, LayoutConfig(name, 'portal', None, None)) for name in names
+        ])),
+    ])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+
+# Usage: python3 -m unittest petronia.tests.lazy_factory
+#
+# Some of the factory modules load the native functions, so the registry
+# tests run against the simulated desktop.
+
+import importlib
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from ..system.extensions.lazy_factory import LazyFactory, as_factory
+from ..system.extensions.component_factory_registry import get_base_extension_factories
+from ..system.extensions.singleton_factory_registry import get_base_singleton_factories
+from .simulated import SIMULATED as _SIMULATED, run_simulated
+
+_SAMPLE_MODULE = 'petronia_lazy_factory_sample'
+
+
+class LazyFactoryTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        with open(os.path.join(self.tmp_dir, _SAMPLE_MODULE + '.py'), 'w') as f:
+            f.write('def factory(*args):\n    return "made", args\n')
+        sys.path.insert(0, self.tmp_dir)
+
+    def tearDown(self):
+        sys.path.remove(self.tmp_dir)
+        sys.modules.pop(_SAMPLE_MODULE, None)
+        shutil.rmtree(self.tmp_dir)
+
+    def test_imported_when_called(self):
+        factory = LazyFactory(_SAMPLE_MODULE + ':factory')
+        self.assertEqual(factory.reference, _SAMPLE_MODULE + ':factory')
+        self.assertFalse(factory.is_resolved)
+        self.assertNotIn(_SAMPLE_MODULE, sys.modules)
+
+        self.assertEqual(factory(1, 2), ('made', (1, 2)))
+        self.assertTrue(factory.is_resolved)
+        self.assertIs(factory.resolve(), sys.modules[_SAMPLE_MODULE].factory)
+
+    def test_as_factory(self):
+        factory = as_factory(_SAMPLE_MODULE + ':factory')
+        self.assertIsInstance(factory, LazyFactory)
+        self.assertNotIn(_SAMPLE_MODULE, sys.modules)
+        self.assertIs(as_factory(len), len)
+
+    def test_bad_reference(self):
+        self.assertRaises(AssertionError, LazyFactory, _SAMPLE_MODULE)
+        factory = LazyFactory(_SAMPLE_MODULE + ':missing')
+        self.assertRaises(AttributeError, factory)
+        self.assertFalse(factory.is_resolved)
+
+
+@unittest.skipUnless(_SIMULATED, "needs the simulated desktop")
+class FactoryRegistryTests(unittest.TestCase):
+    def test_extension_categories(self):
+        # The lazy registry names the categories itself, so it doesn't
+        # import the modules; they must match the modules' own.
+        for category, factory in get_base_extension_factories().items():
+            module = importlib.import_module(factory.reference.partition(':')[0])
+            self.assertEqual(module.get_object_factories(), {category: factory.resolve()})
+
+    def test_singleton_references(self):
+        for factory in get_base_singleton_factories():
+            self.assertTrue(callable(factory.resolve()), factory.reference)
+
+
+@unittest.skipIf(_SIMULATED, "already running against the simulated desktop")
+class SimulatedProcessTests(unittest.TestCase):
+    def test_in_simulated_process(self):
+        run_simulated(self, __name__)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+
+# Usage: python3 -m unittest petronia.tests.parallel_gather
+
+import threading
+import time
+import unittest
+
+from ..util.parallel_gather import gather
+
+
+class GatherTests(unittest.TestCase):
+    def test_results_in_order(self):
+        def slow_square(i):
+            # Later items finish first.
+            time.sleep((20 - i) * 0.001)
+            return i * i
+
+        result = gather(range(20), slow_square, max_workers=5)
+        self.assertEqual(result.results, [(i, i * i) for i in range(20)])
+        self.assertEqual(result.timed_out, [])
+        self.assertEqual(result.failed, [])
+
+    def test_bounded_workers(self):
+        lock = threading.Lock()
+        running = [0, 0]
+
+        def track(i):
+            with lock:
+                running[0] += 1
+                running[1] = max(running[0], running[1])
+            time.sleep(0.005)
+            with lock:
+                running[0] -= 1
+
+        gather(range(30), track, max_workers=4)
+        self.assertLessEqual(running[1], 4)
+
+    def test_failures(self):
+        def fail_odd(i):
+            if i % 2 == 1:
+                raise OSError("window {0} is gone".format(i))
+            return i
+
+        result = gather(range(6), fail_odd, max_workers=2)
+        self.assertEqual(result.results, [(0, 0), (2, 2), (4, 4)])
+        self.assertEqual([item for item, e in result.failed], [1, 3, 5])
+        self.assertIsInstance(result.failed[0][1], OSError)
+
+    def test_hung_items(self):
+        hang = threading.Event()
+        try:
+            def hang_some(i):
+                if i in (1, 2):
+                    hang.wait()
+                return i
+
+            start = time.monotonic()
+            # As many hung items as workers; the rest must still run.
+            result = gather(range(8), hang_some, max_workers=2, item_timeout=0.1)
+            self.assertLess(time.monotonic() - start, 2.0)
+            self.assertEqual(result.timed_out, [1, 2])
+            self.assertEqual([item for item, value in result.results], [0, 3, 4, 5, 6, 7])
+        finally:
+            hang.set()
+
+    def test_empty(self):
+        result = gather([], lambda i: i)
+        self.assertEqual(result.results, [])
@@ -0,0 +1,101 @@
+# Usage: python3 -m petronia.tests.perf.app_rules [window count]
+#
+# Looks up the display flags of synthetic windows against 300 application
+# rules: asking each rule in turn for each flag (as the window mapper did),
+# the compiled rules without the memo, and the compiled rules with the memo.
+# Windows repeat their class and executable, like the windows of one
+# application do.
+
+import random
+import sys
+import time
+
+from ...config.application import ApplicationChromeConfig, AppMatcher, ApplicationListConfig
+from ...util.app_rules import AppRuleEngine, AppFlags
+
+_RULE_COUNT = 300
+_APP_COUNT = 400
+_FLAG_NAMES = ('is_tiled', 'has_title', 'has_border', 'is_resizable')
+
+
+def create_rules(rnd):
+    ret = []
+    for index in range(_RULE_COUNT):
+        kind = index % 6
+        if kind == 0 or kind == 1:
+            matcher = AppMatcher(class_name='AppClass{0}'.format(rnd.randrange(_APP_COUNT)))
+        elif kind == 2 or kind == 3:
+            matcher = AppMatcher(exec_path='app{0}.exe'.format(rnd.randrange(_APP_COUNT)))
+        elif kind == 4:
+            matcher = AppMatcher(class_name_re='AppClass{0}[0-9]'.format(rnd.randrange(_APP_COUNT // 10)))
+        else:
+            matcher = AppMatcher(title_re='.*Document {0}$'.format(rnd.randrange(1000)))
+        flags = [rnd.choice((None, True, False)) for _ in _FLAG_NAMES]
+        if all(flag is None for flag in flags):
+            flags[0] = False
+        ret.append(ApplicationChromeConfig(
+            is_tiled=flags[0], has_title=flags[1], has_border=flags[2], is_resizable=flags[3],
+            app_matchers=[matcher]))
+    return ret
+
+
+def create_windows(rnd, count):
+    ret = []
+    for _ in range(count):
+        app = rnd.randrange(_APP_COUNT)
+        ret.append({
+            'class': 'AppClass{0}'.format(app),
+            'exec_filename': 'c:\\program files\\app{0}\\app{0}.exe'.format(app),
+            'module_filename': 'c:\\program files\\app{0}\\app{0}.exe'.format(app),
+            'title': 'Document {0}'.format(rnd.randrange(20)),
+            'pid': 1000 + app,
+            'hwnd': len(ret),
+            'visible': True,
+        })
+    return ret
+
+
+def walk_rules(configs, apps, window_info):
+    ret = []
+    for name in _FLAG_NAMES:
+        value = getattr(apps, 'default_' + name)
+        for config in configs:
+            res = getattr(config, name)(window_info)
+            if res is not None:
+                value = res
+                break
+        ret.append(value)
+    return AppFlags(*ret)
+
+
+def run(count):
+    rnd = random.Random(0)
+    configs = create_rules(rnd)
+    windows = create_windows(rnd, count)
+    apps = ApplicationListConfig(configs)
+
+    start = time.perf_counter()
+    expected = [walk_rules(configs, apps, info) for info in windows]
+    walked = time.perf_counter() - start
+
+    engine = AppRuleEngine(
+        [rule for config in configs for rule in config.get_flag_rules()],
+        AppFlags(True, True, True, True), memo_size=0)
+    start = time.perf_counter()
+    compiled_flags = [engine.get_flags(info) for info in windows]
+    compiled = time.perf_counter() - start
+
+    start = time.perf_counter()
+    memo_flags = [apps.get_flags(info) for info in windows]
+    memo = time.perf_counter() - start
+
+    assert compiled_flags == expected
+    assert memo_flags == expected
+    print("{0} windows, {1} rules: each rule {2:.3f} s, compiled {3:.3f} s ({4:.1f}x), "
+          "compiled with memo {5:.3f} s ({6:.1f}x)".format(
+              count, _RULE_COUNT, walked, compiled, walked / compiled, memo, walked / memo))
+    return walked, compiled, memo
+
+
+if __name__ == '__main__':
+    run(len(sys.argv) > 1 and int(sys.argv[1]) or 10000)
@@ -0,0 +1,49 @@
+
+# Usage: python3 -m petronia.tests.perf.chord_engine [keystroke count]
+#
+# Throughput of the ChordEngine against the 200 bindings used by the
+# hotkey_matcher benchmark, plus tap / hold keys and a leader sequence.
+# The clock advances by a fixed step per keystroke, so some chains time out.
+
+import sys
+import time
+
+from ...util.chord_engine import ChordEngine
+from ...util.hotkey_chain import KEY_STATE, STR_VK_MAP
+from .hotkey_matcher import create_bindings, create_keystrokes
+
+# Seconds the fake clock advances per keystroke.
+_KEYSTROKE_TIME = 0.05
+
+
+def run(count):
+    now = [0.0]
+    engine = ChordEngine(create_bindings(), clock=lambda: now[0], step_timeout=0.5, hold_time=0.3)
+    engine.set_tap_hold({'f11': (['tap'], ['hold']), 'f12': (['tap'], None)})
+    engine.set_leader('win+space', {'w, h': ['leader-wh'], 'q': ['leader-q']})
+
+    keystrokes = create_keystrokes(count)
+    tap_keys = (STR_VK_MAP['f11'], STR_VK_MAP['f12'])
+    for i in range(0, len(keystrokes) - 1, 97):
+        # Mix in the tap / hold keys.
+        vk_code = tap_keys[i % 2]
+        keystrokes[i] = (vk_code, True)
+        keystrokes[i + 1] = (vk_code, False)
+
+    KEY_STATE.clear()
+    matched = 0
+    start = time.perf_counter()
+    for vk_code, is_down in keystrokes:
+        now[0] += _KEYSTROKE_TIME
+        KEY_STATE.key_event(vk_code, is_down)
+        if isinstance(engine.key_action(vk_code, is_down), tuple):
+            matched += 1
+    duration = time.perf_counter() - start
+    KEY_STATE.clear()
+    print("{0} keystrokes, {1} commands matched, {2} chains expired: {3:.3f} s ({4:.0f} ns / keystroke)".format(
+        count, matched, engine.expired, duration, duration * 1e9 / count))
+    return duration
+
+
+if __name__ == '__main__':
+    run(len(sys.argv) > 1 and int(sys.argv[1]) or 2000000)
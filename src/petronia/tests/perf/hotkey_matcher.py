@@ -0,0 +1,81 @@
+
+# Usage: python3 -m petronia.tests.perf.hotkey_matcher [keystroke count]
+#
+# Drives on_key_hook and HotKeyChain.key_action with synthetic keystrokes,
+# the same way the low-level keyboard hook does, against a configuration
+# with 200 bindings.
+
+import random
+import sys
+import time
+
+from ...util.hotkey_chain import HotKeyChain, on_key_hook, STR_VK_MAP
+
+_MODIFIER_COMBOS = (
+    "win", "win+shift", "win+control", "win+alt", "control+alt",
+    "control+shift", "alt+shift", "win+control+shift",
+)
+_KEYS = (
+    "a", "b", "c", "d", "e", "f", "g", "h", "i", "j", "k", "l", "m",
+    "n", "o", "p", "q", "r", "s", "t", "u", "v", "w", "x", "y", "z",
+)
+_BINDING_COUNT = 200
+
+
+def create_bindings():
+    ret = {}
+    i = 0
+    for modifiers in _MODIFIER_COMBOS:
+        for key in _KEYS:
+            if i % 5 == 4:
+                # Mix in multi-step chains.
+                chain = "{0}+{1}, {2}".format(modifiers, key, _KEYS[(i * 7) % len(_KEYS)])
+            else:
+                chain = "{0}+{1}".format(modifiers, key)
+            ret[chain] = ["cmd", i]
+            i += 1
+            if i >= _BINDING_COUNT:
+                return ret
+    return ret
+
+
+def create_keystrokes(count, seed=1):
+    """
+    Random modifier + key presses, as (vk_code, is_down) pairs.
+    """
+    rand = random.Random(seed)
+    modifier_vks = [
+        STR_VK_MAP[k] for k in ('lwin', 'rwin', 'lshift', 'lcontrol', 'rcontrol', 'lalt')
+    ]
+    key_vks = [STR_VK_MAP[k] for k in _KEYS]
+    ret = []
+    while len(ret) < count:
+        modifiers = rand.sample(modifier_vks, rand.randint(0, 2))
+        for vk in modifiers:
+            ret.append((vk, True))
+        for _ in range(rand.randint(1, 3)):
+            vk = rand.choice(key_vks)
+            ret.append((vk, True))
+            ret.append((vk, False))
+        for vk in reversed(modifiers):
+            ret.append((vk, False))
+    return ret[:count]
+
+
+def run(count):
+    chain = HotKeyChain(create_bindings())
+    keystrokes = create_keystrokes(count)
+    matched = 0
+    start = time.perf_counter()
+    for vk_code, is_down in keystrokes:
+        on_key_hook(vk_code, is_down)
+        if isinstance(chain.key_action(vk_code, is_down), tuple):
+            matched += 1
+    duration = time.perf_counter() - start
+    print("{0} keystrokes, {1} commands matched: {2:.3f} s ({3:.0f} ns / keystroke)".format(
+        count, matched, duration, duration * 1e9 / count))
+    return duration
+
+
+if __name__ == '__main__':
+    run(len(sys.argv) > 1 and int(sys.argv[1]) or 2000000)
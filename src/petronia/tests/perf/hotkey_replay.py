@@ -0,0 +1,135 @@
+
+# Usage: python3 -m petronia.tests.perf.hotkey_replay [-h] trace_file [config_file]
+#
+# Replays a key trace, recorded with `--record-keys', through the same
+# key handling the keyboard hook uses, and reports the per-keystroke
+# latency and the commands generated.  Without a configuration file, the
+# 200 bindings from the hotkey_matcher benchmark are used.
+#
+# Modes with timing options see the replay time, not the recorded time.
+
+import argparse
+import sys
+import time
+
+from ...config import HotKeyConfig, DEFAULT_MODE, MODE_CHANGE_COMMAND
+from ...util.hotkey_chain import KEY_STATE
+from ...util.hotkey_dispatch import HotkeyDispatch
+from ...util.key_trace import KeyEvent, read_key_trace, write_key_trace
+from .hotkey_matcher import create_bindings, create_keystrokes
+
+_PERCENTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+class ReplayResult(object):
+    def __init__(self):
+        # (event index, kind, value 1, value 2) for each dispatched item.
+        self.commands = []
+        # Seconds spent on each event, in event order.
+        self.latencies = []
+        self.swallowed = 0
+
+    def percentile(self, fraction):
+        if len(self.latencies) <= 0:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+    def report(self):
+        lines = [
+            "{0} key events, {1} swallowed, {2} commands".format(
+                len(self.latencies), self.swallowed, len(self.commands)),
+        ]
+        for fraction in _PERCENTILES:
+            lines.append("  p{0:<5} {1:8.2f} us".format(
+                "{0:g}".format(fraction * 100), self.percentile(fraction) * 1e6))
+        lines.append("  max    {0:8.2f} us".format(max(self.latencies or [0.0]) * 1e6))
+        return "\n".join(lines)
+
+
+def replay(events, hotkeys, clock=time.perf_counter):
+    """
+    Push the key events through the hotkey handling.  This uses the global
+    KEY_STATE, like the key handlers created by the configuration.
+
+    :param events: list of KeyEvent
+    :param hotkeys: HotKeyConfig
+    :param clock: timer for the latencies.
+    :return: ReplayResult
+    """
+    assert isinstance(hotkeys, HotKeyConfig)
+    KEY_STATE.clear()
+    for chain in hotkeys.mode_combos.values():
+        chain.reset()
+    dispatch = HotkeyDispatch(KEY_STATE, MODE_CHANGE_COMMAND, 1024)
+    dispatch.set_mode_combos(dict(hotkeys.mode_combos), DEFAULT_MODE)
+    result = ReplayResult()
+    index = [0]
+
+    def on_dispatched(item):
+        result.commands.append((index[0], item[0], item[1], item[2]))
+
+    verdict = dispatch.verdict
+    latencies = result.latencies
+    try:
+        for i in range(len(events)):
+            event = events[i]
+            start = clock()
+            swallowed = verdict(event.vk_code, event.is_down)
+            latencies.append(clock() - start)
+            if swallowed:
+                result.swallowed += 1
+            index[0] = i
+            dispatch.drain(on_dispatched)
+    finally:
+        KEY_STATE.clear()
+    return result
+
+
+def synthetic_events(count, seconds_per_event=0.03):
+    return [
+        KeyEvent(vk_code, is_down, False, i * seconds_per_event)
+        for i, (vk_code, is_down) in enumerate(create_keystrokes(count))
+    ]
+
+
+def synthetic_hotkeys():
+    hotkeys = HotKeyConfig()
+    hotkeys.parse_hotkey_mode_keys(DEFAULT_MODE, create_bindings())
+    return hotkeys
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.description = "Replay a key trace through the hot key handling."
+    parser.add_argument("trace_file", help="Key trace file to replay, or to create with --synthesize.")
+    parser.add_argument("config_file", nargs='?', help="Configuration file with the hot keys.")
+    parser.add_argument(
+        "--synthesize", type=int, metavar="COUNT",
+        help="Write COUNT synthetic key events to the trace file, then replay it.")
+    parser.add_argument("--commands", action="store_true", help="List the generated commands.")
+    args = parser.parse_args()
+
+    if args.synthesize:
+        write_key_trace(args.trace_file, synthetic_events(args.synthesize))
+    events = read_key_trace(args.trace_file)
+
+    if args.config_file:
+        from ...script.read_config import read_user_configuration
+        from ...script.script_logger import create_stdout_logger
+        hotkeys = read_user_configuration(args.config_file, create_stdout_logger()).hotkeys
+    else:
+        hotkeys = synthetic_hotkeys()
+
+    result = replay(events, hotkeys)
+    if args.commands:
+        for index, kind, value_1, value_2 in result.commands:
+            print("{0:8d} {1:10.3f}s {2} {3} {4}".format(
+                index, events[index].timestamp, kind, value_1, value_2 is not None and value_2 or ''))
+    print(result.report())
+    return result
+
+
+if __name__ == '__main__':
+    main()
+    sys.exit(0)
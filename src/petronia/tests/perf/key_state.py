@@ -0,0 +1,33 @@
+
+# Usage: python3 -m petronia.tests.perf.key_state [keystroke count]
+#
+# Times the KeyState updates made for every key event by the keyboard hook,
+# including the forced windows key states.
+
+import sys
+import time
+
+from ...util.hotkey_chain import KEY_STATE, STR_VK_MAP, SPECIAL_MODIFIER_CHECK_VKEY_CODES
+
+
+def run(count):
+    keys = [STR_VK_MAP[k] for k in ('lwin', 'a', 'lshift', 'b', 'rcontrol', 'c')]
+    states = bytearray(len(SPECIAL_MODIFIER_CHECK_VKEY_CODES))
+    KEY_STATE.clear()
+    start = time.perf_counter()
+    for i in range(count):
+        vk_code = keys[i % len(keys)]
+        is_down = (i // len(keys)) % 2 == 0
+        KEY_STATE.key_event(vk_code, is_down, SPECIAL_MODIFIER_CHECK_VKEY_CODES, states)
+        if vk_code == keys[0]:
+            # What the OS reports for the windows key on the next event.
+            states[0] = is_down and 1 or 0
+    duration = time.perf_counter() - start
+    KEY_STATE.clear()
+    print("{0} key events: {1:.3f} s ({2:.0f} ns / event)".format(
+        count, duration, duration * 1e9 / count))
+    return duration
+
+
+if __name__ == '__main__':
+    run(len(sys.argv) > 1 and int(sys.argv[1]) or 2000000)
@@ -0,0 +1,117 @@
+# Usage: python3 -m petronia.tests.perf.layout_engine [node count]
+#
+# Builds a random split layout tree with the given number of tiles, times
+# computing every tile rectangle in one pass, then creates the tiles through
+# the root layout and counts the rectangle events.  Before, each tile got one
+# rectangle event from each of its ancestors as the sizes trickled down
+# (depth + 1); now each tile gets one.  Last, it times changing the monitor
+# size, which updates the existing tiles rather than building them again.
+
+import random
+import sys
+import time
+
+from ...system.bus import SingleThreadedBus
+from ...system.id_manager import IdManager
+from ...system.registrar import StatefulRegistrar
+from ...system import event_ids, target_ids
+from ... import config
+from ...config import LayoutConfig, ChildSplitConfig, ORIENTATION_HORIZONTAL, ORIENTATION_VERTICAL
+from ...shell.control.root_layout import RootLayout
+from ...shell.control.split_layout import get_object_factories as layout_factories
+from ...shell.control.portal import get_object_factories as portal_factories
+from ...util.layout_engine import compute_layout
+
+_REPEAT = 100
+
+
+def create_tree(rnd, count):
+    """
+    Grow the tree by turning random portals into splits, until it has
+    (about) `count` tiles.
+    """
+    root = {'children': []}
+    portals = [root]
+    tiles = 1
+    while tiles < count:
+        node = portals.pop(rnd.randrange(len(portals)))
+        for _ in range(rnd.randint(2, 4)):
+            child = {'children': []}
+            node['children'].append(child)
+            portals.append(child)
+            tiles += 1
+    index = [0]
+
+    def to_config(node, orientation):
+        index[0] += 1
+        name = 'tile-{0}'.format(index[0])
+        if len(node['children']) <= 0:
+            return LayoutConfig(name, 'portal', None, None)
+        other = orientation == ORIENTATION_HORIZONTAL and ORIENTATION_VERTICAL or ORIENTATION_HORIZONTAL
+        return LayoutConfig(name, 'split-layout', orientation, [
+            ChildSplitConfig(rnd.randint(1, 3), to_config(child, other)) for child in node['children']
+        ])
+
+    return to_config(root, ORIENTATION_HORIZONTAL)
+
+
+def build(layout, rect):
+    bus = SingleThreadedBus()
+    id_manager = IdManager(bus)
+    cfg = config.Config(workgroups=config.DisplayWorkGroupsConfig([{
+        'name': 'default',
+        'monitors': [config.MonitorResConfig(rect['width'], rect['height'])],
+        'workgroup': config.WorkGroupConfig({'default': [layout]}),
+    }]))
+    registrar = StatefulRegistrar(bus, id_manager, cfg)
+    for reg_objects in (layout_factories(), portal_factories()):
+        for category, factory in reg_objects.items():
+            registrar.register_category_factory(category, factory)
+    rect_events = []
+
+    def on_set_rectangle(event_id, target_id, obj):
+        rect_events.append(target_id)
+
+    bus.add_listener(event_ids.LAYOUT__SET_RECTANGLE, target_ids.ANY, on_set_rectangle)
+    root = RootLayout(bus, cfg, id_manager)
+    start = time.perf_counter()
+    _set_monitor(bus, root, rect)
+    elapsed = time.perf_counter() - start
+    tiles = len(registrar.created_objects_by_cid)
+    events = len(rect_events)
+
+    start = time.perf_counter()
+    _set_monitor(bus, root, {'x': rect['x'], 'y': rect['y'], 'width': rect['width'] // 2, 'height': rect['height']})
+    changed = time.perf_counter() - start
+    assert len(registrar.created_objects_by_cid) == tiles
+    return tiles, events, elapsed, changed
+
+
+def _set_monitor(bus, root, rect):
+    bus.fire(event_ids.OS__RESOLUTION_CHANGED, root.cid, {'monitors': [{
+        'left': rect['x'], 'right': rect['x'] + rect['width'],
+        'top': rect['y'], 'bottom': rect['y'] + rect['height'],
+        'width': rect['width'], 'height': rect['height'],
+    }]})
+
+
+def run(count):
+    rnd = random.Random(0)
+    layout = create_tree(rnd, count)
+    rect = {'x': 0, 'y': 0, 'width': 3840, 'height': 2160}
+
+    start = time.perf_counter()
+    for _ in range(_REPEAT):
+        rects = compute_layout(layout, rect)
+    computed = (time.perf_counter() - start) / _REPEAT
+    cascade = sum(len(path) + 1 for path in rects)
+
+    tiles, events, elapsed, changed = build(layout, rect)
+    print("{0} tiles: compute_layout {1:.3f} ms; built {2} tiles in {3:.3f} s with {4} rectangle events "
+          "(cascade would fire {5}); monitor size change {6:.3f} s".format(
+              len(rects), computed * 1000, tiles, elapsed, events, cascade, changed))
+    return computed, events, cascade
+
+
+if __name__ == '__main__':
+    run(len(sys.argv) > 1 and int(sys.argv[1]) or 500)
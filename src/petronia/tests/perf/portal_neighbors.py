@@ -0,0 +1,114 @@
+# Usage: python3 -m petronia.tests.perf.portal_neighbors [query count]
+#
+# Builds 4 monitors side by side, each with 10 portals (2 columns of 5), and
+# moves the focus in random directions: through the layout negotiation
+# events (as the active portal manager did), through the active portal
+# manager with the neighbor index, and on the neighbor index alone.  Reports
+# the time and the number of bus events per move.
+
+import random
+import sys
+import time
+
+from ...system.bus import SingleThreadedBus
+from ...system.id_manager import IdManager
+from ...system.registrar import StatefulRegistrar
+from ...system import event_ids, target_ids
+from ... import config
+from ...config import LayoutConfig, ChildSplitConfig, ORIENTATION_HORIZONTAL, ORIENTATION_VERTICAL
+from ...shell.control.root_layout import RootLayout
+from ...shell.control.active_portal_manager import ActivePortalManager
+from ...shell.control.split_layout import get_object_factories as layout_factories
+from ...shell.control.portal import Portal, get_object_factories as portal_factories
+from ...shell.navigation import create_direction_negotiation_start_event_obj
+from ...util.portal_neighbors import PortalNeighborIndex
+
+_MONITOR_COUNT = 4
+_WIDTH = 1920
+_HEIGHT = 1080
+_DIRECTIONS = ('north', 'east', 'south', 'west')
+
+
+def create_layout(monitor):
+    return LayoutConfig('monitor-{0}'.format(monitor), 'split-layout', ORIENTATION_HORIZONTAL, [
+        ChildSplitConfig(1, LayoutConfig('column-{0}-{1}'.format(monitor, column), 'split-layout',
+                                         ORIENTATION_VERTICAL, [
+            ChildSplitConfig(1, LayoutConfig('portal-{0}-{1}-{2}'.format(monitor, column, row), 'portal', None, None))
+            for row in range(5)
+        ]))
+        for column in range(2)
+    ])
+
+
+def build():
+    bus = SingleThreadedBus()
+    id_manager = IdManager(bus)
+    cfg = config.Config(workgroups=config.DisplayWorkGroupsConfig([{
+        'name': 'default',
+        'monitors': [config.MonitorResConfig(_WIDTH, _HEIGHT) for _ in range(_MONITOR_COUNT)],
+        'workgroup': config.WorkGroupConfig({'default': [create_layout(m) for m in range(_MONITOR_COUNT)]}),
+    }]))
+    registrar = StatefulRegistrar(bus, id_manager, cfg)
+    for reg_objects in (layout_factories(), portal_factories()):
+        for category, factory in reg_objects.items():
+            registrar.register_category_factory(category, factory)
+    manager = ActivePortalManager(bus, cfg)
+    root = RootLayout(bus, cfg, id_manager)
+    bus.fire(event_ids.OS__RESOLUTION_CHANGED, root.cid, {'monitors': [{
+        'left': m * _WIDTH, 'right': (m + 1) * _WIDTH, 'top': 0, 'bottom': _HEIGHT,
+        'width': _WIDTH, 'height': _HEIGHT,
+    } for m in range(_MONITOR_COUNT)]})
+    portals = dict((cid, obj) for cid, obj in registrar.created_objects_by_cid.items() if isinstance(obj, Portal))
+    return bus, manager, portals
+
+
+def run(count):
+    rnd = random.Random(0)
+    directions = [rnd.choice(_DIRECTIONS) for _ in range(count)]
+    bus, manager, portals = build()
+    assert len(portals) == _MONITOR_COUNT * 10
+    active = [sorted(portals.keys())[0]]
+    event_count = [0]
+
+    def on_any_event(event_id, target_id, event_obj):
+        event_count[0] += 1
+
+    def on_activated(event_id, target_id, event_obj):
+        active[0] = event_obj['portal-cid']
+
+    bus.add_listener(event_ids.ALL, target_ids.ANY, on_any_event)
+    bus.add_listener(event_ids.PORTAL__ACTIVATED, target_ids.ANY, on_activated)
+    bus.fire(event_ids.PORTAL__SET_ACTIVE, active[0], {})
+
+    def negotiate(direction):
+        bus.fire(event_ids.DIRECTION_NEGOTIATION__BEGIN, active[0], create_direction_negotiation_start_event_obj(
+            target_ids.ACTIVE_PORTAL_MANAGER, direction, 'portal', event_ids.PORTAL__SET_ACTIVE, None, {}))
+
+    def focus_move(direction):
+        bus.fire(event_ids.FOCUS__MOVE, target_ids.ACTIVE_PORTAL_MANAGER, {'direction': direction})
+
+    results = []
+    for name, move in (('negotiation', negotiate), ('neighbor index', focus_move)):
+        event_count[0] = 0
+        start = time.perf_counter()
+        for direction in directions:
+            move(direction)
+        elapsed = time.perf_counter() - start
+        results.append(elapsed)
+        print("{0} moves through {1}: {2:.3f} s, {3:.1f} bus events per move".format(
+            count, name, elapsed, event_count[0] / count))
+
+    index = PortalNeighborIndex()
+    for cid, obj in portals.items():
+        index.set_rect(cid, obj.size)
+    cid = active[0]
+    start = time.perf_counter()
+    for direction in directions:
+        cid = index.neighbor(cid, direction) or cid
+    elapsed = time.perf_counter() - start
+    print("{0} lookups on the neighbor index alone: {1:.3f} s".format(count, elapsed))
+    return results[0], results[1], elapsed
+
+
+if __name__ == '__main__':
+    run(len(sys.argv) > 1 and int(sys.argv[1]) or 10000)
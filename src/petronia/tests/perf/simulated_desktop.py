@@ -0,0 +1,92 @@
+# Usage: python3 -m petronia.tests.perf.simulated_desktop CONFIG [window count]
+#
+# Runs the window mapper and the shell hooks from the user configuration
+# against the simulated desktop (see petronia.arch.funcs_simulated), with
+# 1 ms per OS call.  Reports the start-up time, the time to register a burst
+# of new windows, and the OS calls they took.
+
+import os
+import sys
+import threading
+import time
+
+# Must be set before the native functions are imported.
+os.environ['PETRONIA_ARCH'] = 'simulated'
+
+from ...arch import funcs_simulated
+from ...arch.simulated_desktop import SimulatedDesktop
+
+_CALL_TIME = 0.001
+_WINDOWS_PER_PROCESS = 3
+_BURST_SIZE = 10
+_TIMEOUT = 30.0
+
+
+def run(config_file, count):
+    from ...system.bus import SingleThreadedBus
+    from ...system.id_manager import IdManager
+    from ...system.registrar import Registrar
+    from ...system import event_ids, target_ids
+    from ...script.read_config import read_user_configuration
+    from ...script.script_logger import create_stdout_logger
+    from ...shell.native.windows_hook_event import WindowsHookEvent
+    from ...shell.native.window_mapper import WindowMapper
+
+    desktop = SimulatedDesktop(current_pid=os.getpid())
+    funcs_simulated.set_desktop(desktop)
+    for index in range(count):
+        desktop.create_window(
+            'App{0}'.format(index % 4), 'Window {0}'.format(index),
+            pid=2000 + index // _WINDOWS_PER_PROCESS, activate=False)
+    desktop.set_latency(_CALL_TIME)
+
+    config = read_user_configuration(config_file, create_stdout_logger())
+    bus = SingleThreadedBus()
+    id_manager = IdManager(bus)
+    registrar = Registrar(bus, id_manager, config)
+    config.register_components(registrar)
+
+    # The created event can be sent again for a window, so count the ids.
+    created = set()
+    burst_target = [None]
+    burst_done = threading.Event()
+
+    def on_created(event_id, target_id, obj):
+        created.add(target_id)
+        if burst_target[0] is not None and len(created) >= burst_target[0]:
+            burst_done.set()
+
+    # The bus only keeps weak references to the listeners.
+    listener = on_created
+    bus.add_listener(event_ids.WINDOW__CREATED, target_ids.ANY, listener)
+
+    start = time.perf_counter()
+    mapper = WindowMapper(bus, id_manager, config)
+    startup = time.perf_counter() - start
+    hooks = WindowsHookEvent(bus, config)
+    startup_calls = sum(desktop.call_counts.values())
+    startup_batches = list(desktop.batch_sizes)
+    startup_created = len(created)
+
+    burst_target[0] = startup_created + _BURST_SIZE
+    start = time.perf_counter()
+    for index in range(_BURST_SIZE):
+        desktop.create_window('Late', 'Late window {0}'.format(index), pid=3000, activate=False)
+    burst_done.wait(_TIMEOUT)
+    burst = time.perf_counter() - start
+
+    print("{0} windows: start-up {1:.3f} s, {2} tiled, {3} OS calls, position batch sizes {4}".format(
+        count, startup, startup_created, startup_calls, startup_batches))
+    print("{0} new windows: {1} tiled in {2:.3f} s, {3} OS calls in total".format(
+        _BURST_SIZE, len(created) - startup_created, burst, sum(desktop.call_counts.values())))
+    print("Most called: {0}".format(', '.join(
+        '{0} {1}'.format(name, calls) for name, calls in
+        sorted(desktop.call_counts.items(), key=lambda item: -item[1])[:5])))
+    return startup, burst, mapper, hooks
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Usage: python3 -m petronia.tests.perf.simulated_desktop CONFIG [window count]")
+        sys.exit(1)
+    run(sys.argv[1], len(sys.argv) > 2 and int(sys.argv[2]) or 30)
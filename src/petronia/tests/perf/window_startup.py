@@ -0,0 +1,76 @@
+
+# Usage: python3 -m petronia.tests.perf.window_startup [window count]
+#
+# Start-up window discovery against a simulated slow OS: each window takes
+# about ten calls of 1 ms each, windows from the same process share the
+# process lookups through the ProcessInfoCache, and one window is hung.
+# Compares reading the window details one at a time with the parallel
+# gather used by the WindowMapper.
+
+import sys
+import threading
+import time
+
+from ...util.parallel_gather import gather
+from ...util.process_cache import ProcessInfoCache
+
+# Seconds per simulated OS call.
+_CALL_TIME = 0.001
+_WINDOW_CALLS = 8
+_PROCESS_CALL_TIME = 0.005
+_WINDOWS_PER_PROCESS = 6
+_HUNG_WINDOW = 7
+_TIMEOUT = 0.5
+
+
+class SlowBackend(object):
+    def __init__(self):
+        self.hung = threading.Event()
+
+    @staticmethod
+    def username_domain(pid):
+        time.sleep(_PROCESS_CALL_TIME)
+        return 'user', 'domain'
+
+    @staticmethod
+    def executable_filename(pid):
+        time.sleep(_PROCESS_CALL_TIME)
+        return 'c:\\app{0}.exe'.format(pid)
+
+    def read_window(self, cache, hwnd):
+        if hwnd == _HUNG_WINDOW:
+            # Stands in for an application that stopped answering messages.
+            self.hung.wait(_TIMEOUT * 4)
+        for _ in range(_WINDOW_CALLS):
+            time.sleep(_CALL_TIME)
+        pid = hwnd // _WINDOWS_PER_PROCESS
+        cache.add_window(hwnd, pid)
+        return cache.get_username_domain(pid), cache.get_executable_filename(pid)
+
+
+def run(count):
+    backend = SlowBackend()
+    hwnds = list(range(count))
+
+    def new_cache():
+        return ProcessInfoCache(backend.username_domain, backend.executable_filename, lambda pid: True)
+
+    cache = new_cache()
+    start = time.perf_counter()
+    for hwnd in hwnds:
+        backend.read_window(cache, hwnd)
+    serial = time.perf_counter() - start
+
+    cache = new_cache()
+    start = time.perf_counter()
+    result = gather(hwnds, lambda hwnd: backend.read_window(cache, hwnd), item_timeout=_TIMEOUT)
+    parallel = time.perf_counter() - start
+    backend.hung.set()
+
+    print("{0} windows, 1 hung: serial {1:.3f} s, parallel {2:.3f} s ({3:.1f}x); {4} read, {5} timed out".format(
+        count, serial, parallel, serial / parallel, len(result.results), len(result.timed_out)))
+    return serial, parallel
+
+
+if __name__ == '__main__':
+    run(len(sys.argv) > 1 and int(sys.argv[1]) or 150)
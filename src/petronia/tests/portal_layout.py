@@ -0,0 +1,161 @@
+
+# Usage: python3 -m unittest petronia.tests.portal_layout
+
+import random
+import unittest
+
+from ..config import Config
+from ..config.application import ApplicationListConfig
+from ..system.id_manager import IdManager
+from ..system import event_ids, target_ids
+from ..shell.control.portal import Portal
+from .bus_recorder import BusRecorder, make_rect as _rect
+
+_WINDOW_NAMES = ('a', 'b', 'c', 'd', 'e')
+
+
+class PortalLazyLayoutTests(unittest.TestCase):
+    def setUp(self):
+        self.recorder = BusRecorder()
+        self.bus = self.recorder.bus
+        self.portal = self._create_portal(Config())
+        # window cid -> the rectangle the window is at.
+        self.window_rects = {}
+        # window cid -> (width, height) the window keeps, whatever size
+        # it's given.
+        self.fixed_sizes = {}
+        self.moved = []
+        self.shown = []
+        self.shown_stale = []
+        self.recorder.listen(event_ids.LAYOUT__SET_RECTANGLE, target_ids.ANY, self._on_set_rectangle)
+        self.recorder.listen(event_ids.ZORDER__SET_WINDOW_ON_TOP, target_ids.ANY, self._on_shown)
+        self.recorder.listen(event_ids.TELL_WINDOWS__FOCUS_WINDOW, target_ids.ANY, self._on_shown)
+        self._resize(0, 0, 100, 100)
+        for name in _WINDOW_NAMES:
+            self.bus.fire(event_ids.LAYOUT__ADD_WINDOW, 'portal-1', {
+                'window-cid': name, 'window-info': {'cid': name, 'hwnd': name},
+            })
+        self.bus.fire(event_ids.WINDOW__FOCUSED, 'c', {})
+        del self.moved[:]
+
+    def _create_portal(self, config):
+        return Portal('portal-1', self.bus, config, IdManager(self.bus), target_ids.TOP_LAYOUT)
+
+    def _on_set_rectangle(self, event_id, target_id, obj):
+        if target_id in _WINDOW_NAMES:
+            self.moved.append(target_id)
+            width, height = self.fixed_sizes.get(target_id, (obj['width'], obj['height']))
+            self.window_rects[target_id] = _rect(obj['x'], obj['y'], width, height)
+            # Reported like the window mapper does once the window moved.
+            positioned = dict(self.window_rects[target_id])
+            positioned['window-cid'] = target_id
+            self.bus.fire(event_ids.WINDOW__POSITIONED, target_id, positioned)
+
+    def _on_shown(self, event_id, target_id, obj):
+        self.shown.append(target_id)
+        if self.window_rects[target_id] != self.portal._get_window_rect():
+            self.shown_stale.append(target_id)
+
+    def _resize(self, x, y, width, height):
+        self.bus.fire(event_ids.LAYOUT__SET_RECTANGLE, 'portal-1', _rect(x, y, width, height))
+
+    def test_only_top_window_moves(self):
+        self._resize(0, 0, 200, 100)
+        self.assertEqual(self.moved, ['c'])
+
+        # The windows under it are moved as they come to the top.
+        self.bus.fire(event_ids.ZORDER__CHANGE_TOP_WINDOW, 'portal-1', {'direction': 'next'})
+        self.assertEqual(self.shown, ['d'])
+        self.assertEqual(self.moved, ['c', 'd'])
+        self.assertEqual(self.shown_stale, [])
+
+        # Shrinking the portal would leave the old windows sticking out from
+        # under the top window, so they all move.
+        del self.moved[:]
+        self._resize(0, 0, 50, 100)
+        self.assertEqual(sorted(self.moved), list(_WINDOW_NAMES))
+
+    def test_top_window_keeps_its_size(self):
+        # The top window doesn't fill the rectangle, so the windows under it
+        # are moved straight away.
+        self.fixed_sizes['c'] = (100, 100)
+        self._resize(0, 0, 200, 100)
+        self.assertEqual(sorted(self.moved), list(_WINDOW_NAMES))
+
+    def test_top_window_size_capped(self):
+        self._resize(0, 0, 200, 100)
+        self.assertEqual(self.moved, ['c'])
+        # The top window stopped growing, so the windows under it are moved
+        # as soon as that's reported.
+        del self.moved[:]
+        self.fixed_sizes['c'] = (250, 100)
+        self._resize(0, 0, 300, 100)
+        self.assertEqual(sorted(self.moved), list(_WINDOW_NAMES))
+
+    def test_top_window_not_resizable(self):
+        self.portal.close()
+        self.portal = self._create_portal(Config(applications=ApplicationListConfig([], default_is_resizable=False)))
+        self._resize(0, 0, 100, 100)
+        for name in _WINDOW_NAMES:
+            self.bus.fire(event_ids.LAYOUT__ADD_WINDOW, 'portal-1', {
+                'window-cid': name, 'window-info': {'cid': name, 'hwnd': name},
+            })
+        del self.moved[:]
+        self._resize(0, 0, 200, 100)
+        self.assertEqual(sorted(self.moved), list(_WINDOW_NAMES))
+
+    def test_idle_layout(self):
+        self._resize(0, 0, 200, 100)
+        # The single threaded bus leaves the idle tasks for the test to run.
+        while self.bus.idle_scheduler.run_slice() > 0:
+            pass
+        self.assertEqual(len(self.bus.idle_scheduler), 0)
+        for name in _WINDOW_NAMES:
+            self.assertEqual(self.window_rects[name], _rect(0, 0, 200, 100), name)
+
+    def test_random_operations(self):
+        rnd = random.Random(49)
+        windows = list(_WINDOW_NAMES)
+        for step in range(500):
+            action = rnd.random()
+            if action < 0.3:
+                self._resize(rnd.randint(0, 20), rnd.randint(0, 20), rnd.randint(50, 200), rnd.randint(50, 200))
+            elif action < 0.5:
+                self.bus.fire(event_ids.ZORDER__CHANGE_TOP_WINDOW, 'portal-1', {
+                    'direction': rnd.choice(('next', 'previous'))})
+            elif action < 0.65 and len(windows) > 0:
+                self.bus.fire(event_ids.WINDOW__FLASHING, rnd.choice(windows), {})
+                self.bus.fire(event_ids.FOCUS__SWITCH_TO_LAST_FLASHING_WINDOW, target_ids.BROADCAST, {})
+            elif action < 0.75:
+                self.bus.fire(event_ids.FOCUS__SET_FIRST_WINDOW_FOCUSED, 'portal-1', {})
+            elif action < 0.85 and len(windows) > 1:
+                name = rnd.choice(windows)
+                windows.remove(name)
+                self.bus.fire(event_ids.WINDOW__CLOSED, name, {})
+            elif action < 0.93:
+                name = rnd.choice(_WINDOW_NAMES)
+                if name not in windows:
+                    windows.append(name)
+                self.bus.fire(event_ids.LAYOUT__ADD_WINDOW, 'portal-1', {
+                    'window-cid': name, 'window-info': {'cid': name, 'hwnd': name},
+                })
+            else:
+                self.bus.idle_scheduler.run_slice()
+            # The top window is always at the current position, and the
+            # others are hidden under it.
+            current = self.portal._get_window_rect()
+            top = self.portal._get_active_hwnd()
+            self.assertEqual(self.window_rects[top], current, step)
+            for name in windows:
+                rect = self.window_rects[name]
+                self.assertTrue(
+                    current['x'] <= rect['x'] and current['y'] <= rect['y'] and
+                    rect['x'] + rect['width'] <= current['x'] + current['width'] and
+                    rect['y'] + rect['height'] <= current['y'] + current['height'], (step, name))
+        self.assertGreater(len(self.shown), 0)
+        # A window is never brought up at an old position.
+        self.assertEqual(self.shown_stale, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
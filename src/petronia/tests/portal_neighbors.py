@@ -0,0 +1,129 @@
+
+# Usage: python3 -m unittest petronia.tests.portal_neighbors
+
+import unittest
+
+from ..config import Config
+from ..system import event_ids, target_ids
+from ..shell.control.active_portal_manager import ActivePortalManager
+from ..shell.control.portal import PORTAL_CATEGORY
+from ..util.portal_neighbors import PortalNeighborIndex, format_table
+from .bus_recorder import BusRecorder, make_rect as _rect
+
+
+class PortalNeighborIndexTests(unittest.TestCase):
+    def setUp(self):
+        # Two monitors; the left one has a tall portal and two stacked
+        # portals, the right one has two stacked portals, offset.
+        #   +---+---+-------+
+        #   |   | b |   d   |
+        #   | a +---+-------+
+        #   |   | c |   e   |
+        #   +---+---+-------+
+        self.index = PortalNeighborIndex()
+        self.index.set_rect('a', _rect(0, 0, 500, 1000))
+        self.index.set_rect('b', _rect(500, 0, 500, 500))
+        self.index.set_rect('c', _rect(500, 500, 500, 500))
+        self.index.set_rect('d', _rect(1000, 0, 1000, 400))
+        self.index.set_rect('e', _rect(1000, 400, 1000, 600))
+
+    def test_compass(self):
+        self.assertEqual(self.index.neighbor('b', 'south'), 'c')
+        self.assertEqual(self.index.neighbor('c', 'north'), 'b')
+        self.assertIsNone(self.index.neighbor('b', 'north'))
+        self.assertEqual(self.index.neighbor('b', 'west'), 'a')
+        self.assertIsNone(self.index.neighbor('a', 'west'))
+        # Across the monitors; the larger overlap wins.
+        self.assertEqual(self.index.neighbor('b', 'east'), 'd')
+        self.assertEqual(self.index.neighbor('c', 'east'), 'e')
+        self.assertEqual(self.index.neighbor('e', 'west'), 'c')
+        self.assertIsNone(self.index.neighbor('unknown', 'east'))
+
+    def test_most_recently_used(self):
+        # Both b and c are next to a, with the same overlap.
+        self.assertEqual(self.index.neighbor('a', 'east'), 'b')
+        self.index.touch('c')
+        self.assertEqual(self.index.neighbor('a', 'east'), 'c')
+        self.index.touch('b')
+        self.assertEqual(self.index.neighbor('a', 'east'), 'b')
+
+    def test_next_previous(self):
+        self.assertEqual(self.index.neighbor('a', 'next'), 'b')
+        self.assertEqual(self.index.neighbor('e', 'next'), 'a')
+        self.assertEqual(self.index.neighbor('a', 'previous'), 'e')
+
+    def test_table(self):
+        table = self.index.table
+        self.assertEqual(sorted(table.keys()), ['a', 'b', 'c', 'd', 'e'])
+        self.assertEqual(table['c'], {
+            'north': 'b', 'east': 'e', 'south': None, 'west': 'a', 'next': 'd', 'previous': 'b',
+        })
+        self.assertEqual(table['a']['east'], 'b')
+        # Using a portal changes the ties it's in, without a rebuild.
+        self.index.touch('c')
+        self.assertEqual(self.index.table['a']['east'], 'c')
+        self.assertEqual(format_table(self.index.table, {'c': ['main']})[2],
+                         'c (main): north=b east=e south=- west=a next=d previous=b')
+
+    def test_layout_change(self):
+        self.assertEqual(self.index.neighbor('b', 'south'), 'c')
+        self.index.remove('c')
+        self.assertIsNone(self.index.neighbor('b', 'south'))
+        self.assertEqual(self.index.neighbor('a', 'east'), 'b')
+        self.index.set_rect('b', _rect(500, 0, 500, 1000))
+        self.assertEqual(self.index.neighbor('e', 'west'), 'b')
+        self.assertEqual(self.index.neighbor('b', 'next'), 'd')
+
+    def test_known_rectangles(self):
+        self.index.build_table()
+        self.assertEqual((self.index.hits, self.index.misses), (0, 1))
+        # The tiles are created again for the same monitors, with new cids.
+        for name in 'abcde':
+            self.index.remove(name)
+        self.index.set_rect('a2', _rect(0, 0, 500, 1000))
+        self.index.set_rect('b2', _rect(500, 0, 500, 500))
+        self.index.set_rect('c2', _rect(500, 500, 500, 500))
+        self.index.set_rect('d2', _rect(1000, 0, 1000, 400))
+        self.index.set_rect('e2', _rect(1000, 400, 1000, 600))
+        self.index.touch('c2')
+        self.assertEqual(self.index.table['c2'], {
+            'north': 'b2', 'east': 'e2', 'south': None, 'west': 'a2', 'next': 'd2', 'previous': 'b2',
+        })
+        self.assertEqual(self.index.neighbor('a2', 'east'), 'c2')
+        self.assertEqual((self.index.hits, self.index.misses), (1, 1))
+
+
+class ActivePortalManagerNavigationTests(unittest.TestCase):
+    def setUp(self):
+        self.recorder = BusRecorder()
+        self.bus = self.recorder.bus
+        self.manager = ActivePortalManager(self.bus, Config())
+        self.activated = self.recorder.record(event_ids.PORTAL__SET_ACTIVE)
+        self.negotiations = self.recorder.record(event_ids.DIRECTION_NEGOTIATION__BEGIN)
+        for cid, rect in (('left', _rect(0, 0, 500, 500)), ('right', _rect(500, 0, 500, 500))):
+            self.bus.fire(event_ids.REGISTRAR__OBJECT_REGISTERED, cid, {'category': PORTAL_CATEGORY, 'cid': cid})
+            self.bus.fire(event_ids.LAYOUT__SET_RECTANGLE, cid, rect)
+        self.bus.fire(event_ids.PORTAL__ACTIVATED, 'left', {'portal-cid': 'left'})
+        del self.activated[:]
+
+    def test_focus_move(self):
+        self.bus.fire(event_ids.FOCUS__MOVE, target_ids.ACTIVE_PORTAL_MANAGER, {'direction': 'east'})
+        self.assertEqual(self.activated, ['right'])
+        # Nothing to the north; the focus stays.
+        self.bus.fire(event_ids.FOCUS__MOVE, target_ids.ACTIVE_PORTAL_MANAGER, {'direction': 'north'})
+        self.assertEqual(self.activated, ['right'])
+        self.assertEqual(self.negotiations, [])
+
+        # The parent direction still goes through the layouts.
+        self.bus.fire(event_ids.FOCUS__MOVE, target_ids.ACTIVE_PORTAL_MANAGER, {'direction': 'parent'})
+        self.assertEqual(self.negotiations, ['left'])
+
+    def test_show_navigation(self):
+        messages = self.recorder.record(event_ids.LOG__INFO, item=lambda t, o: o['message'])
+        self.bus.fire(event_ids.FOCUS__SHOW_NAVIGATION, target_ids.ACTIVE_PORTAL_MANAGER, {})
+        self.assertEqual(len(messages), 1)
+        self.assertIn('left: north=- east=right south=- west=- next=right previous=right', messages[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+
+# Usage: python3 -m unittest petronia.tests.portal_placement
+
+import random
+import re
+import unittest
+
+from ..config import Config, ApplicationListConfig, ApplicationPositionConfig, ApplicationChromeConfig, AppMatcher
+from ..system import event_ids, target_ids
+from ..shell.control.active_portal_manager import ActivePortalManager
+from ..shell.control.portal import PORTAL_CATEGORY
+from ..util.portal_placement import PortalPlacement
+from .bus_recorder import BusRecorder
+
+
+class PortalPlacementTests(unittest.TestCase):
+    def test_preference_order(self):
+        apps = ApplicationListConfig([
+            ApplicationChromeConfig(has_title=False, app_matchers=[AppMatcher(class_name='Notepad')]),
+            ApplicationPositionConfig(['editor', re.compile('side.*')], [AppMatcher(class_name='Notepad')]),
+            ApplicationPositionConfig(['main'], [AppMatcher(exec_path='notepad.exe'), AppMatcher(title_re='x')]),
+        ])
+        placement = PortalPlacement(apps.get_portal_rules())
+        notepad = {'class': 'Notepad', 'exec_filename': 'c:\\notepad.exe'}
+        other = {'class': 'Edit', 'exec_filename': 'c:\\notepad.exe'}
+        self.assertIsNone(placement.get_portal_cid(notepad))
+
+        placement.set_alias('main', 'portal-1')
+        self.assertEqual(placement.get_portal_cid(notepad), 'portal-1')
+        placement.set_alias('side 2', 'portal-2')
+        placement.set_alias('side 1', 'portal-3')
+        self.assertEqual(placement.get_portal_cid(notepad), 'portal-2')
+        self.assertEqual(placement.get_portal_cid(other), 'portal-1')
+        placement.set_alias('editor', 'portal-4')
+        self.assertEqual(placement.get_portal_cid(notepad), 'portal-4')
+
+        # Moving an alias moves the windows placed by it.
+        placement.set_alias('editor', 'portal-5')
+        self.assertEqual(placement.get_portal_cid(notepad), 'portal-5')
+        placement.remove_portal('portal-5')
+        self.assertEqual(placement.get_portal_cid(notepad), 'portal-2')
+        placement.remove_portal('portal-2')
+        self.assertEqual(placement.get_portal_cid(notepad), 'portal-3')
+        placement.remove_portal('portal-3')
+        placement.remove_portal('portal-1')
+        self.assertIsNone(placement.get_portal_cid(notepad))
+        self.assertIsNone(placement.get_portal_cid(other))
+
+    def test_same_as_config(self):
+        # Random alias changes, compared with get_best_portal_match.
+        rnd = random.Random(99)
+        names = ['Notepad', 'Code', 'cmd', 'Chrome']
+        configs = []
+        for _ in range(12):
+            portals = rnd.sample(['main', 'side', re.compile('side.*'), re.compile('.*2'), 'editor', 'term'],
+                                 rnd.randint(1, 3))
+            matchers = [AppMatcher(class_name=rnd.choice(names), match_returns=rnd.random() > 0.2)
+                        for _ in range(rnd.randint(1, 2))]
+            configs.append(ApplicationPositionConfig(portals, matchers))
+        apps = ApplicationListConfig(configs)
+        placement = PortalPlacement(apps.get_portal_rules(), memo_size=3)
+        aliases = {}
+        alias_names = ['main', 'side 1', 'side 2', 'editor', 'term', 'main2']
+        for step in range(300):
+            action = rnd.random()
+            if action < 0.5:
+                alias = rnd.choice(alias_names)
+                cid = 'portal-{0}'.format(rnd.randint(1, 5))
+                aliases[alias] = cid
+                placement.set_alias(alias, cid)
+            elif action < 0.7:
+                cid = 'portal-{0}'.format(rnd.randint(1, 5))
+                for alias in [a for a, c in aliases.items() if c == cid]:
+                    del aliases[alias]
+                placement.remove_portal(cid)
+            for name in names:
+                info = {'class': name}
+                expected = aliases.get(apps.get_best_portal_match(list(aliases.keys()), info))
+                self.assertEqual(placement.get_portal_cid(info), expected, (step, name))
+
+
+class ActivePortalManagerPlacementTests(unittest.TestCase):
+    def setUp(self):
+        self.recorder = BusRecorder()
+        self.bus = self.recorder.bus
+        config = Config(applications=ApplicationListConfig([
+            ApplicationPositionConfig(['editor'], [AppMatcher(class_name='Notepad')]),
+        ]))
+        self.manager = ActivePortalManager(self.bus, config)
+        self.added = self.recorder.record(event_ids.LAYOUT__ADD_WINDOW)
+
+    def _create_portal(self, cid, alias):
+        self.bus.fire(event_ids.PORTAL__CREATE_ALIAS, target_ids.ACTIVE_PORTAL_MANAGER, {
+            'alias': alias, 'portal-cid': cid,
+        })
+        self.bus.fire(event_ids.REGISTRAR__OBJECT_REGISTERED, cid, {'category': PORTAL_CATEGORY, 'cid': cid})
+
+    def _create_window(self, class_name):
+        self.bus.fire(event_ids.WINDOW__CREATED, 'hwnd-1', {'window-info': {'class': class_name}})
+
+    def test_layout_aliases(self):
+        self._create_portal('portal-1', 'main')
+        self._create_portal('portal-2', 'editor')
+        self._create_window('Notepad')
+        self._create_window('Other')
+        self.assertEqual(self.added, ['portal-2', 'portal-1'])
+
+        # A layout switch replaces the portals.
+        self.bus.fire(event_ids.REGISTRAR__OBJECT_REMOVED, 'portal-2', {})
+        self._create_window('Notepad')
+        self._create_portal('portal-3', 'editor')
+        self._create_window('Notepad')
+        self.assertEqual(self.added, ['portal-2', 'portal-1', 'portal-1', 'portal-3'])
+
+
+if __name__ == '__main__':
+    unittest.main()
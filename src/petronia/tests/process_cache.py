@@ -0,0 +1,100 @@
+
+# Usage: python3 -m unittest petronia.tests.process_cache
+
+import ctypes
+import unittest
+
+from ..util.process_cache import ProcessInfoCache
+
+
+class ProcessInfoCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.processes = FakeProcesses()
+        self.cache = ProcessInfoCache(
+            self.processes.get_username_domain, self.processes.get_executable_filename,
+            self.processes.is_alive, clock=lambda: self.now, check_interval=10.0)
+
+    def test_one_lookup_per_process(self):
+        self.processes.add(100, ('me', 'home'), 'c:\\app.exe')
+        for hwnd in range(1, 21):
+            self.cache.add_window(hwnd, 100)
+            self.assertEqual(self.cache.get_username_domain(100), ('me', 'home'))
+            self.assertEqual(self.cache.get_executable_filename(100), 'c:\\app.exe')
+        self.assertEqual(self.processes.lookups, 2)
+        self.assertEqual(self.cache.misses, 2)
+        self.assertEqual(self.cache.hits, 38)
+
+    def test_native_pid(self):
+        # The native functions return the pid as a c_ulong.
+        self.processes.add(100, ('me', 'home'), 'c:\\app.exe')
+        self.cache.get_username_domain(ctypes.c_ulong(100))
+        self.cache.get_username_domain(ctypes.c_ulong(100))
+        self.assertTrue(100 in self.cache)
+        self.assertEqual(self.processes.lookups, 1)
+
+    def test_errors_cached(self):
+        self.processes.add(100, None, None)
+        for i in range(2):
+            with self.assertRaises(OSError):
+                self.cache.get_username_domain(100)
+        self.assertEqual(self.processes.lookups, 1)
+
+    def test_last_window_destroyed(self):
+        self.processes.add(100, ('me', 'home'), 'c:\\app.exe')
+        self.cache.add_window(1, 100)
+        self.cache.add_window(2, 100)
+        self.cache.get_username_domain(100)
+        self.cache.remove_window(1)
+        self.assertTrue(100 in self.cache)
+        self.cache.remove_window(2)
+        self.assertFalse(100 in self.cache)
+
+        # The pid is reused by a different process.
+        self.processes.add(100, ('other', 'home'), 'c:\\other.exe')
+        self.cache.add_window(3, 100)
+        self.assertEqual(self.cache.get_username_domain(100), ('other', 'home'))
+
+    def test_dead_process_check(self):
+        self.processes.add(100, ('me', 'home'), 'c:\\app.exe')
+        self.processes.add(200, ('me', 'home'), 'c:\\app.exe')
+        self.cache.get_username_domain(100)
+        self.cache.get_username_domain(200)
+        self.processes.kill(100)
+        # Not time yet.
+        self.now = 5.0
+        self.assertEqual(self.cache.check_processes(), 0)
+        self.now = 11.0
+        self.assertEqual(self.cache.check_processes(), 1)
+        self.assertFalse(100 in self.cache)
+        self.assertTrue(200 in self.cache)
+        self.assertEqual(len(self.cache), 1)
+
+
+class FakeProcesses(object):
+    """Stands in for the native process functions."""
+    def __init__(self):
+        self.processes = {}
+        self.lookups = 0
+
+    def add(self, pid, username_domain, executable_filename):
+        self.processes[pid] = (username_domain, executable_filename)
+
+    def kill(self, pid):
+        del self.processes[pid]
+
+    def get_username_domain(self, pid):
+        return self._get(pid, 0)
+
+    def get_executable_filename(self, pid):
+        return self._get(pid, 1)
+
+    def is_alive(self, pid):
+        return pid in self.processes
+
+    def _get(self, pid, index):
+        self.lookups += 1
+        pid = getattr(pid, 'value', pid)
+        if pid not in self.processes or self.processes[pid][index] is None:
+            raise OSError("access denied")
+        return self.processes[pid][index]
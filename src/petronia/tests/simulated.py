@@ -0,0 +1,26 @@
+
+# Shared by the tests which load the native functions.  They only run
+# against the simulated desktop; unless PETRONIA_ARCH is already
+# "simulated", they run again in a new process that sets it.
+
+import os
+import subprocess
+import sys
+
+SIMULATED = os.environ.get('PETRONIA_ARCH', '').strip().lower() == 'simulated'
+
+
+def run_simulated(test_case, module_name):
+    """
+    Run the test module in a new process against the simulated desktop.
+    """
+    env = dict(os.environ)
+    env['PETRONIA_ARCH'] = 'simulated'
+    env['PYTHONPATH'] = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    proc = subprocess.run(
+        [sys.executable, '-m', 'unittest', module_name],
+        env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    output = proc.stdout.decode()
+    test_case.assertEqual(proc.returncode, 0, output)
+    # Only the test that started the process is skipped there.
+    test_case.assertIn('OK (skipped=1)', output)
@@ -0,0 +1,254 @@
+
+# Usage: python3 -m unittest petronia.tests.simulated_desktop
+
+import os
+import subprocess
+import sys
+import threading
+import unittest
+
+from ..arch import simulated_desktop
+from ..arch.simulated_desktop import SimulatedDesktop, SHELL_HOOK_MESSAGE_ID, SHELLHOOKINFO
+from ..arch import funcs_simulated
+from ..arch.windows_constants import SHELL__CANCEL_CALLBACK_CHAIN, WM_PAINT, WM_TIMER
+
+
+class SimulatedDesktopTests(unittest.TestCase):
+    def setUp(self):
+        self.sleeps = []
+        self.desktop = SimulatedDesktop(monitors=[(0, 0, 1920, 1080), (1920, 0, 1280, 1024)],
+                                        sleep=self.sleeps.append)
+
+    def test_windows(self):
+        d = self.desktop
+        hwnd = d.create_window('Notepad', 'Untitled', pid=2000, rect=(10, 20, 300, 200))
+        self.assertEqual(d.window__find_handles(), [hwnd])
+        self.assertEqual(d.window__get_class_name(hwnd), 'Notepad')
+        self.assertEqual(d.window__get_title(hwnd), 'Untitled')
+        self.assertEqual(d.window__get_process_id(hwnd).value, 2000)
+        self.assertEqual(d.process__get_executable_filename(2000), 'c:\\apps\\app2000.exe')
+        self.assertTrue(d.window__is_visible(hwnd))
+        self.assertTrue(d.window__get_style(hwnd)['size-border'])
+        rect = d.window__border_rectangle(hwnd)
+        self.assertEqual((rect['x'], rect['y'], rect['right'], rect['bottom']), (10, 20, 310, 220))
+        self.assertEqual(d.window__get_visibility_states(hwnd), ['shown', 'restored', 'active'])
+
+        d.destroy_window(hwnd)
+        self.assertEqual(d.window__find_handles(), [])
+        self.assertEqual(d.window__get_visibility_states(hwnd), [])
+        with self.assertRaises(OSError):
+            d.window__border_rectangle(hwnd)
+        self.assertFalse(d.window__set_position(hwnd, None, 0, 0, 10, 10, []))
+
+    def test_focus_and_z_order(self):
+        d = self.desktop
+        first = d.create_window('A', 'a')
+        second = d.create_window('B', 'b')
+        self.assertEqual(d.z_order, [second, first])
+        self.assertEqual(d.window__get_active_window(), second)
+        on_top = d.create_window('C', 'c', style=simulated_desktop.DEFAULT_WINDOW_STYLE | {'topmost'},
+                                 activate=False)
+        self.assertEqual(d.z_order, [on_top, second, first])
+
+        d.click(first)
+        self.assertEqual(d.z_order, [on_top, first, second])
+        self.assertEqual(d.active_window, first)
+
+        # The next window in the z-order gets the focus.
+        d.window__minimize(first)
+        self.assertEqual(d.active_window, on_top)
+        self.assertEqual(d.window__border_rectangle(first)['x'], -32000)
+        d.window__restore(first)
+        self.assertEqual(d.window__border_rectangle(first)['x'], 100)
+
+        d.window__maximize(first)
+        self.assertEqual(d.window__get_visibility_states(first), ['shown', 'maximized', 'active'])
+        self.assertEqual(d.window__border_rectangle(first)['width'], 1920)
+
+    def test_set_position(self):
+        d = self.desktop
+        hwnd = d.create_window('A', 'a', min_size=(200, 100))
+        fixed = d.create_window('B', 'b', rect=(0, 0, 50, 50), resizable=False)
+        self.assertTrue(d.window__set_position(hwnd, None, 5, 6, 100, 400, ['no-zorder']))
+        self.assertEqual(d.window(hwnd).rect, {'x': 5, 'y': 6, 'width': 200, 'height': 400})
+        d.window__set_position(fixed, None, 5, 6, 100, 400, [])
+        self.assertEqual(d.window(fixed).rect, {'x': 5, 'y': 6, 'width': 50, 'height': 50})
+        d.window__set_position(hwnd, None, 7, 8, 0, 0, ['no-size'])
+        self.assertEqual(d.window(hwnd).rect, {'x': 7, 'y': 8, 'width': 200, 'height': 400})
+
+        batch = d.window__begin_batch()
+        batch.add(hwnd, None, 0, 0, 300, 300, ())
+        batch.add(fixed, 'topmost', 300, 0, 300, 300, ())
+        self.assertEqual(batch.commit(), [True, True])
+        self.assertEqual(d.batch_sizes, [2])
+        self.assertEqual(d.z_order[0], fixed)
+
+    def test_shell_hook_messages(self):
+        d = self.desktop
+        messages = []
+
+        def shell_callback(hwnd, message, wparam, lparam):
+            if wparam == simulated_desktop.HSHELL_GETMINRECT:
+                lparam = SHELLHOOKINFO.from_address(lparam).hwnd
+            messages.append((wparam, lparam))
+            return 0
+
+        # Like the native function, the hook is only added to a non-empty dict.
+        callbacks = {WM_PAINT: lambda hwnd, message, wparam, lparam: 0}
+        handler = d.shell__create_global_message_handler(callbacks)
+        hook_hwnd = d.window__create_message_window("Hooks", handler)
+        self.assertEqual(d.shell__register_window_hook(hook_hwnd, callbacks, shell_callback), SHELL_HOOK_MESSAGE_ID)
+        self.assertFalse(d.window__is_visible(hook_hwnd))
+
+        hwnd = d.create_window('A', 'a')
+        d.set_title(hwnd, 'b')
+        d.flash(hwnd)
+        d.window__minimize(hwnd)
+        d.destroy_window(hwnd)
+        # Nothing is delivered until the thread handles its messages.
+        self.assertEqual(messages, [])
+        self.assertEqual(d.dispatch_messages(), 6)
+        self.assertEqual(messages, [
+            (simulated_desktop.HSHELL_WINDOWCREATED, hwnd),
+            (simulated_desktop.HSHELL_WINDOWACTIVATED, hwnd),
+            (simulated_desktop.HSHELL_REDRAW, hwnd),
+            (simulated_desktop.HSHELL_FLASH, hwnd),
+            (simulated_desktop.HSHELL_GETMINRECT, hwnd),
+            (simulated_desktop.HSHELL_WINDOWDESTROYED, hwnd),
+        ])
+
+    def test_timers(self):
+        d = self.desktop
+        timers = []
+        callbacks = {WM_TIMER: lambda hwnd, message, wparam, lparam: timers.append((hwnd, wparam))}
+        hwnd = d.window__create_message_window("Hooks", d.shell__create_global_message_handler(callbacks))
+        d.window__set_timer(hwnd, 1, 50)
+        d.window__set_timer(hwnd, 2, 100)
+        self.assertEqual(d.fire_timers(), 2)
+        self.assertTrue(d.window__kill_timer(hwnd, 2))
+        self.assertFalse(d.window__kill_timer(hwnd, 2))
+        self.assertEqual(d.fire_timers(), 1)
+        self.assertEqual(d.dispatch_messages(), 3)
+        self.assertEqual(sorted(timers), [(hwnd, 1), (hwnd, 1), (hwnd, 2)])
+        d.destroy_window(hwnd)
+        self.assertEqual(d.fire_timers(), 0)
+
+    def test_message_pump(self):
+        d = self.desktop
+        painted = threading.Event()
+        exited = threading.Event()
+        hwnds = []
+
+        def pump():
+            callbacks = {WM_PAINT: lambda hwnd, message, wparam, lparam: painted.set()}
+            hwnds.append(d.window__create_display_window(
+                "Display", "title", d.shell__create_global_message_handler(callbacks), {'border'}))
+            d.shell__pump_messages(exited.set)
+
+        thread = threading.Thread(target=pump, daemon=True)
+        thread.start()
+        self.assertTrue(painted.wait(5))
+        d.window__close(hwnds[0])
+        self.assertTrue(exited.wait(5))
+        thread.join(5)
+        self.assertIsNone(d.window(hwnds[0]))
+
+    def test_keyboard_hooks(self):
+        d = self.desktop
+        seen = []
+
+        def first(vk_code, scan_code, is_key_up, is_injected):
+            seen.append(('first', vk_code, is_key_up, is_injected))
+
+        def second(vk_code, scan_code, is_key_up, is_injected):
+            seen.append(('second', vk_code, is_key_up, is_injected))
+            if vk_code == 0x41 and not is_key_up:
+                return SHELL__CANCEL_CALLBACK_CHAIN
+
+        d.shell__keyboard_hook(first)
+        hook = d.shell__keyboard_hook(second)
+        self.assertFalse(d.press_key(0x41))
+        self.assertTrue(d.shell__is_key_pressed(0x41))
+        self.assertTrue(d.press_key(0x41, True))
+        self.assertFalse(d.shell__is_key_pressed(0x41))
+        d.shell__inject_scancode(0x42, False)
+        self.assertEqual(seen, [
+            ('second', 0x41, False, False),
+            ('second', 0x41, True, False), ('first', 0x41, True, False),
+            ('second', 0x42, False, True), ('first', 0x42, False, True),
+        ])
+        d.shell__unhook(hook)
+        self.assertTrue(d.tap_key(0x41))
+
+    def test_latency_and_failures(self):
+        d = self.desktop
+        hwnd = d.create_window('A', 'a')
+        hung = d.create_window('B', 'b')
+        d.set_latency(0.001)
+        d.set_latency(0.01, 'window__get_title')
+        d.hang_window(hung, 2.0)
+        d.call('window__get_class_name', (hwnd,), {})
+        d.call('window__get_title', (hwnd,), {})
+        d.call('window__get_title', (hung,), {})
+        self.assertEqual(self.sleeps, [0.001, 0.01, 2.01])
+
+        d.fail('window__border_rectangle', count=1, hwnd=hung)
+        d.fail('window__set_position', count=None, result=False)
+        d.call('window__border_rectangle', (hwnd,), {})
+        with self.assertRaises(OSError):
+            d.call('window__border_rectangle', (hung,), {})
+        d.call('window__border_rectangle', (hung,), {})
+        for i in range(3):
+            self.assertFalse(d.call('window__set_position', (hwnd, None, 0, 0, 1, 1, []), {}))
+        d.clear_failures()
+        self.assertTrue(d.call('window__set_position', (hwnd, None, 0, 0, 1, 1, []), {}))
+        self.assertEqual(d.call_counts['window__set_position'], 4)
+
+    def test_failure_rate(self):
+        d = self.desktop
+        hwnd = d.create_window('A', 'a')
+        d.fail('window__get_title', count=None, rate=0.25, result="")
+        titles = [d.call('window__get_title', (hwnd,), {}) for _ in range(400)]
+        failed = titles.count("")
+        self.assertTrue(50 < failed < 150, failed)
+
+    def test_scenario(self):
+        d = self.desktop
+        funcs_simulated.load_scenario(d, {
+            'monitors': [[0, 0, 800, 600]],
+            'latency': 0.5,
+            'windows': [
+                {'class': 'A', 'title': 'a', 'pid': 10, 'rect': [1, 2, 3, 4]},
+                {'class': 'B', 'resizable': False},
+            ],
+        })
+        self.assertEqual(len(d.monitor__find_monitors()), 1)
+        self.assertEqual(d.monitor__find_monitors()[0]['right'], 800)
+        self.assertEqual(len(d.window__find_handles()), 2)
+        d.call('window__find_handles', (), {})
+        self.assertEqual(self.sleeps, [0.5])
+
+
+class SimulatedFuncsTests(unittest.TestCase):
+    def test_environment_selects_backend(self):
+        # Run in a new process, so this process keeps its own backend.
+        env = dict(os.environ)
+        env['PETRONIA_ARCH'] = 'simulated'
+        env['PYTHONPATH'] = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        out = subprocess.check_output([
+            sys.executable, '-c',
+            'from petronia.arch import funcs, funcs_simulated\n'
+            'd = funcs_simulated.get_desktop()\n'
+            'hwnd = d.create_window("A", "a")\n'
+            'print(funcs.window__find_handles() == [hwnd], funcs.window__get_title(hwnd))\n'
+        ], env=env)
+        self.assertEqual(out.decode().strip(), 'True a')
+
+    def test_all_native_functions(self):
+        desktop = SimulatedDesktop()
+        for name in funcs_simulated.NATIVE_FUNCTIONS:
+            self.assertTrue(callable(getattr(desktop, name)), name)
+
+
+if __name__ == '__main__':
+    unittest.main()
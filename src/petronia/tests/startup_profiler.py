@@ -0,0 +1,76 @@
+
+# Usage: python3 -m unittest petronia.tests.startup_profiler
+
+import unittest
+
+from ..config import Config
+from ..system import event_ids, target_ids
+from ..system.extensions.lazy_factory import LazyFactory
+from ..system.startup_profiler import StartupProfiler, NULL_PROFILER, get_startup_profiler
+from .bus_recorder import BusRecorder
+
+
+class StartupProfilerTests(unittest.TestCase):
+    def setUp(self):
+        self.now = 10.0
+        self.reports = []
+        self.profiler = StartupProfiler(clock=lambda: self.now, out=self.reports.append)
+
+    def test_report(self):
+        self.profiler.import_started('outer')
+        self.now += 0.002
+        self.profiler.import_started('outer.inner')
+        self.now += 0.005
+        self.profiler.import_finished()
+        self.profiler.import_finished()
+        with self.profiler.measure('portal'):
+            self.now += 0.003
+        with self.profiler.measure_factory(LazyFactory('petronia.x:x_factory')):
+            self.now += 0.001
+        self.profiler.mark('setup complete')
+        self.profiler.report()
+
+        self.assertEqual(len(self.reports), 1)
+        self.assertEqual(self.reports[0].split('\n'), [
+            "===== Startup profile =====",
+            "      11.0 ms  setup complete",
+            "--- Component construction ---",
+            "       3.0 ms  portal",
+            "       1.0 ms  petronia.x:x_factory",
+            "--- Imports (cumulative / self) ---",
+            "       5.0 ms      5.0 ms  outer.inner",
+            "       7.0 ms      2.0 ms  outer",
+            "  (2 modules imported)",
+        ])
+
+        # Only the first report is written.
+        with self.profiler.measure('later'):
+            self.now += 1.0
+        self.profiler.report()
+        self.assertEqual(len(self.reports), 1)
+
+    def test_reported_after_first_window(self):
+        recorder = BusRecorder()
+        self.profiler.listen_for_first_window(recorder.bus)
+        self.profiler.setup_complete()
+        self.assertEqual(self.reports, [])
+        self.now += 0.5
+        recorder.bus.fire(event_ids.WINDOW__CREATED, target_ids.ANY, {})
+        self.assertEqual(len(self.reports), 1)
+        self.assertIn("     500.0 ms  first window", self.reports[0])
+
+    def test_reported_at_quit(self):
+        recorder = BusRecorder()
+        self.profiler.listen_for_first_window(recorder.bus)
+        recorder.bus.fire(event_ids.SYSTEM__QUIT, target_ids.BROADCAST, {})
+        self.assertEqual(len(self.reports), 1)
+
+    def test_config(self):
+        config = Config()
+        self.assertIs(get_startup_profiler(config), NULL_PROFILER)
+        config.init_options['startup-profiler'] = self.profiler
+        self.assertIs(get_startup_profiler(config), self.profiler)
+
+
+if __name__ == '__main__':
+    unittest.main()
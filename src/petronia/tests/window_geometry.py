@@ -0,0 +1,62 @@
+
+# Usage: python3 -m unittest petronia.tests.window_geometry
+
+import unittest
+
+from ..util.window_geometry import GeometryTracker, GeometryRequest
+
+_HWND = 1000
+
+
+class GeometryTrackerTests(unittest.TestCase):
+    def setUp(self):
+        self.tracker = GeometryTracker()
+        self.request = GeometryRequest(10, 20, 300, 400, v_snap='top', h_snap='left')
+        self.final = {'x': 10, 'y': 20, 'width': 300, 'height': 400, 'top': 20, 'left': 10}
+
+    def test_skip_repeated_request(self):
+        self.assertFalse(self.tracker.matches(_HWND, self.request))
+        self.tracker.set_applied(_HWND, self.request, self.final)
+        self.assertTrue(self.tracker.matches(_HWND, GeometryRequest(10, 20, 300, 400, False, 'top', 'left')))
+        self.assertFalse(self.tracker.matches(_HWND, GeometryRequest(10, 20, 300, 401, False, 'top', 'left')))
+        self.assertFalse(self.tracker.matches(_HWND, GeometryRequest(10, 20, 300, 400, False, 'center', 'left')))
+        self.assertEqual(self.tracker.applied, 1)
+        self.assertEqual(self.tracker.skipped, 1)
+
+    def test_from_event(self):
+        self.assertEqual(
+            GeometryRequest.from_event({
+                'x': '10', 'y': 20, 'width': 300, 'height': 400, 'v-snap': 'top', 'h-snap': 'left',
+            }),
+            self.request)
+
+    def test_external_move(self):
+        self.tracker.set_applied(_HWND, self.request, self.final)
+        self.tracker.observed(_HWND, dict(self.final))
+        self.assertTrue(self.tracker.matches(_HWND, self.request))
+        moved = dict(self.final)
+        moved['x'] = 50
+        self.tracker.observed(_HWND, moved)
+        self.assertFalse(self.tracker.matches(_HWND, self.request))
+
+    def test_failed_apply(self):
+        self.tracker.set_applied(_HWND, self.request, self.final)
+        self.tracker.set_applied(_HWND, self.request, None)
+        self.assertFalse(self.tracker.matches(_HWND, self.request))
+
+    def test_make_focused_after_focus_change(self):
+        request = GeometryRequest(10, 20, 300, 400, True)
+        self.tracker.set_applied(_HWND, request, self.final)
+        self.assertTrue(self.tracker.matches(_HWND, request))
+        # Another window may now be on top.
+        self.tracker.focus_changed()
+        self.assertFalse(self.tracker.matches(_HWND, request))
+        # ... which doesn't matter if the request doesn't change the z-order.
+        self.tracker.set_applied(_HWND, self.request, self.final)
+        self.tracker.focus_changed()
+        self.assertTrue(self.tracker.matches(_HWND, self.request))
+
+    def test_forget(self):
+        self.tracker.set_applied(_HWND, self.request, self.final)
+        self.tracker.forget(_HWND)
+        self.assertFalse(self.tracker.matches(_HWND, self.request))
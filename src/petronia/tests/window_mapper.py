@@ -0,0 +1,121 @@
+
+# Usage: python3 -m unittest petronia.tests.window_mapper
+#
+# The window mapper loads the native functions when it's imported, so these
+# tests run against the simulated desktop.
+
+import threading
+import unittest
+
+from .bus_recorder import BusRecorder, make_rect as _rect
+from .simulated import SIMULATED as _SIMULATED, run_simulated
+
+if _SIMULATED:
+    from ..arch import funcs_simulated
+    from ..arch.simulated_desktop import SimulatedDesktop
+    from ..config import Config
+    from ..system.id_manager import IdManager
+    from ..system import event_ids, target_ids
+    from ..shell.control.portal import Portal
+    from ..shell.native.window_mapper import WindowMapper
+
+    class ShowRecordingDesktop(SimulatedDesktop):
+        """Records where each window is when it's brought to the front."""
+        def __init__(self):
+            SimulatedDesktop.__init__(self)
+            self.shown = []
+
+        def window__activate(self, hwnd):
+            window = self.window(hwnd)
+            if window is not None:
+                self.shown.append((hwnd, dict(window.rect)))
+            return SimulatedDesktop.window__activate(self, hwnd)
+
+
+@unittest.skipUnless(_SIMULATED, "needs the simulated desktop")
+class PortalWindowMapperTests(unittest.TestCase):
+    def setUp(self):
+        self.desktop = ShowRecordingDesktop()
+        funcs_simulated.set_desktop(self.desktop)
+        for name in ('a', 'b', 'c'):
+            self.desktop.create_window('App', name, rect=(500, 500, 50, 50))
+        self.recorder = BusRecorder()
+        self.bus = self.recorder.bus
+        id_manager = IdManager(self.bus)
+        self.created = self.recorder.record(event_ids.WINDOW__CREATED, item=lambda t, o: {
+            'window-cid': o['window-cid'], 'window-info': o['window-info']})
+        self.mapper = WindowMapper(self.bus, id_manager, Config())
+        self.portal = Portal('portal-1', self.bus, Config(), id_manager, target_ids.TOP_LAYOUT)
+        self.bus.fire(event_ids.LAYOUT__SET_RECTANGLE, 'portal-1', _rect(0, 0, 400, 300))
+        for event_obj in self.created:
+            self.bus.fire(event_ids.LAYOUT__ADD_WINDOW, 'portal-1', event_obj)
+        self.bus.fire(event_ids.FOCUS__SET_FIRST_WINDOW_FOCUSED, 'portal-1', {})
+        del self.desktop.shown[:]
+
+    def tearDown(self):
+        self.mapper.close()
+
+    def test_stale_window_moved_before_shown(self):
+        self.bus.fire(event_ids.LAYOUT__SET_RECTANGLE, 'portal-1', _rect(0, 0, 800, 600))
+        window_rect = _rect(**self.portal._get_window_rect())
+        top_hwnd = self.portal._get_active_hwnd()
+        hidden = [o['window-info']['hwnd'] for o in self.created if o['window-info']['hwnd'] != top_hwnd]
+        # Only the top window moved.
+        self.assertEqual(self.desktop.window(top_hwnd).rect, window_rect)
+        self.assertNotEqual(self.desktop.window(hidden[0]).rect, window_rect)
+
+        for _ in hidden:
+            self.bus.fire(event_ids.ZORDER__CHANGE_TOP_WINDOW, 'portal-1', {'direction': 'next'})
+        self.bus.fire(event_ids.FOCUS__SET_FIRST_WINDOW_FOCUSED, 'portal-1', {})
+        self.assertEqual(len(self.desktop.shown), len(hidden) + 1)
+        for hwnd, rect in self.desktop.shown:
+            self.assertEqual(rect, window_rect, hwnd)
+
+    def test_top_window_keeps_its_size(self):
+        top_hwnd = self.portal._get_active_hwnd()
+        self.desktop.window(top_hwnd).resizable = False
+        self.bus.fire(event_ids.LAYOUT__SET_RECTANGLE, 'portal-1', _rect(0, 0, 800, 600))
+        # The windows under it aren't covered, so they move too.
+        window_rect = _rect(**self.portal._get_window_rect())
+        for event_obj in self.created:
+            hwnd = event_obj['window-info']['hwnd']
+            if hwnd != top_hwnd:
+                self.assertEqual(self.desktop.window(hwnd).rect, window_rect, hwnd)
+
+    def test_rectangle_with_focus_request(self):
+        # The move may not have reached the window mapper yet, as it's sent
+        # in another event lane.
+        window_cid = self.created[1]['window-cid']
+        hwnd = self.created[1]['window-info']['hwnd']
+        self.bus.fire(event_ids.TELL_WINDOWS__FOCUS_WINDOW, window_cid, {
+            'window-rect': _rect(10, 20, 300, 200),
+        })
+        self.assertEqual(self.desktop.shown, [(hwnd, _rect(10, 20, 300, 200))])
+
+    def test_moved_while_bus_busy(self):
+        # The bus doesn't go idle until the outer event finishes, so the
+        # window is moved after the delay instead.
+        positioned = threading.Event()
+        self.recorder.listen(event_ids.WINDOW__POSITIONED, target_ids.ANY, lambda e, t, o: positioned.set())
+        waited = []
+
+        # noinspection PyUnusedLocal
+        def busy(e, t, o):
+            self.bus.fire(event_ids.LAYOUT__SET_RECTANGLE, 'portal-1', _rect(0, 0, 800, 600))
+            waited.append(positioned.wait(5.0))
+
+        self.recorder.listen(event_ids.WINDOW__REDRAW, 'busy', busy)
+        self.bus.fire(event_ids.WINDOW__REDRAW, 'busy', {})
+        self.assertEqual(waited, [True])
+        top_hwnd = self.portal._get_active_hwnd()
+        self.assertEqual(self.desktop.window(top_hwnd).rect, _rect(**self.portal._get_window_rect()))
+
+
+@unittest.skipIf(_SIMULATED, "already running against the simulated desktop")
+class SimulatedProcessTests(unittest.TestCase):
+    def test_in_simulated_process(self):
+        run_simulated(self, __name__)
+
+
+if __name__ == '__main__':
+    unittest.main()
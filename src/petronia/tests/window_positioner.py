@@ -0,0 +1,194 @@
+
+# Usage: python3 -m unittest petronia.tests.window_positioner
+
+import unittest
+
+from ..system.component import Component
+from ..system import event_ids, target_ids
+from ..arch.position_batch import PositionBatchRecorder
+from ..util.window_geometry import GeometryRequest
+from ..util.window_positioner import WindowPositioner
+from .bus_recorder import BusRecorder, make_rect as _rect
+
+
+class WindowPositionerTests(unittest.TestCase):
+    def setUp(self):
+        self.recorder = PositionBatchRecorder()
+        # hwnd -> size the window takes, if it doesn't take the requested one.
+        self.fixed_sizes = {}
+        self.closed = set()
+        self.positioner = WindowPositioner(self.recorder.begin_batch, self.get_border)
+
+    def get_border(self, hwnd):
+        if hwnd in self.closed:
+            raise OSError("window closed")
+        for entry in reversed([e for batch in self.recorder.batches for e in batch]):
+            if entry[0] == hwnd:
+                width, height = self.fixed_sizes.get(hwnd, (entry[4], entry[5]))
+                return {'x': entry[2], 'y': entry[3], 'width': width, 'height': height}
+        raise OSError("never positioned")
+
+    def test_one_batch(self):
+        for hwnd in (1, 2, 3):
+            self.positioner.request(hwnd, GeometryRequest(hwnd * 100, 0, 100, 200), True)
+        self.assertTrue(self.positioner.has_pending)
+        results = self.positioner.commit()
+        self.assertFalse(self.positioner.has_pending)
+        self.assertEqual(len(self.recorder.batches), 1)
+        self.assertEqual([e[0] for e in self.recorder.batches[0]], [1, 2, 3])
+        self.assertEqual(
+            [r[2] for r in results],
+            [{'x': x, 'y': 0, 'width': 100, 'height': 200} for x in (100, 200, 300)])
+        self.assertEqual(self.positioner.commit(), [])
+        self.assertEqual(len(self.recorder.batches), 1)
+
+    def test_last_request_wins(self):
+        self.positioner.request(1, GeometryRequest(0, 0, 100, 100), True)
+        self.positioner.request(2, GeometryRequest(0, 0, 100, 100), True)
+        self.positioner.request(1, GeometryRequest(50, 50, 10, 10, make_focused=True), True)
+        self.positioner.commit()
+        self.assertEqual(self.recorder.batches, [[
+            (2, None, 0, 0, 100, 100, ('frame-changed', 'draw-frame')),
+            (1, 'topmost', 50, 50, 10, 10, ('frame-changed', 'draw-frame')),
+        ]])
+
+    def test_snap(self):
+        # Resizable, but the window keeps a minimum size.
+        self.fixed_sizes[1] = (60, 60)
+        self.positioner.request(1, GeometryRequest(0, 0, 100, 100, v_snap='bottom', h_snap='center'), True)
+        # Not resizable, so it's only moved.
+        self.fixed_sizes[2] = (20, 20)
+        self.recorder.batches.append([(2, None, 0, 0, 20, 20, ())])
+        self.positioner.request(2, GeometryRequest(200, 0, 100, 100, h_snap='right'), False)
+        results = self.positioner.commit()
+
+        self.assertEqual(len(self.recorder.batches), 3)
+        self.assertEqual([e[0] for e in self.recorder.batches[1]], [1])
+        self.assertEqual(
+            [e[:4] for e in self.recorder.batches[2]],
+            [(1, None, 20, 40), (2, None, 280, 0)])
+        self.assertTrue('no-size' in self.recorder.batches[2][0][6])
+        self.assertEqual(results[0][2], {'x': 20, 'y': 40, 'width': 60, 'height': 60})
+        self.assertEqual(results[1][2], {'x': 280, 'y': 0, 'width': 20, 'height': 20})
+
+    def test_failed_windows(self):
+        self.recorder.failed_hwnds.add(2)
+        for hwnd in (1, 2, 3):
+            self.positioner.request(hwnd, GeometryRequest(0, 0, 100, 100), True)
+        self.closed.add(3)
+        results = self.positioner.commit()
+        self.assertEqual([(r[0], r[2] is None) for r in results], [(1, False), (2, True), (3, True)])
+
+    def test_commit_one_window(self):
+        for hwnd in (1, 2):
+            self.positioner.request(hwnd, GeometryRequest(0, 0, 100, 100), True)
+        self.assertEqual([r[0] for r in self.positioner.commit(2)], [2])
+        self.assertEqual(self.positioner.commit(3), [])
+        self.assertTrue(self.positioner.has_pending)
+        self.assertEqual([r[0] for r in self.positioner.commit()], [1])
+
+    def test_cancel(self):
+        self.positioner.request(1, GeometryRequest(0, 0, 100, 100), True)
+        self.positioner.cancel(1)
+        self.assertFalse(self.positioner.has_pending)
+        self.assertEqual(self.positioner.commit(), [])
+        self.assertEqual(self.recorder.batches, [])
+
+
+class LayoutPassTests(unittest.TestCase):
+    """
+    The batches must line up with the layout passes: every window moved by
+    one layout change goes into the same batch, even though the rectangle
+    events cascade through the bus.
+    """
+    def setUp(self):
+        self.bus_recorder = BusRecorder()
+        self.bus = self.bus_recorder.bus
+        self.recorder = PositionBatchRecorder()
+        self.positioner = WindowPositioner(self.recorder.begin_batch, _border_from(self.recorder))
+        # Layout 'layout' has two portals, each with two windows.
+        self.components = [
+            FakeContainer(self.bus, 'layout', ['portal-1', 'portal-2']),
+            FakeContainer(self.bus, 'portal-1', ['window-1', 'window-2']),
+            FakeContainer(self.bus, 'portal-2', ['window-3', 'window-4']),
+            FakeMapper(self.bus, self.positioner, {
+                'window-1': 1, 'window-2': 2, 'window-3': 3, 'window-4': 4,
+            }),
+        ]
+        self.idles = self.bus_recorder.record(event_ids.BUS__IDLE)
+
+    def test_batch_per_layout_pass(self):
+        self.bus.fire(event_ids.LAYOUT__SET_RECTANGLE, 'layout', _rect(0, 0, 800, 600))
+        self.assertEqual(len(self.recorder.batches), 1)
+        self.assertEqual(sorted(e[0] for e in self.recorder.batches[0]), [1, 2, 3, 4])
+
+        self.bus.fire(event_ids.LAYOUT__SET_RECTANGLE, 'layout', _rect(0, 0, 1024, 768))
+        self.assertEqual(len(self.recorder.batches), 2)
+        self.assertEqual(sorted(e[0] for e in self.recorder.batches[1]), [1, 2, 3, 4])
+
+    def test_partial_pass(self):
+        self.bus.fire(event_ids.LAYOUT__SET_RECTANGLE, 'portal-2', _rect(0, 0, 400, 600))
+        self.assertEqual(len(self.recorder.batches), 1)
+        self.assertEqual(sorted(e[0] for e in self.recorder.batches[0]), [3, 4])
+
+    def test_idle_once_per_fire(self):
+        # The rectangle events end in one idle, and the commit event fired
+        # from it in another.
+        del self.idles[:]
+        self.bus.fire(event_ids.LAYOUT__SET_RECTANGLE, 'layout', _rect(0, 0, 800, 600))
+        self.assertEqual(len(self.idles), 2)
+        self.bus.fire(event_ids.LAYOUT__SET_RECTANGLE, 'portal-1', _rect(0, 0, 400, 600))
+        self.assertEqual(len(self.idles), 4)
+        # Nothing to commit, so just the one.
+        self.bus.fire(event_ids.LAYOUT__SET_RECTANGLE, 'layout-2', _rect(0, 0, 400, 600))
+        self.assertEqual(len(self.idles), 5)
+
+
+class FakeContainer(Component):
+    """Splits its rectangle between its children, like a layout or portal."""
+    def __init__(self, bus, cid, children):
+        Component.__init__(self, bus)
+        self.__children = children
+        self._listen(event_ids.LAYOUT__SET_RECTANGLE, cid, self._on_resize)
+
+    def _on_resize(self, event_id, target_id, obj):
+        width = obj['width'] // len(self.__children)
+        for index, child in enumerate(self.__children):
+            self._fire(event_ids.LAYOUT__SET_RECTANGLE, child,
+                       _rect(obj['x'] + index * width, obj['y'], width, obj['height']))
+
+
+class FakeMapper(Component):
+    """Queues the window positions and commits them at the end of the pass, like the WindowMapper."""
+    def __init__(self, bus, positioner, cid_to_hwnd):
+        Component.__init__(self, bus)
+        self.__positioner = positioner
+        self.__cid_to_hwnd = cid_to_hwnd
+        self._listen(event_ids.LAYOUT__SET_RECTANGLE, target_ids.ANY, self._on_move_resize)
+        self._listen(event_ids.BUS__IDLE, target_ids.ANY, self._on_idle)
+        self._listen(event_ids.WINDOW__COMMIT_POSITIONS, target_ids.WINDOW_MAPPER, self._on_commit)
+
+    def _on_move_resize(self, event_id, target_id, obj):
+        if target_id in self.__cid_to_hwnd:
+            self.__positioner.request(self.__cid_to_hwnd[target_id], GeometryRequest.from_event(obj), True)
+
+    def _on_idle(self, event_id, target_id, obj):
+        if self.__positioner.has_pending:
+            self._fire(event_ids.WINDOW__COMMIT_POSITIONS, target_ids.WINDOW_MAPPER, {})
+
+    def _on_commit(self, event_id, target_id, obj):
+        self.__positioner.commit()
+
+
+def _border_from(recorder):
+    def get_border(hwnd):
+        for batch in reversed(recorder.batches):
+            for entry in batch:
+                if entry[0] == hwnd:
+                    return _rect(*entry[2:6])
+        raise OSError("never positioned")
+    return get_border
+
+
+if __name__ == '__main__':
+    unittest.main()
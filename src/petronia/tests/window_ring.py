@@ -0,0 +1,148 @@
+
+# Usage: python3 -m unittest petronia.tests.window_ring
+
+import random
+import unittest
+
+from ..config import Config
+from ..system.id_manager import IdManager
+from ..system import event_ids, target_ids
+from ..shell.control.portal import Portal
+from ..util.window_ring import WindowRing
+from .bus_recorder import BusRecorder
+
+
+class WindowRingTests(unittest.TestCase):
+    def test_rotate(self):
+        ring = WindowRing()
+        self.assertIsNone(ring.rotate())
+        self.assertIsNone(ring.top)
+        for key in 'abc':
+            ring.add(key, key.upper())
+        self.assertEqual(ring.top_key, 'a')
+        self.assertEqual(ring.rotate(), 'b')
+        self.assertEqual(ring.rotate(), 'c')
+        self.assertEqual(ring.rotate(), 'a')
+        self.assertEqual(ring.rotate(False), 'c')
+        self.assertEqual(ring.top, 'C')
+        self.assertEqual(ring.values(), ['A', 'B', 'C'])
+
+    def test_most_recently_used(self):
+        ring = WindowRing()
+        for key in 'abcd':
+            ring.add(key, key)
+        self.assertEqual(ring.mru_keys(), ['a', 'b', 'c', 'd'])
+        ring.set_top('c')
+        ring.move_to_front('d')
+        self.assertEqual(ring.mru_keys(), ['d', 'c', 'a', 'b'])
+        self.assertEqual(ring.top_key, 'c')
+        ring.add('e', 'e', make_top=True)
+        self.assertEqual(ring.mru_keys(), ['e', 'd', 'c', 'a', 'b'])
+
+        # Removing the top window makes the most recently used one the top.
+        self.assertEqual(ring.remove('e'), 'e')
+        self.assertEqual(ring.top_key, 'd')
+        # Removing another window leaves the top alone.
+        ring.remove('a')
+        self.assertEqual(ring.top_key, 'd')
+        self.assertEqual(ring.keys(), ['b', 'c', 'd'])
+        self.assertIsNone(ring.remove('a'))
+        for key in 'bcd':
+            ring.remove(key)
+        self.assertEqual(len(ring), 0)
+        self.assertIsNone(ring.top_key)
+        self.assertEqual(ring.keys(), [])
+
+    def test_random_operations(self):
+        # Compared with a plain list model after each random operation.
+        rnd = random.Random(48)
+        ring = WindowRing()
+        order = []
+        mru = []
+        top = [None]
+
+        def set_top(key):
+            top[0] = key
+            mru.remove(key)
+            mru.insert(0, key)
+
+        for step in range(2000):
+            action = rnd.random()
+            key = 'w{0}'.format(rnd.randint(1, 12))
+            if action < 0.35:
+                make_top = rnd.random() < 0.3
+                self.assertEqual(ring.add(key, key.upper(), make_top), key not in order)
+                if key not in order:
+                    order.append(key)
+                    mru.append(key)
+                    if top[0] is None:
+                        top[0] = key
+                if make_top:
+                    set_top(key)
+            elif action < 0.6:
+                removed = ring.remove(key)
+                if key in order:
+                    self.assertEqual(removed, key.upper())
+                    order.remove(key)
+                    mru.remove(key)
+                    if top[0] == key:
+                        top[0] = mru and mru[0] or None
+                else:
+                    self.assertIsNone(removed)
+            elif action < 0.75:
+                self.assertEqual(ring.set_top(key), key in order)
+                if key in order:
+                    set_top(key)
+            elif action < 0.85:
+                ring.move_to_front(key)
+                if key in order:
+                    mru.remove(key)
+                    mru.insert(0, key)
+            else:
+                forward = rnd.random() < 0.5
+                expected = None
+                if top[0] is not None:
+                    expected = order[(order.index(top[0]) + (forward and 1 or -1)) % len(order)]
+                    set_top(expected)
+                self.assertEqual(ring.rotate(forward), expected, step)
+            self.assertEqual(ring.keys(), order, step)
+            self.assertEqual(ring.mru_keys(), mru, step)
+            self.assertEqual(ring.top_key, top[0], step)
+            self.assertEqual(len(ring), len(order), step)
+            self.assertEqual(key in ring, key in order, step)
+
+
+class PortalWindowTests(unittest.TestCase):
+    def setUp(self):
+        self.recorder = BusRecorder()
+        self.bus = self.recorder.bus
+        self.portal = Portal('portal-1', self.bus, Config(), IdManager(self.bus), target_ids.TOP_LAYOUT)
+        self.events = self.recorder.record(event_ids.ZORDER__SET_WINDOW_ON_TOP, item=lambda t, o: ('top', t))
+        self.recorder.record(event_ids.TELL_WINDOWS__FOCUS_WINDOW, item=lambda t, o: ('focus', t), into=self.events)
+        self.bus.fire(event_ids.LAYOUT__SET_RECTANGLE, 'portal-1', {'x': 0, 'y': 0, 'width': 100, 'height': 100})
+        for name in 'abc':
+            self.bus.fire(event_ids.LAYOUT__ADD_WINDOW, 'portal-1', {
+                'window-cid': name, 'window-info': {'cid': name, 'hwnd': name},
+            })
+
+    def test_close_before_top(self):
+        self.bus.fire(event_ids.WINDOW__FOCUSED, 'c', {})
+        # Closing a window before the top one keeps the same top window.
+        self.bus.fire(event_ids.WINDOW__CLOSED, 'a', {})
+        self.bus.fire(event_ids.FOCUS__SET_FIRST_WINDOW_FOCUSED, 'portal-1', {})
+        self.assertEqual(self.events, [('focus', 'c')])
+        self.bus.fire(event_ids.ZORDER__CHANGE_TOP_WINDOW, 'portal-1', {'direction': 'next'})
+        self.assertEqual(self.events[-1], ('top', 'b'))
+
+    def test_close_top(self):
+        self.bus.fire(event_ids.WINDOW__FOCUSED, 'b', {})
+        self.bus.fire(event_ids.WINDOW__FOCUSED, 'c', {})
+        # The window used before the closed one is on top.
+        self.bus.fire(event_ids.WINDOW__CLOSED, 'c', {})
+        self.bus.fire(event_ids.FOCUS__SET_FIRST_WINDOW_FOCUSED, 'portal-1', {})
+        self.assertEqual(self.events, [('focus', 'b')])
+        self.assertEqual(self.portal._get_active_hwnd(), 'b')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+
+# Usage: python3 -m unittest petronia.tests.window_snapshot
+
+import unittest
+
+from ..util.window_snapshot import WindowSnapshotCache, LazyWindowInfo, TITLE, BORDER, VISIBILITY
+
+
+class WindowSnapshotCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.windows = FakeWindows()
+        self.windows.add(10, "Editor", 0, 0)
+        self.cache = WindowSnapshotCache(
+            self.windows.get_title, self.windows.get_border, self.windows.get_visibility, lazy=False)
+
+    def test_cached_until_invalidated(self):
+        info = self.cache.snapshot(10, {'cid': 'hwnd_1', 'hwnd': 10})
+        self.assertEqual(info['title'], "Editor")
+        self.assertEqual(info['border']['x'], 0)
+        self.assertEqual(self.windows.calls, 3)
+
+        self.windows.add(10, "Editor - changed", 5, 0)
+        info = self.cache.snapshot(10, {'cid': 'hwnd_1', 'hwnd': 10})
+        self.assertEqual(info['title'], "Editor")
+        self.assertEqual(self.windows.calls, 3)
+        self.assertEqual(self.cache.hits, 3)
+
+        # A redraw only drops the title.
+        self.cache.invalidate(10, TITLE)
+        info = self.cache.snapshot(10, {'cid': 'hwnd_1', 'hwnd': 10})
+        self.assertEqual(info['title'], "Editor - changed")
+        self.assertEqual(info['border']['x'], 0)
+        self.assertEqual(self.windows.calls, 4)
+
+        self.cache.invalidate(10, BORDER)
+        self.assertEqual(self.cache.border(10)['x'], 5)
+
+    def test_values_are_copies(self):
+        self.cache.border(10)['x'] = 99
+        self.assertEqual(self.cache.border(10)['x'], 0)
+
+    def test_window_gone(self):
+        self.assertEqual(self.cache.title(20), "")
+        self.assertEqual(self.cache.border(20)['width'], 0)
+        self.assertEqual(self.cache.visibility(20), {})
+        # Not remembered, in case the handle is reused.
+        self.windows.add(20, "New", 0, 0)
+        self.assertEqual(self.cache.title(20), "New")
+
+    def test_remove(self):
+        self.cache.title(10)
+        self.cache.remove(10)
+        self.windows.add(10, "Reused", 0, 0)
+        self.assertEqual(self.cache.title(10), "Reused")
+
+
+class LazyWindowInfoTests(unittest.TestCase):
+    def setUp(self):
+        self.windows = FakeWindows()
+        self.windows.add(10, "Editor", 0, 0)
+        self.cache = WindowSnapshotCache(
+            self.windows.get_title, self.windows.get_border, self.windows.get_visibility)
+
+    def test_only_reads_used_fields(self):
+        info = self.cache.snapshot(10, {'cid': 'hwnd_1', 'hwnd': 10})
+        self.assertIsInstance(info, LazyWindowInfo)
+        self.assertEqual(info['cid'], 'hwnd_1')
+        self.assertTrue('title' in info)
+        self.assertEqual(len(info), 5)
+        self.assertEqual(self.windows.calls, 0)
+        self.assertEqual(info['title'], "Editor")
+        self.assertEqual(info.get('visibility'), ['shown'])
+        self.assertEqual(self.windows.calls, 2)
+
+    def test_value_fixed_once_read(self):
+        info = self.cache.snapshot(10, {'hwnd': 10})
+        self.assertEqual(info['title'], "Editor")
+        self.windows.add(10, "Changed", 0, 0)
+        self.cache.invalidate(10, TITLE)
+        self.assertEqual(info['title'], "Editor")
+        self.assertEqual(self.cache.snapshot(10, {'hwnd': 10})['title'], "Changed")
+
+    def test_acts_as_dict(self):
+        info = self.cache.snapshot(10, {'cid': 'hwnd_1', 'hwnd': 10})
+        self.assertEqual(dict(info), {
+            'cid': 'hwnd_1', 'hwnd': 10, 'title': "Editor",
+            'border': {'x': 0, 'y': 0, 'width': 100, 'height': 100}, 'visibility': ['shown'],
+        })
+        self.assertEqual(sorted(info.keys()), ['border', 'cid', 'hwnd', 'title', 'visibility'])
+        self.assertEqual(info, dict(info))
+        self.assertRaises(KeyError, lambda: info['missing'])
+        self.assertIsNone(info.get('missing'))
+
+    def test_copy_reads_fields(self):
+        info = self.cache.snapshot(10, {'hwnd': 10})
+        copied = dict(info)
+        self.assertEqual(copied[VISIBILITY], ['shown'])
+        self.assertEqual(self.windows.calls, 3)
+
+
+class FakeWindows(object):
+    """Stands in for the native window functions."""
+    def __init__(self):
+        self.windows = {}
+        self.calls = 0
+
+    def add(self, hwnd, title, x, y):
+        self.windows[hwnd] = (title, {'x': x, 'y': y, 'width': 100, 'height': 100}, ['shown'])
+
+    def get_title(self, hwnd):
+        return self._get(hwnd, 0)
+
+    def get_border(self, hwnd):
+        return self._get(hwnd, 1)
+
+    def get_visibility(self, hwnd):
+        return self._get(hwnd, 2)
+
+    def _get(self, hwnd, index):
+        self.calls += 1
+        if hwnd not in self.windows:
+            raise OSError("invalid window handle")
+        return self.windows[hwnd][index]
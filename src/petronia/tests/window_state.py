@@ -0,0 +1,172 @@
+
+# Usage: python3 -m unittest petronia.tests.window_state
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from ..config import Config
+from ..system.id_manager import IdManager
+from ..system import event_ids, target_ids
+from ..shell.control.active_portal_manager import ActivePortalManager
+from ..shell.control.portal import Portal, PORTAL_CATEGORY
+from ..util.window_state import WindowStateStore, WindowState, window_identity
+from .bus_recorder import BusRecorder
+
+
+class WindowStateStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmp_dir, 'windows.state')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_identity(self):
+        self.assertEqual(window_identity({
+            'exec_filename': 'C:\\Windows\\System32\\Notepad.exe', 'class': 'Notepad',
+            'title': 'todo.txt - Notepad',
+        }), ('notepad.exe', 'Notepad', 'Notepad'))
+        self.assertEqual(window_identity({'exec_filename': '', 'class': 'X'}), ('', 'X', ''))
+
+    def test_round_trip(self):
+        store = WindowStateStore(self.filename)
+        self.assertEqual(store.load(), 0)
+        store.record(('a.exe', 'A', 'A'), 'main', 0)
+        store.record(('b.exe', 'B', 'B'), 'side', 1)
+        store.record(('a.exe', 'A', 'A'), 'side', 0)
+
+        store = WindowStateStore(self.filename)
+        self.assertEqual(store.load(), 2)
+        self.assertEqual(store.get(('a.exe', 'A', 'A')), WindowState('side', 0))
+        self.assertEqual(store.get(('b.exe', 'B', 'B')), WindowState('side', 1))
+        self.assertIsNone(store.get(('c.exe', 'C', 'C')))
+
+    def test_append_and_compact(self):
+        store = WindowStateStore(self.filename, compact_slack=4)
+        store.load()
+        store.record(('a.exe', 'A', 'A'), 'main', 0)
+        # The same placement isn't written again.
+        store.record(('a.exe', 'A', 'A'), 'main', 0)
+        self.assertEqual(_line_count(self.filename), 1)
+        for i in range(4):
+            store.record(('a.exe', 'A', 'A'), 'main', i + 1)
+        self.assertEqual(_line_count(self.filename), 5)
+        # One more line goes over the slack, so the file is rewritten.
+        store.record(('a.exe', 'A', 'A'), 'side', 0)
+        self.assertEqual(_line_count(self.filename), 1)
+        store.record(('b.exe', 'B', 'B'), 'main', 0)
+        self.assertEqual(_line_count(self.filename), 2)
+
+    def test_bad_lines(self):
+        with open(self.filename, 'w') as f:
+            f.write('{"exec": "a.exe", "class": "A", "title": "A", "portal": "main", "z": 2}\n')
+            f.write('not json\n')
+            f.write('{"exec": "b.exe", "class": "B"')
+        store = WindowStateStore(self.filename)
+        self.assertEqual(store.load(), 1)
+        self.assertEqual(store.get(('a.exe', 'A', 'A')), WindowState('main', 2))
+
+    def test_max_entries(self):
+        store = WindowStateStore(self.filename, max_entries=2)
+        store.load()
+        for name in ('a', 'b', 'c'):
+            store.record((name, name, name), 'main', 0)
+        self.assertEqual(len(store), 2)
+        self.assertIsNone(store.get(('a', 'a', 'a')))
+
+
+class ActivePortalManagerWindowStateTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmp_dir, 'windows.state')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _start(self):
+        self.recorder = BusRecorder()
+        bus = self.recorder.bus
+        config = Config()
+        config.init_options['window-state-file'] = self.filename
+        manager = ActivePortalManager(bus, config)
+        id_manager = IdManager(bus)
+        self.portals = [
+            Portal(cid, bus, config, id_manager, target_ids.TOP_LAYOUT) for cid in ('portal-1', 'portal-2')]
+        added = self.recorder.record(event_ids.LAYOUT__ADD_WINDOW, item=lambda t, o: (o['window-cid'], t))
+        for cid, alias in (('portal-1', 'main'), ('portal-2', 'side')):
+            bus.fire(event_ids.REGISTRAR__OBJECT_REGISTERED, cid, {'category': PORTAL_CATEGORY, 'cid': cid})
+            bus.fire(event_ids.LAYOUT__SET_RECTANGLE, cid, {'x': 0, 'y': 0, 'width': 100, 'height': 100})
+            bus.fire(event_ids.PORTAL__CREATE_ALIAS, target_ids.ACTIVE_PORTAL_MANAGER, {
+                'alias': alias, 'portal-cid': cid})
+        bus.fire(event_ids.PORTAL__ACTIVATED, 'portal-1', {'portal-cid': 'portal-1'})
+        return bus, manager, added
+
+    def test_restart(self):
+        bus, manager, added = self._start()
+        for name in ('a', 'b', 'c'):
+            bus.fire(event_ids.WINDOW__CREATED, name, _window_event(name))
+        self.assertEqual(added, [('a', 'portal-1'), ('b', 'portal-1'), ('c', 'portal-1')])
+        # The user moves the windows around.  The window moved last is on top.
+        bus.fire(event_ids.PORTAL__MOVE_WINDOW_HERE, 'portal-2', _window_event('b'))
+        bus.fire(event_ids.PORTAL__MOVE_WINDOW_HERE, 'portal-2', _window_event('a'))
+
+        # After a restart, the windows come in a different order, and go
+        # back to the portals they were in, in their z-order there.
+        bus, manager, added = self._start()
+
+        def create_windows(event_id, target_id, obj):
+            for name in ('a', 'c', 'b', 'd'):
+                bus.fire(event_ids.WINDOW__CREATED, name, _window_event(name))
+
+        # Stands in for the window mapper, which sends all the windows
+        # without the bus going idle between them.
+        self.recorder.listen(event_ids.LAYOUT__RESEND_WINDOW_CREATED_EVENTS, target_ids.WINDOW_MAPPER, create_windows)
+        bus.fire(event_ids.LAYOUT__RESEND_WINDOW_CREATED_EVENTS, target_ids.WINDOW_MAPPER, {})
+        # Only the window without a remembered portal went in before the
+        # bus went idle.
+        self.assertEqual(added[0], ('d', 'portal-1'))
+        self.assertEqual(sorted(added), [
+            ('a', 'portal-2'), ('b', 'portal-2'), ('c', 'portal-1'), ('d', 'portal-1')])
+        self.assertLess(added.index(('a', 'portal-2')), added.index(('b', 'portal-2')))
+        self.assertEqual(self.portals[1]._get_active_hwnd(), 'a')
+
+    def test_z_order(self):
+        bus, manager, added = self._start()
+        for name in ('a', 'b', 'c'):
+            bus.fire(event_ids.WINDOW__CREATED, name, _window_event(name))
+        self.assertEqual(self._stored_z_order(), {'a': 0, 'b': 1, 'c': 2})
+        bus.fire(event_ids.WINDOW__FOCUSED, 'c', {})
+        self.assertEqual(self._stored_z_order(), {'a': 1, 'b': 2, 'c': 0})
+        bus.fire(event_ids.ZORDER__CHANGE_TOP_WINDOW, 'portal-1', {'direction': 'next'})
+        self.assertEqual(self._stored_z_order(), {'a': 0, 'b': 2, 'c': 1})
+        # The closed window keeps its last place; the others move up.
+        bus.fire(event_ids.WINDOW__CLOSED, 'a', {})
+        self.assertEqual(self._stored_z_order(), {'a': 0, 'b': 1, 'c': 0})
+
+    def _stored_z_order(self):
+        store = WindowStateStore(self.filename)
+        store.load()
+        ret = {}
+        for name in ('a', 'b', 'c'):
+            state = store.get(window_identity(_window_event(name)['window-info']))
+            self.assertEqual(state.alias, 'main')
+            ret[name] = state.z_index
+        return ret
+
+
+def _window_event(name):
+    return {'window-cid': name, 'window-info': {
+        'cid': name, 'hwnd': name, 'class': name.upper(), 'exec_filename': 'C:\\apps\\{0}.exe'.format(name),
+        'title': name,
+    }}
+
+
+def _line_count(filename):
+    with open(filename, 'r') as f:
+        return len(f.readlines())
+
+
+if __name__ == '__main__':
+    unittest.main()
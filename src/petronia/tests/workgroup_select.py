@@ -0,0 +1,65 @@
+
+# Usage: python3 -m unittest petronia.tests.workgroup_select
+
+import unittest
+
+from ..system.bus import SingleThreadedBus
+from ..system.id_manager import IdManager
+from .. import config
+from ..config import LayoutConfig, ORIENTATION_VERTICAL
+from ..shell.control.root_layout import RootLayout
+
+
+class WorkgroupSelectTests(unittest.TestCase):
+    def setUp(self):
+        self.laptop = config.WorkGroupConfig({'default': [_layout('laptop')]})
+        self.docked = config.WorkGroupConfig({'default': [_layout('left'), _layout('right')]})
+        self.workgroups = config.DisplayWorkGroupsConfig([
+            {'name': 'laptop', 'monitors': [config.MonitorResConfig(1366, 768)], 'workgroup': self.laptop},
+            {'name': 'docked', 'monitors': [config.MonitorResConfig(1920, 1080), config.MonitorResConfig(1920, 1080)],
+             'workgroup': self.docked},
+        ])
+
+    def test_docking(self):
+        for _ in range(3):
+            self.assertIs(self.workgroups.get_workgroup_for_display(_monitors((1366, 768))), self.laptop)
+            self.assertIs(self.workgroups.get_workgroup_for_display(
+                _monitors((1920, 1080), (1920, 1080))), self.docked)
+        # Only the sizes pick the workgroup.
+        monitors = _monitors((1920, 1080), (1920, 1080))
+        monitors[1]['left'] = -1920
+        self.assertIs(self.workgroups.get_workgroup_for_display(monitors), self.docked)
+
+    def test_generated_default(self):
+        # Without a default, the generated workgroup is the same object for
+        # the same monitors, so a layout switch can keep the tiles.
+        workgroups = config.DisplayWorkGroupsConfig([])
+        first = workgroups.get_workgroup_for_display(_monitors((800, 600)))
+        self.assertIs(workgroups.get_workgroup_for_display(_monitors((800, 600))), first)
+        self.assertIsNot(workgroups.get_workgroup_for_display(_monitors((800, 600), (800, 600))), first)
+
+    def test_layout_rects(self):
+        bus = SingleThreadedBus()
+        root = RootLayout(bus, config.Config(workgroups=self.workgroups), IdManager(bus))
+        layout = _layout('x')
+        rects = root._get_layout_rects(layout, {'x': 0, 'y': 0, 'width': 100, 'height': 100})
+        self.assertIs(root._get_layout_rects(layout, {'x': 0, 'y': 0, 'width': 100, 'height': 100}), rects)
+        self.assertIsNot(root._get_layout_rects(layout, {'x': 0, 'y': 0, 'width': 200, 'height': 100}), rects)
+        self.assertIsNot(root._get_layout_rects(_layout('x'), {'x': 0, 'y': 0, 'width': 100, 'height': 100}), rects)
+
+
+def _layout(name):
+    return LayoutConfig(name, 'split-layout', ORIENTATION_VERTICAL, [])
+
+
+def _monitors(*sizes):
+    ret = []
+    left = 0
+    for width, height in sizes:
+        ret.append({'left': left, 'right': left + width, 'top': 0, 'bottom': height, 'width': width, 'height': height})
+        left += width
+    return ret
+
+
+if __name__ == '__main__':
+    unittest.main()
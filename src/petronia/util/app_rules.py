@@ -0,0 +1,373 @@
+"""
+Decides the display flags (tiled, title, border, resizable) for a window
+from the application rules, in one pass over the rules that can match it.
+
+The rules are compiled once, when the configuration is loaded:
+
+* Exact class names and exact executable file names (without a path) go
+  into hash indexes, so a rule for "Notepad" is only looked at for windows
+  of that class.
+* The remaining positive patterns of each window field are joined into one
+  alternation regex, so a window that matches none of them is ruled out
+  with a single regex call.
+* The results are remembered in a small LRU memo, keyed by the window
+  fields the rules look at.
+
+The first rule (in configuration order) which matches the window and sets a
+flag decides that flag, like walking the `ApplicationChromeConfig` list.
+"""
+
+import collections
+import re
+import threading
+
+CLASS = 'class'
+EXEC_FILENAME = 'exec_filename'
+MODULE_FILENAME = 'module_filename'
+TITLE = 'title'
+# The window_info keys that the rules can match, in memo key order.
+MATCHED_KEYS = (CLASS, EXEC_FILENAME, MODULE_FILENAME, TITLE)
+
+DEFAULT_MEMO_SIZE = 1024
+
+FLAG_NAMES = ('is_tiled', 'has_title', 'has_border', 'is_resizable')
+
+# Patterns which can't be put into an alternation: back references and
+# conditionals count the groups from the start of the whole regex, group
+# names must be unique, and global flags must start the regex.
+_NOT_JOINABLE_RE = re.compile(r'\\[1-9]|\(\?P[=<]|\(\?\(|\(\?[aiLmsux]+\)')
+_JOINED_FLAGS = re.compile('', re.IGNORECASE).flags
+
+
+class AppFlags(object):
+    """
+    The display flags for a window.  A value is None, in a rule, if the rule
+    doesn't set that flag.
+    """
+    __slots__ = FLAG_NAMES
+
+    def __init__(self, is_tiled=None, has_title=None, has_border=None, is_resizable=None):
+        self.is_tiled = is_tiled
+        self.has_title = has_title
+        self.has_border = has_border
+        self.is_resizable = is_resizable
+
+    def as_tuple(self):
+        return self.is_tiled, self.has_title, self.has_border, self.is_resizable
+
+    def __eq__(self, other):
+        return isinstance(other, AppFlags) and self.as_tuple() == other.as_tuple()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.as_tuple())
+
+    def __repr__(self):
+        return "AppFlags(is_tiled={0}, has_title={1}, has_border={2}, is_resizable={3})".format(
+            *self.as_tuple())
+
+
+class RuleMatcher(object):
+    """
+    One application matcher: every window field given in the patterns must
+    match (fields the window doesn't have are skipped).  The matcher fires
+    when that is equal to `match_returns`, and at least one field was
+    checked.
+    """
+    def __init__(self, match_returns, patterns, exact=None):
+        """
+
+        :param match_returns: False if the matcher fires for windows that
+            don't match.
+        :param patterns: window_info key -> compiled regex (or any object with
+            a `match` method).
+        :param exact: window_info key -> the exact text that the regex for
+            the key was made from; file names have no path.  Used to index
+            the matcher.
+        """
+        assert isinstance(patterns, dict)
+        for key in patterns:
+            assert key in MATCHED_KEYS
+        self.match_returns = match_returns
+        self.patterns = patterns
+        self.exact = exact or {}
+
+    def fires(self, window_info):
+        """Checks the window against each pattern in turn, without the indexes."""
+        checked = False
+        for key, regex in self.patterns.items():
+            value = window_info.get(key)
+            if value is None:
+                continue
+            checked = True
+            if regex.match(value) is None:
+                return not self.match_returns
+        return checked and bool(self.match_returns)
+
+
+class AppRule(object):
+    def __init__(self, flags, matchers):
+        """
+
+        :param flags: AppFlags set by the rule when any of its matchers fire.
+        :param matchers: list of RuleMatcher
+        """
+        assert isinstance(flags, AppFlags)
+        self.flags = flags
+        self.matchers = tuple(matchers)
+
+
+class _CompiledMatcher(object):
+    __slots__ = ('index', 'rule_index', 'match_returns', 'checks')
+
+    def __init__(self, index, rule_index, match_returns, checks):
+        self.index = index
+        self.rule_index = rule_index
+        self.match_returns = match_returns
+        # tuple of (key position, regex, exact index key or None,
+        # position in the joined regex for the key or None)
+        self.checks = checks
+
+
+class AppRuleEngine(object):
+    """
+    Safe to use from several threads.
+    """
+    def __init__(self, rules, defaults, memo_size=DEFAULT_MEMO_SIZE):
+        """
+
+        :param rules: list of AppRule, in order of preference.
+        :param defaults: AppFlags used for the flags that no rule sets.
+        :param memo_size: number of windows to remember the flags for.
+        """
+        assert isinstance(defaults, AppFlags)
+        self.__defaults = defaults.as_tuple()
+        self.__memo_size = memo_size
+        self.__memo = collections.OrderedDict()
+        self.__lock = threading.Lock()
+        self.__memo_hits = 0
+        self.__memo_misses = 0
+
+        self.__rule_flags = []
+        used_keys = set()
+        # (key position, exact index key) -> list of matcher indexes that
+        # can only fire for windows with that exact value.
+        self.__exact_index = {}
+        # key position -> matcher indexes that need the key to have the
+        # exact value, used when the window's value can't be looked up.
+        self.__exact_gated = [[] for _ in MATCHED_KEYS]
+        # key position -> ([matcher index], [pattern]) joined for the key.
+        joined = [([], []) for _ in MATCHED_KEYS]
+        # Matchers which can fire for any window.
+        self.__always = []
+        self.__matchers = []
+        for rule in rules:
+            assert isinstance(rule, AppRule)
+            flags = rule.flags.as_tuple()
+            if all(value is None for value in flags):
+                continue
+            rule_index = len(self.__rule_flags)
+            self.__rule_flags.append(flags)
+            for matcher in rule.matchers:
+                assert isinstance(matcher, RuleMatcher)
+                if len(matcher.patterns) <= 0:
+                    # Never fires.
+                    continue
+                self.__add_matcher(rule_index, matcher, joined, used_keys)
+
+        self.__joined = []
+        for indexes, patterns in joined:
+            if len(indexes) <= 0:
+                self.__joined.append(None)
+                continue
+            try:
+                self.__joined.append((
+                    re.compile('|'.join('({0})'.format(p) for p in patterns), re.IGNORECASE),
+                    _group_positions(patterns),
+                    indexes))
+            except re.error:
+                self.__joined.append(None)
+                self.__always.extend(indexes)
+        self.__always.sort()
+
+        # Only the keys that some rule looks at are part of the memo key,
+        # so windows that only differ in their title share an entry if no
+        # rule matches titles.
+        self.__memo_keys = tuple(key for key in MATCHED_KEYS if key in used_keys)
+
+    @property
+    def memo_hits(self):
+        return self.__memo_hits
+
+    @property
+    def memo_misses(self):
+        return self.__memo_misses
+
+    def get_flags(self, window_info):
+        """
+
+        :param window_info:
+        :return: AppFlags for the window, with every flag set.
+        """
+        memo_key = tuple(window_info.get(key) for key in self.__memo_keys)
+        with self.__lock:
+            ret = self.__memo.get(memo_key)
+            if ret is not None:
+                self.__memo.move_to_end(memo_key)
+                self.__memo_hits += 1
+                return ret
+            self.__memo_misses += 1
+        ret = AppFlags(*self.__evaluate(window_info))
+        if self.__memo_size > 0:
+            with self.__lock:
+                self.__memo[memo_key] = ret
+                while len(self.__memo) > self.__memo_size:
+                    self.__memo.popitem(last=False)
+        return ret
+
+    def __add_matcher(self, rule_index, matcher, joined, used_keys):
+        index = len(self.__matchers)
+        gate = None
+        checks = []
+        for position, key in enumerate(MATCHED_KEYS):
+            regex = matcher.patterns.get(key)
+            if regex is None:
+                continue
+            used_keys.add(key)
+            exact_key = None
+            joined_position = None
+            exact = matcher.exact.get(key)
+            if exact is not None and key in (CLASS, EXEC_FILENAME) and '\\' not in exact:
+                exact_key = _index_key(exact)
+            if exact_key is not None:
+                if matcher.match_returns and gate is None:
+                    gate = position
+                    self.__exact_index.setdefault((position, exact_key), []).append(index)
+                    self.__exact_gated[position].append(index)
+            elif matcher.match_returns and gate is None and _is_joinable(regex):
+                gate = position
+                joined_position = len(joined[position][0])
+                joined[position][0].append(index)
+                joined[position][1].append(regex.pattern)
+            checks.append((position, regex, exact_key, joined_position))
+        if gate is None:
+            # A matcher that fires when the window doesn't match, or whose
+            # patterns can't be indexed.
+            self.__always.append(index)
+        self.__matchers.append(_CompiledMatcher(index, rule_index, matcher.match_returns, tuple(checks)))
+
+    def __evaluate(self, window_info):
+        values = tuple(window_info.get(key) for key in MATCHED_KEYS)
+        exact_keys = tuple(value is not None and _exact_value_key(position, value) or None
+                           for position, value in enumerate(values))
+
+        # The first matching pattern in each joined regex, by key position;
+        # -1 if none match, None if the window doesn't have the key.
+        first_joined = [None] * len(MATCHED_KEYS)
+        candidates = list(self.__always)
+        for position, value in enumerate(values):
+            if exact_keys[position] is None:
+                # Either the window doesn't have the key, or the value can't
+                # be looked up in the index; the matchers check it.
+                candidates.extend(self.__exact_gated[position])
+            else:
+                candidates.extend(self.__exact_index.get((position, exact_keys[position]), ()))
+            joined = self.__joined[position]
+            if joined is None:
+                continue
+            regex, group_positions, indexes = joined
+            if value is None:
+                candidates.extend(indexes)
+                continue
+            m = regex.match(value)
+            if m is None:
+                first_joined[position] = -1
+            else:
+                first = group_positions[m.lastindex]
+                first_joined[position] = first
+                candidates.extend(indexes[first:])
+        candidates.sort()
+
+        flags = list(self.__defaults)
+        undecided = set(range(len(flags)))
+        for index in candidates:
+            matcher = self.__matchers[index]
+            rule_flags = self.__rule_flags[matcher.rule_index]
+            decides = [i for i in undecided if rule_flags[i] is not None]
+            if len(decides) <= 0 or not _fires(matcher, values, exact_keys, first_joined):
+                continue
+            for i in decides:
+                flags[i] = rule_flags[i]
+                undecided.remove(i)
+            if len(undecided) <= 0:
+                break
+        return flags
+
+
+def _fires(matcher, values, exact_keys, first_joined):
+    checked = False
+    for position, regex, exact_key, joined_position in matcher.checks:
+        value = values[position]
+        if value is None:
+            continue
+        checked = True
+        if exact_key is not None and exact_keys[position] is not None and exact_key != exact_keys[position]:
+            matched = False
+        elif joined_position is not None and first_joined[position] is not None and (
+                first_joined[position] < 0 or joined_position <= first_joined[position]):
+            # No pattern before the first match in the joined regex matches.
+            matched = joined_position == first_joined[position]
+        else:
+            matched = regex.match(value) is not None
+        if not matched:
+            return checked and not matcher.match_returns
+    return checked and bool(matcher.match_returns)
+
+
+def _is_joinable(regex):
+    pattern = getattr(regex, 'pattern', None)
+    return (
+        isinstance(pattern, str)
+        and getattr(regex, 'flags', None) == _JOINED_FLAGS
+        and _NOT_JOINABLE_RE.search(pattern) is None
+    )
+
+
+def _group_positions(patterns):
+    """Maps the group number of each pattern's outer group to the pattern position."""
+    ret = {}
+    group = 1
+    for position, pattern in enumerate(patterns):
+        ret[group] = position
+        group += 1 + re.compile(pattern, re.IGNORECASE).groups
+    return ret
+
+
+def _exact_value_key(position, value):
+    if not isinstance(value, str):
+        return None
+    if MATCHED_KEYS[position] == EXEC_FILENAME:
+        if '\\' not in value:
+            return None
+        value = value[value.rindex('\\') + 1:]
+    elif MATCHED_KEYS[position] != CLASS:
+        return None
+    return _index_key(value)
+
+
+def _index_key(text):
+    """
+    The index key for the text, or None if the text isn't plain ASCII (the
+    regex matches some letters without case to other ASCII letters, such as
+    the Kelvin sign to "k").
+    """
+    # "$" also matches before a final new line.
+    if text.endswith('\n'):
+        text = text[:-1]
+    try:
+        text.encode('ascii')
+    except UnicodeEncodeError:
+        return None
+    return text.lower()
@@ -0,0 +1,314 @@
+"""
+Key chains with timing: each step of a chain must follow the previous one
+within a timeout, keys can run one command when tapped and another when
+held, and a leader key can start a sequence of plain (unmodified) keys.
+
+Like HotKeyChain, this is only a state machine.  It's given each key event
+after the KeyState was updated, and answers with IGNORED, ACTION_PENDING or
+the command to run.  The time comes from the clock it's constructed with,
+so it can be driven by tests without real delays.
+"""
+
+from .hotkey_chain import (
+    KEY_STATE, ACTION_PENDING, IGNORED, STR_VK_MAP, VK_ALIASES, MODIFIERS,
+    ChainDiagnostic, compile_key_chains
+)
+import time
+
+# Seconds
+DEFAULT_STEP_TIMEOUT = 1.5
+DEFAULT_HOLD_TIME = 0.3
+
+# Command which marks the end of the leader key chain.
+_LEADER_COMMAND = ('<leader>',)
+
+_VK_LWIN = STR_VK_MAP['lwin']
+_VK_RWIN = STR_VK_MAP['rwin']
+
+
+class ChordEngine(object):
+    """
+    Drop-in replacement for a HotKeyChain, for modes that use timing.
+
+    All the methods must be called from the same thread (the keyboard hook
+    thread).
+    """
+    def __init__(self, chain_commands=None, key_state=None, clock=time.monotonic,
+                 step_timeout=DEFAULT_STEP_TIMEOUT, hold_time=DEFAULT_HOLD_TIME):
+        """
+
+        :param chain_commands: map of key chain text to command.
+        :param key_state: the KeyState to match against; defaults to the
+            hook's KEY_STATE.
+        :param clock: returns the current time in seconds; must never go
+            backwards.
+        :param step_timeout: seconds allowed between two steps in a chain,
+            or in a leader sequence.  None to wait forever.
+        :param hold_time: seconds a tap / hold key must be down to count as
+            held.
+        """
+        self.__key_state = key_state or KEY_STATE
+        self.__clock = clock
+        self.step_timeout = step_timeout
+        self.hold_time = hold_time
+
+        # Set to True to prevent the OS shell from using the "windows" key.
+        self.block_win_key = False
+
+        self.__chain_commands = {}
+        self.__leader = None
+
+        # modifier mask -> ChainNode
+        self.__roots = {}
+        # ChainNode for the sequences after the leader key.
+        self.__leader_root = None
+        # vk code -> (tap command, hold command)
+        self.__tap_hold = {}
+
+        self.__chain_diagnostics = ()
+        self.__leader_diagnostics = ()
+        self.__tap_hold_diagnostics = ()
+
+        self.__active_mask = None
+        self.__active_key = None
+        self.__active_node = None
+        self.__in_leader = False
+        # When the last step of the pending chain matched; None if there
+        # is no pending step.
+        self.__step_time = None
+
+        self.__held_key = None
+        self.__held_since = None
+        self.__hold_fired = False
+
+        self.__expired = 0
+
+        if chain_commands is not None:
+            self.set_key_chains(chain_commands)
+
+    @property
+    def expired(self):
+        """Number of pending chains dropped because the next step was too late."""
+        return self.__expired
+
+    @property
+    def diagnostics(self):
+        """Problems found in the configured keys (list of ChainDiagnostic)."""
+        return self.__chain_diagnostics + self.__leader_diagnostics + self.__tap_hold_diagnostics
+
+    def set_key_chains(self, chain_commands):
+        assert isinstance(chain_commands, dict)
+        self.__chain_commands = dict(chain_commands)
+        self.__compile_chains()
+
+    def set_leader(self, leader_chain, leader_commands):
+        """
+
+        :param leader_chain: key chain text for the leader (e.g. "win+space"),
+            or None to remove the leader.
+        :param leader_commands: map of key sequence text (e.g. "w, h") to
+            command.  The keys can't use modifiers.
+        """
+        self.__leader = leader_chain
+        leader_root = None
+        diagnostics = ()
+        if leader_chain is not None:
+            compiled = compile_key_chains(leader_commands or {}, self.__key_state)
+            diagnostics = compiled.diagnostics
+            if len([mask for mask in compiled.roots.keys() if mask != 0]) > 0:
+                diagnostics += (ChainDiagnostic(
+                    ChainDiagnostic.ERROR, leader_chain, "leader sequences can't use modifiers"),)
+            leader_root = compiled.roots.get(0)
+        self.__leader_root = leader_root
+        self.__leader_diagnostics = diagnostics
+        self.__compile_chains()
+
+    def set_tap_hold(self, tap_hold):
+        """
+
+        :param tap_hold: map of key name to (tap command, hold command);
+            either command may be None.
+        """
+        assert isinstance(tap_hold, dict)
+        keys = {}
+        diagnostics = []
+        for key, commands in tap_hold.items():
+            assert len(commands) == 2
+            tap_command = commands[0] is not None and tuple(commands[0]) or None
+            hold_command = commands[1] is not None and tuple(commands[1]) or None
+            key = key.strip().lower()
+            names = key in VK_ALIASES and VK_ALIASES[key] or [key]
+            for name in names:
+                if name in MODIFIERS:
+                    diagnostics.append(ChainDiagnostic(
+                        ChainDiagnostic.ERROR, key, "tap / hold keys are not allowed to be modifiers"))
+                elif name in STR_VK_MAP:
+                    keys[STR_VK_MAP[name]] = (tap_command, hold_command)
+                else:
+                    diagnostics.append(ChainDiagnostic(
+                        ChainDiagnostic.ERROR, key, "tap / hold key not a known key"))
+        self.__tap_hold = keys
+        self.__tap_hold_diagnostics = tuple(diagnostics)
+        self.reset()
+
+    def reset(self):
+        self.__reset_chain()
+        self.__held_key = None
+        self.__held_since = None
+        self.__hold_fired = False
+
+    def poll(self):
+        """
+        Check for timeouts without a key event.  Drops a stale pending
+        chain, and returns the hold command if a tap / hold key has now
+        been down long enough.  The keyboard hook calls this from a timer,
+        through `HotkeyDispatch.poll`.
+
+        :return: the hold command, or IGNORED.
+        """
+        now = self.__clock()
+        self.__expire(now)
+        if self.__held_key is not None and not self.__hold_fired:
+            hold_command = self.__tap_hold[self.__held_key][1]
+            if hold_command is not None and now - self.__held_since >= self.hold_time:
+                self.__hold_fired = True
+                return hold_command
+        return IGNORED
+
+    def key_action(self, vk_code, is_down):
+        """
+
+        :param is_down:
+        :param vk_code:
+        :return: IGNORED if the key should be passed through,
+            ACTION_PENDING if the key should be blocked from passing to
+            another application, but does not complete an action, or
+            a list of the action to run.
+        """
+        now = self.__clock()
+        self.__expire(now)
+        key_state = self.__key_state
+
+        if self.__held_key == vk_code:
+            return self.__held_key_action(is_down, now)
+        if (
+                is_down and vk_code in self.__tap_hold and self.__step_time is None
+                and key_state.modifier_mask == 0
+        ):
+            self.__held_key = vk_code
+            self.__held_since = now
+            self.__hold_fired = False
+            return ACTION_PENDING
+
+        if self.__in_leader:
+            return self.__leader_action(vk_code, is_down, now)
+
+        mask = key_state.modifier_mask
+        if mask == self.__active_mask:
+            if self.__active_key is None or not key_state.is_down(self.__active_key):
+                # The previous key is no longer down.
+                self.__active_key = None
+
+                next_node = self.__active_node.children.get(vk_code)
+                if next_node is not None:
+                    if next_node.command is not None:
+                        command = next_node.command
+                        self.__reset_chain()
+                        if command == _LEADER_COMMAND:
+                            return self.__start_leader(vk_code, now)
+                        return command
+                    self.__active_key = vk_code
+                    self.__active_node = next_node
+                    self.__step_time = now
+                    return ACTION_PENDING
+                elif is_down:
+                    # A new key was pressed, which isn't a key in a pending
+                    # combo.  Reset our hot keys, and return an ignored.
+                    self.__reset_chain()
+            # else, the previous active key is still down; wait for it
+            # to come up.
+        else:
+            # Discover which chains match the modifiers.
+            self.__reset_chain()
+            root = self.__roots.get(mask)
+            if root is not None:
+                self.__active_node = root
+                self.__active_mask = mask
+
+        if self.block_win_key and (vk_code == _VK_LWIN or vk_code == _VK_RWIN):
+            return ACTION_PENDING
+        return IGNORED
+
+    def __held_key_action(self, is_down, now):
+        if is_down:
+            # Key repeat.
+            return self.poll() or ACTION_PENDING
+        tap_command, hold_command = self.__tap_hold[self.__held_key]
+        held_for = now - self.__held_since
+        hold_fired = self.__hold_fired
+        self.__held_key = None
+        self.__held_since = None
+        self.__hold_fired = False
+        if hold_fired:
+            return ACTION_PENDING
+        if held_for >= self.hold_time and hold_command is not None:
+            return hold_command
+        if tap_command is not None:
+            return tap_command
+        return ACTION_PENDING
+
+    def __start_leader(self, vk_code, now):
+        if self.__leader_root is not None:
+            self.__in_leader = True
+            self.__active_node = self.__leader_root
+            self.__active_key = vk_code
+            self.__step_time = now
+        return ACTION_PENDING
+
+    def __leader_action(self, vk_code, is_down, now):
+        if self.__key_state.is_modifier(vk_code):
+            return IGNORED
+        if not is_down:
+            # Swallow the release of the keys used in the sequence.
+            if vk_code == self.__active_key:
+                return ACTION_PENDING
+            return IGNORED
+        next_node = self.__active_node.children.get(vk_code)
+        if next_node is None:
+            # Not part of a sequence; stop looking for one.
+            self.__reset_chain()
+            return IGNORED
+        if next_node.command is not None:
+            self.__reset_chain()
+            return next_node.command
+        self.__active_node = next_node
+        self.__active_key = vk_code
+        self.__step_time = now
+        return ACTION_PENDING
+
+    def __expire(self, now):
+        if (
+                self.__step_time is not None and self.step_timeout is not None
+                and now - self.__step_time > self.step_timeout
+        ):
+            self.__expired += 1
+            self.__reset_chain()
+
+    def __reset_chain(self):
+        self.__active_mask = None
+        self.__active_key = None
+        self.__active_node = None
+        self.__in_leader = False
+        self.__step_time = None
+
+    def __compile_chains(self):
+        chain_commands = self.__chain_commands
+        if self.__leader is not None:
+            chain_commands = dict(chain_commands)
+            chain_commands[self.__leader] = _LEADER_COMMAND
+        compiled = compile_key_chains(chain_commands, self.__key_state)
+
+        # Change the variable in a single command.
+        self.__roots = compiled.roots
+        self.__chain_diagnostics = compiled.diagnostics
+        self.reset()
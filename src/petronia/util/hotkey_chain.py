@@ -1,45 +1,34 @@
 
+from .key_state import KeyState
+import collections
+import threading
+import weakref
+
 IGNORED = None
 ACTION_PENDING = 1
 
-# Bigger than necessary
-_MAX_VK_KEY = 0x200
-_VK_KEY_MASK = 0x1ff
-_CURRENT_KEY_STATE = [False] * _MAX_VK_KEY
-_MODIFIERS = set()
-
 
 def on_key_hook(vk_code, is_down, special_modifier_state = None):
     """
-    Module-wide storage for the current key state.
+    Module-wide storage for the current key state, in KEY_STATE.
 
     :param vk_code:
     :param is_down:
     :param special_modifier_state: map of vcodes to the up/down state
         (True == is_down, False == !is_down).  This is part of the
-        windows key state / locked desktop work-around.
+        windows key state / locked desktop work-around.  The hook itself
+        uses KEY_STATE.key_event, which avoids building this map.
     :return: True if it's a recognized key, False if it isn't known.
     """
     if special_modifier_state is not None:
+        codes = []
+        states = []
         for k, v in special_modifier_state.items():
-            if k != vk_code and k in _MODIFIER_KEYS:
-                if _CURRENT_KEY_STATE[k] != v:
-                    print("DEBUG modifier {0} does not match inner state.".format(k))
-                    if k in _MODIFIER_KEYS:
-                        if is_down:
-                            _MODIFIERS.add(k)
-                        else:
-                            _MODIFIERS.remove(k)
-                _CURRENT_KEY_STATE[k] = v
-    if 0 <= vk_code <= _MAX_VK_KEY:
-        _CURRENT_KEY_STATE[vk_code] = is_down
-        if vk_code in _MODIFIER_KEYS:
-            if is_down:
-                _MODIFIERS.add(vk_code)
-            else:
-                _MODIFIERS.remove(vk_code)
-        return True
-    return False
+            if KEY_STATE.is_modifier(k):
+                codes.append(k)
+                states.append(v)
+        return KEY_STATE.key_event(vk_code, is_down, codes, states)
+    return KEY_STATE.key_event(vk_code, is_down)
 
 
 class KeyOverride(object):
@@ -51,16 +40,23 @@ class KeyOverride(object):
     """
     def __init__(self, key_commands=None):
         self.__keys = {}
+        self.__diagnostics = ()
 
         if key_commands is not None:
             self.set_key_actions(key_commands)
 
+    @property
+    def diagnostics(self):
+        """Problems found in the last set_key_actions call (list of ChainDiagnostic)."""
+        return self.__diagnostics
+
     def set_key_actions(self, actions):
         assert isinstance(actions, dict)
+        diagnostics = []
         # FIXME use a dict instead
 
         # TODO in the future we may allow "shift+left" type keys here.
-        # The implementation in key_action would just check the _MODIFIERS
+        # The implementation in key_action would just check the KEY_STATE modifier mask
         # state.
         new_key_actions = {}
         for key, action in actions.items():
@@ -70,30 +66,27 @@ class KeyOverride(object):
             if key in VK_ALIASES:
                 for k in VK_ALIASES[key]:
                     if k in MODIFIERS:
-                        # TODO better error / warning
                         # Note use of user's value "key", rather than internal "k"
-                        print("CONFIG ERROR: Simple keys are not allowed to be modifiers: {0}".format(key))
+                        _report(diagnostics, key, "simple keys are not allowed to be modifiers")
                     elif k in STR_VK_MAP:
                         # print("DEBUG KeyOverride: assigning {0} = `{1}`".format(hex(STR_VK_MAP[k]), action))
                         new_key_actions[STR_VK_MAP[k]] = action
                     else:
-                        # TODO better error / warning
-                        print("ERROR IN SETUP: alias {0} not in vk map".format(k))
+                        _report(diagnostics, key, "alias {0} not in vk map".format(k))
             elif key in MODIFIERS:
-                # TODO better error / warning
-                print("CONFIG ERROR: Simple keys are not allowed to be modifiers: {0}".format(key))
+                _report(diagnostics, key, "simple keys are not allowed to be modifiers")
             elif key in STR_VK_MAP:
                 new_key_actions[STR_VK_MAP[key]] = action
             else:
-                # TODO better error / warning
-                print("CONFIG ERROR: Simple key not a known key: {0}".format(key))
+                _report(diagnostics, key, "simple key not a known key")
         self.__keys = new_key_actions
+        self.__diagnostics = tuple(diagnostics)
 
     def reset(self):
         pass
 
     def key_action(self, vk_code, is_down):
-        if vk_code in _MODIFIER_KEYS:
+        if KEY_STATE.is_modifier(vk_code):
             # Ignore all modifier keys, so the "release" from a mode switch works right.
             # This ties in with modifiers not allowed as simple keys.
             return IGNORED
@@ -106,24 +99,35 @@ class KeyOverride(object):
 class HotKeyChain(object):
     """
     Takes a keypress, and manages the state of the keys.
-    It stores a list of key chains to action pairs.
+    The key chains are compiled into a tree of ChainNode objects; the
+    first level is indexed by the modifier bit mask, and each level
+    below that by the VK code of the next key in the chain.
 
     There should be one of these per system "mode".
     """
 
-    def __init__(self, chain_commands=None):
-        self.__combos = []
+    def __init__(self, chain_commands=None, key_state=None):
+        """
 
-        # The modifiers which are down and associated with the active combos
-        self.__active_modifiers = []
+        :param chain_commands: map of key chain text to command.
+        :param key_state: the KeyState to match against; defaults to the
+            hook's KEY_STATE.
+        """
+        self.__key_state = key_state or KEY_STATE
+
+        # modifier mask -> ChainNode
+        self.__roots = {}
+        self.__diagnostics = ()
+
+        # The modifier mask associated with the active chain node.  None
+        # if there is no active node.
+        self.__active_mask = None
 
         # The previous key in the combo chain; we're waiting for it to be off.
         self.__active_key = None
 
-        # The active combo chains.  Index 0 in each item is the remaining list
-        # of key down actions to look for ([0] meaning the next one).  Index 1
-        # in each item is the command to return.
-        self.__active_combos = []
+        # The chain node matched so far.
+        self.__active_node = None
 
         # Set to True to prevent the OS shell from using the "windows" key.
         self.block_win_key = False
@@ -131,32 +135,22 @@ class HotKeyChain(object):
         if chain_commands is not None:
             self.set_key_chains(chain_commands)
 
+    @property
+    def diagnostics(self):
+        """Problems found when compiling the key chains (list of ChainDiagnostic)."""
+        return self.__diagnostics
+
     def set_key_chains(self, chain_commands):
-        assert isinstance(chain_commands, dict)
-
-        combos = []
-        for key_chain, command in chain_commands.items():
-            assert isinstance(command, list) or isinstance(command, tuple)
-            keys = parse_combo_str(key_chain)
-            if len(keys) > 0:
-                # We store modifiers a little differently.
-                # Rather than having a list of lists, which must be
-                # carefully examined, we instead construct the
-                # permutations of the keys, and store each of those as
-                # their own combo.
-                permutation_keys = []
-                _key_permutations(keys[0], 0, [], permutation_keys)
-                for perm in permutation_keys:
-                    # print("DEBUG Combo {0} + {1} => {2}".format(perm, keys[1:], command))
-                    combos.append((perm, keys[1:], tuple(command)))
+        compiled = compile_key_chains(chain_commands, self.__key_state)
 
         # Change the variable in a single command.
-        self.__combos = combos
+        self.__roots = compiled.roots
+        self.__diagnostics = compiled.diagnostics
         self.reset()
 
     def reset(self):
-        self.__active_combos = []
-        self.__active_modifiers = []
+        self.__active_node = None
+        self.__active_mask = None
         self.__active_key = None
 
     def key_action(self, vk_code, is_down):
@@ -169,25 +163,23 @@ class HotKeyChain(object):
             another application, but does not complete an action, or
             a list of the action to run.
         """
-        if _MODIFIERS == self.__active_modifiers:
-            if self.__active_key is None or not _CURRENT_KEY_STATE[self.__active_key]:
+        key_state = self.__key_state
+        mask = key_state.modifier_mask
+        if mask == self.__active_mask:
+            if self.__active_key is None or not key_state.is_down(self.__active_key):
                 # The previous key is no longer down.
                 self.__active_key = None
 
-                next_combos = []
-                for ac in self.__active_combos:
-                    if vk_code in ac[0][0]:
-                        ac[0].pop(0)
-                        if len(ac[0]) <= 0:
-                            # We have our key
-                            command = ac[1]
-                            self.reset()
-                            # print("DEBUG keys generated command {0}".format(command))
-                            return command
-                        next_combos.append(ac)
-                if len(next_combos) > 0:
+                next_node = self.__active_node.children.get(vk_code)
+                if next_node is not None:
+                    if next_node.command is not None:
+                        # We have our key
+                        command = next_node.command
+                        self.reset()
+                        # print("DEBUG keys generated command {0}".format(command))
+                        return command
                     self.__active_key = vk_code
-                    self.__active_combos = next_combos
+                    self.__active_node = next_node
                     return ACTION_PENDING
                 elif is_down:
                     # A new key was pressed, which isn't a key in a pending
@@ -196,25 +188,200 @@ class HotKeyChain(object):
             # else, the previous active key is still down; wait for it
             # to come up.
         else:
-            # Discover which combo matches the modifiers.
+            # Discover which chains match the modifiers.
             self.reset()
-            new_active = []
-            for combo in self.__combos:
-                if combo[0] == _MODIFIERS:
-                    new_active.append((list(combo[1]), combo[2]))
-            if len(new_active) > 0:
-                self.__active_key = None
-                self.__active_combos = new_active
-                self.__active_modifiers = set(_MODIFIERS)
+            root = self.__roots.get(mask)
+            if root is not None:
+                self.__active_node = root
+                self.__active_mask = mask
                 # We still pass on the modifiers to the OS, just in case it's not
                 # a match.
 
-        if self.block_win_key and vk_code in _WIN_KEYS:
+        if self.block_win_key and (vk_code == _VK_LWIN or vk_code == _VK_RWIN):
             return ACTION_PENDING
         return IGNORED
 
 
-def parse_combo_str(chain_description):
+class ChainNode(object):
+    """
+    One step in a compiled key chain.  The children are indexed by the VK
+    code of the next key in the chain.  A node with a command completes the
+    chain; the command wins over any longer chains that continue from it.
+    """
+    __slots__ = ('children', 'command', 'source')
+
+    def __init__(self):
+        self.children = {}
+        self.command = None
+        # The key chain text which set the command.
+        self.source = None
+
+    def add_chain(self, keys, command, source=None, diagnostics=None):
+        """
+
+        :param keys: list of steps; each step is a list of alternate VK codes.
+        :param command: command tuple returned when the chain completes.
+        :param source: the key chain text, for reporting problems.
+        :param diagnostics: list which collects the ChainDiagnostic problems.
+        """
+        if len(keys) <= 0:
+            if self.command is None:
+                self.command = command
+                self.source = source
+                if diagnostics is not None:
+                    for other in _terminal_sources(self.children):
+                        _report(diagnostics, other, "never matched; `{0}` matches first".format(source))
+            elif diagnostics is not None and source != self.source:
+                # The first registered chain keeps its command.
+                if command == self.command:
+                    _report(diagnostics, source, "duplicate of `{0}`".format(self.source),
+                            ChainDiagnostic.WARNING)
+                else:
+                    _report(diagnostics, source, "conflicts with `{0}`, which is used instead".format(
+                        self.source))
+            return
+        if self.command is not None and diagnostics is not None:
+            _report(diagnostics, source, "never matched; `{0}` matches first".format(self.source))
+        for vk_code in keys[0]:
+            if vk_code not in self.children:
+                self.children[vk_code] = ChainNode()
+            self.children[vk_code].add_chain(keys[1:], command, source, diagnostics)
+
+
+class ChainDiagnostic(object):
+    """
+    A problem found in the key chain configuration.
+    """
+    ERROR = 'error'
+    WARNING = 'warning'
+
+    def __init__(self, level, chain, message, mode=None):
+        """
+
+        :param level: ERROR or WARNING
+        :param chain: the key chain text (or key) with the problem.
+        :param message:
+        :param mode: the hotkey mode the chain is in, if known.
+        """
+        self.level = level
+        self.chain = chain
+        self.message = message
+        self.mode = mode
+
+    def for_mode(self, mode):
+        return ChainDiagnostic(self.level, self.chain, self.message, mode)
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, ChainDiagnostic) and self.level == other.level and
+            self.chain == other.chain and self.message == other.message and self.mode == other.mode
+        )
+
+    def __hash__(self):
+        return hash((self.level, self.chain, self.message, self.mode))
+
+    def __str__(self):
+        if self.mode is None:
+            return "hotkey `{0}`: {1}".format(self.chain, self.message)
+        return "hotkey mode `{0}`, `{1}`: {2}".format(self.mode, self.chain, self.message)
+
+    def __repr__(self):
+        return "ChainDiagnostic({0}, {1}, {2}, {3})".format(
+            repr(self.level), repr(self.chain), repr(self.message), repr(self.mode))
+
+
+class CompiledKeyChains(object):
+    """
+    The result of compile_key_chains.  Treat as read-only; it may be shared
+    between key chain handlers.
+    """
+    __slots__ = ('roots', 'diagnostics')
+
+    def __init__(self, roots, diagnostics):
+        # dict of modifier mask -> root ChainNode
+        self.roots = roots
+        # tuple of ChainDiagnostic
+        self.diagnostics = diagnostics
+
+
+def compile_key_chains(chain_commands, key_state):
+    """
+    Compile the key chains, or return the previously compiled chains if the
+    same chains were compiled before, so reloading an unchanged configuration
+    is cheap.
+
+    :param chain_commands: map of key chain text to command.
+    :param key_state: KeyState whose modifier bits are used.
+    :return: CompiledKeyChains
+    """
+    assert isinstance(chain_commands, dict)
+
+    cache_key = repr(sorted(chain_commands.items(), key=lambda x: x[0]))
+    with _COMPILED_CACHE_LOCK:
+        cache = _COMPILED_CACHE.get(key_state)
+        if cache is None:
+            cache = collections.OrderedDict()
+            _COMPILED_CACHE[key_state] = cache
+        compiled = cache.get(cache_key)
+        if compiled is not None:
+            cache.move_to_end(cache_key)
+            return compiled
+
+    diagnostics = []
+    roots = {}
+    for key_chain, command in chain_commands.items():
+        assert isinstance(command, list) or isinstance(command, tuple)
+        keys = parse_combo_str(key_chain, diagnostics)
+        if len(keys) < 2:
+            _report(diagnostics, key_chain, "no keys after the modifiers; never matched")
+            continue
+        # Each permutation of the modifier aliases is its own
+        # modifier mask, all sharing the same remaining chain.
+        permutation_keys = []
+        if len(keys[0]) > 0:
+            _key_permutations(keys[0], 0, [], permutation_keys)
+        else:
+            # No modifiers
+            permutation_keys.append(set())
+        for perm in permutation_keys:
+            mask = key_state.modifier_mask_for(perm)
+            if mask not in roots:
+                roots[mask] = ChainNode()
+            roots[mask].add_chain(keys[1:], tuple(command), key_chain, diagnostics)
+
+    # The alias permutations can report the same problem more than once.
+    unique = []
+    for diagnostic in diagnostics:
+        if diagnostic not in unique:
+            unique.append(diagnostic)
+    compiled = CompiledKeyChains(roots, tuple(unique))
+
+    with _COMPILED_CACHE_LOCK:
+        cache[cache_key] = compiled
+        while len(cache) > _MAX_COMPILED_CACHE_SIZE:
+            cache.popitem(last=False)
+    return compiled
+
+
+def _report(diagnostics, chain, message, level=ChainDiagnostic.ERROR):
+    if diagnostics is None:
+        print("CONFIG {0}: {1}: {2}".format(level.upper(), chain, message))
+    else:
+        diagnostics.append(ChainDiagnostic(level, chain, message))
+
+
+def _terminal_sources(children):
+    ret = []
+    for child in children.values():
+        if child.command is not None and child.source not in ret:
+            ret.append(child.source)
+        for source in _terminal_sources(child.children):
+            if source not in ret:
+                ret.append(source)
+    return ret
+
+
+def parse_combo_str(chain_description, diagnostics=None):
     """
     Special compact form of the string.  For each key combo part,
     we make a "string" of the only VK codes that must be "down" in
@@ -229,6 +396,8 @@ def parse_combo_str(chain_description):
         key2 (and so on) are the keys that must be pressed and released
         in order (the last key will respond on key down).  Each key
         in the list is itself a list of alternate keys.
+    :param diagnostics: list which collects ChainDiagnostic problems; if
+        None, they are printed.
     """
     assert isinstance(chain_description, str)
 
@@ -249,19 +418,16 @@ def parse_combo_str(chain_description):
                     if k in MODIFIERS:
                         primary_key.append(STR_VK_MAP[k])
                     else:
-                        # TODO better error / warning
-                        print("CONFIG ERROR: Primary key not a modifier {0}".format(k))
+                        _report(diagnostics, chain_description, "primary key not a modifier {0}".format(k))
                 else:
-                    print("ERROR IN SETUP: alias {0} not in vk map".format(k))
+                    _report(diagnostics, chain_description, "alias {0} not in vk map".format(k))
         elif key_text in STR_VK_MAP:
             if key_text in MODIFIERS:
                 primary_key.append(STR_VK_MAP[key_text])
             else:
-                # TODO better error / warning
-                print("CONFIG ERROR: Primary key not a modifier {0}".format(key_text))
+                _report(diagnostics, chain_description, "primary key not a modifier {0}".format(key_text))
         else:
-            # TODO better error / warning
-            print("CONFIG ERROR: unknown key code [{0}]".format(key_text))
+            _report(diagnostics, chain_description, "unknown key code [{0}]".format(key_text))
         if len(primary_key) > 0:
             primary_list.append(primary_key)
 
@@ -274,21 +440,18 @@ def parse_combo_str(chain_description):
             for k in VK_ALIASES[key_text]:
                 if k in STR_VK_MAP:
                     if k in MODIFIERS:
-                        # TODO better error / warning
-                        print("CONFIG ERROR: secondary key is a modifier {0}".format(k))
+                        _report(diagnostics, chain_description, "secondary key is a modifier {0}".format(k))
                     else:
                         key.append(STR_VK_MAP[k])
                 else:
-                    print("ERROR IN SETUP: alias {0} not in vk map".format(k))
+                    _report(diagnostics, chain_description, "alias {0} not in vk map".format(k))
         elif key_text in STR_VK_MAP:
             if key_text in MODIFIERS:
-                # TODO better error / warning
-                print("CONFIG ERROR: secondary key is a modifier {0}".format(key_text))
+                _report(diagnostics, chain_description, "secondary key is a modifier {0}".format(key_text))
             else:
                 key.append(STR_VK_MAP[key_text])
         else:
-            # TODO better error / warning
-            print("CONFIG ERROR: unknown key code {0}".format(key_text))
+            _report(diagnostics, chain_description, "unknown key code {0}".format(key_text))
         if len(key) > 0:
             chain.append(key)
     return chain
@@ -634,7 +797,17 @@ _MODIFIER_KEYS = set()
 for __k in MODIFIERS:
     _MODIFIER_KEYS.add(STR_VK_MAP[__k])
 
-_WIN_KEYS = [STR_VK_MAP['lwin'], STR_VK_MAP['rwin']]
+# The key state as reported by the keyboard hook.
+KEY_STATE = KeyState(_MODIFIER_KEYS)
+
+# KeyState -> OrderedDict of the chain text -> CompiledKeyChains
+_COMPILED_CACHE = weakref.WeakKeyDictionary()
+_COMPILED_CACHE_LOCK = threading.Lock()
+_MAX_COMPILED_CACHE_SIZE = 32
+
+_VK_LWIN = STR_VK_MAP['lwin']
+_VK_RWIN = STR_VK_MAP['rwin']
+_WIN_KEYS = [_VK_LWIN, _VK_RWIN]
 
 
 SPECIAL_MODIFIER_CHECK_VKEY_CODES = (
@@ -0,0 +1,223 @@
+"""
+Splits the keyboard hook work in two.  The verdict (swallow the key or
+pass it on to the OS) is made on the hook thread, from the compiled key
+chains alone.  Everything else - firing the commands, mode change events,
+logging - is handed through a ring buffer to a separate thread.
+
+The OS only gives the hook a short time to answer, so the verdict must
+not fire events or format messages.
+"""
+
+from .spsc_ring import SpscRing
+from .hotkey_chain import ACTION_PENDING, IGNORED
+from .chord_engine import ChordEngine
+import threading
+
+# Dispatched item kinds.  Each item is a tuple of (kind, value 1, value 2).
+
+# (COMMAND, command tuple, None)
+COMMAND = 'command'
+
+# (MODE_CHANGED, old mode, new mode)
+MODE_CHANGED = 'mode-changed'
+
+# (UNKNOWN_MODE, requested mode, None)
+UNKNOWN_MODE = 'unknown-mode'
+
+# Only dispatched when the key debugging is on.
+# (KEY_SWALLOWED, vk code, is down)
+KEY_SWALLOWED = 'key-swallowed'
+
+# (WIN_KEY_UP_PASSED, vk code, False)
+WIN_KEY_UP_PASSED = 'win-key-up-passed'
+
+# Made by `drain` rather than the hook, when the ring was full.
+# (DROPPED, items dropped since the last report, total items dropped)
+DROPPED = 'dropped'
+
+_VK_LWIN = 0x5B
+_VK_RWIN = 0x5C
+_DEFAULT_RING_SIZE = 256
+
+
+class HotkeyDispatch(object):
+    def __init__(self, key_state, mode_change_command, ring_size=_DEFAULT_RING_SIZE, debug_keys=False):
+        """
+
+        :param key_state: KeyState updated by the verdict.
+        :param mode_change_command: the command name (first item in the
+            command tuple) which switches modes.
+        :param ring_size: number of dispatched items that can be waiting
+            before new ones are dropped.
+        :param debug_keys: dispatch an item for every key swallowed or Win
+            key release passed on, for debug logging.
+        """
+        self.__key_state = key_state
+        self.__mode_change_command = mode_change_command
+        self.__ring = SpscRing(ring_size)
+        self.__debug_keys = debug_keys
+        # Only used by the draining thread.
+        self.__reported_dropped = 0
+
+        # (mode name, key chain for the mode, mode name -> key chain)
+        # Replaced as a whole, so the hook thread always sees a consistent
+        # set of values.
+        self.__modes = (None, None, {})
+        self.__needs_poll = False
+
+        self.__thread = None
+        self.__stopped = False
+
+    @property
+    def mode(self):
+        return self.__modes[0]
+
+    @property
+    def dropped(self):
+        return self.__ring.dropped
+
+    @property
+    def needs_poll(self):
+        """True if a mode has timed key chains, which need `poll` calls."""
+        return self.__needs_poll
+
+    def set_mode_combos(self, mode_combos, default_mode):
+        """
+        Replace the key chains.  The current mode is kept if it's still
+        present, otherwise the default mode is used.
+
+        :param mode_combos: dict of mode name -> HotKeyChain or KeyOverride
+        :param default_mode:
+        """
+        mode = self.__modes[0]
+        if mode not in mode_combos:
+            mode = default_mode
+        self.__modes = (mode, mode_combos[mode], mode_combos)
+        self.__needs_poll = any(isinstance(chain, ChordEngine) for chain in mode_combos.values())
+
+    def verdict(self, vk_code, is_down, forced_vk_codes=None, forced_states=None):
+        """
+        Called by the keyboard hook.
+
+        :param vk_code:
+        :param is_down:
+        :param forced_vk_codes: see KeyState.key_event
+        :param forced_states: see KeyState.key_event
+        :return: True if the key should be swallowed, False if it should
+            be passed on.
+        """
+        if not self.__key_state.key_event(vk_code, is_down, forced_vk_codes, forced_states):
+            return False
+        res = self.__modes[1].key_action(vk_code, is_down)
+        if res == IGNORED:
+            return False
+        if res != ACTION_PENDING and not self.__dispatch_action(res):
+            # The command was dropped, so rather than lose the key too,
+            # let the OS have it.
+            return False
+
+        # Weird things happen if we block win+L and win+U;
+        # specifically, the win key is stuck down.
+        # Experiments found that if we don't block the key release,
+        # then things won't get stuck.
+        if not is_down and (vk_code == _VK_LWIN or vk_code == _VK_RWIN):
+            if self.__debug_keys:
+                self.__ring.put((WIN_KEY_UP_PASSED, vk_code, False))
+            return False
+        if self.__debug_keys:
+            self.__ring.put((KEY_SWALLOWED, vk_code, is_down))
+        return True
+
+    def poll(self):
+        """
+        Called by the keyboard hook thread every so often, so that timed
+        key chains can act between key events, such as a tap / hold key
+        held down without key repeats.
+        """
+        chain = self.__modes[1]
+        if isinstance(chain, ChordEngine):
+            res = chain.poll()
+            if res != IGNORED:
+                self.__dispatch_action(res)
+
+    def __dispatch_action(self, res):
+        """
+
+        :return: False if the command was dropped.
+        """
+        mode, _, mode_combos = self.__modes
+        if res[0] == self.__mode_change_command:
+            # The next key must be matched against the new mode, so the
+            # switch happens here rather than on the dispatch thread.
+            new_mode = res[1].strip()
+            if new_mode in mode_combos:
+                new_chain = mode_combos[new_mode]
+                new_chain.reset()
+                self.__modes = (new_mode, new_chain, mode_combos)
+                self.__ring.put((MODE_CHANGED, mode, new_mode))
+            else:
+                self.__ring.put((UNKNOWN_MODE, new_mode, None))
+            return True
+        return self.__ring.put((COMMAND, res, None))
+
+    def drain(self, handler, log_error=None):
+        """
+        Pass every waiting item to the handler, then a DROPPED item if
+        more items were dropped since the last call.  Must only be called
+        from one thread at a time.
+
+        :param handler: callable that takes the (kind, value 1, value 2) item.
+        :param log_error: callable that takes a message and the exception,
+            such as a component's `_log_error`; called when the handler
+            fails, and the remaining items are still handled.  If None, the
+            handler's exception is raised.
+        :return: the number of items handled.
+        """
+        count = 0
+        item = self.__ring.get()
+        while item is not None:
+            count += 1
+            _handle(handler, item, log_error)
+            item = self.__ring.get()
+        dropped = self.__ring.dropped
+        if dropped > self.__reported_dropped:
+            count += 1
+            item = (DROPPED, dropped - self.__reported_dropped, dropped)
+            self.__reported_dropped = dropped
+            _handle(handler, item, log_error)
+        return count
+
+    def start(self, handler, log_error):
+        """
+        Start the thread that drains the dispatched items.
+
+        :param handler: see `drain`
+        :param log_error: see `drain`
+        """
+        assert self.__thread is None
+        assert log_error is not None
+
+        def run():
+            while not self.__stopped:
+                self.__ring.wait()
+                self.drain(handler, log_error)
+
+        self.__thread = threading.Thread(target=run, daemon=True)
+        self.__thread.name = "Hotkey Dispatch"
+        self.__thread.start()
+
+    def stop(self, timeout=None):
+        self.__stopped = True
+        self.__ring.interrupt()
+        if self.__thread is not None and threading.current_thread() != self.__thread:
+            self.__thread.join(timeout)
+
+
+def _handle(handler, item, log_error):
+    if log_error is None:
+        handler(item)
+        return
+    try:
+        handler(item)
+    except Exception as e:
+        log_error("Hotkey dispatch of {0} failed".format(item[0]), e)
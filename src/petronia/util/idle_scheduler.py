@@ -0,0 +1,221 @@
+"""
+Runs low priority work while the bus has nothing else to do.
+
+The bus tells the scheduler when an event is queued (busy) and when every
+lane has emptied (idle).  Once the bus has been idle for the quiet period,
+the queued tasks are run, one step at a time, in slices of at most the
+slice time.  A slice stops as soon as the bus is busy again; the next one
+waits for another quiet period.
+
+A task is a callable taking no arguments.  It returns True if it has more
+to do, in which case it is called again, before the tasks queued after it.
+A task may be queued with a key, so that it's only queued once until it
+finishes.
+"""
+
+import collections
+import threading
+import time
+import traceback
+
+# Seconds the bus must be idle before a slice runs.
+DEFAULT_QUIET_PERIOD = 0.05
+
+# Most seconds one slice runs tasks for.
+DEFAULT_SLICE_TIME = 0.005
+
+# A task waiting longer than this many seconds is counted as starved.
+DEFAULT_STARVATION_TIME = 5.0
+
+
+class _Task(object):
+    __slots__ = ('call', 'key', 'queued')
+
+    def __init__(self, call, key, queued):
+        self.call = call
+        self.key = key
+        self.queued = queued
+
+
+class IdleScheduler(object):
+    """
+    Safe to use from several threads.  Without `start`, nothing runs the
+    slices but explicit `run_slice` calls.
+    """
+    def __init__(self, quiet_period=DEFAULT_QUIET_PERIOD, slice_time=DEFAULT_SLICE_TIME,
+                 starvation_time=DEFAULT_STARVATION_TIME, clock=time.perf_counter):
+        self.quiet_period = quiet_period
+        self.slice_time = slice_time
+        self.starvation_time = starvation_time
+        self.__clock = clock
+        self.__condition = threading.Condition()
+        self.__tasks = collections.deque()
+        self.__keys = set()
+        self.__busy = False
+        self.__idle_since = clock()
+        self.__running = False
+        self.__thread = None
+        self.__stopped = False
+
+        self.__completed = 0
+        self.__steps = 0
+        self.__slices = 0
+        self.__yielded = 0
+        self.__starved = 0
+        self.__total_latency = 0.0
+        self.__max_latency = 0.0
+
+    def schedule(self, task, key=None):
+        """
+
+        :param task: callable; returns True to be called again.
+        :param key: if given, and a task with the same key is queued, this
+            task isn't queued.
+        :return: True if the task was queued.
+        """
+        with self.__condition:
+            if key is not None:
+                if key in self.__keys:
+                    return False
+                self.__keys.add(key)
+            self.__tasks.append(_Task(task, key, self.__clock()))
+            self.__condition.notify()
+            return True
+
+    def set_busy(self):
+        """
+        An event was queued on the bus.  Called often, so it only sets a
+        flag; the thread notices it when the quiet period is up, and a
+        running slice notices it before the next step.
+        """
+        self.__busy = True
+
+    def set_idle(self):
+        """
+        Every bus lane is empty.
+        """
+        with self.__condition:
+            self.__busy = False
+            self.__idle_since = self.__clock()
+            self.__condition.notify()
+
+    def __len__(self):
+        with self.__condition:
+            return len(self.__tasks)
+
+    def quiet_wait(self):
+        """
+
+        :return: seconds until a slice can run, 0 if it can run now, or None
+            if the bus is busy or there is nothing to run.
+        """
+        with self.__condition:
+            return self.__quiet_wait()
+
+    def __quiet_wait(self):
+        if self.__busy or len(self.__tasks) <= 0:
+            return None
+        return max(0.0, self.__idle_since + self.quiet_period - self.__clock())
+
+    def run_slice(self):
+        """
+        Run tasks until the slice time is used, the bus is busy, or there
+        are no more tasks.  Does nothing if the bus isn't quiet yet.
+
+        :return: the number of task steps run.
+        """
+        with self.__condition:
+            if self.__running or self.__quiet_wait() != 0:
+                return 0
+            self.__running = True
+            self.__slices += 1
+        start = self.__clock()
+        steps = 0
+        try:
+            while True:
+                with self.__condition:
+                    if len(self.__tasks) <= 0:
+                        break
+                    if self.__quiet_wait() != 0:
+                        # An event came in; let it run.
+                        self.__yielded += 1
+                        break
+                    task = self.__tasks.popleft()
+                again = False
+                try:
+                    again = task.call()
+                except Exception as e:
+                    print("<<IDLE TASK ERROR: Failed to run {0}: {1} ({2})>>".format(task.call, e, type(e)))
+                    traceback.print_exc()
+                steps += 1
+                now = self.__clock()
+                with self.__condition:
+                    self.__steps += 1
+                    if again:
+                        self.__tasks.appendleft(task)
+                    else:
+                        self.__finished(task, now)
+                if now - start >= self.slice_time:
+                    break
+        finally:
+            with self.__condition:
+                self.__running = False
+        return steps
+
+    def __finished(self, task, now):
+        if task.key is not None:
+            self.__keys.discard(task.key)
+        latency = now - task.queued
+        self.__completed += 1
+        self.__total_latency += latency
+        self.__max_latency = max(self.__max_latency, latency)
+        if latency > self.starvation_time:
+            self.__starved += 1
+
+    def statistics(self):
+        """
+
+        :return: dict of the counts, and the latencies (the seconds from
+            queueing a task to it finishing) in seconds.
+        """
+        with self.__condition:
+            now = self.__clock()
+            waits = [now - task.queued for task in self.__tasks]
+            return {
+                'queued': len(self.__tasks),
+                'completed': self.__completed,
+                'steps': self.__steps,
+                'slices': self.__slices,
+                'yielded-slices': self.__yielded,
+                'mean-latency': self.__completed > 0 and self.__total_latency / self.__completed or 0.0,
+                'max-latency': self.__max_latency,
+                'max-wait': len(waits) > 0 and max(waits) or 0.0,
+                'starved': self.__starved,
+                'starving': len([w for w in waits if w > self.starvation_time]),
+            }
+
+    def start(self):
+        """
+        Run the slices from a daemon thread.
+        """
+        with self.__condition:
+            if self.__thread is None:
+                self.__thread = threading.Thread(target=self.__run, daemon=True)
+                self.__thread.name = "Idle Scheduler"
+                self.__thread.start()
+
+    def stop(self):
+        with self.__condition:
+            self.__stopped = True
+            self.__condition.notify()
+
+    def __run(self):
+        while True:
+            with self.__condition:
+                if self.__stopped:
+                    return
+                wait = self.__quiet_wait()
+                if wait is None or wait > 0:
+                    self.__condition.wait(wait)
+                    continue
+            self.run_slice()
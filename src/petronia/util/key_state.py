@@ -0,0 +1,115 @@
+"""
+The up / down state of the keyboard, as seen by the keyboard hook.
+"""
+
+import threading
+
+# Bigger than necessary
+MAX_VK_KEY = 0x200
+VK_KEY_MASK = 0x1ff
+
+
+class KeyState(object):
+    """
+    Tracks which keys are down, along with a bit mask of the modifier keys
+    that are down.  Each modifier VK code is assigned its own bit, in
+    increasing VK code order.
+
+    Updates are made under a lock.  The key state and the modifier mask
+    can be read from any thread without the lock; the `lock` must be held
+    if the key state and the mask need to agree with each other.
+    """
+    def __init__(self, modifier_vk_codes):
+        """
+
+        :param modifier_vk_codes: iterable of the VK codes which are modifiers.
+        """
+        self.__keys = bytearray(MAX_VK_KEY)
+        self.__modifier_bits = [0] * MAX_VK_KEY
+        for i, vk_code in enumerate(sorted(set(modifier_vk_codes))):
+            assert 0 <= vk_code < MAX_VK_KEY
+            self.__modifier_bits[vk_code] = 1 << i
+        self.__modifier_mask = 0
+        self.lock = threading.Lock()
+
+    @property
+    def modifier_mask(self):
+        return self.__modifier_mask
+
+    def is_down(self, vk_code):
+        return self.__keys[vk_code & VK_KEY_MASK] != 0
+
+    def is_modifier(self, vk_code):
+        return self.__modifier_bits[vk_code & VK_KEY_MASK] != 0
+
+    def modifier_mask_for(self, modifier_vk_codes):
+        """
+
+        :param modifier_vk_codes: iterable of modifier VK codes.
+        :return: the modifier bit mask with just those modifiers down.
+        """
+        mask = 0
+        for vk_code in modifier_vk_codes:
+            mask |= self.__modifier_bits[vk_code & VK_KEY_MASK]
+        return mask
+
+    def set_key(self, vk_code, is_down):
+        """
+
+        :param vk_code:
+        :param is_down:
+        :return: True if it's a recognized key, False if it isn't known.
+        """
+        if not 0 <= vk_code < MAX_VK_KEY:
+            return False
+        with self.lock:
+            self.__set_key(vk_code, is_down)
+        return True
+
+    def key_event(self, vk_code, is_down, forced_vk_codes=None, forced_states=None):
+        """
+        Record a key press or release, after first forcing the state of
+        the keys in `forced_vk_codes`.  This is for keys, such as the
+        windows keys, whose up event the hook can miss (e.g. while the
+        desktop is locked).  The forced keys are passed as two parallel
+        sequences so that the caller can reuse the same objects for
+        every key event.
+
+        :param vk_code:
+        :param is_down:
+        :param forced_vk_codes: sequence of VK codes whose state is forced,
+            or None.  The key for this event is never forced.
+        :param forced_states: sequence of the down state (true if down) for
+            each of the forced VK codes.
+        :return: True if it's a recognized key, False if it isn't known.
+        """
+        with self.lock:
+            if forced_vk_codes is not None:
+                for i in range(len(forced_vk_codes)):
+                    k = forced_vk_codes[i]
+                    if k != vk_code:
+                        down = forced_states[i]
+                        if (self.__keys[k & VK_KEY_MASK] != 0) != bool(down):
+                            self.__set_key(k & VK_KEY_MASK, down)
+            if 0 <= vk_code < MAX_VK_KEY:
+                self.__set_key(vk_code, is_down)
+                return True
+        return False
+
+    def clear(self):
+        """
+        Mark every key as up.
+        """
+        with self.lock:
+            for i in range(MAX_VK_KEY):
+                self.__keys[i] = 0
+            self.__modifier_mask = 0
+
+    def __set_key(self, vk_code, is_down):
+        bit = self.__modifier_bits[vk_code]
+        if is_down:
+            self.__keys[vk_code] = 1
+            self.__modifier_mask |= bit
+        else:
+            self.__keys[vk_code] = 0
+            self.__modifier_mask &= ~bit
@@ -0,0 +1,156 @@
+"""
+Records the keyboard hook events to a compact file, and reads them back.
+
+A trace file starts with a short header, followed by one fixed-size record
+per key event: the VK code, the down / injected flags, and the microseconds
+since the previous event.
+"""
+
+import struct
+import threading
+import time
+
+_MAGIC = b'PKTRACE'
+_VERSION = 1
+_HEADER = struct.Struct('<7sB')
+_RECORD = struct.Struct('<HBI')
+_FLAG_DOWN = 0x01
+_FLAG_INJECTED = 0x02
+_MAX_DELTA_MICROS = 0xffffffff
+
+# Bytes held in memory before the recorder writes them out.
+_FLUSH_SIZE = 64 * 1024
+
+
+class KeyEvent(object):
+    __slots__ = ('vk_code', 'is_down', 'injected', 'timestamp')
+
+    def __init__(self, vk_code, is_down, injected, timestamp):
+        """
+
+        :param vk_code:
+        :param is_down:
+        :param injected: True if the event was injected by software.
+        :param timestamp: seconds since the start of the trace.
+        """
+        self.vk_code = vk_code
+        self.is_down = is_down
+        self.injected = injected
+        self.timestamp = timestamp
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, KeyEvent) and self.vk_code == other.vk_code and
+            self.is_down == other.is_down and self.injected == other.injected and
+            abs(self.timestamp - other.timestamp) < 0.000001
+        )
+
+    def __repr__(self):
+        return "KeyEvent({0}, {1}, {2}, {3})".format(
+            hex(self.vk_code), self.is_down, self.injected, self.timestamp)
+
+
+class KeyTraceRecorder(object):
+    """
+    Called from the keyboard hook, so recording an event only packs it into
+    an in-memory buffer; the buffer is written out when it grows large, and
+    on close.
+    """
+    def __init__(self, filename, clock=time.perf_counter):
+        self.__clock = clock
+        self.__lock = threading.Lock()
+        self.__buffer = bytearray(_HEADER.pack(_MAGIC, _VERSION))
+        self.__start = None
+        self.__last_micros = 0
+        self.__file = open(filename, 'wb')
+
+    def record(self, vk_code, is_down, injected):
+        now = self.__clock()
+        with self.__lock:
+            if self.__file is None:
+                return
+            if self.__start is None:
+                self.__start = now
+            micros = int((now - self.__start) * 1000000)
+            delta = min(_MAX_DELTA_MICROS, max(0, micros - self.__last_micros))
+            self.__last_micros = micros
+            flags = (is_down and _FLAG_DOWN or 0) | (injected and _FLAG_INJECTED or 0)
+            self.__buffer += _RECORD.pack(vk_code & 0xffff, flags, delta)
+            if len(self.__buffer) >= _FLUSH_SIZE:
+                self.__flush()
+
+    def flush(self):
+        with self.__lock:
+            if self.__file is not None:
+                self.__flush()
+                self.__file.flush()
+
+    def close(self):
+        with self.__lock:
+            if self.__file is not None:
+                self.__flush()
+                self.__file.close()
+                self.__file = None
+
+    def __flush(self):
+        if len(self.__buffer) > 0:
+            self.__file.write(self.__buffer)
+            self.__buffer = bytearray()
+
+
+def read_key_trace(filename):
+    """
+
+    :param filename:
+    :return: list of KeyEvent
+    """
+    with open(filename, 'rb') as f:
+        data = f.read()
+    return parse_key_trace(data)
+
+
+def parse_key_trace(data):
+    """
+
+    :param data: bytes of a trace file.
+    :return: list of KeyEvent
+    """
+    if len(data) < _HEADER.size:
+        raise ValueError("not a key trace: too short")
+    magic, version = _HEADER.unpack_from(data, 0)
+    if magic != _MAGIC:
+        raise ValueError("not a key trace")
+    if version != _VERSION:
+        raise ValueError("unsupported key trace version {0}".format(version))
+    ret = []
+    micros = 0
+    for vk_code, flags, delta in _RECORD.iter_unpack(data[_HEADER.size:_trace_end(data)]):
+        micros += delta
+        ret.append(KeyEvent(vk_code, flags & _FLAG_DOWN != 0, flags & _FLAG_INJECTED != 0, micros / 1000000.0))
+    return ret
+
+
+def write_key_trace(filename, events):
+    """
+    Write out a list of KeyEvent objects, such as synthetic key presses.
+    """
+    with open(filename, 'wb') as f:
+        f.write(encode_key_trace(events))
+
+
+def encode_key_trace(events):
+    ret = bytearray(_HEADER.pack(_MAGIC, _VERSION))
+    last_micros = 0
+    for event in events:
+        micros = int(round(event.timestamp * 1000000))
+        delta = min(_MAX_DELTA_MICROS, max(0, micros - last_micros))
+        last_micros = micros
+        flags = (event.is_down and _FLAG_DOWN or 0) | (event.injected and _FLAG_INJECTED or 0)
+        ret += _RECORD.pack(event.vk_code & 0xffff, flags, delta)
+    return bytes(ret)
+
+
+def _trace_end(data):
+    # A trace cut off mid-record (e.g. a crash while recording) keeps
+    # its complete records.
+    return len(data) - ((len(data) - _HEADER.size) % _RECORD.size)
@@ -0,0 +1,123 @@
+"""
+Computes the rectangle of every layout and portal in a layout tree, from
+the layout configuration and the rectangle of the top layout, in one pass.
+
+Each tile in the tree is identified by its path: the tuple of child indexes
+from the top layout (which is the empty tuple).  The tiles are created with
+the rectangle from the table, so a rectangle doesn't have to trickle down
+the tree one event at a time.
+
+The split math is the same as the split layouts use when they are resized:
+each child gets its share of the split steps (integer division), the last
+child gets whatever remains, and floating children (split size 0) get the
+whole rectangle.
+"""
+
+# Category of the leaf tiles; the same as shell.navigation.PORTAL_TYPE.
+PORTAL_CATEGORY = 'portal'
+
+ORIENTATION_HORIZONTAL = 'horizontal'
+ORIENTATION_VERTICAL = 'vertical'
+
+
+def is_portal(layout_def):
+    """A child without a layout definition is a portal."""
+    return layout_def is None or layout_def.category == PORTAL_CATEGORY
+
+
+def get_child_splits(layout_def):
+    """
+    The split size and layout definition of each child of the layout.  A
+    layout without splits has a single portal child.
+
+    :param layout_def: LayoutConfig
+    :return: list of (size, LayoutConfig or None)
+    """
+    splits = layout_def.child_splits
+    if splits is None or len(splits) <= 0:
+        return [(1, None)]
+    ret = []
+    for split in splits:
+        if split is None:
+            ret.append((1, None))
+        else:
+            ret.append((split.size, split.layout_def))
+    return ret
+
+
+def split_rects(orientation, sizes, rect):
+    """
+    Split the rectangle between the children.
+
+    :param orientation: ORIENTATION_HORIZONTAL splits the width,
+        ORIENTATION_VERTICAL the height; anything else gives every child the
+        whole rectangle.
+    :param sizes: split size of each child, in order.
+    :param rect: dict with x, y, width and height.
+    :return: list of rectangle dicts, one per child.
+    """
+    if orientation == ORIENTATION_HORIZONTAL:
+        dyn_min, dyn_max, static_min, static_max = 'x', 'width', 'y', 'height'
+    elif orientation == ORIENTATION_VERTICAL:
+        dyn_min, dyn_max, static_min, static_max = 'y', 'height', 'x', 'width'
+    else:
+        return [_copy_rect(rect) for _ in sizes]
+
+    static_min_pos = rect[static_min]
+    static_max_pos = rect[static_max]
+    start_pos = rect[dyn_min]
+    diff_pos = rect[dyn_max]
+    max_pos = diff_pos + start_pos
+    step_count = sum(sizes)
+
+    ret = []
+    step_pos = 0
+    current_dyn = start_pos
+    for size in sizes:
+        if size <= 0:
+            # Floating child.
+            ret.append(_copy_rect(rect))
+            continue
+        next_step = step_pos + size
+        next_dyn = current_dyn + ((size * diff_pos) // step_count)
+        if next_step >= step_count:
+            # Last child; it takes the remainder, so the children always
+            # fill the rectangle.
+            next_dyn = max_pos
+        ret.append({
+            static_min: static_min_pos,
+            static_max: static_max_pos,
+            dyn_min: current_dyn,
+            dyn_max: next_dyn - current_dyn,
+        })
+        step_pos = next_step
+        current_dyn = next_dyn
+    return ret
+
+
+def compute_layout(layout_def, rect):
+    """
+    Compute the rectangles for the layout and all of its descendants.
+
+    :param layout_def: LayoutConfig of the top layout.
+    :param rect: rectangle dict for the top layout.
+    :return: dict of path -> rectangle dict
+    """
+    ret = {(): _copy_rect(rect)}
+    if is_portal(layout_def):
+        return ret
+    pending = [((), layout_def)]
+    while len(pending) > 0:
+        path, node = pending.pop()
+        splits = get_child_splits(node)
+        child_rects = split_rects(node.orientation, [size for size, child in splits], ret[path])
+        for index, (size, child_def) in enumerate(splits):
+            child_path = path + (index,)
+            ret[child_path] = child_rects[index]
+            if not is_portal(child_def):
+                pending.append((child_path, child_def))
+    return ret
+
+
+def _copy_rect(rect):
+    return {'x': rect['x'], 'y': rect['y'], 'width': rect['width'], 'height': rect['height']}
@@ -0,0 +1,111 @@
+"""
+Runs a blocking function over a list of items on a bounded set of threads,
+and collects the results in the original order.
+
+Made for querying the OS about many windows at once, where one hung
+application can block a call indefinitely.  An item that takes longer
+than the timeout is reported as timed out, and its thread is abandoned
+(the threads are daemons) and replaced, so the rest still finish.
+"""
+
+import queue
+import threading
+import time
+
+DEFAULT_MAX_WORKERS = 8
+
+# Seconds
+DEFAULT_ITEM_TIMEOUT = 2.0
+
+_STOP = object()
+
+
+class GatherResult(object):
+    def __init__(self):
+        # (item, value), in the order of the items.
+        self.results = []
+        # Items which took longer than the timeout.
+        self.timed_out = []
+        # (item, exception)
+        self.failed = []
+
+
+def gather(items, func, max_workers=DEFAULT_MAX_WORKERS, item_timeout=DEFAULT_ITEM_TIMEOUT,
+           clock=time.monotonic):
+    """
+
+    :param items: list of the items to pass to the function.
+    :param func: called with one item; may block.
+    :param max_workers: number of threads running the function at once,
+        not counting the threads abandoned to timed out items.
+    :param item_timeout: seconds a single call may run.
+    :param clock:
+    :return: GatherResult
+    """
+    items = list(items)
+    count = len(items)
+    ret = GatherResult()
+    if count <= 0:
+        return ret
+
+    condition = threading.Condition()
+    tasks = queue.Queue()
+    # Time each item's call started, or None.
+    started = [None] * count
+    # (True, value) or (False, exception), or None while running.
+    done = [None] * count
+
+    def worker():
+        while True:
+            index = tasks.get()
+            if index is _STOP:
+                return
+            with condition:
+                started[index] = clock()
+                condition.notify_all()
+            try:
+                outcome = (True, func(items[index]))
+            except Exception as e:
+                outcome = (False, e)
+            with condition:
+                done[index] = outcome
+                condition.notify_all()
+
+    # Includes the replacement workers.
+    worker_count = [0]
+
+    def start_worker():
+        thread = threading.Thread(target=worker, name="Gather Worker", daemon=True)
+        thread.start()
+        worker_count[0] += 1
+
+    for index in range(count):
+        tasks.put(index)
+    for _ in range(min(max_workers, count)):
+        start_worker()
+
+    try:
+        for index in range(count):
+            with condition:
+                while done[index] is None:
+                    if started[index] is None:
+                        # Still queued behind other items.
+                        condition.wait()
+                        continue
+                    remaining = started[index] + item_timeout - clock()
+                    if remaining <= 0:
+                        break
+                    condition.wait(remaining)
+                outcome = done[index]
+            if outcome is None:
+                ret.timed_out.append(items[index])
+                # The worker is stuck; let another take its place.
+                start_worker()
+            elif outcome[0]:
+                ret.results.append((items[index], outcome[1]))
+            else:
+                ret.failed.append((items[index], outcome[1]))
+    finally:
+        for _ in range(worker_count[0]):
+            tasks.put(_STOP)
+    return ret
@@ -0,0 +1,259 @@
+"""
+Finds the portal next to another portal in a direction, from the portal
+rectangles, rather than by negotiating through the layout tree.
+
+The rectangles are in screen coordinates, so the neighbors work across
+monitors.  After a layout change, the neighbors of every portal in every
+direction are worked out in one go (`build_table`, or on the next lookup),
+so a lookup is a single dictionary access.  The tables are kept for the
+last few sets of portal rectangles, by the portals' positions rather than
+their cids, so going back to a known monitor setup reuses its table even
+though the tiles were created again.
+
+For the compass directions, the nearest portal wins: portals which overlap
+the source portal across the direction come before those only diagonally
+in that direction, then the smallest gap, then the largest overlap.  Any
+remaining tie goes to the most recently used portal, then to the portal
+added first.  `next` and `previous` go through the portals in the order
+they were added, wrapping around.
+"""
+
+import collections
+import threading
+
+# The same as the shell.navigation directions.
+DIR_NORTH = 'north'
+DIR_SOUTH = 'south'
+DIR_EAST = 'east'
+DIR_WEST = 'west'
+DIR_NEXT = 'next'
+DIR_PREVIOUS = 'previous'
+
+COMPASS_DIRECTIONS = (DIR_NORTH, DIR_EAST, DIR_SOUTH, DIR_WEST)
+DIRECTIONS = COMPASS_DIRECTIONS + (DIR_NEXT, DIR_PREVIOUS)
+
+# Number of neighbor tables to keep, one for each set of portal rectangles;
+# the same as the root layout keeps for the layout rectangles.
+_TABLE_MEMO_SIZE = 32
+
+
+class PortalNeighborIndex(object):
+    """
+    Safe to use from several threads.
+    """
+    def __init__(self):
+        # cid -> (left, top, right, bottom), in the order the portals were added.
+        self.__edges = {}
+        self.__order = []
+        # cid -> {direction -> neighbor cid or None}; None when it needs to
+        # be rebuilt.
+        self.__table = None
+        # cid -> list of (cid, direction) table entries that the portal ties
+        # for, with other equally near portals.
+        self.__ties = {}
+        # cid -> use count when it was last used.
+        self.__used = {}
+        self.__use_count = 0
+        # tuple of the portal edges, in the order the portals were added ->
+        # the table from _compute_table.
+        self.__memo = collections.OrderedDict()
+        self.__hits = 0
+        self.__misses = 0
+        self.__lock = threading.Lock()
+
+    @property
+    def hits(self):
+        return self.__hits
+
+    @property
+    def misses(self):
+        return self.__misses
+
+    def set_rect(self, portal_cid, rect):
+        """
+        Add the portal, or change its rectangle.
+
+        :param rect: dict with x, y, width and height.
+        """
+        edges = (rect['x'], rect['y'], rect['x'] + rect['width'], rect['y'] + rect['height'])
+        with self.__lock:
+            if portal_cid not in self.__edges:
+                self.__order.append(portal_cid)
+            elif self.__edges[portal_cid] == edges:
+                return
+            self.__edges[portal_cid] = edges
+            self.__table = None
+
+    def remove(self, portal_cid):
+        with self.__lock:
+            if portal_cid in self.__edges:
+                del self.__edges[portal_cid]
+                self.__order.remove(portal_cid)
+                self.__table = None
+            self.__used.pop(portal_cid, None)
+
+    def touch(self, portal_cid):
+        """
+        Mark the portal as the most recently used one.
+        """
+        with self.__lock:
+            self.__use_count += 1
+            self.__used[portal_cid] = self.__use_count
+            if self.__table is not None:
+                # The portal is now the most recent of any tie.
+                for cid, direction in self.__ties.get(portal_cid, ()):
+                    self.__table[cid][direction] = portal_cid
+
+    def __contains__(self, portal_cid):
+        with self.__lock:
+            return portal_cid in self.__edges
+
+    def neighbor(self, portal_cid, direction):
+        """
+
+        :param portal_cid:
+        :param direction: one of DIRECTIONS
+        :return: the cid of the portal in the direction, or None if there is
+            none (or the portal isn't known).
+        """
+        with self.__lock:
+            if self.__table is None:
+                self.__build_table()
+            neighbors = self.__table.get(portal_cid)
+            if neighbors is None:
+                return None
+            return neighbors.get(direction)
+
+    @property
+    def table(self):
+        """
+        A copy of the neighbor table: portal cid -> {direction -> neighbor
+        cid, or None}.
+        """
+        with self.__lock:
+            if self.__table is None:
+                self.__build_table()
+            return dict((cid, dict(neighbors)) for cid, neighbors in self.__table.items())
+
+    def build_table(self):
+        """
+        Work out the neighbors of every portal, if the portals changed since
+        the last time.
+        """
+        with self.__lock:
+            if self.__table is None:
+                self.__build_table()
+
+    def __build_table(self):
+        order = self.__order
+        edges = tuple(self.__edges[cid] for cid in order)
+        index_table = self.__memo.get(edges)
+        if index_table is None:
+            self.__misses += 1
+            index_table = _compute_table(edges)
+            self.__memo[edges] = index_table
+            while len(self.__memo) > _TABLE_MEMO_SIZE:
+                self.__memo.popitem(last=False)
+        else:
+            self.__hits += 1
+            self.__memo.move_to_end(edges)
+
+        table = {}
+        ties = {}
+        for index, index_neighbors in enumerate(index_table):
+            portal_cid = order[index]
+            neighbors = {}
+            for direction, nearest in index_neighbors.items():
+                if len(nearest) <= 0:
+                    neighbors[direction] = None
+                elif len(nearest) == 1:
+                    neighbors[direction] = order[nearest[0]]
+                else:
+                    cids = [order[i] for i in nearest]
+                    # max keeps the first of equally recent portals, so unused
+                    # portals go in the order they were added.
+                    neighbors[direction] = max(cids, key=lambda cid: self.__used.get(cid, 0))
+                    for cid in cids:
+                        ties.setdefault(cid, []).append((portal_cid, direction))
+            table[portal_cid] = neighbors
+        self.__table = table
+        self.__ties = ties
+
+
+def _compute_table(edges):
+    """
+    Work out the neighbors by position.
+
+    :param edges: the (left, top, right, bottom) of each portal.
+    :return: list with a dict for each portal of direction -> tuple of the
+        indexes of the nearest portals (more than one when they tie).
+    """
+    table = []
+    count = len(edges)
+    for index in range(count):
+        neighbors = {
+            DIR_NEXT: ((index + 1) % count,),
+            DIR_PREVIOUS: ((index - 1) % count,),
+        }
+        for direction in COMPASS_DIRECTIONS:
+            neighbors[direction] = _find_nearest(edges, index, direction)
+        table.append(neighbors)
+    return table
+
+
+def _find_nearest(edges, source_index, direction):
+    source = _oriented(edges[source_index], direction)
+    best_key = None
+    ret = []
+    for index in range(len(edges)):
+        if index == source_index:
+            continue
+        other = _oriented(edges[index], direction)
+        gap = other[0] - source[1]
+        if gap < 0:
+            continue
+        overlap = min(source[3], other[3]) - max(source[2], other[2])
+        key = (overlap <= 0, gap, -overlap)
+        if best_key is None or key < best_key:
+            best_key = key
+            ret = [index]
+        elif key == best_key:
+            ret.append(index)
+    return tuple(ret)
+
+
+def _oriented(edges, direction):
+    """
+    Turn the edges around so the direction always points to larger values
+    of the first two.
+
+    :return: (near edge, far edge, cross start, cross end)
+    """
+    left, top, right, bottom = edges
+    if direction == DIR_EAST:
+        return left, right, top, bottom
+    if direction == DIR_WEST:
+        return -right, -left, top, bottom
+    if direction == DIR_SOUTH:
+        return top, bottom, left, right
+    if direction == DIR_NORTH:
+        return -bottom, -top, left, right
+    raise ValueError('direction {0}'.format(direction))
+
+
+def format_table(table, aliases=None):
+    """
+    Describe the neighbor table, one line per portal.
+
+    :param table: the `PortalNeighborIndex.table`
+    :param aliases: optional dict of portal cid -> list of aliases.
+    :return: list of str
+    """
+    ret = []
+    for portal_cid in sorted(table.keys()):
+        name = portal_cid
+        if aliases and aliases.get(portal_cid):
+            name = '{0} ({1})'.format(portal_cid, ', '.join(sorted(aliases[portal_cid])))
+        ret.append('{0}: {1}'.format(name, ' '.join(
+            '{0}={1}'.format(direction, table[portal_cid].get(direction) or '-') for direction in DIRECTIONS)))
+    return ret
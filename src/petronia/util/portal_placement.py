@@ -0,0 +1,175 @@
+"""
+Picks the portal for a new window from the application location rules,
+through a table of the window's application to the portal id.
+
+The portal alias that each rule prefers is worked out when the aliases
+change, rather than for each window.  Which rules match an application
+doesn't depend on the aliases, so it's found once per application; when
+an alias is added, moved or dropped, only the applications whose rules
+prefer a changed alias are looked up again.
+
+Matches `ApplicationListConfig.get_best_portal_match`: the first rule whose
+application matchers fire, and which has a matching alias, picks the portal.
+Within a rule, the portal matchers are in order of preference, and ties go
+to the alias created first.
+"""
+
+import collections
+import threading
+
+from .app_rules import RuleMatcher, MATCHED_KEYS, DEFAULT_MEMO_SIZE
+
+
+class PortalRule(object):
+    def __init__(self, app_matchers, portal_matchers):
+        """
+
+        :param app_matchers: list of RuleMatcher; the rule applies to windows
+            that fire any of them.
+        :param portal_matchers: list of compiled regex (or any object with a
+            `match` method) for the portal aliases, in order of preference.
+        """
+        for matcher in app_matchers:
+            assert isinstance(matcher, RuleMatcher)
+        self.app_matchers = tuple(app_matchers)
+        self.portal_matchers = tuple(portal_matchers)
+
+
+class _AppEntry(object):
+    __slots__ = ('rules', 'portal_cid')
+
+    def __init__(self, rules, portal_cid):
+        # tuple of the indexes of the rules that apply to the application.
+        self.rules = rules
+        self.portal_cid = portal_cid
+
+
+class PortalPlacement(object):
+    """
+    Safe to use from several threads.
+    """
+    def __init__(self, rules, memo_size=DEFAULT_MEMO_SIZE):
+        """
+
+        :param rules: list of PortalRule, in order of preference.
+        :param memo_size: number of applications to keep in the table.
+        """
+        self.__rules = []
+        used_keys = set()
+        for rule in rules:
+            assert isinstance(rule, PortalRule)
+            if len(rule.portal_matchers) <= 0:
+                continue
+            self.__rules.append(rule)
+            for matcher in rule.app_matchers:
+                used_keys.update(matcher.patterns.keys())
+        self.__memo_keys = tuple(key for key in MATCHED_KEYS if key in used_keys)
+        self.__memo_size = memo_size
+        self.__lock = threading.Lock()
+
+        # alias -> portal cid, in the order the aliases were created.
+        self.__aliases = collections.OrderedDict()
+        # rule index -> (portal matcher index, alias) that the rule prefers,
+        # or None if no alias matches the rule.
+        self.__preferred = [None] * len(self.__rules)
+        # app key -> _AppEntry
+        self.__apps = collections.OrderedDict()
+        # rule index -> set of app keys that the rule applies to.
+        self.__rule_apps = [set() for _ in self.__rules]
+
+    @property
+    def aliases(self):
+        with self.__lock:
+            return dict(self.__aliases)
+
+    def set_alias(self, alias, portal_cid):
+        """
+        Add the alias for the portal, or move an existing alias to the portal.
+        """
+        with self.__lock:
+            changed = set()
+            if alias in self.__aliases:
+                if self.__aliases[alias] == portal_cid:
+                    return
+                self.__aliases[alias] = portal_cid
+                for rule_index, preferred in enumerate(self.__preferred):
+                    if preferred is not None and preferred[1] == alias:
+                        changed.add(rule_index)
+            else:
+                self.__aliases[alias] = portal_cid
+                # The new alias is the last one, so it's only preferred by a
+                # rule if it matches an earlier portal matcher.
+                for rule_index, rule in enumerate(self.__rules):
+                    preferred = self.__preferred[rule_index]
+                    end = preferred is None and len(rule.portal_matchers) or preferred[0]
+                    for matcher_index in range(end):
+                        if rule.portal_matchers[matcher_index].match(alias) is not None:
+                            self.__preferred[rule_index] = (matcher_index, alias)
+                            changed.add(rule_index)
+                            break
+            self.__update_apps(changed)
+
+    def remove_portal(self, portal_cid):
+        """
+        Drop the aliases of the portal.
+        """
+        with self.__lock:
+            removed = [alias for alias, cid in self.__aliases.items() if cid == portal_cid]
+            if len(removed) <= 0:
+                return
+            for alias in removed:
+                del self.__aliases[alias]
+            changed = set()
+            for rule_index, preferred in enumerate(self.__preferred):
+                if preferred is not None and preferred[1] in removed:
+                    self.__preferred[rule_index] = self.__find_preferred(self.__rules[rule_index])
+                    changed.add(rule_index)
+            self.__update_apps(changed)
+
+    def get_portal_cid(self, window_info):
+        """
+
+        :param window_info:
+        :return: the portal cid for the window, or None if no rule places it.
+        """
+        app_key = tuple(window_info.get(key) for key in self.__memo_keys)
+        with self.__lock:
+            entry = self.__apps.get(app_key)
+            if entry is not None:
+                self.__apps.move_to_end(app_key)
+                return entry.portal_cid
+            rules = tuple(
+                rule_index for rule_index, rule in enumerate(self.__rules)
+                if any(matcher.fires(window_info) for matcher in rule.app_matchers))
+            entry = _AppEntry(rules, self.__portal_cid_for(rules))
+            if self.__memo_size > 0:
+                self.__apps[app_key] = entry
+                for rule_index in rules:
+                    self.__rule_apps[rule_index].add(app_key)
+                while len(self.__apps) > self.__memo_size:
+                    old_key, old_entry = self.__apps.popitem(last=False)
+                    for rule_index in old_entry.rules:
+                        self.__rule_apps[rule_index].discard(old_key)
+            return entry.portal_cid
+
+    def __find_preferred(self, rule):
+        for matcher_index, matcher in enumerate(rule.portal_matchers):
+            for alias in self.__aliases:
+                if matcher.match(alias) is not None:
+                    return matcher_index, alias
+        return None
+
+    def __portal_cid_for(self, rules):
+        for rule_index in rules:
+            preferred = self.__preferred[rule_index]
+            if preferred is not None:
+                return self.__aliases[preferred[1]]
+        return None
+
+    def __update_apps(self, changed_rules):
+        app_keys = set()
+        for rule_index in changed_rules:
+            app_keys.update(self.__rule_apps[rule_index])
+        for app_key in app_keys:
+            entry = self.__apps[app_key]
+            entry.portal_cid = self.__portal_cid_for(entry.rules)
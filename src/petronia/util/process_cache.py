@@ -0,0 +1,215 @@
+"""
+Caches the per-process details (owner and executable) used when a window
+is registered.  Applications such as browsers and IDEs own dozens of
+top-level windows, and each lookup opens the process and queries its
+token.
+
+The OS lookups are passed in, so the cache doesn't depend on the native
+functions.
+"""
+
+import threading
+import time
+
+# Seconds between checks that the cached processes are still running.
+DEFAULT_CHECK_INTERVAL = 30.0
+
+
+def pid_key(pid):
+    """The native functions return the pid as a c_ulong; the cache uses the int."""
+    return getattr(pid, 'value', pid)
+
+
+class _ProcessEntry(object):
+    __slots__ = ('username_domain', 'executable_filename', 'hwnds', 'lock')
+
+    def __init__(self):
+        # Held while looking up the details, so windows of the same process
+        # read in parallel wait for the first lookup instead of repeating it.
+        self.lock = threading.Lock()
+        # The looked up value, the OSError raised by the lookup, or None
+        # if not looked up yet.
+        self.username_domain = None
+        self.executable_filename = None
+        self.hwnds = set()
+
+
+class ProcessInfoCache(object):
+    """
+    An entry is dropped when the last window seen for the process is
+    destroyed, or when a periodic check finds that the process has exited
+    (for processes whose windows were never reported as destroyed).
+
+    Lookup failures are cached too, so an inaccessible process is only
+    queried once.
+
+    Safe to use from several threads.
+    """
+    def __init__(self, get_username_domain, get_executable_filename, is_alive,
+                 clock=time.monotonic, check_interval=DEFAULT_CHECK_INTERVAL):
+        """
+
+        :param get_username_domain: pid -> (username, domain); raises OSError
+        :param get_executable_filename: pid -> filename; raises OSError
+        :param is_alive: pid -> True if the process is still running.
+        :param clock: returns the current time in seconds.
+        :param check_interval: seconds between process liveness checks.
+        """
+        self.__get_username_domain = get_username_domain
+        self.__get_executable_filename = get_executable_filename
+        self.__is_alive = is_alive
+        self.__clock = clock
+        self.__check_interval = check_interval
+        self.__last_check = clock()
+        self.__lock = threading.Lock()
+
+        # pid int -> _ProcessEntry
+        self.__entries = {}
+        # hwnd -> pid int
+        self.__hwnd_pids = {}
+
+        self.__hits = 0
+        self.__misses = 0
+
+    @property
+    def hits(self):
+        return self.__hits
+
+    @property
+    def misses(self):
+        return self.__misses
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def __contains__(self, pid):
+        return pid_key(pid) in self.__entries
+
+    def get_username_domain(self, pid):
+        """
+
+        :param pid:
+        :return: (username, domain)
+        """
+        entry = self.__entry(pid)
+        with entry.lock:
+            hit = entry.username_domain is not None
+            if not hit:
+                try:
+                    entry.username_domain = self.__get_username_domain(pid)
+                except OSError as e:
+                    entry.username_domain = e
+            value = entry.username_domain
+        self.__count(hit)
+        return _value(value)
+
+    def get_executable_filename(self, pid):
+        entry = self.__entry(pid)
+        with entry.lock:
+            hit = entry.executable_filename is not None
+            if not hit:
+                try:
+                    entry.executable_filename = self.__get_executable_filename(pid) or ''
+                except OSError as e:
+                    entry.executable_filename = e
+            value = entry.executable_filename
+        self.__count(hit)
+        return _value(value)
+
+    def add_window(self, hwnd, pid):
+        """
+        Associate a window with its process, so its destruction can drop the
+        process details.
+        """
+        key = pid_key(pid)
+        with self.__lock:
+            old_key = self.__hwnd_pids.get(hwnd)
+            if old_key is not None and old_key != key:
+                # The handle was reused without a destroyed event.
+                self.__remove_window(hwnd)
+            self.__hwnd_pids[hwnd] = key
+            self.__get_entry(key).hwnds.add(hwnd)
+
+    def remove_window(self, hwnd):
+        """
+        Called when the window is destroyed.  If it was the last window seen for
+        the process, the process details are dropped.
+        """
+        with self.__lock:
+            self.__remove_window(hwnd)
+
+    def invalidate(self, pid):
+        with self.__lock:
+            self.__invalidate(pid_key(pid))
+
+    def check_processes(self, force=False):
+        """
+        Drop the processes which are no longer running.  Only checks once every
+        check interval, unless forced.
+
+        :return: the number of processes dropped.
+        """
+        now = self.__clock()
+        with self.__lock:
+            if not force and now - self.__last_check < self.__check_interval:
+                return 0
+            self.__last_check = now
+            keys = list(self.__entries.keys())
+        dead = []
+        for key in keys:
+            try:
+                if not self.__is_alive(key):
+                    dead.append(key)
+            except OSError:
+                dead.append(key)
+        with self.__lock:
+            for key in dead:
+                self.__invalidate(key)
+        return len(dead)
+
+    def clear(self):
+        with self.__lock:
+            self.__entries = {}
+            self.__hwnd_pids = {}
+
+    def __remove_window(self, hwnd):
+        key = self.__hwnd_pids.pop(hwnd, None)
+        if key is None:
+            return
+        entry = self.__entries.get(key)
+        if entry is not None:
+            entry.hwnds.discard(hwnd)
+            if len(entry.hwnds) <= 0:
+                del self.__entries[key]
+
+    def __invalidate(self, key):
+        entry = self.__entries.pop(key, None)
+        if entry is not None:
+            for hwnd in entry.hwnds:
+                if self.__hwnd_pids.get(hwnd) == key:
+                    del self.__hwnd_pids[hwnd]
+
+    def __count(self, hit):
+        with self.__lock:
+            if hit:
+                self.__hits += 1
+            else:
+                self.__misses += 1
+
+    def __entry(self, pid):
+        with self.__lock:
+            return self.__get_entry(pid_key(pid))
+
+    def __get_entry(self, key):
+        entry = self.__entries.get(key)
+        if entry is None:
+            entry = _ProcessEntry()
+            self.__entries[key] = entry
+        return entry
+
+
+def _value(value):
+    if isinstance(value, OSError):
+        # Drop the old traceback, so it doesn't grow with every raise.
+        raise value.with_traceback(None)
+    return value
@@ -0,0 +1,119 @@
+"""
+A bounded single-producer, single-consumer ring buffer.
+"""
+
+import threading
+
+
+class SpscRing(object):
+    """
+    Hands items from exactly one producer thread to exactly one consumer
+    thread.  The producer never blocks and never takes a lock unless the
+    consumer is asleep waiting for an item; if the ring is full, the item
+    is dropped.
+
+    This relies on the interpreter making the index updates atomic and
+    visible in order, which the GIL provides.  Each index is only ever
+    written by one side.
+
+    `None` can't be put into the ring; it's how `get` reports an empty ring.
+    """
+    def __init__(self, capacity):
+        """
+
+        :param capacity: minimum number of items held; rounded up to a
+            power of 2.
+        """
+        assert capacity > 0
+        size = 1
+        while size < capacity:
+            size <<= 1
+        self.__slots = [None] * size
+        self.__mask = size - 1
+
+        # Next slot to write; only changed by the producer.
+        self.__head = 0
+        # Next slot to read; only changed by the consumer.
+        self.__tail = 0
+
+        self.__dropped = 0
+        self.__consumer_waiting = False
+        self.__interrupted = False
+        self.__wake = threading.Event()
+
+    @property
+    def capacity(self):
+        return self.__mask + 1
+
+    @property
+    def dropped(self):
+        """Number of items the producer dropped because the ring was full."""
+        return self.__dropped
+
+    def __len__(self):
+        return self.__head - self.__tail
+
+    def put(self, item):
+        """
+        Producer side.
+
+        :param item: non-None item.
+        :return: False if the ring is full and the item was dropped.
+        """
+        head = self.__head
+        if head - self.__tail > self.__mask:
+            self.__dropped += 1
+            return False
+        self.__slots[head & self.__mask] = item
+        self.__head = head + 1
+        if self.__consumer_waiting:
+            self.__wake.set()
+        return True
+
+    def get(self):
+        """
+        Consumer side; does not block.
+
+        :return: the oldest item, or None if the ring is empty.
+        """
+        tail = self.__tail
+        if tail == self.__head:
+            return None
+        index = tail & self.__mask
+        item = self.__slots[index]
+        self.__slots[index] = None
+        self.__tail = tail + 1
+        return item
+
+    def wait(self, timeout=None):
+        """
+        Consumer side; block until the ring has an item, `interrupt` is
+        called, or the timeout expires.
+
+        :param timeout: seconds, or None to wait forever.
+        :return: True if there's an item available.
+        """
+        if self.__tail != self.__head:
+            return True
+        self.__wake.clear()
+        self.__consumer_waiting = True
+        try:
+            # The producer may have added an item before it could see the
+            # waiting flag.
+            if self.__tail != self.__head:
+                return True
+            if self.__interrupted:
+                self.__interrupted = False
+                return False
+            self.__wake.wait(timeout)
+            return self.__tail != self.__head
+        finally:
+            self.__consumer_waiting = False
+
+    def interrupt(self):
+        """
+        Wake the consumer from `wait`, or make its next `wait` return
+        immediately.  Can be called from any thread.
+        """
+        self.__interrupted = True
+        self.__wake.set()
@@ -0,0 +1,130 @@
+"""
+Remembers the last position applied to each window, so a layout request
+which wouldn't change anything can skip the OS calls.
+
+Layouts re-send the rectangle of every window whenever anything changes
+(such as a portal border size), and most of those requests match what the
+window already has.
+"""
+
+import threading
+
+_RECT_KEYS = ('x', 'y', 'width', 'height')
+
+
+class GeometryRequest(object):
+    """
+    A requested window position, with the options that change how it's applied.
+    """
+    __slots__ = ('x', 'y', 'width', 'height', 'make_focused', 'v_snap', 'h_snap', '__key')
+
+    def __init__(self, x, y, width, height, make_focused=False, v_snap=None, h_snap=None):
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.make_focused = make_focused
+        self.v_snap = v_snap
+        self.h_snap = h_snap
+        self.__key = (x, y, width, height, make_focused, v_snap, h_snap)
+
+    @staticmethod
+    def from_event(event_obj):
+        return GeometryRequest(
+            int(event_obj['x']), int(event_obj['y']), int(event_obj['width']), int(event_obj['height']),
+            bool(event_obj.get('make-focused')), event_obj.get('v-snap'), event_obj.get('h-snap'))
+
+    def __eq__(self, other):
+        return isinstance(other, GeometryRequest) and self.__key == other.__key
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash(self.__key)
+
+    def __repr__(self):
+        return "GeometryRequest{0}".format(self.__key)
+
+
+class GeometryTracker(object):
+    """
+    The applied position is forgotten when the window is seen somewhere
+    else (through `observed`), or when the owner knows it changed (such as
+    a minimize).  A request that puts the window on top only matches if no
+    window was focused since it was applied.
+    """
+    def __init__(self):
+        self.__lock = threading.Lock()
+        # hwnd -> (GeometryRequest, final rectangle dict, focus epoch)
+        self.__applied = {}
+        # Incremented on every focus change; the z-order may have changed.
+        self.__focus_epoch = 0
+        self.__apply_count = 0
+        self.__skip_count = 0
+
+    @property
+    def applied(self):
+        """Number of requests which were sent to the OS."""
+        return self.__apply_count
+
+    @property
+    def skipped(self):
+        """Number of requests which matched the window position, and were skipped."""
+        return self.__skip_count
+
+    def matches(self, hwnd, request):
+        """
+        Check whether the request is already applied to the window.  Counts
+        the request as skipped if so.
+
+        :param hwnd:
+        :param request: GeometryRequest
+        :return: True if the OS calls can be skipped.
+        """
+        with self.__lock:
+            state = self.__applied.get(hwnd)
+            if (
+                    state is None or state[0] != request
+                    or (request.make_focused and state[2] != self.__focus_epoch)
+            ):
+                return False
+            self.__skip_count += 1
+            return True
+
+    def set_applied(self, hwnd, request, final_rect):
+        """
+
+        :param hwnd:
+        :param request: GeometryRequest
+        :param final_rect: where the window ended up (x, y, width, height),
+            or None if that isn't known.
+        """
+        with self.__lock:
+            self.__apply_count += 1
+            if final_rect is None:
+                self.__applied.pop(hwnd, None)
+            else:
+                self.__applied[hwnd] = (request, _rect(final_rect), self.__focus_epoch)
+
+    def observed(self, hwnd, rect):
+        """
+        The window was seen at this rectangle.  If it's not where it was put,
+        something else moved it, and the next request must be applied.
+        """
+        with self.__lock:
+            state = self.__applied.get(hwnd)
+            if state is not None and state[1] != _rect(rect):
+                del self.__applied[hwnd]
+
+    def focus_changed(self):
+        with self.__lock:
+            self.__focus_epoch += 1
+
+    def forget(self, hwnd):
+        with self.__lock:
+            self.__applied.pop(hwnd, None)
+
+
+def _rect(rect):
+    return tuple(rect[key] for key in _RECT_KEYS)
@@ -0,0 +1,157 @@
+"""
+Collects the window positions requested during one layout pass, and applies
+them together through a position batch (see petronia.arch.position_batch).
+
+A layout change sends one rectangle event per window, and the events
+cascade through the bus (layout, then portals, then windows).  Moving each
+window as its event arrives redraws the screen once per window; holding the
+requests until the pass is over moves them all at once.
+
+The OS functions are passed in, so this doesn't depend on the native
+functions.
+"""
+
+import collections
+import threading
+
+# Because the final size of the window is checked, the first batch doesn't
+# use "async".
+_RESIZE_FLAGS = ('frame-changed', 'draw-frame')
+_SNAP_FLAGS = _RESIZE_FLAGS + ('no-size', 'async-window-pos')
+
+
+class WindowPositioner(object):
+    def __init__(self, begin_batch, get_border):
+        """
+
+        :param begin_batch: () -> PositionBatch
+        :param get_border: hwnd -> rectangle dict; raises OSError
+        """
+        self.__begin_batch = begin_batch
+        self.__get_border = get_border
+        self.__lock = threading.Lock()
+        # hwnd -> (GeometryRequest, resizable); the last request for a
+        # window wins.
+        self.__pending = collections.OrderedDict()
+        self.__batch_count = 0
+
+    @property
+    def has_pending(self):
+        return len(self.__pending) > 0
+
+    @property
+    def batch_count(self):
+        """Number of batches committed."""
+        return self.__batch_count
+
+    def request(self, hwnd, geometry_request, resizable):
+        """
+        Queue the window position until the next `commit`.
+
+        :param hwnd:
+        :param geometry_request: GeometryRequest
+        :param resizable: False if the window keeps its own size, and is only
+            snapped into the rectangle.
+        """
+        with self.__lock:
+            self.__pending.pop(hwnd, None)
+            self.__pending[hwnd] = (geometry_request, resizable)
+
+    def cancel(self, hwnd):
+        with self.__lock:
+            self.__pending.pop(hwnd, None)
+
+    def commit(self, hwnd=None):
+        """
+        Move the queued windows.
+
+        :param hwnd: if given, only move this window, such as just before
+            it's brought to the top; the others stay queued.
+        :return: list of (hwnd, GeometryRequest, final rectangle), in request
+            order.  The final rectangle (x, y, width, height) is None if the
+            window didn't respond.
+        """
+        with self.__lock:
+            if hwnd is None:
+                pending = list(self.__pending.items())
+                self.__pending.clear()
+            elif hwnd in self.__pending:
+                pending = [(hwnd, self.__pending.pop(hwnd))]
+            else:
+                pending = []
+        if len(pending) <= 0:
+            return []
+
+        # hwnd -> final rectangle, or None
+        final_rects = {}
+
+        # First, move and resize the windows that can be resized.
+        batch = self.__begin_batch()
+        resized = []
+        for hwnd, (req, resizable) in pending:
+            if resizable:
+                batch.add(hwnd, _z_order(req), req.x, req.y, req.width, req.height, _RESIZE_FLAGS)
+                resized.append(hwnd)
+        if len(resized) > 0:
+            self.__batch_count += 1
+            for hwnd, ok in zip(resized, batch.commit()):
+                if not ok:
+                    final_rects[hwnd] = None
+
+        # Then snap the windows that didn't end up at the requested size into
+        # their rectangle.
+        batch = self.__begin_batch()
+        snapped = []
+        for hwnd, (req, resizable) in pending:
+            if hwnd in final_rects:
+                continue
+            try:
+                final_size = self.__get_border(hwnd)
+            except OSError:
+                final_rects[hwnd] = None
+                continue
+            final_rect = {
+                'x': final_size['x'], 'y': final_size['y'],
+                'width': final_size['width'], 'height': final_size['height']
+            }
+            final_rects[hwnd] = final_rect
+            if not resizable or final_size['width'] != req.width or final_size['height'] != req.height:
+                # The window could not be inserted into the portal at the
+                # expected size.  Put the window in according to the
+                # position options.
+                x, y = _snap(req, final_size['width'], final_size['height'])
+                batch.add(hwnd, _z_order(req), x, y, 0, 0, _SNAP_FLAGS)
+                final_rect['x'] = x
+                final_rect['y'] = y
+                snapped.append(hwnd)
+        if len(snapped) > 0:
+            self.__batch_count += 1
+            for hwnd, ok in zip(snapped, batch.commit()):
+                if not ok:
+                    final_rects[hwnd] = None
+
+        return [(hwnd, req, final_rects[hwnd]) for hwnd, (req, resizable) in pending]
+
+
+def _z_order(req):
+    if req.make_focused:
+        return 'topmost'
+    return None
+
+
+def _snap(req, width, height):
+    v = (req.v_snap or 'top').strip().lower()
+    h = (req.h_snap or 'left').strip().lower()
+    if v == 'bottom':
+        y = req.y + req.height - height
+    elif v == 'center':
+        y = req.y + (req.height // 2) - (height // 2)
+    else:
+        y = req.y
+    if h == 'right':
+        x = req.x + req.width - width
+    elif h == 'center':
+        x = req.x + (req.width // 2) - (width // 2)
+    else:
+        x = req.x
+    return x, y
@@ -0,0 +1,196 @@
+"""
+The windows in a portal.
+
+The windows form a ring in the order they were added, which the z-order
+rotation steps through, and a separate most recently used (MRU) list.  One
+window is the top window.  Each window has a node in both doubly linked
+lists, found through a dictionary, so adding, removing, rotating and
+moving a window to the front don't search the windows.
+
+When the top window is removed, the most recently used remaining window
+becomes the top window.
+"""
+
+
+class _Node(object):
+    __slots__ = ('key', 'value', 'ring_prev', 'ring_next', 'mru_prev', 'mru_next')
+
+    def __init__(self, key, value):
+        self.key = key
+        self.value = value
+        self.ring_prev = self
+        self.ring_next = self
+        self.mru_prev = self
+        self.mru_next = self
+
+
+class WindowRing(object):
+    """
+    Not thread safe; the portal only changes it from its event handlers.
+    """
+    def __init__(self):
+        self.__nodes = {}
+        # The first window added, and the most recently used window; None
+        # when there are no windows.
+        self.__ring_head = None
+        self.__mru_head = None
+        self.__top = None
+
+    def __len__(self):
+        return len(self.__nodes)
+
+    def __contains__(self, key):
+        return key in self.__nodes
+
+    def get(self, key, default=None):
+        node = self.__nodes.get(key)
+        if node is None:
+            return default
+        return node.value
+
+    def values(self):
+        """
+        The window values in ring order, starting from the first added.
+        """
+        return [node.value for node in self.__walk(self.__ring_head, 'ring_next')]
+
+    def keys(self):
+        return [node.key for node in self.__walk(self.__ring_head, 'ring_next')]
+
+    def mru_keys(self):
+        """
+        The window keys, most recently used first.
+        """
+        return [node.key for node in self.__walk(self.__mru_head, 'mru_next')]
+
+    @property
+    def top_key(self):
+        if self.__top is None:
+            return None
+        return self.__top.key
+
+    @property
+    def top(self):
+        """
+        The value of the top window, or None if there are no windows.
+        """
+        if self.__top is None:
+            return None
+        return self.__top.value
+
+    def add(self, key, value, make_top=False):
+        """
+        Add the window at the end of the ring, and the end of the MRU list,
+        or the front if it becomes the top window.  The first window added
+        is always the top.  Adding a known window replaces its value.
+
+        :return: True if the window was added, False if it was already there.
+        """
+        node = self.__nodes.get(key)
+        if node is not None:
+            node.value = value
+            if make_top:
+                self.set_top(key)
+            return False
+        node = _Node(key, value)
+        self.__nodes[key] = node
+        if self.__ring_head is None:
+            self.__ring_head = node
+            self.__mru_head = node
+            self.__top = node
+            return True
+        _link_before(self.__ring_head, node, 'ring_prev', 'ring_next')
+        _link_before(self.__mru_head, node, 'mru_prev', 'mru_next')
+        if make_top:
+            self.set_top(key)
+        return True
+
+    def remove(self, key):
+        """
+
+        :return: the removed window's value, or None if it isn't here.
+        """
+        node = self.__nodes.pop(key, None)
+        if node is None:
+            return None
+        if len(self.__nodes) <= 0:
+            self.__ring_head = None
+            self.__mru_head = None
+            self.__top = None
+            return node.value
+        if self.__ring_head is node:
+            self.__ring_head = node.ring_next
+        if self.__mru_head is node:
+            self.__mru_head = node.mru_next
+        _unlink(node, 'ring_prev', 'ring_next')
+        _unlink(node, 'mru_prev', 'mru_next')
+        if self.__top is node:
+            self.__top = self.__mru_head
+        return node.value
+
+    def set_top(self, key):
+        """
+        Make the window the top window, and the most recently used.
+
+        :return: False if the window isn't here.
+        """
+        node = self.__nodes.get(key)
+        if node is None:
+            return False
+        self.__top = node
+        self.move_to_front(key)
+        return True
+
+    def move_to_front(self, key):
+        """
+        Make the window the most recently used, without changing the top
+        window.
+        """
+        node = self.__nodes.get(key)
+        if node is None or node is self.__mru_head:
+            return
+        _unlink(node, 'mru_prev', 'mru_next')
+        _link_before(self.__mru_head, node, 'mru_prev', 'mru_next')
+        self.__mru_head = node
+
+    def rotate(self, forward=True):
+        """
+        Make the next (or previous) window in the ring the top window.
+
+        :return: the new top window's key, or None if there are no windows.
+        """
+        if self.__top is None:
+            return None
+        if forward:
+            node = self.__top.ring_next
+        else:
+            node = self.__top.ring_prev
+        self.set_top(node.key)
+        return node.key
+
+    @staticmethod
+    def __walk(head, next_name):
+        node = head
+        while node is not None:
+            yield node
+            node = getattr(node, next_name)
+            if node is head:
+                break
+
+
+def _link_before(head, node, prev_name, next_name):
+    # Before the head is the end of the circular list.
+    tail = getattr(head, prev_name)
+    setattr(node, prev_name, tail)
+    setattr(node, next_name, head)
+    setattr(tail, next_name, node)
+    setattr(head, prev_name, node)
+
+
+def _unlink(node, prev_name, next_name):
+    prev_node = getattr(node, prev_name)
+    next_node = getattr(node, next_name)
+    setattr(prev_node, next_name, next_node)
+    setattr(next_node, prev_name, prev_node)
+    setattr(node, prev_name, node)
+    setattr(node, next_name, node)
@@ -0,0 +1,224 @@
+"""
+Caches the window details which change over the life of a window (title,
+border rectangle, and visibility states), so firing an event for a window
+doesn't query the OS each time.
+
+Each field is dropped separately, by the owner of the cache, when
+something changes it: the title on a redraw, the border after the window
+is moved, and the visibility after a minimize, restore or focus change.
+
+The OS lookups are passed in, so the cache doesn't depend on the native
+functions.
+"""
+
+import threading
+
+TITLE = 'title'
+BORDER = 'border'
+VISIBILITY = 'visibility'
+ALL_FIELDS = (TITLE, BORDER, VISIBILITY)
+
+_UNSET = object()
+
+# Used if the window went away before the field was read (#4).
+_GONE_VALUES = {
+    TITLE: "",
+    BORDER: {'x': 0, 'y': 0, 'width': 0, 'height': 0, 'top': 0, 'bottom': 0, 'left': 0, 'right': 0},
+    VISIBILITY: {},
+}
+
+
+class WindowSnapshotCache(object):
+    """
+    Safe to use from several threads; lazy window info objects read the
+    fields from whichever listener thread first uses them.
+    """
+    def __init__(self, get_title, get_border, get_visibility, lazy=True):
+        """
+
+        :param get_title: hwnd -> str; raises OSError
+        :param get_border: hwnd -> rectangle dict; raises OSError
+        :param get_visibility: hwnd -> visibility states; raises OSError
+        :param lazy: if True, the window info objects only read the fields
+            when they're first used.
+        """
+        self.__lookups = {
+            TITLE: get_title,
+            BORDER: get_border,
+            VISIBILITY: get_visibility,
+        }
+        self.lazy = lazy
+        self.__lock = threading.Lock()
+        # hwnd -> {field: value}
+        self.__windows = {}
+        # hwnd -> count of invalidations, so a lookup that raced with an
+        # invalidation isn't stored.
+        self.__versions = {}
+        self.__hits = 0
+        self.__misses = 0
+
+    @property
+    def hits(self):
+        return self.__hits
+
+    @property
+    def misses(self):
+        return self.__misses
+
+    def get(self, hwnd, field):
+        """
+
+        :param hwnd:
+        :param field: one of TITLE, BORDER, VISIBILITY
+        :return: the field value; an empty value if the window is gone.
+        """
+        with self.__lock:
+            fields = self.__windows.get(hwnd)
+            value = _UNSET
+            if fields is not None:
+                value = fields.get(field, _UNSET)
+            if value is not _UNSET:
+                self.__hits += 1
+                return _copy(value)
+            self.__misses += 1
+            version = self.__versions.get(hwnd, 0)
+        try:
+            value = self.__lookups[field](hwnd)
+        except OSError:
+            # Window is gone now; don't remember it.
+            return _copy(_GONE_VALUES[field])
+        with self.__lock:
+            if self.__versions.get(hwnd, 0) == version:
+                self.__windows.setdefault(hwnd, {})[field] = value
+        return _copy(value)
+
+    def title(self, hwnd):
+        return self.get(hwnd, TITLE)
+
+    def border(self, hwnd):
+        return self.get(hwnd, BORDER)
+
+    def visibility(self, hwnd):
+        return self.get(hwnd, VISIBILITY)
+
+    def invalidate(self, hwnd, *fields):
+        """
+        Drop the given fields for the window, or all of them if none are given.
+        """
+        with self.__lock:
+            self.__versions[hwnd] = self.__versions.get(hwnd, 0) + 1
+            window = self.__windows.get(hwnd)
+            if window is not None:
+                for field in (fields or ALL_FIELDS):
+                    window.pop(field, None)
+
+    def remove(self, hwnd):
+        with self.__lock:
+            self.__windows.pop(hwnd, None)
+            self.__versions.pop(hwnd, None)
+
+    def snapshot(self, hwnd, static_info):
+        """
+        Create the window info passed to event listeners.
+
+        :param hwnd:
+        :param static_info: dict of the fields which never change.
+        :return: a dict with the static fields and the cached fields.
+        """
+        if self.lazy:
+            return LazyWindowInfo(self, hwnd, static_info)
+        ret = dict(static_info)
+        for field in ALL_FIELDS:
+            ret[field] = self.get(hwnd, field)
+        return ret
+
+
+class LazyWindowInfo(dict):
+    """
+    A window info dict which reads the cached fields from the
+    WindowSnapshotCache the first time they're used.  Once read, the value
+    doesn't change.
+    """
+    def __init__(self, cache, hwnd, static_info):
+        dict.__init__(self, static_info)
+        self.__cache = cache
+        self.__hwnd = hwnd
+        self.__pending = set(field for field in ALL_FIELDS if field not in static_info)
+
+    def __missing__(self, key):
+        if key in self.__pending:
+            return self.__resolve(key)
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in self.__pending or dict.__contains__(self, key)
+
+    def get(self, key, default=None):
+        if key in self.__pending:
+            return self.__resolve(key)
+        return dict.get(self, key, default)
+
+    def keys(self):
+        self.__resolve_all()
+        return dict.keys(self)
+
+    def values(self):
+        self.__resolve_all()
+        return dict.values(self)
+
+    def items(self):
+        self.__resolve_all()
+        return dict.items(self)
+
+    def __iter__(self):
+        self.__resolve_all()
+        return dict.__iter__(self)
+
+    def __len__(self):
+        return dict.__len__(self) + len([key for key in self.__pending if not dict.__contains__(self, key)])
+
+    def __eq__(self, other):
+        self.__resolve_all()
+        return dict.__eq__(self, other)
+
+    def __ne__(self, other):
+        self.__resolve_all()
+        return dict.__ne__(self, other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        self.__resolve_all()
+        return dict.__repr__(self)
+
+    def copy(self):
+        self.__resolve_all()
+        return dict(self)
+
+    def pop(self, key, *default):
+        self.__resolve_all()
+        return dict.pop(self, key, *default)
+
+    def __delitem__(self, key):
+        self.__resolve_all()
+        dict.__delitem__(self, key)
+
+    def __resolve(self, key):
+        self.__pending.discard(key)
+        if dict.__contains__(self, key):
+            # Set directly, e.g. through update().
+            return dict.__getitem__(self, key)
+        value = self.__cache.get(self.__hwnd, key)
+        return dict.setdefault(self, key, value)
+
+    def __resolve_all(self):
+        for key in list(self.__pending):
+            self.__resolve(key)
+
+
+def _copy(value):
+    if isinstance(value, dict):
+        return dict(value)
+    if isinstance(value, list):
+        return list(value)
+    return value
@@ -0,0 +1,159 @@
+"""
+Remembers which portal each application window was in, so that after a
+restart or a layout switch the windows go back where the user put them.
+
+A window is known by its application executable (without the directory),
+its window class, and its title pattern: the end of the title after the
+last " - ", which is usually the application name rather than the
+document.  Each window identity maps to a portal alias and the window's
+z-order index in that portal.
+
+The state file has one JSON object per line.  A change appends a line, so
+saving a placement doesn't rewrite the file; the last line for an
+identity wins.  When the file holds many more lines than identities, it is
+rewritten with one line per identity (compacted).
+"""
+
+import json
+import os
+import threading
+
+# The most identities kept; the least recently placed ones are dropped
+# when the file is compacted.
+_MAX_ENTRIES = 500
+
+# Appended lines allowed beyond the live identities before compacting.
+_COMPACT_SLACK = 200
+
+
+class WindowState(object):
+    __slots__ = ('alias', 'z_index')
+
+    def __init__(self, alias, z_index):
+        """
+
+        :param alias: portal alias name.
+        :param z_index: position of the window in the portal's z-order;
+            0 is the top window, then the most recently used.
+        """
+        self.alias = alias
+        self.z_index = z_index
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, WindowState) and self.alias == other.alias and
+            self.z_index == other.z_index
+        )
+
+    def __repr__(self):
+        return "WindowState({0}, {1})".format(self.alias, self.z_index)
+
+
+def window_identity(window_info):
+    """
+
+    :param window_info: the window information from the window mapper.
+    :return: (exec name, class, title pattern) tuple
+    """
+    exec_name = (window_info.get('exec_filename') or '').replace('/', '\\').split('\\')[-1].lower()
+    title = window_info.get('title') or ''
+    pos = title.rfind(' - ')
+    if pos >= 0:
+        title = title[pos + 3:]
+    return exec_name, window_info.get('class') or '', title.strip()
+
+
+class WindowStateStore(object):
+    """
+    Safe to use from several threads.  The file is written as the
+    placements change; placements come from user actions, so the file is
+    only opened to append each one.
+    """
+    def __init__(self, filename, max_entries=_MAX_ENTRIES, compact_slack=_COMPACT_SLACK):
+        self.__filename = filename
+        self.__max_entries = max_entries
+        self.__compact_slack = compact_slack
+        self.__lock = threading.Lock()
+        # identity -> WindowState, in the order they were last placed.
+        self.__states = {}
+        self.__order = []
+        self.__line_count = 0
+
+    def load(self):
+        """
+        Read the state file, if there is one.  Lines that can't be read
+        (such as one cut off by a crash) are skipped.
+
+        :return: number of window identities loaded.
+        """
+        with self.__lock:
+            self.__states = {}
+            self.__order = []
+            self.__line_count = 0
+            if os.path.isfile(self.__filename):
+                with open(self.__filename, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        self.__line_count += 1
+                        try:
+                            data = json.loads(line)
+                            identity = (data['exec'], data['class'], data['title'])
+                            state = WindowState(data['portal'], int(data['z']))
+                        except (ValueError, KeyError, TypeError):
+                            continue
+                        self.__set(identity, state)
+            if self.__line_count > len(self.__states) + self.__compact_slack:
+                self.__compact()
+            return len(self.__states)
+
+    def get(self, identity):
+        """
+
+        :param identity: from `window_identity`
+        :return: the WindowState, or None if the window isn't known.
+        """
+        with self.__lock:
+            return self.__states.get(identity)
+
+    def __len__(self):
+        with self.__lock:
+            return len(self.__states)
+
+    def record(self, identity, alias, z_index):
+        """
+        Remember the window placement.  Nothing is written if it didn't
+        change.
+        """
+        state = WindowState(alias, z_index)
+        with self.__lock:
+            if self.__states.get(identity) == state:
+                return
+            self.__set(identity, state)
+            if self.__line_count + 1 > len(self.__states) + self.__compact_slack:
+                self.__compact()
+                return
+            with open(self.__filename, 'a', encoding='utf-8') as f:
+                f.write(_encode(identity, state))
+            self.__line_count += 1
+
+    def __set(self, identity, state):
+        if identity in self.__states:
+            self.__order.remove(identity)
+        self.__states[identity] = state
+        self.__order.append(identity)
+        while len(self.__order) > self.__max_entries:
+            del self.__states[self.__order.pop(0)]
+
+    def __compact(self):
+        temp_filename = self.__filename + '.tmp'
+        with open(temp_filename, 'w', encoding='utf-8') as f:
+            for identity in self.__order:
+                f.write(_encode(identity, self.__states[identity]))
+        os.replace(temp_filename, self.__filename)
+        self.__line_count = len(self.__order)
+
+
+def _encode(identity, state):
+    return json.dumps({
+        'exec': identity[0], 'class': identity[1], 'title': identity[2],
+        'portal': state.alias, 'z': state.z_index,
+    }, sort_keys=True) + '\n'